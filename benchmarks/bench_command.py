@@ -0,0 +1,60 @@
+"""Micro-benchmark for config -> tippecanoe argv throughput.
+
+Usage: python benchmarks/bench_command.py [--configs N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import command  # noqa: E402
+
+
+def random_config(rng, i):
+    return {
+        "output_file": f"tileset_{i}.mbtiles",
+        "output_format": rng.choice(command.OUTPUT_FORMATS[:2]),
+        "name": f"Tileset {i}",
+        "zoom_mode": rng.choice(command.ZOOM_MODES),
+        "max_zoom": rng.randint(8, 16),
+        "min_zoom": rng.randint(0, 4),
+        "drop_options": rng.sample(command.DROP_OPTIONS, rng.randint(0, 3)),
+        "drop_rate": rng.choice([1.0, 2.5, 3.0]),
+        "cluster_options": rng.choice(command.CLUSTER_METHODS),
+        "accumulate_attributes": "population:sum",
+        "attribute_mode": rng.choice(command.ATTRIBUTE_MODES),
+        "exclude_attributes": "notes\ndescription",
+        "buffer_size": rng.randint(0, 10),
+        "inputs": [{"path": f"data/layer_{j}.geojson", "layer": f"layer_{j}"} for j in range(rng.randint(1, 5))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    configs = [random_config(rng, i) for i in range(args.configs)]
+
+    started = time.perf_counter()
+    options = [command.options_from_dict(config) for config in configs]
+    parsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for item in options:
+        command.build_argv(item)
+    built = time.perf_counter() - started
+
+    print(f"{args.configs} configs")
+    print(f"config -> options: {args.configs / parsed:,.0f}/s")
+    print(f"options -> argv:   {args.configs / built:,.0f}/s")
+    print(f"config -> argv:    {args.configs / (parsed + built):,.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
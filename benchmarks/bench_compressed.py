@@ -0,0 +1,132 @@
+"""Benchmark streaming compressed inputs through named pipes against decompressing them to disk first.
+
+Usage: python benchmarks/bench_compressed.py [--count 1000000] [--format geojsonl] [--workers 1,4] [--fake]
+
+A synthetic points dataset is compressed as plain gzip, block gzip (BGZF) and,
+when the zstd command is installed, multi-frame zstd. For each file the table
+lists the decompression throughput on its own at each --workers setting, then
+the build time with the input streamed through a pipe and with it
+decompressed to a scratch file first, and the scratch space that takes.
+--fake (the default when tippecanoe isn't on the PATH) runs the scripted
+stand-in, whose reading is slower than tippecanoe's, so the pipe is rarely the
+bottleneck there.
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import compressed, fake_tippecanoe, runner, synthetic  # noqa: E402
+
+COLUMNS = (
+    "input",
+    "method",
+    "workers",
+    "compressed MB",
+    "MB",
+    "decompress s",
+    "MB/s",
+    "piped build s",
+    "unpack + build s",
+    "scratch MB",
+)
+
+
+def _compress(path, workdir):
+    files = {}
+    plain = os.path.join(workdir, "plain", os.path.basename(path) + ".gz")
+    os.makedirs(os.path.dirname(plain))
+    with open(path, "rb") as f, gzip.open(plain, "wb", compresslevel=6) as out:
+        shutil.copyfileobj(f, out, compressed.READ_SIZE)
+    files["gzip"] = plain
+    block = os.path.join(workdir, "block", os.path.basename(path) + ".gz")
+    os.makedirs(os.path.dirname(block))
+    files["block gzip"] = compressed.write_block_gzip(path, block)
+    if shutil.which("zstd"):
+        frames = os.path.join(workdir, "frames", os.path.basename(path) + ".zst")
+        os.makedirs(os.path.dirname(frames))
+        # One frame per 8 MB, as a multi-threaded or parallel zstd would write
+        with open(path, "rb") as f, open(frames, "wb") as out:
+            while True:
+                data = f.read(8 << 20)
+                if not data:
+                    break
+                out.write(subprocess.run(["zstd", "-q", "-c"], input=data, stdout=subprocess.PIPE, check=True).stdout)
+        files["multi-frame zstd"] = frames
+    return files
+
+
+def _build(program, path, output):
+    record = runner.run([*program, "-f", "-z10", "-o", output, "-L", f"points:{path}"])
+    if record.returncode != 0:
+        sys.exit("\n".join(record.stderr_tail[-20:]))
+    os.remove(output)
+    return record.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--format", default="geojsonl", help="Input format: geojsonl or csv")
+    parser.add_argument("--workers", default="1,4", help="Comma-separated decompression thread counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    program = ["tippecanoe"]
+    if args.fake or shutil.which("tippecanoe") is None:
+        print("using the fake tippecanoe: build timings exercise the harness, not tippecanoe")
+        program = fake_tippecanoe.TIPPECANOE
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        dataset = synthetic.generate("points", args.count, seed=args.seed)
+        path = synthetic.write(dataset, os.path.join(workdir, f"points.{args.format}"))
+        output = os.path.join(workdir, "out.mbtiles")
+        for name, packed in _compress(path, workdir).items():
+            for workers in (int(value) for value in args.workers.split(",")):
+                how = compressed.decompression_method(packed)
+                started = time.perf_counter()
+                size = sum(len(chunk) for chunk in compressed.iter_chunks(packed, workers, how))
+                seconds = time.perf_counter() - started
+                rows.append(
+                    {
+                        "input": name,
+                        "method": how,
+                        "workers": workers,
+                        "compressed MB": round(os.path.getsize(packed) / 1e6, 1),
+                        "MB": round(size / 1e6, 1),
+                        "decompress s": round(seconds, 2),
+                        "MB/s": round(size / 1e6 / seconds, 1),
+                        "piped build s": None,
+                        "unpack + build s": None,
+                        "scratch MB": None,
+                    }
+                )
+            piped = _build(program, packed, output)
+            started = time.perf_counter()
+            unpacked = os.path.join(workdir, "unpacked." + args.format)
+            with open(unpacked, "wb") as out:
+                for chunk in compressed.iter_chunks(packed):
+                    out.write(chunk)
+            unpack_seconds = time.perf_counter() - started
+            rows[-1]["piped build s"] = round(piped, 2)
+            rows[-1]["unpack + build s"] = round(unpack_seconds + _build(program, unpacked, output), 2)
+            rows[-1]["scratch MB"] = round(os.path.getsize(unpacked) / 1e6, 1)
+            os.remove(unpacked)
+
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
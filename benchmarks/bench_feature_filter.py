@@ -0,0 +1,103 @@
+"""Benchmark pre-filtering inputs with a -j feature filter against letting tippecanoe parse everything.
+
+Usage: python benchmarks/bench_feature_filter.py [--count 500000] [--format geojsonl] [--fake]
+
+A synthetic points dataset is filtered on its category attribute at a few
+selectivities. For each filter the table lists the selectivity the sample
+preview estimated and the true one, the pre-filtering pass's throughput, and
+the build time with -j from the original input and from the filtered copy.
+--fake (the default when tippecanoe isn't on the PATH) runs the scripted
+stand-in, which doesn't apply -j, so only real tippecanoe build timings say
+anything.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import fake_tippecanoe, feature_filter, runner, synthetic  # noqa: E402
+
+COLUMNS = (
+    "filter",
+    "input MB",
+    "preview s",
+    "estimated",
+    "selectivity",
+    "filter s",
+    "filter MB/s",
+    "build s",
+    "filtered build s",
+)
+
+FILTERS = {
+    "one category": ["==", "category", "footpath"],
+    "two categories": ["in", "category", "footpath", "road"],
+    "numeric range": ["all", [">=", "population", 100], ["<", "value", 0.5]],
+    "no match": ["==", "category", "none"],
+}
+
+
+def _build(program, options, path, output):
+    record = runner.run([*program, *options, "-o", output, "-L", f"points:{path}"])
+    if record.returncode != 0:
+        sys.exit("\n".join(record.stderr_tail[-20:]))
+    os.remove(output)
+    return record.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=500000)
+    parser.add_argument("--format", default="geojsonl", help="Input format: geojsonl, csv or fgb")
+    parser.add_argument("--max-zoom", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    program = ["tippecanoe"]
+    if args.fake or shutil.which("tippecanoe") is None:
+        print("using the fake tippecanoe: timings exercise the harness, not tippecanoe")
+        program = fake_tippecanoe.TIPPECANOE
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, "out.mbtiles")
+        dataset = synthetic.generate("points", args.count, seed=args.seed)
+        path = synthetic.write(dataset, os.path.join(workdir, f"points.{args.format}"))
+        for name, expression in FILTERS.items():
+            filters = {"points": expression}
+            options = ["-f", f"-z{args.max_zoom}", "-j", json.dumps(filters)]
+            started = time.perf_counter()
+            preview = feature_filter.preview_selectivity(filters, [(path, "points")])[0]
+            preview_seconds = time.perf_counter() - started
+            stats = feature_filter.prefilter(path, expression, layer="points")
+            print(feature_filter.describe_stats(stats), file=sys.stderr)
+            rows.append(
+                {
+                    "filter": name,
+                    "input MB": round(os.path.getsize(path) / 1e6, 1),
+                    "preview s": round(preview_seconds, 2),
+                    "estimated": preview["selectivity"],
+                    "selectivity": round(stats.selectivity, 4),
+                    "filter s": round(stats.seconds, 2),
+                    "filter MB/s": round(os.path.getsize(path) / 1e6 / max(stats.seconds, 1e-9), 1),
+                    "build s": round(_build(program, options, path, output), 2),
+                    "filtered build s": round(_build(program, options, stats.output_path, output), 2),
+                }
+            )
+            os.remove(stats.output_path)
+
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
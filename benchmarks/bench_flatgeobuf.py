@@ -0,0 +1,109 @@
+"""Benchmark tippecanoe ingest from CSV/GeoJSONSeq against the same data preconverted to FlatGeobuf.
+
+Usage: python benchmarks/bench_flatgeobuf.py [--kinds points,lines,polygons] [--count 200000]
+       [--formats geojsonl,csv] [--memory 256] [--fake]
+
+Each synthetic dataset is written in the text formats, converted once with
+tiling_tools.to_flatgeobuf (Hilbert-sorted, packed R-tree) and built with the
+same options from both files. The table lists the conversion time, the build
+time from each input and how many builds it takes for the conversion to pay
+for itself. Point dropping depends on input order, so Hilbert-sorted points
+can keep a different set at low zooms. --fake (the default when tippecanoe
+isn't on the PATH) runs the scripted stand-in, whose reader is Python on both
+sides, so only real tippecanoe timings say anything about ingest speed.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import analyzer, fake_tippecanoe, runner, synthetic, to_flatgeobuf  # noqa: E402
+
+COLUMNS = (
+    "dataset",
+    "input MB",
+    "convert s",
+    "convert MB/s",
+    "fgb MB",
+    "build s",
+    "fgb build s",
+    "ingest speedup",
+    "break-even builds",
+    "tiles",
+    "fgb tiles",
+)
+
+
+def _build(program, options, path, layer, output):
+    record = runner.run([*program, *options, "-o", output, "-L", f"{layer}:{path}"])
+    if record.returncode != 0:
+        sys.exit("\n".join(record.stderr_tail[-20:]))
+    tiles = analyzer.analyze(output, count_features=False, top_n=1).tile_count
+    os.remove(output)
+    return record.seconds, tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kinds", default="points,lines,polygons")
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--formats", default="geojsonl,csv", help="Text formats to compare (CSV only for points)")
+    parser.add_argument("--memory", type=int, default=to_flatgeobuf.MEMORY_BYTES >> 20, help="MB sorted in memory")
+    parser.add_argument("--max-zoom", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    program = ["tippecanoe"]
+    if args.fake or shutil.which("tippecanoe") is None:
+        print("using the fake tippecanoe: timings exercise the harness, not tippecanoe")
+        program = fake_tippecanoe.TIPPECANOE
+    options = ["-f", f"-z{args.max_zoom}", "--drop-densest-as-needed"]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, "out.mbtiles")
+        for kind in args.kinds.split(","):
+            dataset = synthetic.generate(kind, args.count, seed=args.seed)
+            for input_format in args.formats.split(","):
+                if input_format == "csv" and kind != "points":
+                    continue
+                path = synthetic.write(dataset, os.path.join(workdir, f"{kind}.{input_format}"))
+                stats = to_flatgeobuf.convert(path, memory_bytes=args.memory << 20)
+                print(to_flatgeobuf.describe_stats(stats), file=sys.stderr)
+                seconds, tiles = _build(program, options, path, kind, output)
+                fgb_options = options
+                if to_flatgeobuf.has_feature_ids(stats.output_path):
+                    fgb_options = [*options, "--use-attribute-for-id", to_flatgeobuf.ID_COLUMN]
+                fgb_seconds, fgb_tiles = _build(program, fgb_options, stats.output_path, kind, output)
+                saved = seconds - fgb_seconds
+                rows.append(
+                    {
+                        "dataset": os.path.basename(path),
+                        "input MB": round(stats.bytes_in / 1e6, 1),
+                        "convert s": round(stats.seconds, 2),
+                        "convert MB/s": round(stats.bytes_per_second / 1e6, 1),
+                        "fgb MB": round(stats.bytes_out / 1e6, 1),
+                        "build s": round(seconds, 2),
+                        "fgb build s": round(fgb_seconds, 2),
+                        "ingest speedup": round(seconds / max(fgb_seconds, 1e-9), 2),
+                        "break-even builds": round(stats.seconds / saved, 1) if saved > 0 else None,
+                        "tiles": tiles,
+                        "fgb tiles": fgb_tiles,
+                    }
+                )
+                os.remove(path)
+                os.remove(stats.output_path)
+
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark Hilbert-sorting inputs and its effect on tippecanoe wall time and temp disk.
+
+Usage: python benchmarks/bench_hilbert_sort.py [--kinds points,lines,polygons] [--count 200000]
+       [--memory 64] [--workers 4] [--fake]
+
+Each synthetic dataset is written as GeoJSONSeq in spatially random order,
+sorted with tiling_tools.hilbert_sort (a small --memory forces it to spill
+and merge runs) and built from both files with the same options, with
+tippecanoe's temp files in their own directory so the instrumented runner
+can measure them. --fake (the default when tippecanoe isn't on the PATH) runs
+the scripted stand-in, which keeps no temp files, so only real tippecanoe
+timings say anything about the effect on the build.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import analyzer, fake_tippecanoe, hilbert_sort, runner, synthetic  # noqa: E402
+
+COLUMNS = (
+    "dataset",
+    "input MB",
+    "sort s",
+    "sorted MB/s",
+    "runs",
+    "build s",
+    "sorted build s",
+    "temp MB",
+    "sorted temp MB",
+    "tiles",
+    "sorted tiles",
+)
+
+
+def _build(program, options, path, layer, output, temp_dir):
+    os.makedirs(temp_dir, exist_ok=True)
+    record = runner.run([*program, *options, "-t", temp_dir, "-o", output, "-L", f"{layer}:{path}"])
+    if record.returncode != 0:
+        sys.exit("\n".join(record.stderr_tail[-20:]))
+    tiles = analyzer.analyze(output, count_features=False, top_n=1).tile_count
+    os.remove(output)
+    return record, tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kinds", default="points,lines,polygons")
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--memory", type=int, default=64, help="MB the sort may hold in memory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-zoom", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    program = ["tippecanoe"]
+    if args.fake or shutil.which("tippecanoe") is None:
+        print("using the fake tippecanoe: timings exercise the harness, not tippecanoe")
+        program = fake_tippecanoe.TIPPECANOE
+    options = ["-f", f"-z{args.max_zoom}", "--drop-densest-as-needed"]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, "out.mbtiles")
+        temp_dir = os.path.join(workdir, "tippecanoe-tmp")
+        for kind in args.kinds.split(","):
+            # Synthetic features are drawn independently, so the file is in spatially random order
+            dataset = synthetic.generate(kind, args.count, seed=args.seed)
+            path = synthetic.write(dataset, os.path.join(workdir, f"{kind}.geojsonl"))
+
+            stats = hilbert_sort.sort_input(path, memory_bytes=args.memory << 20, workers=args.workers)
+            print(hilbert_sort.describe_stats(stats), file=sys.stderr)
+            record, tiles = _build(program, options, path, kind, output, temp_dir)
+            sorted_record, sorted_tiles = _build(program, options, stats.output_path, kind, output, temp_dir)
+            rows.append(
+                {
+                    "dataset": os.path.basename(path),
+                    "input MB": round(stats.bytes_in / 1e6, 1),
+                    "sort s": round(stats.seconds, 2),
+                    "sorted MB/s": round(stats.bytes_per_second / 1e6, 1),
+                    "runs": stats.runs,
+                    "build s": round(record.seconds, 2),
+                    "sorted build s": round(sorted_record.seconds, 2),
+                    "temp MB": round(record.peak_temp_mb, 1),
+                    "sorted temp MB": round(sorted_record.peak_temp_mb, 1),
+                    "tiles": tiles,
+                    "sorted tiles": sorted_tiles,
+                }
+            )
+            os.remove(path)
+            os.remove(stats.output_path)
+
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark incremental tippecanoe updates against full rebuilds, checking every tile matches.
+
+Usage: python benchmarks/bench_incremental.py [--kind polygons] [--count 20000] [--edits 300]
+       [--max-zoom 10] [--clustered-fraction 0.8] [--fake]
+
+A synthetic dataset is built in full, then a day's worth of edits is applied
+(a third each moved, deleted and added, plus property changes on moved ones).
+The edited dataset is brought up to date with tiling_tools.incremental and, for
+comparison, rebuilt from scratch; the table compares the two tile by tile per
+zoom. --fake (the default when tippecanoe isn't on the PATH) runs the scripted
+stand-in. With points and a drop rate above 1, zooms below the base zoom are
+rebuilt whole, so an update rarely beats a full rebuild unless -B is lowered;
+--drop-rate 1 shows the cost without dot dropping.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import fake_tippecanoe, incremental, runner, synthetic  # noqa: E402
+
+
+# Function to apply a reproducible batch of moves, deletions and additions to a dataset's features
+def edit_features(features, edits, seed):
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(features), size=min(len(features), 2 * (edits // 3)), replace=False)
+    moved, deleted = chosen[: edits // 3], set(chosen[edits // 3 :].tolist())
+    features = [dict(feature) for feature in features]
+    for i in moved.tolist():
+        shift = rng.normal(0.0, 0.01, 2)
+        feature = features[i]
+        feature["geometry"] = json.loads(json.dumps(feature["geometry"]))
+        _shift(feature["geometry"]["coordinates"], shift)
+        feature["properties"] = {**feature["properties"], "value": round(float(rng.lognormal()), 3)}
+    features = [feature for i, feature in enumerate(features) if i not in deleted]
+    donors = rng.choice(len(features), size=edits - 2 * (edits // 3), replace=False)
+    next_id = max(feature["properties"]["id"] for feature in features) + 1
+    for offset, i in enumerate(donors.tolist()):
+        feature = json.loads(json.dumps(features[i]))
+        _shift(feature["geometry"]["coordinates"], rng.normal(0.0, 0.05, 2))
+        feature["properties"]["id"] = next_id + offset
+        features.append(feature)
+    return features
+
+
+def _shift(coordinates, shift):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        coordinates[0] = round(coordinates[0] + float(shift[0]), 7)
+        coordinates[1] = round(coordinates[1] + float(shift[1]), 7)
+        return
+    for child in coordinates:
+        _shift(child, shift)
+
+
+def _write(features, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for feature in features:
+            f.write(json.dumps(feature, separators=(",", ":")) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kind", choices=synthetic.KINDS, default="polygons")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--edits", type=int, default=300, help="Features moved, deleted and added, in thirds")
+    parser.add_argument("--max-zoom", type=int, default=10)
+    parser.add_argument("--drop-rate", default=None, help="Passed to tippecanoe as -r")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clusters", type=int, default=20)
+    parser.add_argument("--clustered-fraction", type=float, default=0.8)
+    parser.add_argument("--spread", type=float, default=0.05)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    tippecanoe = ("tippecanoe",)
+    if args.fake or shutil.which("tippecanoe") is None:
+        print("using the fake tippecanoe: timings exercise the harness, not tippecanoe")
+        tippecanoe = tuple(fake_tippecanoe.TIPPECANOE)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data = os.path.join(workdir, f"{args.kind}.geojsonl")
+        output = os.path.join(workdir, "incremental.mbtiles")
+        options = ["-f", f"-z{args.max_zoom}"] + ([f"-r{args.drop_rate}"] if args.drop_rate else [])
+        command = [*options, "-o", output, "-L", f"{args.kind}:{data}"]
+
+        dataset = synthetic.generate(
+            args.kind,
+            args.count,
+            seed=args.seed,
+            clusters=args.clusters,
+            clustered_fraction=args.clustered_fraction,
+            spread=args.spread,
+        )
+        features = list(synthetic.iter_features(dataset))
+        _write(features, data)
+        first = incremental.update(command, id_property="id", tippecanoe=tippecanoe)
+        print(f"initial: {incremental.describe_result(first)}")
+
+        _write(edit_features(features, args.edits, args.seed + 1), data)
+        result = incremental.update(command, id_property="id", tippecanoe=tippecanoe)
+        print(f"update: {incremental.describe_result(result)}")
+
+        full_output = os.path.join(workdir, "full.mbtiles")
+        started = time.perf_counter()
+        record = runner.run([*tippecanoe, *options, "-o", full_output, "-L", f"{args.kind}:{data}"])
+        full_seconds = time.perf_counter() - started
+        if record.returncode != 0:
+            sys.exit("\n".join(record.stderr_tail[-20:]))
+        speedup = full_seconds / max(result.seconds, 1e-9)
+        print(f"full rebuild: {full_seconds:.1f}s; incremental update: {result.seconds:.1f}s ({speedup:.1f}x faster)")
+
+        rows = incremental.compare_tilesets(output, full_output)
+        columns = list(rows[0]) if rows else []
+        print("  ".join(column.rjust(14) for column in columns))
+        for row in rows:
+            print("  ".join(str(row[column]).rjust(14) for column in columns))
+        mismatched = sum(row["different"] + row["only in first"] + row["only in second"] for row in rows)
+        print("identical to the full rebuild" if not mismatched else f"{mismatched} tiles differ from the full rebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark FeatureCollection -> line-delimited GeoJSON conversion and tippecanoe ingest.
+
+Usage: python benchmarks/bench_ndjson.py [--features N] [--workers N] [--keep DIR]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import ndjson  # noqa: E402
+
+
+def write_feature_collection(path, count, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for i in range(count):
+            lon, lat = rng.uniform(-180, 180), rng.uniform(-80, 80)
+            coordinates = [[lon + j * 0.001, lat + rng.uniform(-0.001, 0.001)] for j in range(8)]
+            feature = {
+                "type": "Feature",
+                "properties": {"id": i, "name": f"feature {i}", "value": rng.random()},
+                "geometry": {"type": "LineString", "coordinates": coordinates},
+            }
+            f.write(("," if i else "") + json.dumps(feature, indent=1) + "\n")
+        f.write("]}\n")
+
+
+def time_tippecanoe(args):
+    started = time.perf_counter()
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--features", type=int, default=500000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--keep", help="Directory to keep the generated files in")
+    args = parser.parse_args()
+
+    workdir = args.keep or tempfile.mkdtemp(prefix="bench_ndjson_")
+    os.makedirs(workdir, exist_ok=True)
+    source = os.path.join(workdir, "benchmark.geojson")
+    write_feature_collection(source, args.features)
+    print(f"Input: {source} ({os.path.getsize(source) / 1e6:.1f} MB, {args.features} features)")
+
+    for workers in sorted({1, args.workers}):
+        stats = ndjson.convert(source, workers=workers)
+        print(
+            f"convert workers={workers}: {stats.seconds:.2f}s, "
+            f"{stats.bytes_per_second / 1e6:.1f} MB/s, {stats.features} features"
+        )
+
+    if shutil.which("tippecanoe"):
+        output = os.path.join(workdir, "benchmark.mbtiles")
+        serial = time_tippecanoe(["tippecanoe", "-f", "-z10", "-o", output, source])
+        parallel = time_tippecanoe(
+            ["tippecanoe", "-f", "-z10", "-P", "-o", output, ndjson.converted_path(source)]
+        )
+        print(f"tippecanoe serial FeatureCollection: {serial:.2f}s")
+        print(f"tippecanoe -P line-delimited:        {parallel:.2f}s ({serial / parallel:.2f}x)")
+        print(f"conversion + -P total:               {parallel + stats.seconds:.2f}s")
+    else:
+        print("tippecanoe not found on PATH; skipping ingest comparison")
+
+    if not args.keep:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark matrix of tippecanoe feature-handling options over synthetic datasets.
+
+Usage: python benchmarks/bench_options.py [--kinds points,lines,polygons] [--counts 10000,100000]
+       [--format fgb] [--options baseline,drop-densest,...] [--fake] [--csv results.csv]
+
+Each dataset is generated reproducibly (tiling_tools.synthetic), each option set
+is turned into a command with the command builder, and every build is run with
+the instrumented runner. The table lists the dataset's density in its densest
+0.1° cell, then build time, CPU, peak memory, output size and the largest tile
+per configuration. --fake (the default when tippecanoe
+isn't on the PATH) runs the scripted stand-in so the harness works offline; its
+numbers say nothing about tippecanoe itself.
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import analyzer, command, fake_tippecanoe, runner, synthetic  # noqa: E402
+
+# Option sets compared, as TippecanoeOptions overrides
+OPTION_SETS = {
+    "baseline": {},
+    "drop-densest": {"drop_options": ("Drop Densest As Needed",)},
+    "coalesce-densest": {"drop_options": ("Coalesce Densest As Needed",)},
+    "drop-fraction": {"drop_options": ("Drop Fraction As Needed",)},
+    "cluster-densest": {"cluster_options": "Cluster Densest As Needed", "accumulate_attributes": "population:sum"},
+    "cluster-distance": {"cluster_options": "Fixed Distance", "accumulate_attributes": "population:sum"},
+    "grid-low-zooms": {"grid_low_zooms": True},
+    "shared-borders": {"detect_shared_borders": True},
+    "extend-zooms": {"drop_options": ("Drop Densest As Needed",), "extend_zooms": True},
+}
+
+COLUMNS = (
+    "dataset",
+    "densest features/km²",
+    "options",
+    "exit",
+    "seconds",
+    "CPU s",
+    "peak RSS MB",
+    "output MB",
+    "tiles",
+    "max tile bytes",
+)
+
+
+# Function to run one configuration and return its table row
+def run_configuration(dataset_path, kind, option_set, workdir, max_zoom, program, density=None):
+    output = os.path.join(workdir, f"{os.path.basename(dataset_path)}.{option_set}.mbtiles")
+    options = command.TippecanoeOptions(
+        output_file=output,
+        max_zoom=max_zoom,
+        inputs=(command.InputFile(path=dataset_path, layer=kind),),
+        **OPTION_SETS[option_set],
+    )
+    argv = list(program) + command.build_argv(options)[1:]
+    record = runner.run(argv)
+    tiles = largest = None
+    if record.returncode == 0 and os.path.exists(output):
+        analysis = analyzer.analyze(output, count_features=False, top_n=1)
+        tiles = analysis.tile_count
+        largest = int(analysis.largest[0, 0]) if len(analysis.largest) else 0
+        os.remove(output)
+    return {
+        "dataset": os.path.basename(dataset_path),
+        "densest features/km²": None if density is None else float(f"{density:.3g}"),
+        "options": option_set,
+        "exit": record.returncode,
+        "seconds": round(record.seconds, 2),
+        "CPU s": round(record.cpu_seconds, 2),
+        "peak RSS MB": round(record.peak_rss_mb, 1),
+        "output MB": round(record.output_bytes / 1e6, 3) if record.output_bytes is not None else None,
+        "tiles": tiles,
+        "max tile bytes": largest,
+    }
+
+
+def _print_table(rows):
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kinds", default="points,lines,polygons")
+    parser.add_argument("--counts", default="10000,100000", help="Feature counts to generate")
+    parser.add_argument("--format", choices=("fgb", "geojsonl", "csv"), default="fgb")
+    parser.add_argument("--options", default=",".join(OPTION_SETS), help="Option sets to run")
+    parser.add_argument("--max-zoom", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clusters", type=int, default=20)
+    parser.add_argument("--spread", type=float, default=0.05)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    parser.add_argument("--csv", help="Also write the results to this CSV file")
+    args = parser.parse_args()
+
+    option_sets = args.options.split(",")
+    unknown = [name for name in option_sets if name not in OPTION_SETS]
+    if unknown:
+        parser.error(f"unknown option sets {unknown}; choose from {', '.join(OPTION_SETS)}")
+    program = ["tippecanoe"]
+    if args.fake or shutil.which("tippecanoe") is None:
+        print("using the fake tippecanoe: timings exercise the harness, not tippecanoe")
+        program = fake_tippecanoe.TIPPECANOE
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for kind in args.kinds.split(","):
+            for count in (int(value) for value in args.counts.split(",")):
+                if kind != "points" and args.format == "csv":
+                    print(f"skipping {kind}: CSV inputs can only hold points")
+                    continue
+                dataset = synthetic.generate(
+                    kind, count, seed=args.seed, clusters=args.clusters, spread=args.spread
+                )
+                path = synthetic.write(dataset, os.path.join(workdir, f"{kind}_{count}.{args.format}"))
+                print(f"{os.path.basename(path)}: {synthetic.describe_dataset(dataset)}")
+                density = synthetic.densities(dataset)[1]
+                for option_set in option_sets:
+                    rows.append(run_configuration(path, kind, option_set, workdir, args.max_zoom, program, density))
+                    print(f"  {option_set}: {rows[-1]['seconds']}s", file=sys.stderr)
+                os.remove(path)
+
+    _print_table(rows)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark PMTiles tile lookups: memory-mapped lazy reader vs a naive full-directory decode.
+
+Usage: python benchmarks/bench_pmtiles.py [archive.pmtiles] [--max-zoom 10] [--lookups 10000]
+
+Without an archive, a synthetic one with every tile down to --max-zoom is written first.
+"""
+
+import argparse
+import gzip
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import pmtiles  # noqa: E402
+
+LEAF_SIZE = 4096
+
+
+def _directory(tile_ids, run_lengths, lengths, offsets):
+    return gzip.compress(pmtiles.encode_directory(tile_ids, run_lengths, lengths, offsets), mtime=0)
+
+
+# Function to write a synthetic archive: one small tile per z/x/y, leaves of LEAF_SIZE entries
+def write_synthetic(path, max_zoom):
+    count = pmtiles.tile_id(max_zoom + 1, 0, 0)
+    tile_ids = np.arange(count, dtype=np.uint64)
+    data = np.repeat(tile_ids, 4).tobytes()  # 32 distinct bytes per tile
+    lengths = np.full(count, 32, dtype=np.uint64)
+    offsets = tile_ids * np.uint64(32)
+    ones = np.ones(count, dtype=np.uint64)
+
+    leaves = io.BytesIO()
+    root = ([], [], [])
+    for start in range(0, count, LEAF_SIZE):
+        end = start + LEAF_SIZE
+        encoded = _directory(tile_ids[start:end], ones[start:end], lengths[start:end], offsets[start:end])
+        root[0].append(start)
+        root[1].append(leaves.tell())
+        root[2].append(len(encoded))
+        leaves.write(encoded)
+    root_bytes = _directory(root[0], [0] * len(root[0]), root[2], root[1])
+    metadata = gzip.compress(b"{}", mtime=0)
+
+    root_offset = pmtiles.HEADER_SIZE
+    header = pmtiles.Header(
+        version=pmtiles.VERSION,
+        root_offset=root_offset,
+        root_length=len(root_bytes),
+        metadata_offset=root_offset + len(root_bytes),
+        metadata_length=len(metadata),
+        leaf_directory_offset=root_offset + len(root_bytes) + len(metadata),
+        leaf_directory_length=leaves.tell(),
+        tile_data_offset=root_offset + len(root_bytes) + len(metadata) + leaves.tell(),
+        tile_data_length=len(data),
+        addressed_tiles_count=count,
+        tile_entries_count=count,
+        tile_contents_count=count,
+        clustered=True,
+        internal_compression=2,
+        tile_compression=1,
+        tile_type=1,
+        min_zoom=0,
+        max_zoom=max_zoom,
+        min_lon_e7=-1800000000,
+        min_lat_e7=-850511287,
+        max_lon_e7=1800000000,
+        max_lat_e7=850511287,
+        center_zoom=0,
+        center_lon_e7=0,
+        center_lat_e7=0,
+    )
+    with open(path, "wb") as f:
+        f.write(pmtiles.pack_header(header) + root_bytes + metadata + leaves.getvalue() + data)
+
+
+def _read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _naive_directory(data):
+    count, pos = _read_varint(data, 0)
+    columns = []
+    for _ in range(4):
+        column = []
+        for _ in range(count):
+            value, pos = _read_varint(data, pos)
+            column.append(value)
+        columns.append(column)
+    deltas, run_lengths, lengths, raw_offsets = columns
+    entries = []
+    tile = 0
+    for i in range(count):
+        tile += deltas[i]
+        if raw_offsets[i] == 0 and i:
+            offset = entries[-1][2] + entries[-1][3]
+        else:
+            offset = raw_offsets[i] - 1
+        entries.append((tile, run_lengths[i], offset, lengths[i]))
+    return entries
+
+
+# Baseline: read the whole file and decode every directory into one dict before looking anything up
+def naive_index(path):
+    with open(path, "rb") as f:
+        buf = f.read()
+    header = pmtiles.parse_header(buf)
+    index = {}
+    pending = [gzip.decompress(buf[header.root_offset : header.root_offset + header.root_length])]
+    while pending:
+        for tile, run_length, offset, length in _naive_directory(pending.pop()):
+            if run_length == 0:
+                start = header.leaf_directory_offset + offset
+                pending.append(gzip.decompress(buf[start : start + length]))
+            else:
+                for i in range(run_length):
+                    index[tile + i] = (offset, length)
+    return buf, header, index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", help="Existing PMTiles archive (default: write a synthetic one)")
+    parser.add_argument("--max-zoom", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--leaf-cache", type=int, default=pmtiles.LEAF_CACHE_SIZE, help="Leaf directories to cache")
+    args = parser.parse_args()
+
+    tmpdir = None
+    path = args.path
+    if path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, "synthetic.pmtiles")
+        started = time.perf_counter()
+        write_synthetic(path, args.max_zoom)
+        print(f"wrote synthetic archive in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(0)
+    with pmtiles.PMTilesReader(path) as reader:
+        max_zoom = reader.header.max_zoom
+        min_zoom = reader.header.min_zoom
+    queries = []
+    for _ in range(args.lookups):
+        z = rng.randint(min_zoom, max_zoom)
+        queries.append((z, rng.randrange(1 << z), rng.randrange(1 << z)))
+    print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB, zooms {min_zoom}-{max_zoom}, {args.lookups} lookups")
+
+    started = time.perf_counter()
+    reader = pmtiles.PMTilesReader(path, leaf_cache_size=args.leaf_cache)
+    reader.get_tile(*queries[0])
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    found = sum(reader.get_tile(*query) is not None for query in queries)
+    lookups = time.perf_counter() - started
+    leaves = reader.leaves_decoded
+    reader.close()
+    print(
+        f"mmap reader: open + first tile {first * 1000:.2f} ms, "
+        f"{lookups / len(queries) * 1e6:.1f} us/lookup, {leaves} leaves decoded, {found} found"
+    )
+
+    started = time.perf_counter()
+    buf, header, index = naive_index(path)
+    decode = time.perf_counter() - started
+    started = time.perf_counter()
+    naive_found = 0
+    for z, x, y in queries:
+        location = index.get(pmtiles.tile_id(z, x, y))
+        if location is not None:
+            start = header.tile_data_offset + location[0]
+            buf[start : start + location[1]]
+            naive_found += 1
+    naive_lookups = time.perf_counter() - started
+    print(
+        f"naive decode: open + full decode {decode * 1000:.2f} ms, "
+        f"{naive_lookups / len(queries) * 1e6:.1f} us/lookup, {naive_found} found"
+    )
+    print(f"time to first tile: {decode / first:,.0f}x faster with the mmap reader")
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
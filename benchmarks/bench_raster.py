@@ -0,0 +1,91 @@
+"""Benchmark the raster pyramid builder against the equivalent gdal2tiles command.
+
+Usage: python benchmarks/bench_raster.py [raster.tif ...] [--processes 4] [--max-zoom 15]
+
+Without rasters, a synthetic 8-bit GeoTIFF (with a nodata strip and a flat block
+of colour, to exercise the empty-tile skipping and deduplication) is written
+first. gdal2tiles runs only when it is on the PATH.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import geotiff, raster_tiles  # noqa: E402
+
+
+# Function to write a north-up EPSG:4326 GeoTIFF with Pillow, adding the GeoTIFF tags by hand
+def write_synthetic(path, width, height, pixel_size=0.00005, west=36.8, north=-1.28):
+    from PIL import Image, TiffImagePlugin
+
+    rows, cols = np.mgrid[0:height, 0:width]
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = (cols // 16) % 256
+    pixels[..., 1] = (rows // 16) % 256
+    pixels[..., 2] = 128
+    pixels[:, : width // 5] = 0  # nodata
+    pixels[height // 3 : height // 2, width // 2 : 3 * width // 4] = (10, 200, 30)
+
+    tags = TiffImagePlugin.ImageFileDirectory_v2()
+    for tag, tag_type, value in [
+        (geotiff.MODEL_PIXEL_SCALE, 12, (pixel_size, pixel_size, 0.0)),
+        (geotiff.MODEL_TIEPOINT, 12, (0.0, 0.0, 0.0, west, north, 0.0)),
+        (geotiff.GEO_KEY_DIRECTORY, 3, (1, 1, 0, 3, 1024, 0, 1, 2, 1025, 0, 1, 1, 2048, 0, 1, 4326)),
+        (geotiff.GDAL_NODATA, 2, "0"),
+    ]:
+        tags[tag] = value
+        tags.tagtype[tag] = tag_type
+    Image.fromarray(pixels).save(path, tiffinfo=tags, compression="tiff_deflate")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="GeoTIFFs to tile (default: write a synthetic one)")
+    parser.add_argument("--size", type=int, default=8000, help="Width of the synthetic raster in pixels")
+    parser.add_argument("--min-zoom", type=int)
+    parser.add_argument("--max-zoom", type=int)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--resampling", choices=raster_tiles.RESAMPLING, default="average")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    paths = args.paths
+    if not paths:
+        paths = [os.path.join(tmpdir.name, "synthetic.tif")]
+        write_synthetic(paths[0], args.size, args.size * 3 // 4)
+    min_zoom, max_zoom = raster_tiles.default_zooms(paths)
+    min_zoom = args.min_zoom if args.min_zoom is not None else min_zoom
+    max_zoom = args.max_zoom if args.max_zoom is not None else max_zoom
+    print(f"{len(paths)} raster(s), zooms {min_zoom}-{max_zoom}, {args.processes} processes")
+
+    output = os.path.join(tmpdir.name, "pyramid")
+    stats = raster_tiles.build(
+        paths, output, min_zoom, max_zoom, resampling=args.resampling, processes=args.processes
+    )
+    print(f"raster_tiles: {raster_tiles.describe_stats(stats)}")
+
+    commands = geotiff.gdal2tiles_commands(
+        paths, min_zoom, max_zoom, os.path.join(tmpdir.name, "gdal2tiles"), args.processes, args.resampling
+    )
+    if shutil.which(commands[-1][0]) is None:
+        print("gdal2tiles: not installed, skipped")
+    else:
+        started = time.perf_counter()
+        for argv in commands:
+            subprocess.run(argv, cwd=tmpdir.name, check=True, stdout=subprocess.DEVNULL)
+        seconds = time.perf_counter() - started
+        print(f"gdal2tiles: {seconds:.1f}s ({seconds / stats.seconds:.1f}x the time of raster_tiles)")
+
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark recompressing the tiles of an MBTiles file for serving.
+
+Usage: python benchmarks/bench_recompress.py [archive.mbtiles] [--methods gzip,brotli,zstd] [--workers 1,4]
+
+Without an archive, one is built first from --count synthetic points with
+tippecanoe, or with the scripted fake tippecanoe when it isn't on the PATH
+(--fake forces it). The fake's tiles are small gzipped JSON rather than MVT,
+so the per-tile rows and indexes of the map/images schema weigh more against
+them than against real tiles, and its ratios are only indicative. Each method
+whose codec is installed is run at each --workers setting on a fresh copy,
+and the table lists the time, tiles/s and MB/s of tile data recompressed, the
+output size after deduplication and VACUUM, and the saving against the input.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import fake_tippecanoe, recompress, runner, synthetic  # noqa: E402
+
+COLUMNS = (
+    "method",
+    "level",
+    "workers",
+    "tiles",
+    "unique",
+    "seconds",
+    "VACUUM s",
+    "tiles/s",
+    "MB/s",
+    "input MB",
+    "output MB",
+    "saved %",
+)
+
+
+def _build(program, count, max_zoom, seed, workdir):
+    dataset = synthetic.generate("points", count, seed=seed)
+    path = synthetic.write(dataset, os.path.join(workdir, "points.geojsonl"))
+    output = os.path.join(workdir, "points.mbtiles")
+    record = runner.run([*program, "-f", f"-z{max_zoom}", "-o", output, "-L", f"points:{path}"])
+    if record.returncode != 0:
+        sys.exit("\n".join(record.stderr_tail[-20:]))
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("archive", nargs="?", help="MBTiles file (default: build one)")
+    parser.add_argument(
+        "--methods", default="gzip,brotli,zstd", help="Comma-separated methods, as method or method:level"
+    )
+    parser.add_argument("--workers", default="1,4", help="Comma-separated worker process counts")
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--max-zoom", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        archive = args.archive
+        if archive is None:
+            program = ["tippecanoe"]
+            if args.fake or shutil.which("tippecanoe") is None:
+                print("using the fake tippecanoe: its tiles are gzipped JSON, not MVT")
+                program = fake_tippecanoe.TIPPECANOE
+            archive = _build(program, args.count, args.max_zoom, args.seed, workdir)
+
+        for spec in args.methods.split(","):
+            method, _, level = spec.partition(":")
+            try:
+                recompress.check_codec(method)
+            except ImportError as e:
+                print(f"skipping {method}: {e}")
+                continue
+            for workers in (int(value) for value in args.workers.split(",")):
+                copy = os.path.join(workdir, "copy.mbtiles")
+                shutil.copyfile(archive, copy)
+                stats = recompress.recompress(copy, None, method, int(level or 0), workers)
+                print(recompress.describe_stats(stats), file=sys.stderr)
+                rows.append(
+                    {
+                        "method": method,
+                        "level": stats.level,
+                        "workers": workers,
+                        "tiles": stats.tiles,
+                        "unique": stats.unique_tiles,
+                        "seconds": round(stats.seconds, 2),
+                        "VACUUM s": round(stats.vacuum_seconds, 2),
+                        "tiles/s": round(stats.tiles_per_second),
+                        "MB/s": round(stats.mb_per_second, 1),
+                        "input MB": round(stats.input_bytes / 1e6, 1),
+                        "output MB": round(stats.output_bytes / 1e6, 1),
+                        "saved %": round(100 * (1 - stats.output_bytes / stats.input_bytes), 1),
+                    }
+                )
+                os.remove(copy)
+
+    if not rows:
+        sys.exit("No method could run")
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark the vectorized polygon simplification preview on a mosaic of polygons with shared borders.
+
+Usage: python benchmarks/bench_simplification.py [--cells 60] [--vertices 60] [--zoom 8] [--max-vertices 500000]
+
+A --cells by --cells grid of polygons is written as line-delimited GeoJSON,
+each border between neighbours a random walk of --vertices points that both
+polygons trace exactly, so every inner edge is shared. The table lists, for
+each simplification method with and without -ab, the vertices kept, the
+gapped shared edges and the time, after the time to hash and index the edges.
+The baseline is the obvious approach, a recursive pure-Python Douglas-Peucker
+of one ring at a time, timed on the same snapped rings.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import simplification  # noqa: E402
+
+COLUMNS = ("method", "-ab", "vertices", "reduction %", "gapped edges", "max gap px", "ms")
+
+
+def _border(rng, a, b, vertices, wiggle):
+    t = np.linspace(0, 1, vertices + 2)[1:-1, None]
+    normal = np.array([a[1] - b[1], b[0] - a[0]])
+    walk = np.cumsum(rng.normal(0, wiggle / np.sqrt(vertices), vertices))
+    walk -= np.linspace(0, walk[-1], vertices)
+    return np.vstack([a, a + t * (b - a) + walk[:, None] * normal, b])
+
+
+# Function to write a grid of polygons whose borders are shared random walks
+def write_mosaic(path, cells, vertices, seed=0, size=0.01, wiggle=0.2):
+    rng = np.random.default_rng(seed)
+    corners = np.stack(np.meshgrid(np.arange(cells + 1), np.arange(cells + 1)), -1).astype(np.float64)
+    corners += rng.uniform(-0.2, 0.2, corners.shape)
+    across = {
+        (r, c): _border(rng, corners[r, c], corners[r, c + 1], vertices, wiggle)
+        for r in range(cells + 1)
+        for c in range(cells)
+    }
+    down = {
+        (r, c): _border(rng, corners[r, c], corners[r + 1, c], vertices, wiggle)
+        for r in range(cells)
+        for c in range(cells + 1)
+    }
+    with open(path, "w") as f:
+        for r in range(cells):
+            for c in range(cells):
+                ring = np.vstack([across[r, c], down[r, c + 1][1:], across[r + 1, c][::-1][1:], down[r, c][::-1][1:]])
+                coordinates = (ring * size + [-100.0, 40.0]).round(7).tolist()
+                geometry = {"type": "Polygon", "coordinates": [coordinates]}
+                feature = {"type": "Feature", "properties": {"cell": r * cells + c}, "geometry": geometry}
+                f.write(json.dumps(feature) + "\n")
+
+
+def _douglas_peucker(points, tolerance, first, last, kept):
+    a, b = points[first], points[last]
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = (dx * dx + dy * dy) ** 0.5
+    farthest, index = -1.0, None
+    for i in range(first + 1, last):
+        px, py = points[i][0] - a[0], points[i][1] - a[1]
+        distance = abs(dx * py - dy * px) / length if length else (px * px + py * py) ** 0.5
+        if distance > farthest:
+            farthest, index = distance, i
+    if index is not None and farthest > tolerance:
+        kept.add(index)
+        _douglas_peucker(points, tolerance, first, index, kept)
+        _douglas_peucker(points, tolerance, index, last, kept)
+
+
+def _baseline(rings, tolerance):
+    started = time.perf_counter()
+    vertices = 0
+    for start, end in zip(rings.starts[:-1].tolist(), rings.starts[1:].tolist()):
+        points = list(zip(rings.x[start:end].tolist(), rings.y[start:end].tolist()))
+        kept = {0, len(points) - 1}
+        _douglas_peucker(points, tolerance, 0, len(points) - 1, kept)
+        vertices += len(kept)
+    return vertices, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, default=60)
+    parser.add_argument("--vertices", type=int, default=60, help="Vertices per shared border")
+    parser.add_argument("--zoom", type=int, default=8)
+    parser.add_argument("--detail", type=int, default=12)
+    parser.add_argument("--simplification", type=float, default=1.0)
+    parser.add_argument("--max-vertices", type=int, default=simplification.SAMPLE_VERTICES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "mosaic.geojsonl")
+        write_mosaic(path, args.cells, args.vertices, args.seed)
+        started = time.perf_counter()
+        result = simplification.preview(
+            [path], args.zoom, args.detail, args.simplification, max_vertices=args.max_vertices
+        )
+        seconds = time.perf_counter() - started
+        sampled, layers, *_ = simplification._sample_rings([path], args.zoom, result.tile[1:], args.max_vertices)
+        rings, _ = simplification._snap(sampled, layers, args.zoom, args.detail)
+        baseline_vertices, baseline_seconds = _baseline(rings, args.simplification)
+
+    print(simplification.describe_preview(result))
+    print(f"edge index: {result.edges:,} edges in {result.index_seconds * 1000:.1f} ms; whole preview {seconds:.2f}s")
+    rows = simplification.mode_rows(result)
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+    independent = result.modes[0]
+    print(
+        f"baseline, recursive Python Douglas-Peucker per ring: {baseline_vertices:,} vertices in "
+        f"{baseline_seconds * 1000:.1f} ms ({baseline_seconds / independent.seconds:.1f}x the vectorized pass)"
+    )
+
+
+if __name__ == "__main__":
+    main()
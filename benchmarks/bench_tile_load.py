@@ -0,0 +1,139 @@
+"""Benchmark the dry-run tile load estimator on large point streams.
+
+Usage: python benchmarks/bench_tile_load.py [--count 100000000] [--max-zoom 14] [--baseline-count 5000000]
+
+Points are generated in batches around a few hundred Gaussian clusters, so a
+handful of tiles are much hotter than the rest, and streamed into the
+estimator. For each clustering setting the table lists the binning and
+estimate times and throughput, the occupied tiles at the max zoom, the zooms
+flagged over -O and the hottest tile's features, next to what a 100,000 point
+sample of the same stream (scaled up, as the profiler's sample is) predicts.
+The baseline is the obvious approach, np.unique of the tile index at every
+zoom separately, timed on --baseline-count points.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import command, tile_load  # noqa: E402
+from tiling_tools.tiles import lonlat_to_world  # noqa: E402
+
+COLUMNS = (
+    "clustering",
+    "points",
+    "bin s",
+    "estimate s",
+    "M points/s",
+    "max zoom tiles",
+    "zooms over -O",
+    "hottest",
+    "sample hottest",
+)
+
+BATCH_SIZE = 1 << 22
+SAMPLE_SIZE = 100000
+
+
+def _batches(count, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centres = np.column_stack([rng.uniform(-120, -70, clusters), rng.uniform(25, 48, clusters)])
+    spread = rng.uniform(0.01, 1.0, clusters)
+    for start in range(0, count, BATCH_SIZE):
+        n = min(BATCH_SIZE, count - start)
+        which = rng.integers(0, clusters, n)
+        lon = rng.normal(centres[which, 0], spread[which])
+        lat = rng.normal(centres[which, 1], spread[which])
+        yield lon, lat
+
+
+def _hottest(result):
+    return max((zoom.max_features for zoom in result.zooms), default=0)
+
+
+def _baseline(count, options, seed):
+    lon, lat = map(np.concatenate, zip(*_batches(count, 300, seed)))
+    started = time.perf_counter()
+    x, y = lonlat_to_world(lon, lat)
+    for zoom in range(options.min_zoom, options.max_zoom + 1):
+        n = 1 << zoom
+        np.unique((x * n).astype(np.int64) * n + (y * n).astype(np.int64), return_counts=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100_000_000)
+    parser.add_argument("--max-zoom", type=int, default=14)
+    parser.add_argument("--max-tile-features", type=int, default=200000)
+    parser.add_argument("--clusters", type=int, default=300)
+    parser.add_argument("--baseline-count", type=int, default=5_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = {
+        "none": command.TippecanoeOptions(max_zoom=args.max_zoom, max_tile_features=args.max_tile_features),
+        "-K10 -k12": command.TippecanoeOptions(
+            max_zoom=args.max_zoom,
+            max_tile_features=args.max_tile_features,
+            cluster_options="Fixed Distance",
+            cluster_distance=10,
+            cluster_maxzoom=12,
+        ),
+    }
+    rows = []
+    for name, options in settings.items():
+        level = tile_load.key_level(options)
+        load = tile_load.TileLoad(level=level)
+        sample = tile_load.TileLoad(level=level)
+        keep = SAMPLE_SIZE / args.count
+        rng = np.random.default_rng(args.seed)
+        binning = 0.0
+        for lon, lat in _batches(args.count, args.clusters, args.seed):
+            kinds = np.zeros(len(lon), dtype=np.uint64)
+            started = time.perf_counter()
+            tile_load.add_points(load, lon, lat, kinds)
+            binning += time.perf_counter() - started
+            chosen = rng.random(len(lon)) < keep
+            tile_load.add_points(sample, lon[chosen], lat[chosen], kinds[chosen])
+        started = time.perf_counter()
+        result = tile_load.estimate(load, options)
+        estimating = time.perf_counter() - started
+        sample.scale = args.count / max(1, sample.feature_count)
+        sampled = tile_load.estimate(sample, options)
+        print(tile_load.describe_estimate(result), file=sys.stderr)
+        rows.append(
+            {
+                "clustering": name,
+                "points": args.count,
+                "bin s": round(binning, 2),
+                "estimate s": round(estimating, 2),
+                "M points/s": round(args.count / 1e6 / (binning + estimating), 1),
+                "max zoom tiles": result.zooms[-1].tiles if result.zooms else 0,
+                "zooms over -O": sum(1 for zoom in result.zooms if zoom.status != "ok"),
+                "hottest": round(_hottest(result)),
+                "sample hottest": round(_hottest(sampled)),
+            }
+        )
+
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+    if args.baseline_count:
+        options = settings["none"]
+        seconds = _baseline(args.baseline_count, options, args.seed)
+        print(
+            f"baseline, np.unique per zoom: {args.baseline_count:,} points in {seconds:.2f}s "
+            f"({args.baseline_count / 1e6 / seconds:.1f} M points/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Load-test the local tile server: latency percentiles and requests/s from MBTiles and PMTiles.
+
+Usage: python benchmarks/bench_tile_server.py [--tileset out.mbtiles] [--requests 20000]
+       [--concurrency 32] [--cache-mb 0,64] [--revalidate 0.2] [--fake]
+
+Without --tileset, a synthetic points dataset is built with tippecanoe (or the
+scripted stand-in with --fake or when tippecanoe isn't on the PATH) and
+converted to PMTiles, and both files are served. The server runs in its own
+process and the client keeps --concurrency keep-alive connections busy with
+requests drawn from a Zipf distribution over the tileset's tiles, lowest zooms
+hottest, as a map being panned around would. A --revalidate share of requests
+repeat a tile with the ETag seen last time, as a browser's cache would. Each
+--cache-mb setting (0 turns the tile cache off) gets its own server.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import fake_tippecanoe, runner, synthetic, to_pmtiles  # noqa: E402
+
+COLUMNS = (
+    "tileset",
+    "cache MB",
+    "requests",
+    "requests/s",
+    "p50 ms",
+    "p90 ms",
+    "p99 ms",
+    "max ms",
+    "304s",
+    "cache hit rate",
+    "errors",
+)
+
+
+def _tiles(path):
+    connection = sqlite3.connect(path)
+    rows = connection.execute("SELECT zoom_level, tile_column, tile_row FROM tiles ORDER BY zoom_level").fetchall()
+    connection.close()
+    return [(z, x, (1 << z) - 1 - row) for z, x, row in rows]
+
+
+async def _request(reader, writer, path, etag):
+    head = f"GET {path} HTTP/1.1\r\nHost: bench\r\n"
+    if etag:
+        head += f"If-None-Match: {etag}\r\n"
+    writer.write((head + "\r\n").encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("etag")
+
+
+async def _client(host, port, paths, revalidate, latencies, statuses, etags, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            etag = etags.get(path) if rng.random() < revalidate else None
+            started = time.perf_counter()
+            status, seen = await _request(reader, writer, path, etag)
+            latencies.append(time.perf_counter() - started)
+            statuses.append(status)
+            if seen:
+                etags[path] = seen
+    finally:
+        writer.close()
+
+
+async def _load(host, port, paths, concurrency, revalidate, seed):
+    latencies, statuses, etags = [], [], {}
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _client(host, port, paths[i::concurrency], revalidate, latencies, statuses, etags, rng)
+            for i in range(concurrency)
+        )
+    )
+    return time.perf_counter() - started, np.array(latencies), np.array(statuses)
+
+
+def _start_server(path, cache_mb):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "tiling_tools.tile_server", path, "--port", "0", "--cache-mb", str(cache_mb)],
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    line = process.stdout.readline()
+    if not line.startswith("Serving"):
+        process.kill()
+        sys.exit(f"The tile server didn't start: {line}")
+    host, port = line.rsplit("http://", 1)[1].strip().split(":")
+    return process, host, int(port)
+
+
+def _stats(host, port):
+    async def fetch():
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"GET /stats HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+        data = await reader.read()
+        writer.close()
+        return data
+
+    return json.loads(asyncio.run(fetch()).split(b"\r\n\r\n", 1)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tileset", default=None, help="MBTiles file to serve (its PMTiles twin is made alongside)")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cache-mb", default="0,64", help="Comma-separated tile cache sizes to compare")
+    parser.add_argument("--revalidate", type=float, default=0.2, help="Share of requests sent with If-None-Match")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Skew of the tile popularity")
+    parser.add_argument("--count", type=int, default=200000, help="Synthetic points when no --tileset is given")
+    parser.add_argument("--max-zoom", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        mbtiles_path = args.tileset
+        if mbtiles_path is None:
+            program = ["tippecanoe"]
+            if args.fake or shutil.which("tippecanoe") is None:
+                print("using the fake tippecanoe: the tileset is the stand-in's, the serving numbers are real")
+                program = fake_tippecanoe.TIPPECANOE
+            dataset = synthetic.generate("points", args.count, seed=args.seed)
+            path = synthetic.write(dataset, os.path.join(workdir, "points.geojsonl"))
+            mbtiles_path = os.path.join(workdir, "points.mbtiles")
+            record = runner.run([*program, "-f", f"-z{args.max_zoom}", "-o", mbtiles_path, "-L", f"points:{path}"])
+            if record.returncode != 0:
+                sys.exit("\n".join(record.stderr_tail[-20:]))
+        pmtiles_path = os.path.join(workdir, os.path.splitext(os.path.basename(mbtiles_path))[0] + ".pmtiles")
+        print(to_pmtiles.describe_stats(to_pmtiles.convert(mbtiles_path, pmtiles_path)), file=sys.stderr)
+
+        tiles = _tiles(mbtiles_path)
+        # Popularity by rank in zoom order: world and region tiles are requested far more than street tiles
+        weights = 1.0 / np.arange(1, len(tiles) + 1) ** args.zipf
+        rng = np.random.default_rng(args.seed)
+        picks = rng.choice(len(tiles), size=args.requests, p=weights / weights.sum())
+        paths = ["/{}/{}/{}.pbf".format(*tiles[i]) for i in picks.tolist()]
+
+        for tileset in (mbtiles_path, pmtiles_path):
+            for cache_mb in (int(value) for value in args.cache_mb.split(",")):
+                process, host, port = _start_server(tileset, cache_mb)
+                try:
+                    seconds, latencies, statuses = asyncio.run(
+                        _load(host, port, paths, args.concurrency, args.revalidate, args.seed)
+                    )
+                    stats = _stats(host, port)
+                finally:
+                    process.terminate()
+                    process.wait()
+                lookups = stats["cache_hits"] + stats["cache_misses"]
+                milliseconds = latencies * 1000
+                rows.append(
+                    {
+                        "tileset": os.path.basename(tileset),
+                        "cache MB": cache_mb,
+                        "requests": len(latencies),
+                        "requests/s": round(len(latencies) / seconds),
+                        "p50 ms": round(float(np.percentile(milliseconds, 50)), 2),
+                        "p90 ms": round(float(np.percentile(milliseconds, 90)), 2),
+                        "p99 ms": round(float(np.percentile(milliseconds, 99)), 2),
+                        "max ms": round(float(milliseconds.max()), 2),
+                        "304s": int((statuses == 304).sum()),
+                        "cache hit rate": round(stats["cache_hits"] / lookups, 3) if lookups else None,
+                        "errors": int((statuses >= 400).sum()),
+                    }
+                )
+
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS}
+    print("  ".join(column.rjust(widths[column]) for column in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(widths[column]) for column in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -20,17 +20,23 @@ Create optimized command lines for the Tippecanoe tool to generate vector tiles
 - Handle various input formats (GeoJSON, FlatGeobuf, CSV)
 - Copy generated commands directly to your clipboard
 
-### 🗺️ Raster Tile Helper (coming soon)
-View and interact with generated map tiles.
-- Guess the max zoom needed based on resolution
-- Generate gdal2tiles.py commands for raster tiles
+### 📊 MBTiles Analyzer
+See what a tippecanoe run actually produced.
+- Tile size histograms and percentiles for every zoom level
+- Find the largest tiles and how many sit near the -M and -O limits
+- Inspect PMTiles archives: deduplication, bytes per zoom and single tiles
+
+### 🗺️ Raster Tile Helper
+Plan raster tilesets from GeoTIFFs and COGs.
+- Guess the min and max zoom needed based on resolution, for whole directories of rasters at once
+- Generate gdal2tiles.py commands for raster tiles, or build the tiles in-process with a parallel pyramid builder
 
 ## Getting Started
 
 Use the sidebar to navigate between different tools, or click one of the links below:
 """)
 
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 
 with col1:
     st.page_link("pages/01_Tippecanoe_Command_Generator.py", label="Tippecanoe Command Generator", icon="🛶")
@@ -38,6 +44,9 @@ with col1:
 with col2:
     st.page_link("pages/02_Raster_Tile_Helper.py", label="Raster Tile Helper", icon="🗺️")
 
+with col3:
+    st.page_link("pages/03_MBTiles_Analyzer.py", label="MBTiles Analyzer", icon="📊")
+
 st.divider()
 
 st.markdown("""
@@ -1,9 +1,36 @@
+import functools
+import os
+import sys
+import time
+
 import streamlit as st
 from st_copy_to_clipboard import st_copy_to_clipboard
 
+from tiling_tools import (
+    argv as argv_tools,
+    attributes,
+    autotune,
+    batch,
+    build_cache,
+    command,
+    compressed,
+    fake_tippecanoe,
+    feature_filter,
+    hilbert_sort,
+    ndjson,
+    profiler,
+    readers,
+    recompress,
+    runner,
+    simplification,
+    tile_load,
+    tile_server,
+    to_flatgeobuf,
+)
+
 # Moving content from home.py to this page file
 
-# TODO - fix mbtiles/pmtiles output switching
+run_started = time.perf_counter()
 
 st.set_page_config(
     page_title="Tippecanoe Command Generator", page_icon="🛶", layout="wide"
@@ -16,19 +43,209 @@ This tool helps generate commands for [Tippecanoe](https://github.com/felt/tippe
 """
 )
 
-# Initialize session state for storing inputs
+# Initialize session state for storing inputs; each row keeps a stable id for its widget keys
 if "input_files" not in st.session_state:
-    st.session_state.input_files = [{"path": "", "layer": ""}]
+    st.session_state.input_files = [{"id": 0, "path": "", "layer": ""}]
+    st.session_state.next_input_id = 1
+
+if "rerun_timings" not in st.session_state:
+    st.session_state.rerun_timings = []
+
+# Fragments that show the command and the timings; every change reruns them along with its own section
+OUTPUT_FRAGMENTS = ["command_block", "timings_panel"]
+
+# Number of recent timings kept for the instrumentation panel
+TIMINGS_KEPT = 100
+
+
+# Function to record how long a section of the page took to render
+def record_timing(section, seconds):
+    timings = st.session_state.rerun_timings
+    timings.append({"section": section, "ms": round(seconds * 1000, 2), "at": time.strftime("%H:%M:%S")})
+    del timings[:-TIMINGS_KEPT]
+
+
+# Function to wrap a fragment body so each of its reruns is timed
+def timed(section):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_timing(section, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+# Function to rerun only the changed section and the command, instead of the whole page
+def rerun_sections(*fragment_keys):
+    st.rerun(scope=[*fragment_keys, *OUTPUT_FRAGMENTS])
+
+
+# Function to give a widget the callback that reruns its section and the command
+def reruns(*fragment_keys):
+    return {"on_change": rerun_sections, "args": fragment_keys}
 
 
 # Function to add a new input file
 def add_input_file():
-    st.session_state.input_files.append({"path": "", "layer": ""})
+    st.session_state.input_files.append({"id": st.session_state.next_input_id, "path": "", "layer": ""})
+    st.session_state.next_input_id += 1
+    rerun_sections("input_files")
 
 
 # Function to remove an input file
-def remove_input_file(index):
-    st.session_state.input_files.pop(index)
+def remove_input_file(row_id):
+    st.session_state.input_files = [
+        file_input for file_input in st.session_state.input_files if file_input["id"] != row_id
+    ]
+    rerun_sections("input_files")
+
+
+# Function to copy an edited input row into the input list and rerun just that row
+def update_input_file(row_id):
+    for file_input in st.session_state.input_files:
+        if file_input["id"] == row_id:
+            file_input["path"] = st.session_state.get(f"file_{row_id}", file_input["path"])
+            file_input["layer"] = st.session_state.get(f"layer_{row_id}", file_input["layer"])
+    fragment_keys = [f"input_{row_id}"]
+    if st.session_state.get("profile_inputs"):
+        fragment_keys.append("zoom_tab")
+    rerun_sections(*fragment_keys)
+
+
+# Function to convert CSV and GeoJSON inputs to spatially indexed FlatGeobuf
+def convert_inputs_to_flatgeobuf():
+    results = []
+    problems = []
+    for file_input in st.session_state.input_files:
+        path = file_input["path"].strip()
+        if to_flatgeobuf.is_convertible(path) and not to_flatgeobuf.is_converted(path):
+            try:
+                results.append(to_flatgeobuf.convert(path))
+            except (OSError, ValueError) as e:
+                problems.append(f"Couldn't convert {path}: {e}")
+    st.session_state.flatgeobuf_results = results
+    st.session_state.flatgeobuf_problems = problems
+    rerun_sections("basic_tab")
+
+
+# Function to Hilbert-sort the inputs into spatially ordered copies
+def sort_inputs():
+    results = []
+    problems = []
+    for file_input in st.session_state.input_files:
+        path = file_input["path"].strip()
+        if hilbert_sort.is_sortable(path) and not hilbert_sort.is_sorted(path):
+            try:
+                results.append(hilbert_sort.sort_input(path))
+            except (OSError, ValueError) as e:
+                problems.append(f"Couldn't sort {path}: {e}")
+    st.session_state.sort_results = results
+    st.session_state.sort_problems = problems
+    rerun_sections("advanced_tab")
+
+
+# Function to parse the feature filter text; returns ({layer: filter}, problem)
+def feature_filters():
+    text = st.session_state.get("opt_feature_filter", "").strip()
+    if not text:
+        return {}, None
+    try:
+        return feature_filter.parse_filters(text), None
+    except feature_filter.FilterError as e:
+        return {}, f"Invalid feature filter: {e}"
+
+
+# Function to list (path, layer, filter) for the inputs whose layer has a filter that can be applied ahead of time
+def prefilterable_inputs():
+    filters = feature_filters()[0]
+    inputs = []
+    for file_input in st.session_state.input_files:
+        path = file_input["path"].strip()
+        if not os.path.isfile(path):
+            continue
+        expression = feature_filter.prefilter_expression(filters, argv_tools.layer_name(file_input["layer"], path))
+        if expression is not None:
+            inputs.append((path, file_input["layer"], expression))
+    return inputs
+
+
+# Function to write copies of the inputs holding only the features the filter keeps
+def prefilter_inputs():
+    results = []
+    problems = []
+    for path, layer, expression in prefilterable_inputs():
+        if not feature_filter.is_filtered(path, expression):
+            try:
+                results.append(feature_filter.prefilter(path, expression, layer=layer))
+            except (OSError, ValueError) as e:
+                problems.append(f"Couldn't filter {path}: {e}")
+    st.session_state.prefilter_results = results
+    st.session_state.prefilter_problems = problems
+    rerun_sections("advanced_tab")
+
+
+# Function to check if an input is a GeoJSON FeatureCollection that -P can't read in parallel
+def needs_line_delimited(path):
+    # Compressed inputs are streamed through a pipe, which tippecanoe reads in one pass anyway
+    return os.path.isfile(path) and not compressed.is_compressed(path) and readers.detect_format(path) == "geojson"
+
+
+# Function to convert FeatureCollection inputs to line-delimited GeoJSON
+def convert_inputs_for_parallel():
+    results = []
+    problems = []
+    for file_input in st.session_state.input_files:
+        path = file_input["path"].strip()
+        if needs_line_delimited(path) and not ndjson.is_converted(path):
+            try:
+                results.append(ndjson.convert(path))
+            except (OSError, ValueError) as e:
+                problems.append(f"Couldn't convert {path}: {e}")
+    st.session_state.conversion_results = results
+    st.session_state.conversion_problems = problems
+    rerun_sections("basic_tab")
+
+
+# Function to list the non-empty input paths
+def input_paths():
+    return [
+        file_input["path"].strip()
+        for file_input in st.session_state.input_files
+        if file_input["path"].strip()
+    ]
+
+
+# Function to profile the inputs (cached per file) and suggest options; returns (profile, suggestions, problem)
+def profile_suggestions():
+    profile_paths = input_paths()
+    missing = [path for path in profile_paths if not os.path.isfile(path)]
+    if missing:
+        return None, {}, "Can't profile missing files: " + ", ".join(missing)
+    if not profile_paths:
+        return None, {}, None
+    try:
+        input_profile = profiler.merge_profiles([profiler.profile_input(path) for path in profile_paths])
+    except ValueError as e:
+        return None, {}, f"Couldn't profile input files: {e}"
+    return input_profile, profiler.suggest_options(input_profile), None
+
+
+# Function to gather the widget values into engine options; hidden widgets keep the engine defaults
+def collect_options():
+    defaults = command.TippecanoeOptions()
+    options = {
+        name: st.session_state.get(f"opt_{name}", getattr(defaults, name))
+        for name in command.FIELD_NAMES
+        if name != "inputs"
+    }
+    options["drop_options"] = tuple(options["drop_options"])
+    return options
 
 
 # Main tabs
@@ -42,189 +259,294 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs(
     ]
 )
 
+
 # Basic Options tab
-with tab1:
+@st.fragment(key="basic_tab")
+@timed("Basic Options")
+def basic_tab():
     st.header("Output Settings")
     col1, col2 = st.columns(2)
 
     with col1:
-        def sanitize_output_filename(name, extension):
-            if name.endswith(".mbtiles") or name.endswith(".pmtiles"):
-                name = name.rsplit(".", 1)[0]  # Remove existing extension
-            return name + extension
-
-        file_extension = ".mbtiles"
-        output_file = st.text_input(
+        st.text_input(
             "Output Filename",
-            value="output" + file_extension,
+            value="output.mbtiles",
+            key="opt_output_file",
             help="Name of the output file",
+            **reruns("basic_tab"),
         )
 
         output_format = st.radio(
             "Output Format",
-            ["MBTiles", "PMTiles", "Directory"],
+            command.OUTPUT_FORMATS,
             horizontal=True,
-            help="Format of the output tileset",
+            key="opt_output_format",
+            help="Format of the output tileset. MBTiles + PMTiles runs tippecanoe once and converts its MBTiles output to PMTiles afterwards. The extension of the output filename follows this choice.",
+            **reruns("basic_tab"),
         )
 
+        if output_format in command.OUTPUT_EXTENSIONS:
+            outputs = {command.output_filename(st.session_state.get("opt_output_file", ""), output_format)}
+            if output_format == "MBTiles + PMTiles":
+                outputs.add(command.output_filename(st.session_state.get("opt_output_file", ""), "PMTiles"))
+            st.caption("Writes " + " and ".join(sorted(outputs)))
+
         if output_format == "Directory":
-            output_dir = st.text_input(
-            "Output Directory",
-            value="output_tiles",
-            help="Directory to output the tiles",
+            st.text_input(
+                "Output Directory",
+                value="output_tiles",
+                key="opt_output_dir",
+                help="Directory to output the tiles",
+                **reruns("basic_tab"),
             )
-        elif output_format == "MBTiles":
-            file_extension = ".mbtiles"
-            output_file = sanitize_output_filename(output_file, file_extension)
-        else:
-            file_extension = ".pmtiles"
-            output_file = sanitize_output_filename(output_file, file_extension)
-
-        force_overwrite = st.checkbox(
+
+        st.checkbox(
             "Force Overwrite",
             value=True,
+            key="opt_force_overwrite",
             help="Delete output file if it already exists",
+            **reruns("basic_tab"),
         )
         read_parallel = st.checkbox(
             "Parallel Processing",
             value=False,
+            key="opt_read_parallel",
             help="Use multiple threads to read different parts of each GeoJSON input file at once. This will only work if the input is line-delimited JSON with each Feature on its own line.",
+            **reruns("basic_tab"),
+        )
+        if read_parallel:
+            convert_for_parallel = st.checkbox(
+                "Convert FeatureCollections to Line-Delimited",
+                value=True,
+                key="convert_for_parallel",
+                help="Point the command at a line-delimited copy (.geojsonl) of each GeoJSON FeatureCollection input so -P can read it in parallel",
+                **reruns("basic_tab"),
+            )
+            if convert_for_parallel:
+                st.button("Convert Inputs Now", on_click=convert_inputs_for_parallel)
+                for stats in st.session_state.get("conversion_results", []):
+                    st.caption(
+                        f"{stats.output_path}: {stats.features} features in {stats.seconds:.1f}s "
+                        f"({stats.bytes_per_second / 1e6:.1f} MB/s, {stats.workers} workers)"
+                    )
+                for problem in st.session_state.get("conversion_problems", []):
+                    st.error(problem)
+
+        use_preconverted = st.checkbox(
+            "Use Preconverted FlatGeobuf Input",
+            value=False,
+            key="use_preconverted",
+            help="Point the command at a FlatGeobuf copy (.fgb, with a packed Hilbert R-tree) of each CSV and GeoJSON input, which tippecanoe reads without parsing text. Layer names are kept with -L, and feature ids with --use-attribute-for-id. Inputs whose features carry a \"tippecanoe\" member (layer, minzoom, maxzoom) can't be converted.",
+            **reruns("basic_tab"),
+        )
+        if use_preconverted:
+            st.button("Convert to FlatGeobuf Now", on_click=convert_inputs_to_flatgeobuf)
+            for stats in st.session_state.get("flatgeobuf_results", []):
+                st.caption(to_flatgeobuf.describe_stats(stats))
+            for problem in st.session_state.get("flatgeobuf_problems", []):
+                st.error(problem)
+            pending = [
+                path for path in input_paths() if to_flatgeobuf.is_convertible(path) and not to_flatgeobuf.is_converted(path)
+            ]
+            if pending:
+                st.warning("Not converted yet (or changed since): " + ", ".join(pending))
+
+    with col2:
+        st.text_input(
+            "Tileset Name",
+            key="opt_name",
+            help="Human-readable name for the tileset",
+            **reruns("basic_tab"),
+        )
+        st.text_input(
+            "Description",
+            key="opt_description",
+            help="Description for the tileset",
+            **reruns("basic_tab"),
+        )
+        st.text_input(
+            "Attribution",
+            key="opt_attribution",
+            help="Attribution text shown with maps using this tileset",
+            **reruns("basic_tab"),
         )
 
+
+# One input file row; editing it reruns only this row and the command
+@timed("Input row")
+def input_row(file_input, removable):
+    row_id = file_input["id"]
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        st.text_input(
+            "File Path",
+            value=file_input["path"],
+            key=f"file_{row_id}",
+            help="Path to GeoJSON, FlatGeobuf, or CSV file; GeoJSON and CSV can be gzip (.gz) or zstd (.zst) compressed",
+            on_change=update_input_file,
+            args=(row_id,),
+        )
     with col2:
-        name = st.text_input("Tileset Name", help="Human-readable name for the tileset")
-        description = st.text_input("Description", help="Description for the tileset")
-        attribution = st.text_input(
-            "Attribution", help="Attribution text shown with maps using this tileset"
+        st.text_input(
+            "Layer Name (optional)",
+            value=file_input["layer"],
+            key=f"layer_{row_id}",
+            help="Custom layer name for this file",
+            on_change=update_input_file,
+            args=(row_id,),
         )
-        
+    with col3:
+        if removable:  # Don't allow removing the first file
+            st.button(
+                "Remove", key=f"remove_{row_id}", on_click=remove_input_file, args=(row_id,)
+            )
+
 
+@st.fragment(key="input_files")
+@timed("Input Files")
+def input_files_section():
     st.header("Input Files")
     st.info(
-        "Add one or more GeoJSON, FlatGeobuf, or CSV files to process. For each file, you can specify a custom layer name. CSV input files currently support only Point geometries, from columns named latitude, longitude, lat, lon, long, lng, x, or y"
+        "Add one or more GeoJSON, FlatGeobuf, or CSV files to process. For each file, you can specify a custom layer name. CSV input files currently support only Point geometries, from columns named latitude, longitude, lat, lon, long, lng, x, or y. Compressed GeoJSON and CSV (.gz, .zst) are decompressed while tippecanoe reads them, through named pipes, so they don't need unpacking first"
     )
 
     # Display input file fields
     for i, file_input in enumerate(st.session_state.input_files):
-        col1, col2, col3 = st.columns([3, 2, 1])
-        with col1:
-            st.session_state.input_files[i]["path"] = st.text_input(
-                "File Path",
-                value=file_input["path"],
-                key=f"file_{i}",
-                help="Path to GeoJSON, FlatGeobuf, or CSV file",
-            )
-        with col2:
-            st.session_state.input_files[i]["layer"] = st.text_input(
-                "Layer Name (optional)",
-                value=file_input["layer"],
-                key=f"layer_{i}",
-                help="Custom layer name for this file",
-            )
-        with col3:
-            if i > 0:  # Don't allow removing the first file
-                st.button(
-                    "Remove", key=f"remove_{i}", on_click=remove_input_file, args=(i,)
-                )
+        st.fragment(input_row, key=f"input_{file_input['id']}")(file_input, i > 0)
 
     st.button("Add Another File", on_click=add_input_file)
 
+
 # Zoom & Detail tab
-with tab2:
+@st.fragment(key="zoom_tab")
+@timed("Zoom & Detail")
+def zoom_tab():
     st.header("Zoom Levels")
     col1, col2 = st.columns(2)
 
     with col1:
         zoom_mode = st.radio(
             "Maximum Zoom Mode",
-            ["Specify", "Auto-detect"],
+            command.ZOOM_MODES,
+            key="opt_zoom_mode",
             help="Choose how the maximum zoom level is determined",
+            **reruns("zoom_tab"),
         )
 
         if zoom_mode == "Specify":
-            max_zoom = st.number_input(
+            st.number_input(
                 "Maximum Zoom",
                 value=14,
                 min_value=0,
                 max_value=22,
+                key="opt_max_zoom",
                 help="Highest zoom level for which tiles are generated",
+                **reruns("zoom_tab"),
             )
 
-        min_zoom = st.number_input(
+        st.number_input(
             "Minimum Zoom",
             value=0,
             min_value=0,
             max_value=22,
+            key="opt_min_zoom",
             help="Lowest zoom level for which tiles are generated",
+            **reruns("zoom_tab"),
         )
 
-        extend_zooms = st.checkbox(
+        st.checkbox(
             "Extend Zooms If Still Dropping",
+            key="opt_extend_zooms",
             help="Increase the maxzoom if features are still being dropped at that zoom level",
+            **reruns("zoom_tab"),
         )
 
+        if zoom_mode == "Auto-detect":
+            use_profile = st.checkbox(
+                "Profile Input Files",
+                key="profile_inputs",
+                help="Scan the input files here and use the suggested max zoom, detail and drop rate instead of letting tippecanoe guess with -zg. Results are cached until a file changes.",
+                **reruns("zoom_tab"),
+            )
+            if use_profile:
+                with st.spinner("Profiling input files..."):
+                    input_profile, suggestions, problem = profile_suggestions()
+                if problem:
+                    st.warning(problem)
+                elif input_profile is not None:
+                    st.json(profiler.describe_profile(input_profile), expanded=False)
+                    st.caption(
+                        f"Suggested: -z{suggestions.get('max_zoom')} "
+                        f"-d{suggestions.get('full_detail')} "
+                        f"-r{suggestions.get('drop_rate')}"
+                    )
+
     with col2:
         st.subheader("Tile Detail")
         auto_detail = st.checkbox(
             "Auto Tile Resolution",
             value=True,
+            key="opt_auto_detail",
             help="Automatically choose tile resolutions",
+            **reruns("zoom_tab"),
         )
         if auto_detail != True:
-            full_detail = st.number_input(
+            st.number_input(
                 "Full Detail",
                 value=12,
                 min_value=0,
                 max_value=32,
+                key="opt_full_detail",
                 help="Detail at max zoom level (tile resolution = 2^detail)",
+                **reruns("zoom_tab"),
             )
 
-            low_detail = st.number_input(
+            st.number_input(
                 "Low Detail",
                 value=12,
                 min_value=0,
                 max_value=32,
+                key="opt_low_detail",
                 help="Detail at lower zoom levels",
+                **reruns("zoom_tab"),
             )
 
-            min_detail = st.number_input(
+            st.number_input(
                 "Minimum Detail",
                 value=7,
                 min_value=0,
                 max_value=32,
+                key="opt_min_detail",
                 help="Minimum detail to try if tiles are too big at regular detail",
+                **reruns("zoom_tab"),
             )
 
+
 # Feature Handling tab
-with tab3:
+@st.fragment(key="features_tab")
+@timed("Feature Handling")
+def features_tab():
     st.header("Feature Handling")
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Feature Dropping & Simplification")
 
-        drop_options = st.multiselect(
+        st.multiselect(
             "Drop Options",
-            [
-                "Drop Densest As Needed",
-                "Drop Fraction As Needed",
-                "Drop Smallest As Needed",
-                "Coalesce Densest As Needed",
-                "Coalesce Smallest As Needed",
-                "Coalesce Fraction As Needed",
-                "No Line Simplification",
-                "No Tiny Polygon Reduction",
-                "No Feature Limit",
-                "No Tile Size Limit",
-            ],
+            command.DROP_OPTIONS,
+            key="opt_drop_options",
             help="Options for dropping features to keep tiles under size limits",
+            **reruns("features_tab"),
         )
 
-        drop_rate = st.number_input(
+        st.number_input(
             "Drop Rate",
             value=2.5,
             min_value=0.0,
+            key="opt_drop_rate",
             help="Rate at which features are dropped at zoom levels below basezoom",
+            **reruns("features_tab"),
         )
 
         # st.checkbox("Drop Lines", help="Let feature dropping apply to lines too")
@@ -235,345 +557,839 @@ with tab3:
 
         cluster_options = st.selectbox(
             "Clustering Method",
-            ["None", "Fixed Distance", "Cluster Densest As Needed"],
+            command.CLUSTER_METHODS,
+            key="opt_cluster_options",
             help="Method for clustering points",
+            **reruns("features_tab"),
         )
 
         if cluster_options in ["Fixed Distance", "Cluster Densest As Needed"]:
-            cluster_distance = st.number_input(
+            st.number_input(
                 "Cluster Distance",
                 value=10,
                 min_value=1,
                 max_value=255,
+                key="opt_cluster_distance",
                 help="Cluster points within this distance",
+                **reruns("features_tab"),
             )
 
-            cluster_maxzoom = st.number_input(
+            st.number_input(
                 "Cluster Max Zoom",
                 value=14,
                 min_value=0,
                 max_value=22,
+                key="opt_cluster_maxzoom",
                 help="Maximum zoom at which to cluster points",
+                **reruns("features_tab"),
             )
 
-            accumulate_attributes = st.text_input(
+            st.text_input(
                 "Accumulate Attributes (comma-separated)",
+                key="opt_accumulate_attributes",
                 help="Attributes to preserve from features that are clustered (format: attr:operation, e.g. population:sum)",
+                **reruns("features_tab"),
             )
 
-        calculate_feature_density = st.checkbox(
+        st.checkbox(
             "Calculate Feature Density",
+            key="opt_calculate_feature_density",
             help="Add a tippecanoe_feature_density attribute to each feature",
+            **reruns("features_tab"),
         )
 
-        detect_shared_borders = st.checkbox(
+        st.checkbox(
             "Detect Shared Borders",
+            key="opt_detect_shared_borders",
             help="detect borders that are shared between multiple polygons and simplify them identically in each polygon. This takes more time and memory than considering each polygon individually.",
+            **reruns("features_tab"),
         )
 
-        grid_low_zooms = st.checkbox(
+        st.checkbox(
             "Grid Low Zooms",
+            key="opt_grid_low_zooms",
             help="At all zoom levels below maxzoom, snap all lines and polygons to a stairstep grid instead of allowing diagonals. You will also want to specify a tile resolution, probably -D8",
+            **reruns("features_tab"),
+        )
+
+    with st.expander("Tile Load"):
+        st.caption(
+            "Bins every feature into the tile grid from Min Zoom to Max Zoom and estimates the features in each "
+            "tile after the drop rate and fixed-distance clustering, before anything is built. Zooms whose "
+            "hottest tile would be over Max Tile Features or Max Tile Bytes are flagged. Without a full scan the "
+            "input profiler's sample is used, which is quick but noisy at high zooms. Attribute sizes count once "
+            "they've been analyzed in the Attributes tab."
+        )
+        full_scan = st.checkbox("Full Scan", key="tile_load_full_scan", help="Read every feature instead of a sample")
+        if st.button("Estimate Tile Load"):
+            paths = input_paths()
+            missing = [path for path in paths if not os.path.isfile(path)]
+            if missing:
+                st.warning("Can't estimate missing files: " + ", ".join(missing))
+            elif paths:
+                try:
+                    with st.spinner("Binning features into tiles..."):
+                        st.session_state.tile_load_estimate = estimate_tile_load(full_scan)
+                except (OSError, ValueError) as e:
+                    st.error(f"Couldn't estimate the tile load: {e}")
+
+        estimate = st.session_state.get("tile_load_estimate")
+        if estimate is not None:
+            st.caption(tile_load.describe_estimate(estimate))
+            for warning in estimate.warnings:
+                st.warning(warning)
+            st.dataframe(tile_load.zoom_rows(estimate), width="stretch", hide_index=True)
+            st.dataframe(tile_load.hottest_rows(estimate), width="stretch", hide_index=True)
+
+    with st.expander("Simplification Preview"):
+        st.caption(
+            "Simplifies the polygons around the tile with the most polygon vertices at a zoom, with Douglas-Peucker "
+            "(what tippecanoe uses) and Visvalingam, each with and without Detect Shared Borders, at that zoom's "
+            "detail and the Simplification multiplier. It reports the vertices kept, the gaps left along borders "
+            "that polygons share, and roughly what -ab would add to the build in time and memory."
+        )
+        zoom = st.number_input(
+            "Preview Zoom",
+            value=int(st.session_state.get("opt_max_zoom", 14)),
+            min_value=0,
+            max_value=22,
+            key="simplification_preview_zoom",
         )
+        if st.button("Preview Simplification"):
+            paths = input_paths()
+            missing = [path for path in paths if not os.path.isfile(path)]
+            if missing:
+                st.warning("Can't preview missing files: " + ", ".join(missing))
+            elif paths:
+                try:
+                    with st.spinner("Simplifying a sample of the polygons..."):
+                        st.session_state.simplification_preview = preview_simplification(zoom)
+                except (OSError, ValueError) as e:
+                    st.error(f"Couldn't preview the simplification: {e}")
+
+        result = st.session_state.get("simplification_preview")
+        if result is not None:
+            st.caption(simplification.describe_preview(result))
+            st.info(simplification.recommendation(result))
+            st.dataframe(simplification.mode_rows(result), width="stretch", hide_index=True)
+
+
+# Function to estimate features per tile for the current options; attribute costs count if they've been analyzed
+def estimate_tile_load(full_scan):
+    options = collect_options()
+    options["inputs"] = tuple(command.InputFile(path=path) for path in input_paths())
+    if options["zoom_mode"] == "Auto-detect":
+        options["max_zoom"] = profile_suggestions()[1].get("max_zoom", options["max_zoom"])
+    attribute_bytes = 0
+    attribute_profile = st.session_state.get("attribute_profile")
+    if attribute_profile is not None and attribute_profile.feature_count:
+        attribute_bytes = sum(
+            attributes.encoded_bytes(stats, attribute_profile.feature_count)
+            for stats in attribute_profile.attributes.values()
+        ) / attribute_profile.feature_count
+    return tile_load.estimate_inputs(
+        command.TippecanoeOptions(**options), sample=not full_scan, attribute_bytes=attribute_bytes
+    )
+
+
+# Function to preview polygon simplification at a zoom for the current options
+def preview_simplification(zoom):
+    options = collect_options()
+    options["inputs"] = tuple(command.InputFile(path=path) for path in input_paths())
+    return simplification.preview_inputs(command.TippecanoeOptions(**options), zoom)
+
+
+# Function to fill in the Attributes tab from the attribute cost analysis
+def apply_attribute_suggestions(suggestions):
+    if st.session_state.get("opt_attribute_mode") == "Include Only":
+        st.session_state.opt_include_attributes = suggestions["include_attributes"]
+    elif suggestions["exclude_attributes"]:
+        st.session_state.opt_attribute_mode = "Exclude Some"
+        st.session_state.opt_exclude_attributes = suggestions["exclude_attributes"]
+    st.session_state.opt_attribute_types = attributes.merge_attribute_types(
+        st.session_state.get("opt_attribute_types", ""), suggestions["attribute_types"]
+    )
+    rerun_sections("attributes_tab")
+
 
 # Attributes tab
-with tab4:
+@st.fragment(key="attributes_tab")
+@timed("Attributes")
+def attributes_tab():
     st.header("Feature Attributes")
     col1, col2 = st.columns(2)
 
     with col1:
         attribute_mode = st.radio(
             "Attribute Mode",
-            ["Keep All", "Include Only", "Exclude Some", "Exclude All"],
+            command.ATTRIBUTE_MODES,
+            key="opt_attribute_mode",
             help="How to handle feature attributes",
+            **reruns("attributes_tab"),
         )
 
         if attribute_mode == "Include Only":
-            include_attributes = st.text_area(
+            st.text_area(
                 "Include Attributes (one per line)",
+                key="opt_include_attributes",
                 help="Only these attributes will be included in the output",
+                **reruns("attributes_tab"),
             )
 
         if attribute_mode == "Exclude Some":
-            exclude_attributes = st.text_area(
+            st.text_area(
                 "Exclude Attributes (one per line)",
+                key="opt_exclude_attributes",
                 help="These attributes will be excluded from the output",
+                **reruns("attributes_tab"),
             )
 
     with col2:
-        generate_ids = st.checkbox(
+        st.checkbox(
             "Generate IDs",
+            key="opt_generate_ids",
             help="Add an ID to each feature that doesn't already have one",
+            **reruns("attributes_tab"),
+        )
+
+        st.text_input(
+            "Use Attribute for ID",
+            key="opt_attribute_for_id",
+            help="Use this attribute's value as the feature ID (and drop it from the attributes). Preconverted "
+            "FlatGeobuf inputs carry their IDs in tippecanoe_id, which is filled in here when left empty",
+            **reruns("attributes_tab"),
         )
 
-        attribute_types = st.text_area(
-            "Attribute Types (one per line type)",
+        st.text_area(
+            "Attribute Types (one per line, format: attribute:type)",
+            key="opt_attribute_types",
             help="Coerce attributes to specific types. Type can be the following strings, float, int, or bool",
+            **reruns("attributes_tab"),
         )
 
-        set_attributes = st.text_area(
+        st.text_area(
             "Set Attributes (one per line, format: attribute:value)",
+            key="opt_set_attributes",
             help="Set attribute values for all features. Format: attribute:value",
+            **reruns("attributes_tab"),
         )
 
+    with st.expander("Attribute Cost"):
+        st.caption(
+            "Scans every attribute of the input files for its type, distinct values, null rate and estimated "
+            "bytes in the max-zoom tiles, and suggests attributes to drop and string attributes to coerce with -T. "
+            "Distinct values are estimated in fixed memory, so large inputs are fine. Results are cached until a "
+            "file changes."
+        )
+        if st.button("Analyze Attributes"):
+            paths = input_paths()
+            missing = [path for path in paths if not os.path.isfile(path)]
+            if missing:
+                st.warning("Can't analyze missing files: " + ", ".join(missing))
+            elif paths:
+                try:
+                    with st.spinner("Scanning attributes..."):
+                        st.session_state.attribute_profile = attributes.merge_profiles(
+                            [attributes.profile_attributes(path) for path in paths]
+                        )
+                except (OSError, ValueError) as e:
+                    st.error(f"Couldn't scan input files: {e}")
+
+        attribute_profile = st.session_state.get("attribute_profile")
+        if attribute_profile is not None:
+            suggestions = attributes.suggest_attributes(attribute_profile)
+            st.dataframe(attributes.attribute_rows(attribute_profile), width="stretch", hide_index=True)
+            st.caption(attributes.describe_suggestions(suggestions))
+            st.button("Apply Suggestions", on_click=apply_attribute_suggestions, args=(suggestions,))
+
+
 # Advanced Options tab
-with tab5:
+@st.fragment(key="advanced_tab")
+@timed("Advanced Options")
+def advanced_tab():
     st.header("Advanced Options")
     col1, col2 = st.columns(2)
 
     with col1:
-        buffer_size = st.number_input(
+        st.number_input(
             "Buffer Size",
             value=5,
             min_value=0,
+            key="opt_buffer_size",
             help="Buffer size where features are duplicated from adjacent tiles",
+            **reruns("advanced_tab"),
         )
 
-        simplification = st.number_input(
+        st.number_input(
             "Simplification",
             value=1.0,
             min_value=0.0,
+            key="opt_simplification",
             help="Multiply the tolerance for line and polygon simplification",
+            **reruns("advanced_tab"),
         )
 
-        projection = st.selectbox(
+        st.selectbox(
             "Projection",
-            ["EPSG:4326 (WGS84)", "EPSG:3857 (Web Mercator)"],
+            command.PROJECTIONS,
+            key="opt_projection",
             help="Projection of the input data",
+            **reruns("advanced_tab"),
         )
 
-        no_clipping = st.checkbox(
-            "No Clipping", help="Don't clip features to the size of the tile"
+        st.checkbox(
+            "No Clipping",
+            key="opt_no_clipping",
+            help="Don't clip features to the size of the tile",
+            **reruns("advanced_tab"),
         )
 
-        no_duplication = st.checkbox(
-            "No Duplication", help="Don't duplicate features between tiles"
+        st.checkbox(
+            "No Duplication",
+            key="opt_no_duplication",
+            help="Don't duplicate features between tiles",
+            **reruns("advanced_tab"),
         )
 
+        sharded_build = st.checkbox(
+            "Sharded Build",
+            key="sharded_build",
+            help="Split the inputs into spatial shards, build each shard with its own tippecanoe job in parallel and merge them with tile-join. Needs a specified maximum zoom.",
+            **reruns("advanced_tab"),
+        )
+        if sharded_build:
+            st.number_input(
+                "Shard Zoom",
+                value=6,
+                min_value=1,
+                max_value=22,
+                key="shard_zoom",
+                help="Zoom level whose tiles are grouped into shards; lower zooms are built in one overview job",
+                **reruns("advanced_tab"),
+            )
+            st.number_input(
+                "Number of Shards",
+                value=8,
+                min_value=1,
+                key="shard_count",
+                help="Number of spatial shards of roughly equal feature counts",
+                **reruns("advanced_tab"),
+            )
+            st.radio(
+                "Shard Ordering",
+                ["hilbert", "quadkey"],
+                horizontal=True,
+                key="shard_method",
+                help="Space-filling curve used to group neighbouring tiles into shards",
+                **reruns("advanced_tab"),
+            )
+
     with col2:
-        feature_filter = st.text_area(
+        st.text_area(
             "Feature Filter (JSON)",
+            key="opt_feature_filter",
             help="Filter features using a Mapbox GL Style expression",
+            **reruns("advanced_tab"),
         )
-
-        max_tile_bytes = st.number_input(
+        filters, filter_problem = feature_filters()
+        if filter_problem:
+            st.error(filter_problem)
+        elif filters:
+            st.caption("Valid filter for layers: " + ", ".join(filters))
+            for reason in feature_filter.tippecanoe_only(filters).values():
+                st.caption(f"Not previewed or pre-filtered, tippecanoe applies it: {reason}")
+            if st.button("Preview Selectivity"):
+                paths = input_paths()
+                missing = [path for path in paths if not os.path.isfile(path)]
+                if missing:
+                    st.warning("Can't preview missing files: " + ", ".join(missing))
+                else:
+                    try:
+                        with st.spinner("Sampling inputs..."):
+                            st.session_state.filter_preview = feature_filter.preview_selectivity(
+                                filters,
+                                [
+                                    (file_input["path"].strip(), file_input["layer"])
+                                    for file_input in st.session_state.input_files
+                                    if file_input["path"].strip()
+                                ],
+                            )
+                    except (OSError, ValueError) as e:
+                        st.error(f"Couldn't sample input files: {e}")
+            if st.session_state.get("filter_preview"):
+                st.dataframe(st.session_state.filter_preview, width="stretch", hide_index=True)
+
+            prefilter = st.checkbox(
+                "Pre-filter Inputs",
+                key="prefilter_inputs",
+                help="Point the command at line-delimited GeoJSON copies of the inputs that hold only the features the filter keeps, so tippecanoe doesn't parse the rest. -j is still passed, and layers whose filter depends on $zoom or uses expressions only tippecanoe evaluates (\"match\", \"case\", ...) are left alone. The filtered copies take the place of the sorted or FlatGeobuf copies.",
+                **reruns("advanced_tab"),
+            )
+            if prefilter:
+                st.button("Filter Inputs Now", on_click=prefilter_inputs)
+                for stats in st.session_state.get("prefilter_results", []):
+                    st.caption(feature_filter.describe_stats(stats))
+                for problem in st.session_state.get("prefilter_problems", []):
+                    st.error(problem)
+                pending = [
+                    path
+                    for path, _, expression in prefilterable_inputs()
+                    if not feature_filter.is_filtered(path, expression)
+                ]
+                if pending:
+                    st.warning("Not filtered yet (or changed since): " + ", ".join(pending))
+
+        st.number_input(
             "Max Tile Bytes",
             value=500000,
             min_value=0,
+            key="opt_max_tile_bytes",
             help="Maximum compressed tile size in bytes",
+            **reruns("advanced_tab"),
         )
 
-        max_tile_features = st.number_input(
+        st.number_input(
             "Max Tile Features",
             value=200000,
             min_value=0,
+            key="opt_max_tile_features",
             help="Maximum number of features in a tile",
+            **reruns("advanced_tab"),
         )
 
-        preserve_input_order = st.checkbox(
+        st.checkbox(
             "Preserve Input Order",
+            key="opt_preserve_input_order",
             help="Preserve the original input order of features as the drawing order",
+            **reruns("advanced_tab"),
         )
 
-        no_tile_compression = st.checkbox(
-            "No Tile Compression", help="Don't compress the PBF vector tile data"
+        hilbert_sort_inputs = st.checkbox(
+            "Hilbert-Sort Inputs",
+            key="hilbert_sort_inputs",
+            help="Point the command at copies of the inputs sorted along a Hilbert curve, so features that are near each other are near each other in the file. tippecanoe's own sort then has less to do and uses less temp disk. With Preserve Input Order, the spatial order is also the drawing order.",
+            **reruns("advanced_tab"),
+        )
+        if hilbert_sort_inputs:
+            st.button("Sort Inputs Now", on_click=sort_inputs)
+            for stats in st.session_state.get("sort_results", []):
+                st.caption(hilbert_sort.describe_stats(stats))
+            for problem in st.session_state.get("sort_problems", []):
+                st.error(problem)
+            pending = [path for path in input_paths() if hilbert_sort.is_sortable(path) and not hilbert_sort.is_sorted(path)]
+            if pending:
+                st.warning("Not sorted yet (or changed since): " + ", ".join(pending))
+
+        st.checkbox(
+            "No Tile Compression",
+            key="opt_no_tile_compression",
+            help="Don't compress the PBF vector tile data",
+            **reruns("advanced_tab"),
         )
 
-# Generate command
-st.header("Generated Command")
-
-
-def build_command():
-    cmd = ["tippecanoe"]
-
-    # Output settings
-    if output_format == "MBTiles":
-        cmd.append(f"-o {output_file}")
-    elif output_format == "PMTiles":
-        cmd.append(f"-o {output_file}")
-    else:  # Directory
-        cmd.append(f"-e {output_dir}")
-
-    if force_overwrite:
-        cmd.append("-f")
-
-    if read_parallel:
-        cmd.append("-P")
-
-    if name:
-        cmd.append(f'-n "{name}"')
-
-    if description:
-        cmd.append(f'-N "{description}"')
-
-    if attribution:
-        cmd.append(f'-A "{attribution}"')
-
-    # Zoom levels
-    if zoom_mode == "Auto-detect":
-        cmd.append("-zg")
-    else:
-        cmd.append(f"-z{max_zoom}")
-
-    if min_zoom > 0:
-        cmd.append(f"-Z{min_zoom}")
-
-    if extend_zooms:
-        cmd.append("-ae")
-
-    # Tile detail
-    if auto_detail != True:
-        if full_detail != 12:
-            cmd.append(f"-d{full_detail}")
-
-        if low_detail != 12:
-            cmd.append(f"-D{low_detail}")
-
-        if min_detail != 7:
-            cmd.append(f"-m{min_detail}")
-
-    # Feature handling
-    if "Drop Densest As Needed" in drop_options:
-        cmd.append("-as")
-
-    if "Drop Fraction As Needed" in drop_options:
-        cmd.append("-ad")
-
-    if "Drop Smallest As Needed" in drop_options:
-        cmd.append("-an")
-
-    if "Coalesce Densest As Needed" in drop_options:
-        cmd.append("-aD")
-
-    if "Coalesce Smallest As Needed" in drop_options:
-        cmd.append("-aN")
-
-    if "Coalesce Fraction As Needed" in drop_options:
-        cmd.append("-aS")
-
-    if "No Line Simplification" in drop_options:
-        cmd.append("-ps")
-
-    if "No Tiny Polygon Reduction" in drop_options:
-        cmd.append("-pt")
-
-    if "No Feature Limit" in drop_options:
-        cmd.append("-pf")
-
-    if "No Tile Size Limit" in drop_options:
-        cmd.append("-pk")
-
-    if drop_rate != 2.5:
-        cmd.append(f"-r{drop_rate}")
-
-    # Clustering
-    if cluster_options == "Fixed Distance":
-        cmd.append(f"-K{cluster_distance}")
-        cmd.append(f"-k{cluster_maxzoom}")
-    elif cluster_options == "Cluster Densest As Needed":
-        cmd.append("-aC")
-
-    if (
-        "accumulate_attributes" in locals()
-        and accumulate_attributes
-        and cluster_options != "None"
-    ):
-        for attr in accumulate_attributes.split(","):
-            attr = attr.strip()
-            if attr:
-                cmd.append(f"-E{attr}")
-
-    if calculate_feature_density:
-        cmd.append("-ag")
-    
-    if detect_shared_borders:
-        cmd.append("-ab")
-
-    if grid_low_zooms:
-        cmd.append("-aL")
-
-    # Attributes
-    if attribute_mode == "Exclude All":
-        cmd.append("-X")
-    elif attribute_mode == "Include Only":
-        if include_attributes:
-            for attr in include_attributes.strip().split("\n"):
-                if attr.strip():
-                    cmd.append(f"-y {attr.strip()}")
-    elif attribute_mode == "Exclude Some":
-        if exclude_attributes:
-            for attr in exclude_attributes.strip().split("\n"):
-                if attr.strip():
-                    cmd.append(f"-x {attr.strip()}")
-
-    if generate_ids:
-        cmd.append("-ai")
+        tile_recompression = st.selectbox(
+            "Recompress Tiles",
+            command.TILE_RECOMPRESSIONS,
+            key="opt_tile_recompression",
+            help="After the build, recompress every tile of the MBTiles output in parallel as gzip at a chosen level, brotli or zstd, store identical tiles once and VACUUM the file. Serve brotli and zstd tiles with the matching Content-Encoding.",
+            **reruns("advanced_tab"),
+        )
+        if tile_recompression != "None":
+            st.number_input(
+                "Recompression Level",
+                value=0,
+                min_value=0,
+                key="opt_recompression_level",
+                help=f"0 uses the default for {tile_recompression}, level {recompress.DEFAULT_LEVELS[tile_recompression]}",
+                **reruns("advanced_tab"),
+            )
+            if st.session_state.get("opt_output_format", "MBTiles") not in ("MBTiles", "MBTiles + PMTiles"):
+                st.warning("Recompression only applies to MBTiles output")
+            else:
+                try:
+                    recompress.resolve_level(tile_recompression, st.session_state.get("opt_recompression_level", 0))
+                    recompress.check_codec(tile_recompression)
+                except (ValueError, ImportError) as e:
+                    st.warning(str(e))
 
-    if attribute_types:
-        for line in attribute_types.strip().split("\n"):
-            if line.strip():
-                cmd.append(f"-T attribute:{line.strip()}")
 
-    if set_attributes:
-        for line in set_attributes.strip().split("\n"):
-            if line.strip():
-                cmd.append(f"--set-attribute {line.strip()}")
+with tab1:
+    basic_tab()
+    input_files_section()
 
-    # Advanced options
-    if buffer_size != 5:
-        cmd.append(f"-b {buffer_size}")
+with tab2:
+    zoom_tab()
 
-    if simplification != 1.0:
-        cmd.append(f"-S {simplification}")
+with tab3:
+    features_tab()
 
-    if projection == "EPSG:3857 (Web Mercator)":
-        cmd.append("-s EPSG:3857")
+with tab4:
+    attributes_tab()
 
-    if no_clipping:
-        cmd.append("-pc")
+with tab5:
+    advanced_tab()
 
-    if no_duplication:
-        cmd.append("-pD")
 
-    if feature_filter:
-        cmd.append(f"-j '{feature_filter}'")
+# Generate command
+@st.fragment(key="command_block")
+@timed("Generated Command")
+def command_block():
+    st.header("Generated Command")
+
+    options = collect_options()
+
+    # Profiled suggestions replace tippecanoe's own guesses
+    suggestions = {}
+    if options["zoom_mode"] == "Auto-detect" and st.session_state.get("profile_inputs"):
+        suggestions = profile_suggestions()[1]
+    if suggestions:
+        options["zoom_mode"] = "Specify"
+        options["max_zoom"] = suggestions["max_zoom"]
+        if options["auto_detail"] and suggestions["full_detail"] != 12:
+            options["auto_detail"] = False
+            options["full_detail"] = suggestions["full_detail"]
+        if options["drop_rate"] == 2.5:
+            options["drop_rate"] = suggestions["drop_rate"]
+
+    convert_for_parallel = options["read_parallel"] and st.session_state.get("convert_for_parallel", True)
+    use_preconverted = st.session_state.get("use_preconverted", False)
+    hilbert_sorted = st.session_state.get("hilbert_sort_inputs", False)
+    filters = feature_filters()[0] if st.session_state.get("prefilter_inputs") else {}
+    input_files = []
+    for file_input in st.session_state.input_files:
+        path = file_input["path"].strip()
+        layer = file_input["layer"]
+        expression = feature_filter.prefilter_expression(filters, argv_tools.layer_name(layer, path))
+        if expression is not None and os.path.isfile(path):
+            layer = argv_tools.layer_name(layer, path)
+            path = feature_filter.filtered_path(path, expression)
+        # Preconverted FlatGeobuf is already Hilbert-sorted
+        elif use_preconverted and to_flatgeobuf.is_convertible(path):
+            # The copy's file name would give a different default layer name
+            layer = argv_tools.layer_name(layer, path)
+            path = to_flatgeobuf.converted_path(path)
+            if not options["attribute_for_id"] and os.path.isfile(path) and to_flatgeobuf.has_feature_ids(path):
+                options["attribute_for_id"] = to_flatgeobuf.ID_COLUMN
+        elif hilbert_sorted and hilbert_sort.is_sortable(path):
+            layer = argv_tools.layer_name(layer, path)
+            path = hilbert_sort.sorted_path(path)
+        elif convert_for_parallel and needs_line_delimited(path):
+            path = ndjson.converted_path(path)
+        if compressed.is_compressed(path):
+            # The pipe standing in for it is named after the decompressed file
+            layer = argv_tools.layer_name(layer, path)
+        input_files.append(command.InputFile(path=path, layer=layer))
+    options["inputs"] = tuple(input_files)
+
+    tippecanoe_options = command.TippecanoeOptions(**options)
+    argv = command.cached_argv(tippecanoe_options)
+
+    # Run Here runs wrappers with this interpreter; the copyable command names plain python
+    run_argv = argv
+    if st.session_state.get("sharded_build"):
+        if "-zg" in argv:
+            st.warning("Sharded builds need a specified maximum zoom rather than -zg")
+        sharding_args = [
+            "-m",
+            "tiling_tools.sharding",
+            "--shard-zoom",
+            str(st.session_state.get("shard_zoom", 6)),
+            "--shards",
+            str(st.session_state.get("shard_count", 8)),
+            "--method",
+            st.session_state.get("shard_method", "hilbert"),
+            "--",
+            *argv,
+        ]
+        run_argv = [sys.executable, *sharding_args]
+        argv = ["python", *sharding_args]
+
+    # Run Here streams compressed inputs itself; in a shell the command goes through the same wrapper
+    if compressed.has_compressed_inputs(argv):
+        argv = ["python", "-m", "tiling_tools.compressed", "--", *argv]
+
+    commands = [argv] + command.derived_commands(tippecanoe_options)
+    st.session_state.generated_commands = [run_argv] + command.derived_commands(tippecanoe_options, sys.executable)
+    command_text = command.commands_to_shell(commands)
+
+    st.code(command_text, language="bash")
+    # st.button("Copy to clipboard", on_click=lambda: st.write("Copied!"))
+
+    st_copy_to_clipboard(command_text, "Copy Command")
+
+
+command_block()
+
+
+# Run the generated command here and record how it performed
+@st.fragment(key="run_panel")
+@timed("Run")
+def run_panel():
+    with st.expander("Run Here"):
+        st.caption(
+            "Runs the generated command on this machine, showing tippecanoe's progress, and saves a record of "
+            "wall time, CPU, peak memory and temp disk use so option sets can be compared."
+        )
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            runs_dir = st.text_input("Run Records Directory", value=runner.RUNS_DIR, key="runs_dir")
+        with col2:
+            fake = st.checkbox(
+                "Use Fake tippecanoe", key="run_fake", help="Run the scripted stand-in instead of tippecanoe"
+            )
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            cache_dir = st.text_input("Build Cache Directory", value=build_cache.CACHE_DIR, key="cache_dir")
+        with col2:
+            quota_gb = st.number_input(
+                "Cache Quota (GB)", value=build_cache.QUOTA_BYTES / 1024**3, min_value=0.0, key="cache_quota"
+            )
+        with col3:
+            use_cache = st.checkbox(
+                "Use Build Cache",
+                value=True,
+                key="run_cache",
+                help="Reuse the output of an earlier build with the same inputs (by content) and options",
+            )
+        if st.button("Run Command", type="primary"):
+            status = st.empty()
+            bar = st.progress(0.0)
+            col1, col2, col3, col4 = st.columns(4)
+            elapsed, cpu, rss, temp = col1.empty(), col2.empty(), col3.empty(), col4.empty()
+
+            def show(progress, sample):
+                status.caption(f"{os.path.basename(argv[0])}: {runner.describe_progress(progress)}")
+                bar.progress(min(progress.percent, 100.0) / 100.0, f"{progress.phase} {progress.percent:.1f}%")
+                elapsed.metric("Elapsed", f"{sample[0]:.1f}s")
+                if sample[1] is not None:
+                    cpu.metric("CPU", f"{sample[1]:.1f}s")
+                    rss.metric("Memory", f"{sample[2]:,.0f} MB")
+                temp.metric("Temp Disk", f"{sample[3]:,.0f} MB")
+
+            for argv in st.session_state.get("generated_commands", []):
+                if fake and argv[0] == "tippecanoe":
+                    argv = fake_tippecanoe.TIPPECANOE + argv[1:]
+                elif fake and argv[1:3] == ["-m", "tiling_tools.sharding"]:
+                    argv = [*argv[:3], "--fake", *argv[3:]]
+                is_tippecanoe = argv[0] == "tippecanoe" or argv[:2] == fake_tippecanoe.TIPPECANOE
+                try:
+                    if use_cache and is_tippecanoe:
+                        record = build_cache.run(
+                            argv, on_progress=show, cache_dir=cache_dir, quota_bytes=int(quota_gb * 1024**3)
+                        )
+                    else:
+                        record = runner.run(argv, on_progress=show)
+                except OSError as e:
+                    st.error(f"Couldn't start {argv[0]}: {e}")
+                    break
+                runner.save_record(record, runs_dir)
+                if record.returncode != 0:
+                    st.error(f"{os.path.basename(argv[0])} failed ({runner.describe_record(record)})")
+                    st.code("\n".join(record.stderr_tail[-20:]))
+                    break
+                if record.cached:
+                    st.success(f"Restored {record.output_path} from the build cache in {record.seconds:.2f}s")
+                    continue
+                st.success(runner.describe_record(record))
+                if record.size_warnings:
+                    st.warning(f"{len(record.size_warnings)} tiles hit the size or feature limits")
+                if record.samples:
+                    st.line_chart(
+                        [{"seconds": s[0], "memory (MB)": s[2], "CPU seconds": s[1]} for s in record.samples],
+                        x="seconds",
+                    )
+
+        if use_cache and os.path.isdir(cache_dir):
+            st.caption(build_cache.describe_stats(build_cache.cache_stats(cache_dir)))
+        records = runner.load_records(runs_dir)
+        if records:
+            st.dataframe(runner.summary_rows(records), width="stretch", hide_index=True)
+
+
+run_panel()
+
+
+# Function to serve a tileset for the preview map, replacing any server already running
+def start_preview_server(path):
+    stop_preview_server()
+    try:
+        server = tile_server.TileServer(path)
+        server.start(port=0)
+    except (OSError, ValueError) as e:
+        st.session_state.preview_problem = f"Couldn't serve {path}: {e}"
+        return
+    st.session_state.preview_problem = None
+    st.session_state.tile_server = server
+
+
+# Function to stop the preview server
+def stop_preview_server():
+    server = st.session_state.pop("tile_server", None)
+    if server is not None:
+        server.stop()
+
+
+# Look at the built tileset on a map served from this machine
+@st.fragment(key="preview_panel")
+@timed("Preview")
+def preview_panel():
+    with st.expander("Preview Output"):
+        st.caption(
+            "Serves the built tileset from a local tile server with an in-memory tile cache and shows it on a "
+            "map. Rebuilding the tileset reloads it. The server listens on 127.0.0.1 and the map loads MapLibre "
+            "from unpkg, so the preview works when the browser runs on this machine."
+        )
+        options = collect_options()
+        output_format = "PMTiles" if options["output_format"] == "PMTiles" else "MBTiles"
+        # No key, so the default follows the output filename
+        path = st.text_input("Tileset", value=command.output_filename(options["output_file"], output_format))
+        server = st.session_state.get("tile_server")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("Start Preview", on_click=start_preview_server, args=(path,))
+        with col2:
+            st.button("Stop Preview", on_click=stop_preview_server, disabled=server is None)
+        if st.session_state.get("preview_problem"):
+            st.error(st.session_state.preview_problem)
+        if server is not None:
+            stats = server.stats()
+            st.caption(
+                f"Serving {server.path} at {server.url}: {stats['requests']:,} requests, "
+                f"{stats['cache_hits']:,} cache hits, {stats['not_modified']:,} not modified"
+            )
+            st.iframe(server.url, height=500)
 
-    if max_tile_bytes != 500000:
-        cmd.append(f"-M {max_tile_bytes}")
 
-    if max_tile_features != 200000:
-        cmd.append(f"-O {max_tile_features}")
+preview_panel()
 
-    if preserve_input_order:
-        cmd.append("-pi")
 
-    if no_tile_compression:
-        cmd.append("-pC")
+# Function to copy tuned options into the option widgets
+def apply_tuned_options(tuned):
+    st.session_state.opt_drop_options = list(tuned.drop_options)
+    st.session_state.opt_auto_detail = False
+    st.session_state.opt_full_detail = tuned.full_detail
+    st.session_state.opt_low_detail = tuned.low_detail
+    st.session_state.opt_min_detail = tuned.min_detail
+    st.session_state.opt_drop_rate = tuned.drop_rate
+    st.session_state.opt_max_tile_bytes = tuned.max_tile_bytes
+    rerun_sections("zoom_tab", "features_tab", "advanced_tab")
 
-    # Input files
-    input_file_args = []
 
-    for file_input in st.session_state.input_files:
-        path = file_input["path"].strip()
-        layer = file_input["layer"].strip()
+# Search the size-related options on a sample of the inputs
+@st.fragment(key="autotune_panel")
+@timed("Auto-tune")
+def autotune_panel():
+    with st.expander("Auto-tune"):
+        st.caption(
+            "Builds a spatially stratified sample of the inputs with a budgeted set of drop strategies, detail "
+            "levels, drop rates and -M values, and finds the fastest build whose predicted largest tile stays "
+            "under Max Tile Bytes and Max Tile Features. Results are cached, so tuning again only builds what's new."
+        )
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            fraction = st.number_input(
+                "Sample Fraction", value=autotune.SAMPLE_FRACTION, min_value=0.001, max_value=1.0, format="%.3f"
+            )
+        with col2:
+            evaluations = st.number_input("Sample Builds", value=autotune.EVALUATIONS, min_value=1, max_value=100)
+        with col3:
+            fake = st.checkbox(
+                "Use Fake tippecanoe", key="tune_fake", help="Run the scripted stand-in instead of tippecanoe"
+            )
+        if st.button("Tune Options"):
+            options = collect_options()
+            options["inputs"] = tuple(
+                command.InputFile(path=file_input["path"].strip(), layer=file_input["layer"])
+                for file_input in st.session_state.input_files
+                if file_input["path"].strip()
+            )
+            bar = st.progress(0.0)
+            program = fake_tippecanoe.TIPPECANOE if fake else ["tippecanoe"]
+            try:
+                st.session_state.tune_result = autotune.tune(
+                    command.TippecanoeOptions(**options),
+                    fraction,
+                    evaluations,
+                    program=program,
+                    progress=lambda evaluation, built, budget: bar.progress(
+                        min(built / budget, 1.0), f"{built} of {budget} sample builds"
+                    ),
+                )
+            except (OSError, ValueError) as e:
+                st.error(f"Couldn't tune: {e}")
 
-        if path:
-            if layer:
-                input_file_args.append(f"-L {layer}:{path}")
+        result = st.session_state.get("tune_result")
+        if result is not None:
+            if result.options is None:
+                st.warning(autotune.describe_result(result))
             else:
-                input_file_args.append(path)
+                st.success(autotune.describe_result(result))
+                st.code(command.commands_to_shell(command.build_commands(result.options)), language="bash")
+                st.button("Apply to Options", on_click=apply_tuned_options, args=(result.options,))
+            st.dataframe(autotune.evaluation_rows(result), width="stretch", hide_index=True)
 
-    cmd.extend(input_file_args)
 
-    return " ".join(cmd)
+autotune_panel()
 
 
-command = build_command()
+# Function to add the current options to a batch manifest as one tileset
+def add_to_batch_manifest(path, name, priority, after):
+    options = collect_options()
+    options["inputs"] = tuple(
+        command.InputFile(path=file_input["path"].strip(), layer=file_input["layer"])
+        for file_input in st.session_state.input_files
+        if file_input["path"].strip()
+    )
+    try:
+        batch.add_to_manifest(path, name, command.TippecanoeOptions(**options), priority, after)
+    except (OSError, ValueError) as e:
+        st.session_state.batch_problem = f"Couldn't update {path}: {e}"
+    else:
+        st.session_state.batch_problem = None
+    rerun_sections("batch_panel")
+
+
+# Collect tilesets into a manifest for the batch scheduler
+@st.fragment(key="batch_panel")
+@timed("Batch Manifest")
+def batch_panel():
+    with st.expander("Batch Manifest"):
+        st.caption(
+            "Adds the current options as a tileset in a manifest, replacing one of the same name, so many "
+            "tilesets can be built in one run. The batch scheduler runs them concurrently within a core and "
+            "memory budget, giving each tippecanoe its own thread count, and reports the time saved against "
+            "running them one after another."
+        )
+        path = st.text_input("Manifest File", value="tilesets.json", key="batch_manifest")
+        jobs, problem = [], None
+        if os.path.exists(path):
+            try:
+                jobs = batch.load_manifest(path)[0]
+            except (OSError, ValueError) as e:
+                problem = f"Couldn't read {path}: {e}"
+        col1, col2, col3 = st.columns([2, 1, 2])
+        with col1:
+            options = collect_options()
+            output = command.output_filename(options["output_file"], options["output_format"])
+            name = st.text_input(
+                "Job Name", value=os.path.splitext(os.path.basename(output))[0], help="The tileset's manifest name"
+            )
+        with col2:
+            priority = st.number_input("Priority", value=0, help="Higher priorities start first")
+        with col3:
+            after = st.multiselect(
+                "Run After", [job.name for job in jobs if job.name != name], help="Tilesets that must finish first"
+            )
+        st.button("Add to Manifest", on_click=add_to_batch_manifest, args=(path, name, int(priority), after))
+        problem = st.session_state.get("batch_problem") or problem
+        if problem:
+            st.error(problem)
+        if jobs:
+            st.dataframe(batch.job_rows(jobs), width="stretch", hide_index=True)
+            st.code(f"python -m tiling_tools.batch {path}", language="bash")
 
-st.code(command, language="bash")
-# st.button("Copy to clipboard", on_click=lambda: st.write("Copied!"))
 
-st_copy_to_clipboard(command, "Copy Command")
+batch_panel()
 
 # Add useful examples
 with st.expander("Example Commands"):
@@ -616,4 +1432,21 @@ with st.expander("Tippecanoe Documentation"):
     to a single building, you can see the density and texture of the data rather than a simplification from dropping
     features or clustering them.
     """
-    )
\ No newline at end of file
+    )
+
+
+# Instrumentation: timings of the last full run and of each fragment rerun since
+@st.fragment(key="timings_panel")
+def timings_panel():
+    with st.expander("Rerun Timings"):
+        st.caption(
+            "Edits rerun only the section they belong to and the generated command. "
+            "Each row is one render, newest first."
+        )
+        st.dataframe(list(reversed(st.session_state.rerun_timings)), width="stretch")
+        cache = command.argv_cache_info()
+        st.caption(f"Command cache: {cache.hits} hits, {cache.misses} misses, {cache.currsize} entries")
+
+
+record_timing("Full page run", time.perf_counter() - run_started)
+timings_panel()
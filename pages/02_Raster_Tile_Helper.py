@@ -1,11 +1,119 @@
+import os
+import shlex
+import time
+
 import streamlit as st
 
+from tiling_tools import geotiff, raster_tiles
+
 st.set_page_config(page_title="Raster Tile Helper", page_icon="🗺️", layout="wide")
 
 st.title("🗺️ Raster Tile Helper")
-st.markdown("""
-This is a placeholder page for a future Raster Tile Helper
-""")
+st.markdown(
+    """
+Work out which zoom levels a set of GeoTIFFs (or COGs) is worth tiling to, then generate the `gdal2tiles.py`
+command. Only each file's header is read, never the pixels, so whole directories of rasters are profiled in
+seconds. The **max zoom** is the first zoom whose tile pixels are at least as fine as the raster's ground
+resolution at its latitude; the **min zoom** is where the whole raster fits in roughly one tile.
+"""
+)
+
+patterns = st.text_area(
+    "Rasters",
+    value=st.session_state.get("raster_patterns", ""),
+    placeholder="/data/imagery/\n/data/dem/*.tif",
+    help="One directory, glob pattern or file per line. Directories are searched recursively for .tif/.tiff files.",
+)
+st.session_state.raster_patterns = patterns
+
+if st.button("Profile Rasters", type="primary"):
+    started = time.perf_counter()
+    paths = geotiff.find_rasters(patterns.splitlines())
+    headers = geotiff.read_headers(paths)
+    st.session_state.raster_headers = headers
+    st.session_state.raster_seconds = time.perf_counter() - started
+
+headers = st.session_state.get("raster_headers")
+if headers is not None:
+    rows = geotiff.recommend_zooms(headers)
+    skipped = [h for h in headers if h.error or not h.georeferenced]
+    st.caption(f"Read {len(headers):,} headers in {st.session_state.raster_seconds:.2f}s")
+
+    if not headers:
+        st.warning("No .tif or .tiff files matched")
+    if skipped:
+        with st.expander(f"{len(skipped)} files skipped"):
+            st.dataframe(
+                [{"path": h.path, "reason": h.error or "no georeferencing tags"} for h in skipped],
+                width="stretch",
+                hide_index=True,
+            )
+
+    if rows:
+        min_zoom, max_zoom = geotiff.combined_zooms(rows)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Rasters", f"{len(rows):,}")
+        col2.metric("Recommended Min Zoom", min_zoom)
+        col3.metric("Recommended Max Zoom", max_zoom)
+        if not all(row["latitude known"] for row in rows):
+            st.info(
+                "Some rasters use a projection this tool can't convert to latitude without pyproj, so their "
+                "resolution is treated as if at the equator. Install pyproj for exact recommendations."
+            )
+        st.dataframe(rows, width="stretch", hide_index=True)
+
+        st.header("gdal2tiles Command")
+        col1, col2 = st.columns(2)
+        with col1:
+            zooms = st.slider("Zoom Range", 0, geotiff.MAX_ZOOM, (min_zoom, max_zoom))
+            output_dir = st.text_input("Output Directory", value="tiles")
+        with col2:
+            resampling = st.selectbox(
+                "Resampling",
+                ["average", "near", "bilinear", "cubic", "cubicspline", "lanczos", "mode", "max", "min", "med"],
+                help="Use near or mode for categorical rasters such as land cover",
+            )
+            processes = st.number_input("Processes", min_value=1, value=os.cpu_count() or 1)
+            xyz = st.checkbox("XYZ Tile Numbering", value=True, help="Use XYZ (slippy map) rather than TMS rows")
+
+        commands = geotiff.gdal2tiles_commands(
+            [row["path"] for row in rows], zooms[0], zooms[1], output_dir, processes, resampling, xyz
+        )
+        st.code(" && \\\n".join(shlex.join(argv) for argv in commands), language="bash")
+        if len(rows) > 1:
+            st.caption("Several rasters are mosaicked into a virtual raster with gdalbuildvrt first.")
 
-# Placeholder for future implementation
-st.info("This feature is under development. Check back soon!")
\ No newline at end of file
+        st.header("Build Tiles Here")
+        st.markdown(
+            "Or skip gdal2tiles: this builds the pyramid in-process, reading the rasters once for the max zoom "
+            "and downsampling every lower zoom from the tiles below it. Empty tiles are skipped and repeated "
+            "tiles stored once."
+        )
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            build_output = st.text_input(
+                "Output", value="tiles.mbtiles", help="A .mbtiles or .pmtiles file, or a directory of z/x/y tiles"
+            )
+        with col2:
+            tile_format = st.selectbox("Tile Format", list(raster_tiles.TILE_FORMATS))
+        with col3:
+            build_resampling = st.selectbox(
+                "Downsampling", raster_tiles.RESAMPLING, help="near keeps the exact values of categorical rasters"
+            )
+        if st.button("Build Tiles"):
+            progress = st.progress(0.0)
+            try:
+                stats = raster_tiles.build(
+                    [row["path"] for row in rows],
+                    build_output,
+                    zooms[0],
+                    zooms[1],
+                    tile_format,
+                    build_resampling,
+                    processes,
+                    progress=lambda done, total: progress.progress(done / total, f"{done:,} of {total:,} blocks"),
+                )
+            except (OSError, ValueError) as e:
+                st.error(f"Couldn't build tiles: {e}")
+            else:
+                st.success(raster_tiles.describe_stats(stats))
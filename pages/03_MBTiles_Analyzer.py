@@ -0,0 +1,173 @@
+import os
+
+import streamlit as st
+
+from tiling_tools import analyzer, pmtiles
+
+st.set_page_config(page_title="MBTiles Analyzer", page_icon="📊", layout="wide")
+
+st.title("📊 MBTiles Analyzer")
+st.markdown(
+    """
+Check what tippecanoe actually produced. The analyzer opens an MBTiles file read-only and scans the tile sizes
+(without loading the tiles themselves), so it stays quick and light even on archives with millions of tiles.
+Use it to see how close your tiles get to the **Max Tile Bytes** (`-M`) and **Max Tile Features** (`-O`) limits
+set in the Advanced tab of the command generator. PMTiles archives can be inspected too: the header, deduplication
+and bytes per zoom, and individual tiles, read straight from the memory-mapped file.
+"""
+)
+
+col1, col2, col3 = st.columns([3, 1, 1])
+with col1:
+    path = st.text_input(
+        "MBTiles or PMTiles File",
+        value=st.session_state.get("opt_output_file", ""),
+        help="Path to the .mbtiles or .pmtiles file to analyze",
+    )
+with col2:
+    max_tile_bytes = st.number_input(
+        "Max Tile Bytes",
+        value=st.session_state.get("opt_max_tile_bytes", analyzer.MAX_TILE_BYTES),
+        min_value=1,
+        help="The -M limit the tileset was built with",
+    )
+with col3:
+    max_tile_features = st.number_input(
+        "Max Tile Features",
+        value=st.session_state.get("opt_max_tile_features", analyzer.MAX_TILE_FEATURES),
+        min_value=1,
+        help="The -O limit the tileset was built with",
+    )
+
+top_n = st.slider("Largest Tiles to List", min_value=5, max_value=100, value=analyzer.TOP_N)
+
+if st.button("Analyze", type="primary"):
+    st.session_state.analysis = None
+    st.session_state.pmtiles_path = None
+    if not os.path.isfile(path):
+        st.error(f"File not found: {path}")
+    elif path.lower().endswith(".pmtiles"):
+        st.session_state.pmtiles_path = path
+    else:
+        progress = st.empty()
+        try:
+            st.session_state.analysis = analyzer.analyze(
+                path,
+                max_tile_bytes=max_tile_bytes,
+                max_tile_features=max_tile_features,
+                top_n=top_n,
+                progress=lambda scanned: progress.caption(f"Scanned {scanned:,} tiles..."),
+            )
+        except Exception as e:
+            st.error(f"Couldn't read {path} as MBTiles: {e}")
+        progress.empty()
+
+analysis = st.session_state.get("analysis")
+if analysis is not None:
+    near = int(analysis.near_limit.sum())
+    over = int(analysis.over_limit.sum())
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Tiles", f"{analysis.tile_count:,}")
+    col2.metric("Total Size", f"{analysis.total_bytes.sum() / 1e6:,.1f} MB")
+    col3.metric(f"Within {round(100 * (1 - analyzer.NEAR_FRACTION))}% of -M", f"{near:,}")
+    col4.metric("Over -M", f"{over:,}")
+    st.caption(
+        f"{analysis.path}: scanned {analysis.tile_count:,} tiles in {analysis.seconds:.2f}s "
+        f"({analysis.tiles_per_second:,.0f} tiles/s). Percentiles are estimated from "
+        f"{analyzer.BINS_PER_OCTAVE} histogram bins per doubling of size."
+    )
+    if over:
+        st.warning(
+            "Some tiles are bigger than the -M limit. tippecanoe only writes these when size limits are "
+            "disabled (No Tile Size Limit) or the tileset was built with a different limit."
+        )
+
+    st.header("Tile Sizes by Zoom")
+    st.dataframe(analyzer.zoom_summary(analysis), width="stretch", hide_index=True)
+
+    if analysis.zooms:
+        zoom = st.select_slider("Histogram Zoom", options=analysis.zooms, value=analysis.zooms[-1])
+        histogram = analyzer.histogram_rows(analysis, zoom)
+        st.bar_chart(
+            [{"tile size (bytes)": f"{row['bytes']:,}+", "tiles": row["tiles"]} for row in histogram],
+            x="tile size (bytes)",
+            y="tiles",
+            sort=False,
+        )
+
+    st.header("Largest Tiles")
+    st.dataframe(analyzer.largest_tiles(analysis), width="stretch", hide_index=True)
+    features = [count for count in analysis.largest_features if count is not None]
+    near_features = sum(count >= analyzer.NEAR_FRACTION * analysis.max_tile_features for count in features)
+    if features:
+        st.caption(
+            f"Feature counts are read from the largest tiles only; {near_features} of them are "
+            f"within {round(100 * (1 - analyzer.NEAR_FRACTION))}% of the -O limit."
+        )
+
+    with st.expander("Metadata"):
+        st.json(analysis.metadata, expanded=False)
+
+
+# Function to open a PMTiles archive once per session and path
+@st.cache_resource(max_entries=4)
+def open_pmtiles(path, mtime):
+    return pmtiles.PMTilesReader(path)
+
+
+# Function to walk an archive's directories once per path and modification time
+@st.cache_data(max_entries=4)
+def pmtiles_stats(path, mtime):
+    return pmtiles.archive_stats(open_pmtiles(path, mtime))
+
+
+pmtiles_path = st.session_state.get("pmtiles_path")
+if pmtiles_path:
+    try:
+        mtime = os.path.getmtime(pmtiles_path)
+        reader = open_pmtiles(pmtiles_path, mtime)
+    except (OSError, ValueError) as e:
+        st.error(f"Couldn't read {pmtiles_path} as PMTiles: {e}")
+    else:
+        header = pmtiles.describe_header(reader.header)
+        stats = pmtiles_stats(pmtiles_path, mtime)
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Addressed Tiles", f"{stats['addressed_tiles']:,}")
+        col2.metric("Unique Tiles", f"{stats['tile_contents']:,}")
+        col3.metric("Dedup Ratio", f"{stats['dedup_ratio'] or 0:.2f}x")
+        col4.metric("Leaf Directories", f"{stats['leaf_directories']:,}")
+        st.caption(
+            f"{stats['tile_entries']:,} directory entries, {stats['run_length_entries']:,} of them runs of "
+            f"repeated tiles; {stats['tile_data_bytes'] / 1e6:,.1f} MB of tile data and "
+            f"{stats['directory_bytes'] / 1e3:,.1f} kB of directories."
+        )
+
+        st.header("Tiles by Zoom")
+        st.dataframe(
+            [
+                {"zoom": z, "tiles": row["tiles"], "MB (before dedup)": round(row["bytes"] / 1e6, 3)}
+                for z, row in stats["zooms"].items()
+            ],
+            width="stretch",
+            hide_index=True,
+        )
+
+        st.header("Tile Lookup")
+        tile = st.text_input("Tile (z/x/y)", value=f"{header['min_zoom']}/0/0")
+        try:
+            z, x, y = (int(part) for part in tile.split("/"))
+            location = reader.locate(z, x, y)
+        except ValueError as e:
+            st.error(f"Enter a tile as z/x/y, e.g. 3/4/2 ({e})")
+        else:
+            if location is None:
+                st.info(f"{tile} is not in the archive")
+            else:
+                st.write(f"{tile}: {location[1]:,} bytes at offset {location[0]:,} of the tile data")
+
+        with st.expander("Header"):
+            st.json(header, expanded=False)
+        with st.expander("Metadata"):
+            st.json(reader.metadata, expanded=False)
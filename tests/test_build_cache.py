@@ -0,0 +1,53 @@
+import os
+import sqlite3
+
+from tiling_tools import build_cache, fake_tippecanoe, synthetic
+
+
+def test_editing_a_restored_output_leaves_the_cache_alone(tmp_path):
+    dataset = synthetic.generate("points", 500, seed=7)
+    path = synthetic.write(dataset, str(tmp_path / "points.geojsonl"))
+    output = str(tmp_path / "points.mbtiles")
+    cache_dir = str(tmp_path / "cache")
+    args = [*fake_tippecanoe.TIPPECANOE, "-f", "-z5", "-o", output, path]
+
+    assert not build_cache.run(args, cache_dir=cache_dir).cached
+    record = build_cache.run(args, cache_dir=cache_dir)
+    assert record.cached
+    (cached,) = os.listdir(os.path.join(cache_dir, "objects"))
+    cached = os.path.join(cache_dir, "objects", cached)
+    assert not os.path.samefile(cached, output)
+    with open(cached, "rb") as f:
+        before = f.read()
+
+    # Metadata edits after a build, as tile-join or a publishing script would make
+    connection = sqlite3.connect(output)
+    connection.execute("UPDATE metadata SET value = 'edited' WHERE name = 'name'")
+    connection.execute("DELETE FROM tiles WHERE zoom_level = 5")
+    connection.commit()
+    connection.close()
+    with open(cached, "rb") as f:
+        assert f.read() == before
+
+    assert build_cache.run(args, cache_dir=cache_dir).cached
+    connection = sqlite3.connect(output)
+    assert connection.execute("SELECT value FROM metadata WHERE name = 'name'").fetchone()[0] == "fake"
+    connection.close()
+
+
+def test_a_cached_object_that_changed_size_is_not_served(tmp_path):
+    dataset = synthetic.generate("points", 200, seed=8)
+    path = synthetic.write(dataset, str(tmp_path / "points.geojsonl"))
+    output = str(tmp_path / "points.mbtiles")
+    cache_dir = str(tmp_path / "cache")
+    args = [*fake_tippecanoe.TIPPECANOE, "-f", "-z4", "-o", output, path]
+    build_cache.run(args, cache_dir=cache_dir)
+    (cached,) = os.listdir(os.path.join(cache_dir, "objects"))
+    cached = os.path.join(cache_dir, "objects", cached)
+    os.chmod(cached, 0o644)
+    with open(cached, "ab") as f:
+        f.write(b"junk")
+
+    assert not build_cache.run(args, cache_dir=cache_dir).cached
+    assert build_cache.cache_stats(cache_dir)["misses"] == 2
+    assert build_cache.run(args, cache_dir=cache_dir).cached
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from tiling_tools import compressed
+
+
+@pytest.fixture(scope="module")
+def big_file(tmp_path_factory):
+    path = tmp_path_factory.mktemp("compressed") / "big.bin"
+    with open(path, "wb") as f:
+        f.write(os.urandom(16 * compressed.READ_SIZE))
+    return str(path)
+
+
+def test_stopping_early_is_not_a_failure(big_file):
+    # The command is still writing when the reader stops; it used to die of SIGPIPE now and then and raise
+    for _ in range(50):
+        chunks = compressed._command_chunks(["cat", big_file])
+        assert next(chunks)
+        chunks.close()
+
+
+def test_reading_everything(big_file):
+    assert sum(map(len, compressed._command_chunks(["cat", big_file]))) == os.path.getsize(big_file)
+
+
+def test_failing_command_raises(tmp_path):
+    with pytest.raises(ValueError, match="cat failed"):
+        list(compressed._command_chunks(["cat", str(tmp_path / "missing")]))
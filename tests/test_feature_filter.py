@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from tiling_tools import feature_filter, synthetic
+
+MATCH = ["match", ["get", "category"], ["a", "b"], True, False]
+
+
+def test_expressions_only_tippecanoe_evaluates_are_valid(tmp_path):
+    filters = feature_filter.parse_filters(json.dumps({"points": MATCH, "*": ["==", "category", "a"]}))
+    assert set(feature_filter.tippecanoe_only(filters)) == {"points"}
+    assert feature_filter.prefilter_expression(filters, "points") is None
+    assert feature_filter.prefilter_expression(filters, "other") == ["==", "category", "a"]
+
+    path = synthetic.write(synthetic.generate("points", 200, seed=3), str(tmp_path / "points.geojsonl"))
+    (row,) = feature_filter.preview_selectivity(filters, [(path, "points")])
+    assert row["sampled"] is None and "tippecanoe" in row["note"]
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        ["all", ["==", "category", "a"], ["case", ["has", "value"], True, False]],
+        ["==", ["to-number", ["get", "value"]], 3],
+        ["==", ["get", "category"], ["get", "other"]],
+        ["==", "category", ["literal", ["a", "b"]]],
+    ],
+)
+def test_other_expressions_are_left_to_tippecanoe(expression):
+    assert feature_filter.tippecanoe_only(feature_filter.parse_filters(json.dumps({"points": expression})))
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        ["bogus", "category", "a"],
+        ["all", MATCH, ["bogus"]],
+        ["==", "category", {"a": 1}],
+        ["==", "category"],
+    ],
+)
+def test_mistakes_are_still_errors(expression):
+    with pytest.raises(feature_filter.FilterError) as error:
+        feature_filter.parse_filters(json.dumps({"points": expression}))
+    assert not isinstance(error.value, feature_filter.UnsupportedFilter)
@@ -0,0 +1,50 @@
+import json
+from collections import Counter
+
+import numpy as np
+
+from tiling_tools import hilbert_sort, synthetic
+
+
+def _sort(tmp_path, monkeypatch, path):
+    # Small ranges and runs, so several workers each spill several runs that the merge has to interleave
+    monkeypatch.setattr(hilbert_sort, "MIN_RANGE", 4096)
+    stats = hilbert_sort.sort_input(path, memory_bytes=1 << 18, workers=4, workdir=str(tmp_path))
+    assert stats.workers == 4
+    assert stats.runs > stats.workers
+    return stats
+
+
+def test_line_delimited_geojson(tmp_path, monkeypatch):
+    path = synthetic.write(synthetic.generate("polygons", 3000, seed=6), str(tmp_path / "polygons.geojsonl"))
+    with open(path, "rb") as f:
+        lines = [line.rstrip(b"\n") + b"\n" for line in f if line.strip()]
+    # A feature without geometry sorts last
+    lines.append(json.dumps({"type": "Feature", "geometry": None, "properties": {}}).encode() + b"\n")
+    with open(path, "wb") as f:
+        f.writelines(lines[-1:] + lines[:-1])
+
+    stats = _sort(tmp_path, monkeypatch, path)
+    with open(stats.output_path, "rb") as f:
+        output = f.readlines()
+    assert stats.features == len(output)
+    assert Counter(output) == Counter(lines)
+    keys = hilbert_sort._geojson_keys(output)
+    assert (np.diff(keys) >= 0).all()
+    assert keys[-1] == hilbert_sort.NO_GEOMETRY_KEY
+
+
+def test_csv(tmp_path, monkeypatch):
+    path = synthetic.write(synthetic.generate("points", 5000, seed=6), str(tmp_path / "points.csv"))
+    with open(path, "rb") as f:
+        # Sorted lines end in \n whatever the input used
+        header, *lines = [line.rstrip(b"\r\n") + b"\n" for line in f]
+
+    stats = _sort(tmp_path, monkeypatch, path)
+    with open(stats.output_path, "rb") as f:
+        out_header, *output = f.readlines()
+    assert out_header == header
+    assert Counter(output) == Counter(lines)
+    columns = header.decode().strip().split(",")
+    lat_index, lon_index = hilbert_sort.readers.csv_coordinate_columns(columns, path)
+    assert (np.diff(hilbert_sort._csv_keys(output, lon_index, lat_index)) >= 0).all()
@@ -0,0 +1,123 @@
+import json
+import os
+
+import pytest
+
+from tiling_tools import fake_tippecanoe, incremental, runner, synthetic
+
+# Spread over most of the world, so a few edits leave most low-zoom tiles alone
+BBOX = (-170.0, -60.0, 170.0, 60.0)
+TIPPECANOE = tuple(fake_tippecanoe.TIPPECANOE)
+
+
+def _write(features, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for feature in features:
+            f.write(json.dumps(feature, separators=(",", ":")) + "\n")
+
+
+# Function to make a few edits in one place: a changed property, a moved feature, a deletion and an addition
+def _edit(features):
+    features = json.loads(json.dumps(features))
+    target = features[0]["geometry"]["coordinates"]
+    while isinstance(target[0], list):
+        target = target[0]
+    near = sorted(range(len(features)), key=lambda i: _distance(features[i]["geometry"]["coordinates"], target))[:4]
+    features[near[0]]["properties"]["value"] = 12345.0
+    added = json.loads(json.dumps(features[near[1]]))
+    added["properties"]["id"] = len(features) + 1
+    _shift(added["geometry"]["coordinates"], 0.01)
+    _shift(features[near[2]]["geometry"]["coordinates"], 0.02)
+    del features[near[3]]
+    return features + [added]
+
+
+def _distance(coordinates, target):
+    while isinstance(coordinates[0], list):
+        coordinates = coordinates[0]
+    return abs(coordinates[0] - target[0]) + abs(coordinates[1] - target[1])
+
+
+def _shift(coordinates, offset):
+    if isinstance(coordinates[0], list):
+        for child in coordinates:
+            _shift(child, offset)
+    else:
+        coordinates[0] += offset
+        coordinates[1] += offset
+
+
+def _update_and_verify(tmp_path, kind, *options):
+    dataset = synthetic.generate(kind, 4000, seed=9, bbox=BBOX, clustered_fraction=0.0)
+    path = str(tmp_path / f"{kind}.geojsonl")
+    features = list(synthetic.iter_features(dataset))
+    _write(features, path)
+    args = [*options, "-o", str(tmp_path / f"{kind}.mbtiles"), "-L", f"{kind}:{path}"]
+    assert incremental.update(args, "id", tippecanoe=TIPPECANOE).mode == "full"
+
+    _write(_edit(features), path)
+    result = incremental.update(args, "id", tippecanoe=TIPPECANOE, workdir=str(tmp_path / "work"))
+    print(incremental.describe_result(result))
+    rows = incremental.verify(args, tippecanoe=TIPPECANOE)
+    for row in rows:
+        assert row["different"] == row["only in first"] == row["only in second"] == 0, row
+    return result
+
+
+def test_polygon_update_matches_a_full_rebuild(tmp_path):
+    result = _update_and_verify(tmp_path, "polygons", "-z8")
+    assert result.mode == "incremental"
+    assert (result.added, result.removed, result.changed) == (1, 1, 2)
+
+
+@pytest.mark.parametrize("options", [("-z8",), ("-z8", "-B4"), ("-z8", "-r3", "-B5")])
+def test_point_update_matches_a_full_rebuild(tmp_path, options):
+    result = _update_and_verify(tmp_path, "points", *options)
+    base_zoom = int(options[-1][2:]) if options[-1].startswith("-B") else 8
+    if result.mode == "incremental":
+        assert result.split_zoom >= base_zoom
+
+
+def test_thinning_zoom():
+    assert incremental.thinning_zoom([["-z10"]], 10) == 10
+    assert incremental.thinning_zoom([["-B6"]], 10) == 6
+    assert incremental.thinning_zoom([["-r1"]], 10) == 0
+    assert incremental.thinning_zoom([["-Bg"]], 10) is None
+
+
+@pytest.mark.parametrize("lose_snapshot", [False, True])
+def test_full_build_over_an_existing_output(tmp_path, lose_snapshot):
+    dataset = synthetic.generate("polygons", 500, seed=4)
+    path = synthetic.write(dataset, str(tmp_path / "polygons.geojsonl"))
+    output = str(tmp_path / "polygons.mbtiles")
+    args = ["-z6", "-o", output, "-L", f"polygons:{path}"]
+    assert incremental.update(args, "id", tippecanoe=TIPPECANOE).mode == "full"
+
+    snapshot = output + incremental.SNAPSHOT_SUFFIX
+    if lose_snapshot:
+        os.remove(snapshot)
+    result = incremental.update(args, "id", tippecanoe=TIPPECANOE, full=not lose_snapshot)
+    assert result.mode == "full"
+    assert os.path.exists(snapshot)
+    assert not os.path.exists(snapshot + ".new")
+
+
+def test_failed_build_leaves_no_new_snapshot(tmp_path):
+    dataset = synthetic.generate("polygons", 200, seed=4)
+    path = synthetic.write(dataset, str(tmp_path / "polygons.geojsonl"))
+    output = str(tmp_path / "polygons.mbtiles")
+    # At most one feature per tile, with nothing allowed to drop, makes tippecanoe fail
+    failing = (*TIPPECANOE, "--maximum-tile-features", "1")
+    with pytest.raises(RuntimeError):
+        incremental.update(["-z6", "-o", output, path], "id", tippecanoe=failing)
+    assert not os.path.exists(output + incremental.SNAPSHOT_SUFFIX + ".new")
+
+
+def test_compare_tilesets_with_awkward_file_names(tmp_path):
+    path = synthetic.write(synthetic.generate("points", 100, seed=1), str(tmp_path / "points.geojsonl"))
+    outputs = [str(tmp_path / name) for name in ("a#1.mbtiles", "a?b.mbtiles")]
+    for output in outputs:
+        record = runner.run([*TIPPECANOE, "-f", "-z3", "-o", output, path])
+        assert record.returncode == 0, record.stderr_tail
+    rows = incremental.compare_tilesets(*outputs)
+    assert rows and all(row["different"] == row["only in first"] == row["only in second"] == 0 for row in rows)
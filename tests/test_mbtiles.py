@@ -0,0 +1,18 @@
+import pytest
+
+from tiling_tools import fake_tippecanoe, mbtiles, runner, synthetic
+
+
+@pytest.mark.parametrize("name", ["a#1.mbtiles", "a?b.mbtiles", "a%20b.mbtiles", "a b.mbtiles"])
+def test_awkward_file_names(tmp_path, name):
+    path = synthetic.write(synthetic.generate("points", 100, seed=1), str(tmp_path / "points.geojsonl"))
+    output = str(tmp_path / name)
+    record = runner.run([*fake_tippecanoe.TIPPECANOE, "-f", "-z3", "-o", output, path])
+    assert record.returncode == 0, record.stderr_tail
+
+    connection = mbtiles.connect(output)
+    try:
+        assert connection.execute("SELECT count(*) FROM tiles").fetchone()[0] > 0
+    finally:
+        connection.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([name, "points.geojsonl"])
@@ -0,0 +1,37 @@
+import json
+
+from tiling_tools import ndjson
+
+
+# Function to make features whose strings look like feature boundaries, so wrong range guesses show up
+def _features(count):
+    features = []
+    for i in range(count):
+        name = ['plain', '{"type": "Feature", "geometry": null}', 'brackets ] } [ {', 'quote \\" and ,'][i % 4]
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [i * 0.01, -i * 0.01]},
+                "properties": {"i": i, "name": name, "nested": {"list": [{"a": i}, [i, [i]]]}},
+            }
+        )
+        if i % 3 == 0:
+            # Features nested in a list look like top-level ones to the boundary guess
+            child = {"type": "Feature", "geometry": None, "properties": {"child": i}}
+            features[-1]["properties"]["children"] = [child] * 20
+    return features
+
+
+def test_parallel_conversion_keeps_every_feature(tmp_path):
+    features = _features(3000)
+    path = tmp_path / "collection.geojson"
+    # Indented, so features span many lines and ranges start mid-feature
+    path.write_text(json.dumps({"type": "FeatureCollection", "name": "x", "features": features}, indent=1))
+
+    stats = ndjson.convert(str(path), workers=4, min_chunk=4096)
+    assert stats.workers == 4
+    with open(stats.output_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert stats.features == len(lines) == len(features)
+    assert [json.loads(line) for line in lines] == features
+    assert not [p.name for p in tmp_path.iterdir() if ".part" in p.name]
@@ -0,0 +1,88 @@
+import gzip
+
+import pytest
+
+from tiling_tools import fake_tippecanoe, mbtiles, pmtiles, runner, synthetic, to_pmtiles
+from tiling_tools.tiles import flip_y
+
+
+def _mbtiles_tiles(path):
+    connection = mbtiles.connect(path)
+    try:
+        rows = connection.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles").fetchall()
+    finally:
+        connection.close()
+    return {(z, x, flip_y(z, row)): bytes(data) for z, x, row, data in rows}
+
+
+def _check_round_trip(source, output):
+    expected = _mbtiles_tiles(source)
+    with pmtiles.PMTilesReader(output) as reader:
+        for (z, x, y), data in expected.items():
+            assert bytes(reader.get_tile(z, x, y)) == data, (z, x, y)
+        # Neighbours of stored tiles that aren't in the tileset stay missing
+        for z, x, y in expected:
+            for nx, ny in ((x + 1, y), (x, y + 1)):
+                if nx < 1 << z and ny < 1 << z and (z, nx, ny) not in expected:
+                    assert reader.get_tile(z, nx, ny) is None
+        stats = pmtiles.archive_stats(reader)
+        assert reader.header.clustered
+        assert stats["addressed_tiles"] == reader.header.addressed_tiles_count == len(expected)
+        assert stats["tile_contents"] == reader.header.tile_contents_count == len(set(expected.values()))
+        return reader.header, stats
+
+
+@pytest.fixture(scope="module")
+def fake_tiles(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("pmtiles")
+    path = synthetic.write(synthetic.generate("polygons", 3000, seed=5), str(directory / "polygons.geojsonl"))
+    output = str(directory / "polygons.mbtiles")
+    record = runner.run([*fake_tippecanoe.TIPPECANOE, "-f", "-z7", "-o", output, path])
+    assert record.returncode == 0, record.stderr_tail
+    return output
+
+
+def test_fake_tippecanoe_round_trip(fake_tiles, tmp_path):
+    output = str(tmp_path / "polygons.pmtiles")
+    stats = to_pmtiles.convert(fake_tiles, output)
+    header, _ = _check_round_trip(fake_tiles, output)
+    assert stats.leaf_directories == 0
+    assert header.tile_compression == 2
+    with pmtiles.PMTilesReader(output) as reader:
+        z, x, y = next(iter(_mbtiles_tiles(fake_tiles)))
+        assert bytes(reader.get_tile_data(z, x, y)) == gzip.decompress(bytes(reader.get_tile(z, x, y)))
+
+
+def test_leaf_directories(fake_tiles, tmp_path, monkeypatch):
+    # A root too small for the entries forces leaves, and a tiny leaf size forces many of them
+    monkeypatch.setattr(to_pmtiles, "ROOT_LIMIT", 200)
+    monkeypatch.setattr(to_pmtiles, "LEAF_SIZE", 16)
+    output = str(tmp_path / "polygons.pmtiles")
+    stats = to_pmtiles.convert(fake_tiles, output)
+    header, archive = _check_round_trip(fake_tiles, output)
+    assert stats.leaf_directories > 1
+    assert archive["leaf_directories"] == stats.leaf_directories
+    assert header.root_length <= 200
+
+
+def test_repeated_tiles_are_stored_once(tmp_path):
+    source = str(tmp_path / "repeated.mbtiles")
+    connection = mbtiles.create(source)
+    for z in range(6):
+        for x in range(1 << z):
+            for y in range(1 << z):
+                if z == 5 and (x + y) % 7 == 0:
+                    continue  # Gaps break runs
+                # Ocean tiles repeat in long runs; land tiles are unique or repeat far apart
+                data = b"ocean" if y < (1 << z) // 2 else b"land %d %d" % (z, (x * 3 + y) % 5 if z > 3 else x + y)
+                connection.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, flip_y(z, y), data))
+    mbtiles.write_metadata(connection, {"name": "repeated", "format": "png", "minzoom": 0, "maxzoom": 5})
+    connection.commit()
+    connection.close()
+
+    output = str(tmp_path / "repeated.pmtiles")
+    stats = to_pmtiles.convert(source, output)
+    header, archive = _check_round_trip(source, output)
+    assert stats.tiles > stats.entries > stats.unique_tiles
+    assert archive["run_length_entries"] > 0
+    assert header.tile_data_length == sum(len(data) for data in set(_mbtiles_tiles(source).values()))
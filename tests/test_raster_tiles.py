@@ -0,0 +1,51 @@
+import importlib.util
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+import pytest
+
+from tiling_tools import raster_tiles
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+@pytest.fixture(scope="module")
+def raster(tmp_path_factory):
+    spec = importlib.util.spec_from_file_location("bench_raster", os.path.join(BENCHMARKS, "bench_raster.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    path = str(tmp_path_factory.mktemp("raster") / "synthetic.tif")
+    module.write_synthetic(path, 1200, 900)
+    return path
+
+
+def _tiles(path):
+    connection = sqlite3.connect(path)
+    try:
+        return dict(((z, x, y), data) for z, x, y, data in connection.execute("SELECT * FROM tiles"))
+    finally:
+        connection.close()
+
+
+def test_pool_reads_shared_pixels(raster, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "scratch"))
+    os.makedirs(tempfile.tempdir)
+    single = raster_tiles.build([raster], str(tmp_path / "single.mbtiles"), 10, 14, processes=1)
+    pool = raster_tiles.build([raster], str(tmp_path / "pool.mbtiles"), 10, 14, processes=2)
+
+    assert single.tiles == pool.tiles > 0
+    assert _tiles(str(tmp_path / "single.mbtiles")) == _tiles(str(tmp_path / "pool.mbtiles"))
+    assert os.listdir(tempfile.tempdir) == []
+
+
+def test_decode_to_file(raster, tmp_path):
+    pixel_path, dtype, shape = raster_tiles.decode_to_file(raster, str(tmp_path))
+    assert shape == (3, 900, 1200)
+    source = raster_tiles.RasterSource(raster, (pixel_path, dtype, shape))
+    window = source.read(300, 100, 310, 104)
+    assert window.shape == (3, 4, 10)
+    assert (window[0] == np.arange(300, 310) // 16).all() and (window[1] == 100 // 16).all()
+    assert (window[2] == 128).all()
+    source.close()
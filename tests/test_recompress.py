@@ -0,0 +1,62 @@
+import importlib.util
+
+import pytest
+
+from tiling_tools import analyzer, fake_tippecanoe, mbtiles, recompress, runner, synthetic
+
+CODECS = {"gzip": None, "none": None, "brotli": "brotli", "zstd": "zstandard"}
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number, payload):
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+# Function to encode a vector tile holding one layer of empty features: enough for mvt.count_features
+def _vector_tile(name, features):
+    layer = _field(1, name.encode("utf-8")) + _field(2, b"") * features
+    return _field(3, layer)
+
+
+@pytest.mark.parametrize("method", list(CODECS))
+def test_analyzer_counts_recompressed_features(tmp_path, method):
+    if CODECS[method] and importlib.util.find_spec(CODECS[method]) is None:
+        pytest.skip(f"{CODECS[method]} isn't installed")
+    source = str(tmp_path / "vector.mbtiles")
+    connection = mbtiles.create(source)
+    counts = {}
+    for x in range(4):
+        for y in range(4):
+            counts[(2, x, y)] = 10 + 7 * x + y
+            tile = _vector_tile("roads", counts[(2, x, y)])
+            connection.execute("INSERT INTO tiles VALUES (2, ?, ?, ?)", (x, (1 << 2) - 1 - y, tile))
+    mbtiles.write_metadata(connection, {"name": "vector", "format": "pbf"})
+    connection.commit()
+    connection.close()
+
+    output = str(tmp_path / f"vector.{method}.mbtiles")
+    recompress.recompress(source, output, method=method, workers=2)
+    analysis = analyzer.analyze(output, top_n=5)
+    largest = [counts[(int(z), int(x), int(y))] for _, z, x, y in analysis.largest]
+    assert len(largest) == 5
+    assert analysis.largest_features == largest
+
+
+def test_recompressed_fake_tiles_read_back(tmp_path):
+    path = synthetic.write(synthetic.generate("polygons", 1000, seed=2), str(tmp_path / "polygons.geojsonl"))
+    source = str(tmp_path / "polygons.mbtiles")
+    record = runner.run([*fake_tippecanoe.TIPPECANOE, "-f", "-z6", "-o", source, path])
+    assert record.returncode == 0, record.stderr_tail
+
+    output = str(tmp_path / "recompressed.mbtiles")
+    stats = recompress.recompress(source, output, method="gzip", level=1, workers=2)
+    assert stats.tiles == analyzer.analyze(source).tiles.sum() == analyzer.analyze(output).tiles.sum()
+    assert fake_tippecanoe.read_tiles(output) == fake_tippecanoe.read_tiles(source)
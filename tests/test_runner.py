@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from tiling_tools import fake_tippecanoe, runner, synthetic
+
+COUNT = 8000
+
+
+@pytest.fixture(scope="module")
+def polygons(tmp_path_factory):
+    dataset = synthetic.generate("polygons", COUNT, seed=2)
+    return synthetic.write(dataset, str(tmp_path_factory.mktemp("inputs") / "polygons.geojsonl"))
+
+
+def _run(tmp_path, path, output_option="-o", output_name="polygons.mbtiles"):
+    output = str(tmp_path / output_name)
+    args = [*fake_tippecanoe.TIPPECANOE, "-z9", output_option, output, "-L", f"polygons:{path}"]
+    return runner.run(args, temp_dir=str(tmp_path), sample_interval=0.05), output
+
+
+def test_run_record_from_a_fake_build(tmp_path, polygons):
+    record, output = _run(tmp_path, polygons)
+    assert record.returncode == 0
+    assert record.features_read == COUNT
+    assert record.max_zoom_reached == 9
+    assert record.output_path == output
+    assert record.output_bytes == os.path.getsize(output)
+    assert set(record.phase_seconds) == {"reading", "tiling"}
+    assert record.samples and all(len(sample) == 4 for sample in record.samples)
+    assert record.peak_rss_mb > 0 and record.cpu_seconds > 0
+    assert not record.cached and not record.temp_includes_output
+
+    saved = runner.load_records(os.path.dirname(runner.save_record(record, str(tmp_path / "runs"))))
+    assert saved[0]["features_read"] == COUNT
+    assert runner.summary_rows(saved)[0]["exit"] == 0
+
+
+def test_peak_temp_leaves_out_the_output(tmp_path, polygons):
+    # The fake writes no temp files, only the output, on the same filesystem as the temp directory
+    record, _ = _run(tmp_path, polygons)
+    assert record.output_bytes > 5e5
+    assert record.peak_temp_mb < 0.25 * record.output_bytes / (1024 * 1024)
+
+
+def test_directory_output_is_labelled_as_a_filesystem_delta(tmp_path, polygons):
+    record, _ = _run(tmp_path, polygons, "-e", "tiles")
+    assert record.temp_includes_output
+    assert "filesystem growth" in runner.describe_record(record)
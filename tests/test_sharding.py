@@ -0,0 +1,61 @@
+import json
+import subprocess
+
+from tiling_tools import fake_tippecanoe, sharding, synthetic
+
+MAX_ZOOM = 8
+SHARD_ZOOM = 4
+
+
+def _features(layers):
+    return sorted(json.dumps(properties, sort_keys=True) for features in layers.values() for properties in features)
+
+
+def _builds(tmp_path, kind):
+    dataset = synthetic.generate(kind, 3000, seed=1, clusters=5)
+    path = synthetic.write(dataset, str(tmp_path / f"{kind}.geojsonl"))
+    monolithic = str(tmp_path / "monolithic.mbtiles")
+    sharded = str(tmp_path / "sharded.mbtiles")
+    args = [f"-z{MAX_ZOOM}", "-L", f"{kind}:{path}"]
+    subprocess.run([*fake_tippecanoe.TIPPECANOE, "-o", monolithic, *args], check=True, capture_output=True)
+    sharding.run_sharded(
+        ["-o", sharded, *args],
+        shard_zoom=SHARD_ZOOM,
+        shards=4,
+        workers=1,
+        workdir=str(tmp_path / "shards"),
+        tippecanoe=fake_tippecanoe.TIPPECANOE,
+        tile_join=fake_tippecanoe.TILE_JOIN,
+    )
+    return fake_tippecanoe.read_tiles(monolithic), fake_tippecanoe.read_tiles(sharded)
+
+
+def test_sharded_polygons_match_a_monolithic_build(tmp_path):
+    monolithic, sharded = _builds(tmp_path, "polygons")
+    assert sharded.keys() == monolithic.keys()
+    for key, layers in monolithic.items():
+        assert _features(sharded[key]) == _features(layers), key
+
+
+def test_sharded_points_are_dropped_as_in_a_monolithic_build(tmp_path):
+    monolithic, sharded = _builds(tmp_path, "points")
+    # The overview is built from the whole input with the full build's base zoom, and nothing
+    # is dropped at the base zoom, so those tiles are identical
+    for z in (*range(SHARD_ZOOM), MAX_ZOOM):
+        keys = {key for key in monolithic if key[0] == z}
+        assert {key for key in sharded if key[0] == z} == keys, z
+        for key in keys:
+            assert _features(sharded[key]) == _features(monolithic[key]), key
+    # In between, each shard thins its own points, so only the rate has to match
+    for z in range(SHARD_ZOOM, MAX_ZOOM):
+        expected = sum(len(_features(layers)) for key, layers in monolithic.items() if key[0] == z)
+        count = sum(len(_features(layers)) for key, layers in sharded.items() if key[0] == z)
+        assert abs(count - expected) <= 0.1 * expected, z
+
+
+def test_overview_job_keeps_the_base_zoom(tmp_path):
+    plan = [sharding.Shard(index=0, zoom=SHARD_ZOOM, tiles=[(0, 0)], weight=1, inputs=[("a", "a.geojsonl")])]
+    jobs = sharding.shard_jobs(["-z10", "-o", "out.mbtiles", "in.geojsonl"], plan, str(tmp_path), SHARD_ZOOM)
+    assert "-B10" in jobs[0].argv
+    jobs = sharding.shard_jobs(["-z10", "-B8", "-o", "out.mbtiles", "in.geojsonl"], plan, str(tmp_path), SHARD_ZOOM)
+    assert "-B10" not in jobs[0].argv and "-B8" in jobs[0].argv
@@ -0,0 +1,54 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from tiling_tools import fake_tippecanoe, readers, synthetic
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+def _bench_options():
+    spec = importlib.util.spec_from_file_location("bench_options", os.path.join(BENCHMARKS, "bench_options.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_datasets_are_reproducible():
+    first, second = synthetic.generate("lines", 500, seed=3), synthetic.generate("lines", 500, seed=3)
+    assert np.array_equal(first.lon, second.lon) and np.array_equal(first.offsets, second.offsets)
+    assert not np.array_equal(first.lon, synthetic.generate("lines", 500, seed=4).lon)
+
+
+@pytest.mark.parametrize("extension", ["geojsonl", "csv", "fgb"])
+def test_written_datasets_read_back(tmp_path, extension):
+    dataset = synthetic.generate("points", 1000, seed=5)
+    path = synthetic.write(dataset, str(tmp_path / f"points.{extension}"))
+    features = list(readers.iter_features(path))
+    assert len(features) == 1000
+    assert features[7]["geometry"]["coordinates"] == pytest.approx([dataset.lon[7], dataset.lat[7]])
+
+
+def test_densities():
+    dataset = synthetic.generate("points", 10000, seed=0)
+    mean, peak = synthetic.densities(dataset)
+    # 10,000 points over roughly 14° by 17° of East Africa
+    assert mean == pytest.approx(10000 / 2.9e6, rel=0.1)
+    assert peak > 100 * mean
+    assert "0.0034 features/km² on average" in synthetic.describe_dataset(dataset)
+
+
+def test_option_matrix_row_from_a_fake_build(tmp_path):
+    bench_options = _bench_options()
+    dataset = synthetic.generate("points", 2000, seed=6)
+    path = synthetic.write(dataset, str(tmp_path / "points.fgb"))
+    density = synthetic.densities(dataset)[1]
+    for option_set in ("baseline", "drop-densest"):
+        row = bench_options.run_configuration(
+            path, "points", option_set, str(tmp_path), 6, fake_tippecanoe.TIPPECANOE, density
+        )
+        assert set(row) == set(bench_options.COLUMNS)
+        assert row["exit"] == 0 and row["tiles"] > 0 and row["max tile bytes"] > 0
+        assert row["densest features/km²"] > 0
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from tiling_tools import fake_tippecanoe, flatgeobuf, runner, synthetic, to_flatgeobuf
+
+
+def _write_features(path, features):
+    with open(path, "w") as f:
+        for feature in features:
+            f.write(json.dumps({"type": "Feature", **feature}) + "\n")
+    return str(path)
+
+
+def _point(i, **extra):
+    geometry = {"type": "Point", "coordinates": [i * 0.5 - 50, i * 0.25 - 20]}
+    return {"geometry": geometry, "properties": {"n": i}, **extra}
+
+
+def _features(tiles):
+    return {key: sorted(tuple(sorted(f.items())) for f in layers["points"]) for key, layers in tiles.items()}
+
+
+def _build(path, output, *options):
+    args = ["-f", "-z4", "-r1", *options, "-o", output, "-L", f"points:{path}"]
+    record = runner.run([*fake_tippecanoe.TIPPECANOE, *args])
+    assert record.returncode == 0, record.stderr_tail
+    return fake_tippecanoe.read_tiles(output)
+
+
+def test_ids_survive_conversion(tmp_path):
+    ids = [i * 3 for i in range(100)]
+    path = _write_features(tmp_path / "points.geojsonl", [_point(i, id=ids[i]) for i in range(100)])
+    stats = to_flatgeobuf.convert(path)
+
+    assert to_flatgeobuf.has_feature_ids(stats.output_path)
+    features = flatgeobuf.iter_features(stats.output_path)
+    assert sorted(feature["properties"][to_flatgeobuf.ID_COLUMN] for feature in features) == ids
+
+    # With the id column handed back as ids, the tiles match a build from the GeoJSON (-r1 keeps every point,
+    # since which ones are dropped depends on input order and the copy is Hilbert-sorted)
+    expected = _build(path, str(tmp_path / "geojson.mbtiles"))
+    converted = _build(
+        stats.output_path, str(tmp_path / "fgb.mbtiles"), "--use-attribute-for-id", to_flatgeobuf.ID_COLUMN
+    )
+    assert _features(converted) == _features(expected)
+
+
+def test_feature_id():
+    assert to_flatgeobuf.feature_id({"id": 7}) == 7
+    assert to_flatgeobuf.feature_id({"id": 7.0}) == 7
+    for value in (None, "7", -1, 1.5, True, float("nan"), 1 << 64):
+        assert to_flatgeobuf.feature_id({"id": value}) is None
+
+
+def test_features_without_ids_get_no_column(tmp_path):
+    path = _write_features(tmp_path / "points.geojsonl", [_point(i, id="a") for i in range(10)])
+    stats = to_flatgeobuf.convert(path)
+    assert not to_flatgeobuf.has_feature_ids(stats.output_path)
+
+
+def test_tippecanoe_members_are_refused(tmp_path):
+    features = [_point(i) for i in range(10)]
+    features[4]["tippecanoe"] = {"minzoom": 3}
+    path = _write_features(tmp_path / "points.geojsonl", features)
+    with pytest.raises(ValueError, match="tippecanoe"):
+        to_flatgeobuf.convert(path)
+
+
+def test_memory_budget_bounds_each_run(tmp_path):
+    path = synthetic.write(synthetic.generate("polygons", 3000, seed=8), str(tmp_path / "polygons.geojsonl"))
+    whole = to_flatgeobuf.convert(path, str(tmp_path / "whole.fgb"))
+    spilled = to_flatgeobuf.convert(path, str(tmp_path / "spilled.fgb"), memory_bytes=50000, workdir=str(tmp_path))
+
+    assert whole.runs == 0
+    assert spilled.runs > 10
+    assert list(flatgeobuf.iter_features(spilled.output_path)) == list(flatgeobuf.iter_features(whole.output_path))
@@ -0,0 +1 @@
+"""Helper library behind the B2P Map Tiling Tools pages."""
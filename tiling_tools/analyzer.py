@@ -0,0 +1,249 @@
+"""Bounded-memory MBTiles analyzer: per-zoom tile size histograms, percentiles and limits.
+
+Only the blob lengths are read while scanning (SQLite answers length() from the
+record header), so the scan costs the same for small and large tiles. Blobs are
+read just for the few largest tiles, to count their features.
+
+    python -m tiling_tools.analyzer output.mbtiles [--max-tile-bytes 500000] [--top 20]
+"""
+
+import argparse
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from tiling_tools import mbtiles, mvt, pmtiles
+from tiling_tools.tiles import flip_y
+
+BATCH_SIZE = 100000
+MAX_ZOOM = 32
+TOP_N = 20
+
+# tippecanoe's defaults for -M and -O
+MAX_TILE_BYTES = 500000
+MAX_TILE_FEATURES = 200000
+
+# Tiles at or above this fraction of a limit count as near it
+NEAR_FRACTION = 0.9
+
+# Size histogram bins: BINS_PER_OCTAVE per power of two, from 1 byte to 4 GiB
+BINS_PER_OCTAVE = 16
+SIZE_BINS = 32 * BINS_PER_OCTAVE
+
+
+@dataclass
+class TilesetAnalysis:
+    path: str
+    max_tile_bytes: int = MAX_TILE_BYTES
+    max_tile_features: int = MAX_TILE_FEATURES
+    metadata: dict = field(default_factory=dict)
+    tiles: np.ndarray = field(default_factory=lambda: np.zeros(MAX_ZOOM + 1, dtype=np.int64))
+    total_bytes: np.ndarray = field(default_factory=lambda: np.zeros(MAX_ZOOM + 1, dtype=np.int64))
+    min_bytes: np.ndarray = field(default_factory=lambda: np.full(MAX_ZOOM + 1, np.iinfo(np.int64).max))
+    max_bytes: np.ndarray = field(default_factory=lambda: np.zeros(MAX_ZOOM + 1, dtype=np.int64))
+    near_limit: np.ndarray = field(default_factory=lambda: np.zeros(MAX_ZOOM + 1, dtype=np.int64))
+    over_limit: np.ndarray = field(default_factory=lambda: np.zeros(MAX_ZOOM + 1, dtype=np.int64))
+    histogram: np.ndarray = field(default_factory=lambda: np.zeros((MAX_ZOOM + 1, SIZE_BINS), dtype=np.int64))
+    largest: np.ndarray = field(default_factory=lambda: np.empty((0, 4), dtype=np.int64))  # bytes, z, x, y
+    largest_features: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def tile_count(self):
+        return int(self.tiles.sum())
+
+    @property
+    def tiles_per_second(self):
+        return self.tile_count / self.seconds if self.seconds else 0.0
+
+    @property
+    def zooms(self):
+        return [int(z) for z in np.flatnonzero(self.tiles)]
+
+
+# Function to map tile sizes to log-spaced histogram bins
+def size_bins(sizes):
+    logs = np.log2(np.maximum(sizes, 1).astype(np.float64))
+    return np.clip((logs * BINS_PER_OCTAVE).astype(np.int64), 0, SIZE_BINS - 1)
+
+
+def _add_batch(analysis, rows, top_n):
+    batch = np.asarray(rows, dtype=np.int64)
+    zoom, sizes = batch[:, 0], batch[:, 3]
+    if zoom.max() > MAX_ZOOM:
+        raise ValueError(f"Zoom level {int(zoom.max())} is beyond {MAX_ZOOM}")
+    minlength = MAX_ZOOM + 1
+    analysis.tiles += np.bincount(zoom, minlength=minlength)
+    analysis.total_bytes += np.bincount(zoom, weights=sizes, minlength=minlength).astype(np.int64)
+    np.minimum.at(analysis.min_bytes, zoom, sizes)
+    np.maximum.at(analysis.max_bytes, zoom, sizes)
+
+    over = sizes > analysis.max_tile_bytes
+    near = (sizes >= NEAR_FRACTION * analysis.max_tile_bytes) & ~over
+    analysis.near_limit += np.bincount(zoom[near], minlength=minlength)
+    analysis.over_limit += np.bincount(zoom[over], minlength=minlength)
+
+    flat = zoom * SIZE_BINS + size_bins(sizes)
+    analysis.histogram += np.bincount(flat, minlength=minlength * SIZE_BINS).reshape(minlength, SIZE_BINS)
+
+    # Keep a running top N: the batch's own top N can't be beaten by its other tiles
+    if len(sizes) > top_n:
+        batch = batch[np.argpartition(sizes, -top_n)[-top_n:]]
+    candidates = np.concatenate([analysis.largest, batch[:, [3, 0, 1, 2]]])
+    order = np.lexsort((candidates[:, 3], candidates[:, 2], candidates[:, 1], -candidates[:, 0]))
+    analysis.largest = candidates[order[:top_n]]
+
+
+# Function to count the features of the largest tiles, the only blobs the analyzer reads
+def _count_largest_features(connection, analysis):
+    # Recompressed tilesets name their codec; tippecanoe's own gzip or zlib is recognised from the bytes
+    compression = mbtiles.tile_compression(analysis.metadata)
+    counts = []
+    for _, z, x, y in analysis.largest:
+        row = connection.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (int(z), int(x), flip_y(int(z), int(y))),
+        ).fetchone()
+        try:
+            data = row[0] if row else None
+            if data is not None and compression is not None:
+                data = pmtiles.decompress(data, compression)
+            counts.append(mvt.count_features(data) if data is not None else None)
+        except (ValueError, IndexError, OSError, ImportError):
+            counts.append(None)  # Not a vector tile (e.g. a raster tileset), or a codec that isn't installed
+    analysis.largest_features = counts
+
+
+# Function to scan an MBTiles file read-only in batches of blob lengths
+def analyze(
+    path,
+    max_tile_bytes=MAX_TILE_BYTES,
+    max_tile_features=MAX_TILE_FEATURES,
+    top_n=TOP_N,
+    batch_size=BATCH_SIZE,
+    count_features=True,
+    progress=None,
+):
+    analysis = TilesetAnalysis(path=path, max_tile_bytes=max_tile_bytes, max_tile_features=max_tile_features)
+    started = time.perf_counter()
+    connection = mbtiles.connect(path)
+    try:
+        analysis.metadata = mbtiles.read_metadata(connection)
+        cursor = connection.execute(
+            "SELECT zoom_level, tile_column, tile_row, length(tile_data) FROM tiles"
+        )
+        scanned = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            _add_batch(analysis, rows, top_n)
+            scanned += len(rows)
+            if progress is not None:
+                progress(scanned)
+
+        # Report XYZ rows like the rest of the tools, rather than MBTiles' flipped TMS rows
+        if len(analysis.largest):
+            z, y = analysis.largest[:, 1], analysis.largest[:, 3]
+            analysis.largest[:, 3] = (1 << z) - 1 - y
+        if count_features:
+            _count_largest_features(connection, analysis)
+    finally:
+        connection.close()
+    analysis.seconds = time.perf_counter() - started
+    return analysis
+
+
+# Function to estimate a size percentile at one zoom from its histogram
+def percentile(analysis, zoom, q):
+    counts = analysis.histogram[zoom]
+    total = counts.sum()
+    if not total:
+        return None
+    cumulative = np.cumsum(counts)
+    target = q / 100.0 * total
+    index = int(np.searchsorted(cumulative, target))
+    before = cumulative[index - 1] if index else 0
+    fraction = (target - before) / counts[index] if counts[index] else 0.0
+    # Interpolate in log space within the bin, then clamp to the exact extremes
+    estimate = 2.0 ** ((index + fraction) / BINS_PER_OCTAVE)
+    return float(np.clip(estimate, analysis.min_bytes[zoom], analysis.max_bytes[zoom]))
+
+
+# Function to summarise each zoom level as one row of plain values
+def zoom_summary(analysis, percentiles=(50, 90, 99)):
+    rows = []
+    for z in analysis.zooms:
+        row = {
+            "zoom": z,
+            "tiles": int(analysis.tiles[z]),
+            "total MB": round(float(analysis.total_bytes[z]) / 1e6, 3),
+            "mean bytes": round(float(analysis.total_bytes[z]) / analysis.tiles[z]),
+            "min bytes": int(analysis.min_bytes[z]),
+        }
+        for q in percentiles:
+            row[f"p{q} bytes"] = round(percentile(analysis, z, q))
+        row["max bytes"] = int(analysis.max_bytes[z])
+        row["near limit"] = int(analysis.near_limit[z])
+        row["over limit"] = int(analysis.over_limit[z])
+        rows.append(row)
+    return rows
+
+
+# Function to list the size histogram of one zoom as (bin lower bound in bytes, tiles) pairs
+def histogram_rows(analysis, zoom, bins_per_octave=2):
+    step = BINS_PER_OCTAVE // bins_per_octave
+    counts = analysis.histogram[zoom].reshape(-1, step).sum(axis=1)
+    nonzero = np.flatnonzero(counts)
+    if not len(nonzero):
+        return []
+    return [
+        {"bytes": round(2.0 ** (i / bins_per_octave)), "tiles": int(counts[i])}
+        for i in range(nonzero[0], nonzero[-1] + 1)
+    ]
+
+
+# Function to list the largest tiles with their feature counts
+def largest_tiles(analysis):
+    rows = []
+    for i, (size, z, x, y) in enumerate(analysis.largest.tolist()):
+        features = analysis.largest_features[i] if i < len(analysis.largest_features) else None
+        rows.append(
+            {
+                "tile": f"{z}/{x}/{y}",
+                "bytes": int(size),
+                "% of -M": round(100.0 * float(size) / analysis.max_tile_bytes, 1),
+                "features": features,
+                "% of -O": None if features is None else round(100.0 * features / analysis.max_tile_features, 1),
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise tile sizes in an MBTiles file")
+    parser.add_argument("path", help="MBTiles file")
+    parser.add_argument("--max-tile-bytes", type=int, default=MAX_TILE_BYTES, help="The -M limit used")
+    parser.add_argument("--max-tile-features", type=int, default=MAX_TILE_FEATURES, help="The -O limit used")
+    parser.add_argument("--top", type=int, default=TOP_N, help="Number of largest tiles to list")
+    args = parser.parse_args()
+
+    analysis = analyze(args.path, args.max_tile_bytes, args.max_tile_features, args.top)
+    rows = zoom_summary(analysis)
+    if rows:
+        columns = list(rows[0])
+        print("  ".join(f"{c:>10}" for c in columns))
+        for row in rows:
+            print("  ".join(f"{row[c]:>10}" for c in columns))
+    print()
+    for row in largest_tiles(analysis):
+        print(f"{row['tile']:>16}  {row['bytes']:>10} bytes  {row['features']} features")
+    print(
+        f"\nScanned {analysis.tile_count} tiles in {analysis.seconds:.2f}s "
+        f"({analysis.tiles_per_second:,.0f} tiles/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Splitting tippecanoe argument lists into options and input files."""
+
+import os
+
+# Short options that take a value, either attached (-z14) or as the next argument (-z 14)
+SHORT_WITH_VALUE = set("oenNAlLzZBdDmRgpaxyTjJbrSstCEKkMOcUY")
+
+# Long options that take the next argument as their value when written without "="
+LONG_WITH_VALUE = {
+    "--output",
+    "--output-to-directory",
+    "--name",
+    "--description",
+    "--attribution",
+    "--layer",
+    "--named-layer",
+    "--maximum-zoom",
+    "--minimum-zoom",
+    "--base-zoom",
+    "--full-detail",
+    "--low-detail",
+    "--minimum-detail",
+    "--exclude",
+    "--include",
+    "--attribute-type",
+    "--feature-filter",
+    "--feature-filter-file",
+    "--buffer",
+    "--drop-rate",
+    "--simplification",
+    "--projection",
+    "--temporary-directory",
+    "--accumulate-attribute",
+    "--cluster-distance",
+    "--cluster-maxzoom",
+    "--maximum-tile-bytes",
+    "--maximum-tile-features",
+    "--set-attribute",
+    "--use-attribute-for-id",
+    "--clip-bounding-box",
+}
+
+
+# Function to split a tippecanoe argv (without the program name) into option groups and inputs
+def split_args(args):
+    options = []  # Each entry is the list of tokens making up one option
+    inputs = []  # (layer or None, path)
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("--"):
+            if "=" not in arg and arg in LONG_WITH_VALUE and i + 1 < len(args):
+                group = [arg, args[i + 1]]
+                i += 2
+            else:
+                group = [arg]
+                i += 1
+        elif arg.startswith("-") and len(arg) > 1:
+            flag = arg[1]
+            if flag in SHORT_WITH_VALUE and len(arg) == 2 and i + 1 < len(args):
+                group = [arg, args[i + 1]]
+                i += 2
+            else:
+                group = [arg]
+                i += 1
+        else:
+            inputs.append((None, arg))
+            i += 1
+            continue
+
+        name, value = option_name_value(group)
+        if name in ("-L", "--named-layer") and ":" in value:
+            layer, path = value.split(":", 1)
+            inputs.append((layer, path))
+        else:
+            options.append(group)
+    return options, inputs
+
+
+# Function to return an option group's flag and value, e.g. ["-z14"] -> ("-z", "14")
+def option_name_value(group):
+    if len(group) == 2:
+        return group[0], group[1]
+    arg = group[0]
+    if arg.startswith("--"):
+        name, _, value = arg.partition("=")
+        return name, value
+    return arg[:2], arg[2:]
+
+
+# Function to find the value of the last occurrence of any of the given flags
+def option_value(options, *flags, default=None):
+    value = default
+    for group in options:
+        name, option = option_name_value(group)
+        if name in flags:
+            value = option
+    return value
+
+
+# Function to check for a value-less flag such as -f, -X or -pC
+def has_flag(options, *flags):
+    return any("".join(option_name_value(group)) in flags for group in options)
+
+
+# Function to drop every option group using one of the given flags
+def without_options(options, *flags):
+    return [group for group in options if option_name_value(group)[0] not in flags]
+
+
+# Function to flatten option groups back into a token list
+def join_options(options):
+    return [token for group in options for token in group]
+
+
+# Function to work out the layer name tippecanoe gives an input
+def layer_name(layer, path):
+    if layer:
+        return layer
+    name = os.path.basename(path)
+    # A compressed input streamed through a pipe is named after the file inside it
+    for extension in (".gz", ".gzip", ".zst", ".zstd"):
+        if name.lower().endswith(extension):
+            name = name[: -len(extension)]
+    for extension in (".geojson", ".json", ".geojsonl", ".csv", ".fgb"):
+        if name.lower().endswith(extension):
+            return name[: -len(extension)]
+    return os.path.splitext(name)[0]
+
+
+# Function to format inputs back into tippecanoe arguments
+def input_args(inputs):
+    args = []
+    for layer, path in inputs:
+        if layer:
+            args.extend(["-L", f"{layer}:{path}"])
+        else:
+            args.append(path)
+    return args
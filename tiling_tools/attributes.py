@@ -0,0 +1,405 @@
+"""Streaming attribute cost analyzer used to fill in -x/-y and -T.
+
+Features are read in batches and their properties transposed into one column
+per attribute, so the counting, type checks and hashing for a batch run over a
+column at a time. Each attribute keeps a few counters and a HyperLogLog sketch
+of its distinct values, which takes 2^PRECISION bytes however many features or
+distinct values there are, so the scan runs in bounded memory on tens of
+millions of features.
+
+Encoded bytes are an estimate of what an attribute adds to the uncompressed
+max-zoom tiles: a key and value index per feature, plus each distinct value
+once in every tile's value table. Attributes that are nearly always empty, the
+same everywhere, or long unique text are suggested for exclusion, and string
+attributes that only ever hold numbers or booleans for -T, with the predicted
+saving as a share of the estimated tile size.
+
+Usage: python -m tiling_tools.attributes input.geojson [more inputs...] [--json]
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from tiling_tools import readers
+
+BATCH_SIZE = 65536
+
+# HyperLogLog registers per attribute (2^14 bytes, about 0.8% standard error)
+PRECISION = 14
+REGISTERS = 1 << PRECISION
+
+# Assumed features per max-zoom tile when estimating how often values repeat in value tables
+TILE_FEATURES = 1000
+
+# Rough bytes per vertex and per feature of encoded geometry at the default detail
+VERTEX_BYTES = 3
+FEATURE_BYTES = 6
+
+# Suggest excluding attributes missing from this share of features or more
+SPARSE_NULL_RATE = 0.99
+# Suggest excluding strings at least this long on average when nearly every value is distinct
+LONG_TEXT_LENGTH = 48
+UNIQUE_SHARE = 0.9
+
+INT_PATTERN = re.compile(r"-?(?:0|[1-9][0-9]{0,17})")
+FLOAT_PATTERN = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+BOOL_STRINGS = frozenset(("true", "false"))
+
+TYPE_NAMES = {bool: "bool", int: "int", float: "float", str: "string"}
+
+
+@dataclass
+class AttributeStats:
+    name: str
+    present: int = 0
+    nulls: int = 0
+    types: Counter = field(default_factory=Counter)
+    int_strings: int = 0
+    float_strings: int = 0
+    bool_strings: int = 0
+    value_bytes: int = 0
+    string_length: int = 0
+    registers: np.ndarray = field(default_factory=lambda: np.zeros(REGISTERS, dtype=np.uint8))
+
+
+@dataclass
+class AttributeProfile:
+    paths: list = field(default_factory=list)
+    feature_count: int = 0
+    vertex_count: int = 0
+    attributes: dict = field(default_factory=dict)
+
+
+def _mix(hashes):
+    # splitmix64 finalizer: Python's hash() of an int is the int itself, which HyperLogLog can't use
+    with np.errstate(over="ignore"):
+        h = hashes.view(np.uint64)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return h ^ (h >> np.uint64(31))
+
+
+def _add_hashes(registers, values):
+    # hash() is salted per process for strings, so registers only merge within one process
+    h = _mix(np.fromiter(map(hash, values), dtype=np.int64, count=len(values)))
+    index = (h >> np.uint64(64 - PRECISION)).astype(np.intp)
+    low = (h & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # Rank is the position of the first set bit in the low 32 bits
+    rank = np.full(len(low), 33, dtype=np.uint8)
+    nonzero = low > 0
+    rank[nonzero] = 32 - np.floor(np.log2(low[nonzero])).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+
+
+# Function to estimate the number of distinct values from HyperLogLog registers
+def cardinality(registers):
+    m = float(len(registers))
+    alpha = 0.7213 / (1.0 + 1.079 / m)
+    estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -registers.astype(np.int64))))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is nearly exact while most registers are still empty
+        estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+
+def _varint_bytes(values):
+    magnitude = np.abs(np.asarray(values, dtype=np.float64)) * 2.0 + 1.0
+    return int(np.maximum(1, np.ceil(np.log2(magnitude) / 7.0)).sum())
+
+
+def _add_column(stats, values, features):
+    present = [value for value in values if value is not None]
+    stats.nulls += features - len(present)
+    stats.present += len(present)
+    if not present:
+        return
+    types = Counter(map(type, present))
+    stats.types.update({TYPE_NAMES.get(kind, "other"): count for kind, count in types.items()})
+
+    strings = [value for value in present if type(value) is str] if types[str] else []
+    if strings:
+        stats.string_length += sum(map(len, strings))
+        encoded = sum(map(len, map(str.encode, strings)))
+        stats.value_bytes += encoded + 2 * len(strings)
+        stats.int_strings += sum(map(bool, map(INT_PATTERN.fullmatch, strings)))
+        stats.float_strings += sum(map(bool, map(FLOAT_PATTERN.fullmatch, strings)))
+        stats.bool_strings += sum(1 for value in strings if value in BOOL_STRINGS)
+    if types[int]:
+        ints = [value for value in present if type(value) is int]
+        stats.value_bytes += _varint_bytes(ints) + len(ints)
+    stats.value_bytes += 9 * types[float] + 2 * types[bool]
+
+    others = len(present) - len(strings) - types[int] - types[float] - types[bool]
+    if others:
+        # tippecanoe stores lists and objects as their JSON text
+        texts = [
+            json.dumps(value, separators=(",", ":")) if isinstance(value, (list, dict)) else str(value)
+            for value in present
+            if type(value) not in TYPE_NAMES
+        ]
+        stats.value_bytes += sum(map(len, texts)) + 2 * len(texts)
+        present = [value for value in present if type(value) in TYPE_NAMES] + texts
+    _add_hashes(stats.registers, present)
+
+
+def _flush(profile, columns, features):
+    for name, stats in profile.attributes.items():
+        _add_column(stats, columns.get(name, []), features)
+
+
+# Function to scan one input file's properties in column batches
+def scan_attributes(path, batch_size=BATCH_SIZE):
+    profile = AttributeProfile(paths=[path])
+    # Only counts and distinct values are kept, so a column doesn't need a slot for every feature
+    columns = {}
+    features = 0
+    for feature in readers.iter_features(path):
+        for name, value in (feature.get("properties") or {}).items():
+            try:
+                columns[name].append(value)
+            except KeyError:
+                if name not in profile.attributes:
+                    # Earlier batches didn't have it
+                    profile.attributes[name] = AttributeStats(name, nulls=profile.feature_count - features)
+                columns[name] = [value]
+        for part in readers.geometry_parts(feature.get("geometry")):
+            profile.vertex_count += len(part)
+        features += 1
+        profile.feature_count += 1
+        if features >= batch_size:
+            _flush(profile, columns, features)
+            columns, features = {}, 0
+    _flush(profile, columns, features)
+    return profile
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Function to scan an input, reusing the result while its path, mtime and size are unchanged
+def profile_attributes(path):
+    key = readers.file_key(path)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    profile = scan_attributes(path)
+    with _cache_lock:
+        for stale in [k for k in _cache if k[0] == key[0]]:
+            del _cache[stale]
+        _cache[key] = profile
+    return profile
+
+
+# Function to combine per-file attribute profiles into one
+def merge_profiles(profiles):
+    merged = AttributeProfile()
+    for profile in profiles:
+        for name in merged.attributes.keys() - profile.attributes.keys():
+            merged.attributes[name].nulls += profile.feature_count
+        for name, stats in profile.attributes.items():
+            target = merged.attributes.get(name)
+            if target is None:
+                target = merged.attributes[name] = AttributeStats(name, nulls=merged.feature_count)
+            target.present += stats.present
+            target.nulls += stats.nulls
+            target.types.update(stats.types)
+            target.int_strings += stats.int_strings
+            target.float_strings += stats.float_strings
+            target.bool_strings += stats.bool_strings
+            target.value_bytes += stats.value_bytes
+            target.string_length += stats.string_length
+            np.maximum(target.registers, stats.registers, out=target.registers)
+        merged.paths.extend(profile.paths)
+        merged.feature_count += profile.feature_count
+        merged.vertex_count += profile.vertex_count
+    return merged
+
+
+# Function to name an attribute's type the way -T does, or "mixed"
+def inferred_type(stats):
+    kinds = {kind for kind, count in stats.types.items() if count}
+    if not kinds:
+        return "null"
+    if kinds == {"int", "float"}:
+        return "float"
+    if len(kinds) > 1:
+        return "mixed"
+    return kinds.pop()
+
+
+def _table_share(stats, feature_count, tile_features):
+    # Each tile's value table holds a distinct value once, however many of its features share it
+    tiles = max(1, -(-feature_count // tile_features))
+    return min(1.0, cardinality(stats.registers) * tiles / stats.present)
+
+
+# Function to estimate the bytes an attribute adds to the uncompressed max-zoom tiles
+def encoded_bytes(stats, feature_count, tile_features=TILE_FEATURES):
+    if not stats.present:
+        return 0
+    # Key and value indexes are one-byte varints until a tile has over 127 distinct values
+    index_bytes = 2 if min(cardinality(stats.registers), tile_features) < 128 else 3
+    return stats.present * index_bytes + int(stats.value_bytes * _table_share(stats, feature_count, tile_features))
+
+
+def _geometry_bytes(profile):
+    return profile.vertex_count * VERTEX_BYTES + profile.feature_count * FEATURE_BYTES
+
+
+# Function to suggest a -T type for string attributes that only hold numbers or booleans
+def coerced_type(stats):
+    strings = stats.types["string"]
+    if not strings or strings != stats.present:
+        return None
+    if stats.int_strings == strings:
+        return "int"
+    if stats.float_strings == strings:
+        return "float"
+    if stats.bool_strings == strings:
+        return "bool"
+    return None
+
+
+def _coerced_bytes(stats, kind):
+    # Numbers are a varint or a double instead of a length-prefixed string
+    if kind == "int":
+        digits = stats.string_length / stats.present
+        return stats.present * (1 + max(1, int(np.ceil((digits * np.log2(10) + 1) / 7.0))))
+    return stats.present * (9 if kind == "float" else 2)
+
+
+# Function to decide what to do with each attribute; returns {name: (action, reason)}
+def classify(profile):
+    decisions = {}
+    for name, stats in profile.attributes.items():
+        null_rate = 1.0 - stats.present / max(profile.feature_count, 1)
+        distinct = cardinality(stats.registers)
+        if null_rate >= SPARSE_NULL_RATE:
+            decisions[name] = ("exclude", f"empty in {null_rate:.1%} of features")
+        elif distinct <= 1 and not null_rate:
+            decisions[name] = ("exclude", "the same value on every feature")
+        elif (
+            stats.types["string"]
+            and stats.string_length / stats.types["string"] >= LONG_TEXT_LENGTH
+            and distinct >= UNIQUE_SHARE * stats.present
+        ):
+            decisions[name] = ("exclude", "long text, nearly every value distinct")
+        elif coerced_type(stats):
+            decisions[name] = (f"-T {coerced_type(stats)}", f"strings that are all {coerced_type(stats)}s")
+        else:
+            decisions[name] = ("keep", "")
+    return decisions
+
+
+# Function to turn a profile into include/exclude lists, -T lines and a predicted saving
+def suggest_attributes(profile, tile_features=TILE_FEATURES):
+    decisions = classify(profile)
+    total = _geometry_bytes(profile)
+    saved = 0
+    include, exclude, types = [], [], []
+    for name, stats in profile.attributes.items():
+        cost = encoded_bytes(stats, profile.feature_count, tile_features)
+        total += cost
+        action = decisions[name][0]
+        if action == "exclude":
+            exclude.append(name)
+            saved += cost
+            continue
+        include.append(name)
+        if action.startswith("-T "):
+            kind = action[3:]
+            types.append(f"{name}:{kind}")
+            share = _table_share(stats, profile.feature_count, tile_features)
+            saved += int(max(0, stats.value_bytes - _coerced_bytes(stats, kind)) * share)
+    return {
+        "include_attributes": "\n".join(include),
+        "exclude_attributes": "\n".join(exclude),
+        "attribute_types": "\n".join(types),
+        "estimated_bytes": total,
+        "saved_bytes": saved,
+        "saving": saved / total if total else 0.0,
+    }
+
+
+# Function to merge suggested -T lines into existing ones, replacing lines for the same attributes
+def merge_attribute_types(existing, suggested):
+    suggested_lines = [line for line in suggested.splitlines() if line.strip()]
+    names = {line.split(":", 1)[0] for line in suggested_lines}
+    kept = [line for line in existing.splitlines() if line.strip() and line.split(":", 1)[0].strip() not in names]
+    return "\n".join(kept + suggested_lines)
+
+
+# Function to summarise each attribute as plain values for display, costliest first
+def attribute_rows(profile, tile_features=TILE_FEATURES):
+    decisions = classify(profile)
+    total = _geometry_bytes(profile) + sum(
+        encoded_bytes(stats, profile.feature_count, tile_features) for stats in profile.attributes.values()
+    )
+    rows = []
+    for name, stats in profile.attributes.items():
+        cost = encoded_bytes(stats, profile.feature_count, tile_features)
+        action, reason = decisions[name]
+        rows.append(
+            {
+                "attribute": name,
+                "type": inferred_type(stats),
+                "cardinality": cardinality(stats.registers),
+                "null rate": round(1.0 - stats.present / max(profile.feature_count, 1), 4),
+                "encoded bytes": cost,
+                "share": round(cost / total, 4) if total else 0.0,
+                "suggestion": action,
+                "reason": reason,
+            }
+        )
+    return sorted(rows, key=lambda row: -row["encoded bytes"])
+
+
+# Function to describe the predicted saving in one line
+def describe_suggestions(suggestions):
+    excluded = len([line for line in suggestions["exclude_attributes"].splitlines() if line])
+    typed = len([line for line in suggestions["attribute_types"].splitlines() if line])
+    return (
+        f"Excluding {excluded} attribute{'s' if excluded != 1 else ''} and coercing {typed} "
+        f"saves about {suggestions['saving']:.1%} of the uncompressed max-zoom tiles "
+        f"({suggestions['saved_bytes'] / 1e6:.1f} of {suggestions['estimated_bytes'] / 1e6:.1f} MB)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate what each attribute costs in tippecanoe tiles")
+    parser.add_argument("inputs", nargs="+", help="GeoJSON, GeoJSONSeq, CSV or FlatGeobuf inputs")
+    parser.add_argument("--tile-features", type=int, default=TILE_FEATURES, help="Assumed features per max-zoom tile")
+    parser.add_argument("--json", action="store_true", help="Print the table and suggestions as JSON")
+    args = parser.parse_args()
+
+    try:
+        profile = merge_profiles([scan_attributes(path) for path in args.inputs])
+    except (OSError, ValueError) as e:
+        sys.exit(f"Couldn't scan inputs: {e}")
+    rows = attribute_rows(profile, args.tile_features)
+    suggestions = suggest_attributes(profile, args.tile_features)
+    if args.json:
+        print(json.dumps({"attributes": rows, "suggestions": suggestions}, indent=2))
+        return
+    columns = list(rows[0]) if rows else []
+    print("  ".join(column.rjust(14) for column in columns))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(14) for column in columns))
+    print(describe_suggestions(suggestions))
+    for line in suggestions["exclude_attributes"].splitlines():
+        print(f"  -x {line}")
+    for line in suggestions["attribute_types"].splitlines():
+        print(f"  -T {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""Budgeted search for the fastest tippecanoe options that keep tiles under the size limits.
+
+Judging a choice of -M, -r, -d/-D/-m and drop or coalesce strategy takes a build,
+so candidates are built from a spatially stratified sample instead of the full
+input: features are bucketed by their zoom-8 tile and every bucket keeps the same
+fraction, which preserves the relative densities that decide the largest tile.
+Each sample build gets -M and -O scaled by that fraction, so the full-size largest
+tile is predicted as the sample's divided by it.
+
+Evaluations are memoized in a JSON file keyed by the inputs' (path, mtime, size)
+and the normalized options, so repeated runs only build what's new. A candidate
+is pruned without building when a measured one with the same strategy and no
+more detail, drop rate headroom or byte limit already went over the limits, or
+already built slower than the best candidate that fits.
+
+    python -m tiling_tools.autotune config.json [--fraction 0.05] [--evaluations 12] [--fake]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass, field, replace
+
+import numpy as np
+
+from tiling_tools import analyzer, argv, command, profiler, readers, runner
+from tiling_tools.tiles import lonlat_to_world
+
+WORKDIR = "tippecanoe_autotune"
+CACHE_FILE = "evaluations.json"
+
+# Features are stratified by their tile at this zoom
+STRATUM_ZOOM = 8
+SAMPLE_FRACTION = 0.05
+EVALUATIONS = 12
+
+# Size strategies tried, as drop options
+STRATEGIES = {
+    "none": (),
+    "drop-densest": ("Drop Densest As Needed",),
+    "drop-fraction": ("Drop Fraction As Needed",),
+    "drop-smallest": ("Drop Smallest As Needed",),
+    "coalesce-densest": ("Coalesce Densest As Needed",),
+}
+# Drop options the tuner replaces: the strategies, and the flags that switch the limits off
+SIZE_OPTIONS = (
+    "Drop Densest As Needed",
+    "Drop Fraction As Needed",
+    "Drop Smallest As Needed",
+    "Coalesce Densest As Needed",
+    "Coalesce Smallest As Needed",
+    "Coalesce Fraction As Needed",
+    "No Feature Limit",
+    "No Tile Size Limit",
+)
+DETAILS = (10, 11, 12)  # -d and -D
+DROP_RATES = (4.0, 2.5, 1.5)
+HEADROOM = (0.8, 1.0)  # -M as a fraction of the byte limit, for strategies that drop to fit
+
+# Fitting candidates this much slower than the fastest are ranked by detail instead
+TIME_TOLERANCE = 0.05
+
+
+@dataclass(frozen=True)
+class Candidate:
+    strategy: str
+    detail: int
+    drop_rate: float
+    headroom: float
+
+    # Function to check whether this candidate keeps at least as much as another of the same strategy
+    def covers(self, other):
+        return (
+            self.strategy == other.strategy
+            and self.detail >= other.detail
+            and self.drop_rate <= other.drop_rate
+            and self.headroom >= other.headroom
+        )
+
+
+@dataclass
+class Evaluation:
+    candidate: Candidate
+    returncode: int = 0
+    seconds: float = 0.0  # Sample build
+    predicted_seconds: float = 0.0
+    largest_bytes: int = 0  # Predicted for the full input
+    largest_features: int = 0
+    fits: bool = False
+    cached: bool = False
+
+
+@dataclass
+class TuneResult:
+    options: command.TippecanoeOptions = None  # Fastest fitting options, or None
+    best: Evaluation = None
+    evaluations: list = field(default_factory=list)
+    pruned: int = 0
+    input_features: int = 0
+    sample_features: int = 0
+    fraction: float = 0.0
+    seconds: float = 0.0
+
+
+# Function to hash the inputs by path, mtime and size
+def input_hash(paths):
+    keys = [readers.file_key(path) for path in paths]
+    return hashlib.sha256(json.dumps(keys).encode("utf-8")).hexdigest()
+
+
+# Function to key an evaluation by the inputs, the sample and the normalized options
+def evaluation_key(inputs_hash, fraction, seed, options, program):
+    normalized = command.normalize_options(options)
+    # The inputs are covered by their hash and the output path doesn't change the tiles
+    normalized = replace(normalized, inputs=(), output_file="", output_dir="", force_overwrite=True)
+    payload = {
+        "inputs": inputs_hash,
+        "fraction": fraction,
+        "seed": seed,
+        "program": os.path.basename(program[-1]),
+        "options": asdict(normalized),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Function to write a stratified sample of an input as GeoJSONSeq; returns (features read, features kept)
+def stratified_sample(path, output_path, fraction, seed=0, zoom=STRATUM_ZOOM):
+    rng = np.random.default_rng(seed)
+    tiles = 1 << zoom
+    phases = {}
+    counts = {}
+    read = kept = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for feature in readers.iter_features(path):
+            parts = readers.geometry_parts(feature.get("geometry"))
+            if not parts:
+                continue
+            read += 1
+            lon, lat = parts[0][0][:2]
+            x, y = lonlat_to_world(lon, lat)
+            stratum = (min(int(x * tiles), tiles - 1), min(int(y * tiles), tiles - 1))
+            # Systematic sampling from a random phase keeps exactly the fraction of every stratum, give or take one
+            if stratum not in phases:
+                phases[stratum] = rng.random()
+            k = counts.get(stratum, 0)
+            counts[stratum] = k + 1
+            phase = phases[stratum]
+            if math.floor((k + 1) * fraction + phase) > math.floor(k * fraction + phase):
+                f.write(json.dumps(feature, separators=(",", ":")) + "\n")
+                kept += 1
+    return read, kept
+
+
+# Function to list the candidates, cheapest first within each strategy and the strategies interleaved
+def candidates():
+    by_strategy = []
+    for strategy in STRATEGIES:
+        # Without a strategy -M only decides when the build fails, so headroom makes no difference
+        headrooms = (1.0,) if strategy == "none" else HEADROOM
+        by_strategy.append(
+            [
+                Candidate(strategy, detail, drop_rate, headroom)
+                for detail in DETAILS
+                for drop_rate in DROP_RATES
+                for headroom in headrooms
+            ]
+        )
+    ordered = []
+    for i in range(max(len(group) for group in by_strategy)):
+        ordered.extend(group[i] for group in by_strategy if i < len(group))
+    return ordered
+
+
+# Function to apply a candidate to the user's options
+def candidate_options(options, candidate):
+    drop_options = tuple(option for option in options.drop_options if option not in SIZE_OPTIONS)
+    return replace(
+        options,
+        drop_options=drop_options + STRATEGIES[candidate.strategy],
+        auto_detail=False,
+        full_detail=candidate.detail,
+        low_detail=candidate.detail,
+        min_detail=min(options.min_detail, candidate.detail),
+        drop_rate=candidate.drop_rate,
+        max_tile_bytes=int(options.max_tile_bytes * candidate.headroom),
+    )
+
+
+# Function to check whether a measured evaluation rules a candidate out without building it
+def dominated(candidate, evaluations, best):
+    for evaluation in evaluations:
+        if not candidate.covers(evaluation.candidate):
+            continue
+        # Keeping more than a candidate that was already too big, or already slower than the best, can't win
+        if not evaluation.fits:
+            return True
+        if best is not None and evaluation.predicted_seconds > best.predicted_seconds * (1 + TIME_TOLERANCE):
+            return True
+    return False
+
+
+# Function to pick the fastest fitting evaluation, preferring more detail among near-ties
+def best_evaluation(evaluations):
+    fitting = [evaluation for evaluation in evaluations if evaluation.fits]
+    if not fitting:
+        return None
+    fastest = min(evaluation.predicted_seconds for evaluation in fitting)
+    near = [e for e in fitting if e.predicted_seconds <= fastest * (1 + TIME_TOLERANCE)]
+    return max(near, key=lambda e: (e.candidate.detail, -e.candidate.drop_rate, e.candidate.headroom))
+
+
+# Function to build the sample with one candidate's options and measure its largest tile
+def evaluate(candidate, options, sample_inputs, fraction, workdir, program):
+    output = os.path.join(workdir, "candidate.mbtiles")
+    sample_options = replace(
+        options,
+        inputs=sample_inputs,
+        output_file=output,
+        output_format="MBTiles",
+        force_overwrite=True,
+        max_tile_bytes=max(1, round(options.max_tile_bytes * fraction)),
+        max_tile_features=max(1, round(options.max_tile_features * fraction)),
+    )
+    record = runner.run(list(program) + command.build_argv(sample_options)[1:])
+    evaluation = Evaluation(
+        candidate, returncode=record.returncode, seconds=record.seconds, predicted_seconds=record.seconds / fraction
+    )
+    if record.returncode == 0 and os.path.exists(output):
+        # Feature counts are read for the largest tiles by bytes, which are nearly always the fullest too
+        analysis = analyzer.analyze(output, top_n=5)
+        counts = [count for count in analysis.largest_features if count is not None]
+        evaluation.largest_bytes = round(int(analysis.max_bytes.max()) / fraction)
+        evaluation.largest_features = round(max(counts, default=0) / fraction)
+    if os.path.exists(output):
+        os.remove(output)
+    return evaluation
+
+
+def _load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_cache(path, cache):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _evaluation_from_dict(values):
+    values = dict(values)
+    values["candidate"] = Candidate(**values["candidate"])
+    return Evaluation(**values)
+
+
+# Function to search the candidates on a sample of the inputs within a budget of builds
+def tune(
+    options,
+    fraction=SAMPLE_FRACTION,
+    evaluations=EVALUATIONS,
+    workdir=WORKDIR,
+    program=("tippecanoe",),
+    seed=0,
+    progress=None,
+):
+    started = time.perf_counter()
+    zoom_mode = options.zoom_mode
+    paths = [item.path for item in options.inputs if item.path.strip()]
+    if not paths:
+        raise ValueError("No input files to tune on")
+    if options.zoom_mode == "Auto-detect":
+        # A sample is sparser than the input, so tippecanoe would guess too low a zoom from it
+        suggested = profiler.suggest_options(profiler.merge_profiles([profiler.profile_input(p) for p in paths]))
+        options = replace(options, zoom_mode="Specify", max_zoom=suggested.get("max_zoom", options.max_zoom))
+
+    os.makedirs(workdir, exist_ok=True)
+    inputs_hash = input_hash(paths)
+    result = TuneResult()
+    sample_inputs = []
+    for index, item in enumerate(options.inputs):
+        sample_path = os.path.join(workdir, f"sample_{inputs_hash[:12]}_{index}.geojsonl")
+        read, kept = stratified_sample(item.path, sample_path, fraction, seed)
+        result.input_features += read
+        result.sample_features += kept
+        # The layer name comes from the original file, not the sample
+        sample_inputs.append(command.InputFile(sample_path, item.layer or argv.layer_name(None, item.path)))
+    if not result.sample_features:
+        raise ValueError("The sample is empty; raise the fraction")
+    # Scale by the fraction actually kept, which differs a little from the one asked for
+    result.fraction = result.sample_features / result.input_features
+
+    cache_path = os.path.join(workdir, CACHE_FILE)
+    cache = _load_cache(cache_path)
+    built = 0
+    for candidate in candidates():
+        if built >= evaluations:
+            break
+        best = best_evaluation(result.evaluations)
+        if dominated(candidate, result.evaluations, best):
+            result.pruned += 1
+            continue
+        candidate_opts = candidate_options(options, candidate)
+        key = evaluation_key(inputs_hash, fraction, seed, candidate_opts, program)
+        if key in cache:
+            evaluation = _evaluation_from_dict(cache[key])
+            evaluation.cached = True
+        else:
+            evaluation = evaluate(candidate, candidate_opts, tuple(sample_inputs), result.fraction, workdir, program)
+            evaluation.fits = (
+                evaluation.returncode == 0
+                and evaluation.largest_bytes <= options.max_tile_bytes
+                and evaluation.largest_features <= options.max_tile_features
+            )
+            cache[key] = asdict(evaluation)
+            _save_cache(cache_path, cache)
+            built += 1
+        result.evaluations.append(evaluation)
+        if progress is not None:
+            progress(evaluation, built, evaluations)
+
+    result.best = best_evaluation(result.evaluations)
+    if result.best is not None:
+        # Keep the user's own zoom mode; only the size-related options are tuned
+        result.options = replace(candidate_options(options, result.best.candidate), zoom_mode=zoom_mode)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+# Function to list evaluations as table rows
+def evaluation_rows(result):
+    rows = []
+    for evaluation in sorted(result.evaluations, key=lambda e: e.predicted_seconds):
+        candidate = evaluation.candidate
+        rows.append(
+            {
+                "strategy": candidate.strategy,
+                "detail": candidate.detail,
+                "drop rate": candidate.drop_rate,
+                "-M headroom": candidate.headroom,
+                "exit": evaluation.returncode,
+                "sample s": round(evaluation.seconds, 2),
+                "predicted s": round(evaluation.predicted_seconds, 1),
+                "largest tile bytes": evaluation.largest_bytes,
+                "largest tile features": evaluation.largest_features,
+                "fits": evaluation.fits,
+                "best": evaluation is result.best,
+                "cached": evaluation.cached,
+            }
+        )
+    return rows
+
+
+# Function to summarise a tuning run in one line
+def describe_result(result):
+    built = sum(not evaluation.cached for evaluation in result.evaluations)
+    text = (
+        f"{len(result.evaluations)} candidates evaluated ({built} built, "
+        f"{len(result.evaluations) - built} from cache, {result.pruned} skipped) on a "
+        f"{result.sample_features:,}-feature sample ({result.fraction:.1%}) in {result.seconds:.1f}s"
+    )
+    if result.best is None:
+        return text + "; none stayed under the limits"
+    candidate = result.best.candidate
+    return (
+        f"{text}; fastest fitting: {candidate.strategy}, -d{candidate.detail}, -r{candidate.drop_rate}, "
+        f"predicted largest tile {result.best.largest_bytes:,} bytes"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the fastest tippecanoe options that keep tiles under the limits")
+    parser.add_argument("config", help="JSON or YAML options file; the first options object is tuned")
+    parser.add_argument("--fraction", type=float, default=SAMPLE_FRACTION, help="Fraction of features to sample")
+    parser.add_argument("--evaluations", type=int, default=EVALUATIONS, help="Most sample builds to run")
+    parser.add_argument("--workdir", default=WORKDIR, help="Samples and the evaluation cache go here")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    program = ("tippecanoe",)
+    if args.fake or shutil.which("tippecanoe") is None:
+        from tiling_tools import fake_tippecanoe
+
+        program = tuple(fake_tippecanoe.TIPPECANOE)
+    options = command.options_from_dict(command.load_configs(args.config)[0])
+
+    def show(evaluation, built, budget):
+        candidate = evaluation.candidate
+        source = "cached" if evaluation.cached else f"{built}/{budget}"
+        print(
+            f"[{source}] {candidate.strategy} -d{candidate.detail} -r{candidate.drop_rate} "
+            f"x{candidate.headroom}: {evaluation.predicted_seconds:.1f}s, {evaluation.largest_bytes:,} bytes, "
+            f"{'fits' if evaluation.fits else 'too big'}"
+        )
+
+    result = tune(options, args.fraction, args.evaluations, args.workdir, program, args.seed, progress=show)
+    print(describe_result(result))
+    if result.options is not None:
+        print(command.commands_to_shell(command.build_commands(result.options)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+"""Build many tilesets from one manifest, concurrently within a core and memory budget.
+
+A manifest is a JSON or YAML file listing tilesets, each a set of tippecanoe
+options (the fields of tiling_tools.command.TippecanoeOptions) laid over the
+manifest's defaults:
+
+    {
+      "cores": 16,
+      "memory_gb": 48,
+      "defaults": {"zoom_mode": "Auto-detect", "drop_options": ["Drop Densest As Needed"]},
+      "tilesets": [
+        {"name": "roads", "priority": 10, "options": {"output_file": "roads.mbtiles", "inputs": ["roads.geojsonl"]}},
+        {"name": "bridges", "after": ["roads"], "threads": 4, "options": {...}}
+      ]
+    }
+
+Each tileset becomes a job running its tippecanoe command and any derived
+commands (e.g. the PMTiles conversion). A job gets TIPPECANOE_MAX_THREADS
+threads, a power of two as tippecanoe rounds down to one, sized from its input
+unless "threads" is given. Its memory is the peak RSS of its last recorded
+build, with a margin, or otherwise an allowance per input byte, unless
+"memory_mb" is given. Jobs whose "after" jobs have finished are started by
+priority (higher first, then bigger inputs first) whenever their threads and
+memory fit in what's left of the budget, so small jobs fill the gaps beside
+big ones. A job that needs more memory than the whole budget runs alone.
+Jobs after a failed job are skipped.
+
+The report compares the makespan with the sum of the job times, and --serial
+runs the jobs one at a time with every core each, for a real comparison.
+
+    python -m tiling_tools.batch tilesets.json [--cores 16] [--memory-gb 48] [--serial] [--dry-run] [--fake]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field, fields
+
+from tiling_tools import build_cache, command, runner
+
+# Input bytes per tippecanoe thread when a job doesn't say how many it wants
+THREAD_BYTES = 64 << 20
+# Memory allowance for a job with no recorded build: a base plus a multiple of its input size
+MEMORY_BASE_MB = 256
+MEMORY_PER_INPUT_BYTE = 1.0
+# Margin on the peak RSS of a recorded build
+HISTORY_MARGIN = 1.25
+# Assumed build speed for planning jobs with no recorded build
+PLANNING_BYTES_PER_SECOND = 20e6
+
+ENTRY_KEYS = ("name", "priority", "after", "threads", "memory_mb", "options")
+
+
+@dataclass
+class BatchJob:
+    name: str
+    options: command.TippecanoeOptions
+    commands: list
+    output: str
+    priority: int = 0
+    after: tuple = ()
+    threads: int = 1
+    memory_mb: float = 0.0
+    input_bytes: int = 0
+    estimated_seconds: float = None
+
+
+@dataclass
+class JobResult:
+    name: str
+    status: str  # "done", "failed" or "skipped"
+    threads: int
+    memory_mb: float
+    started: float = 0.0  # Seconds after the batch started
+    seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+    returncode: int = None
+    cached: bool = False
+    error: str = ""
+
+
+@dataclass
+class BatchReport:
+    cores: int
+    memory_mb: float
+    serial: bool
+    makespan: float
+    results: list = field(default_factory=list)
+
+    @property
+    def job_seconds(self):
+        return sum(result.seconds for result in self.results)
+
+    @property
+    def speedup(self):
+        return self.job_seconds / self.makespan if self.makespan else 0.0
+
+    @property
+    def core_utilisation(self):
+        busy = sum(result.seconds * result.threads for result in self.results)
+        return busy / (self.cores * self.makespan) if self.makespan else 0.0
+
+
+# Function to round a thread count down to a power of two within the core budget
+def power_of_two_threads(threads, cores):
+    threads = max(1, min(int(threads), cores))
+    return 1 << (threads.bit_length() - 1)
+
+
+def _input_bytes(options):
+    return sum(os.path.getsize(item.path) for item in options.inputs if os.path.isfile(item.path))
+
+
+def _job_output(options):
+    if options.output_format == "Directory":
+        return options.output_dir
+    return command.output_filename(options.output_file, options.output_format)
+
+
+# Function to find the peak memory and duration of the last successful recorded build of an output
+def recorded_build(output, records):
+    for record in records:
+        if record.get("output_path") == output and record.get("returncode") == 0 and not record.get("cached"):
+            return record
+    return None
+
+
+# Function to expand a manifest (parsed JSON/YAML) into jobs; records are saved runs to size them from
+def expand_manifest(manifest, cores, records=(), python="python"):
+    entries = manifest.get("tilesets", []) if isinstance(manifest, dict) else manifest
+    defaults = manifest.get("defaults", {}) if isinstance(manifest, dict) else {}
+    jobs = []
+    for index, entry in enumerate(entries):
+        unknown = set(entry) - set(ENTRY_KEYS)
+        if unknown:
+            raise ValueError(f"Tileset {index + 1}: unknown keys {sorted(unknown)} (options go under \"options\")")
+        options = command.options_from_dict({**defaults, **entry.get("options", {})})
+        if not options.inputs:
+            raise ValueError(f"Tileset {index + 1} has no inputs")
+        output = _job_output(options)
+        input_bytes = _input_bytes(options)
+        record = recorded_build(output, records)
+        threads = entry.get("threads") or math.ceil(input_bytes / THREAD_BYTES)
+        memory_mb = entry.get("memory_mb")
+        if memory_mb is None:
+            if record is not None and record.get("peak_rss_mb"):
+                memory_mb = record["peak_rss_mb"] * HISTORY_MARGIN
+            else:
+                memory_mb = MEMORY_BASE_MB + MEMORY_PER_INPUT_BYTE * input_bytes / (1 << 20)
+        jobs.append(
+            BatchJob(
+                name=str(entry.get("name") or os.path.splitext(os.path.basename(output))[0]),
+                options=options,
+                commands=[command.build_argv(options)] + command.derived_commands(options, python),
+                output=output,
+                priority=int(entry.get("priority", 0)),
+                after=tuple(entry.get("after", ())),
+                threads=power_of_two_threads(threads, cores),
+                memory_mb=round(float(memory_mb), 1),
+                input_bytes=input_bytes,
+                estimated_seconds=record["seconds"] if record is not None else None,
+            )
+        )
+    _check_dependencies(jobs)
+    return jobs
+
+
+def _check_dependencies(jobs):
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Tileset names must be unique: {duplicates}")
+    by_name = {job.name: job for job in jobs}
+    for job in jobs:
+        missing = [name for name in job.after if name not in by_name]
+        if missing:
+            raise ValueError(f"{job.name} runs after unknown tilesets {missing}")
+    # Depth-first search for a cycle
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError("Tilesets depend on each other in a cycle: " + " -> ".join(path + [name]))
+        state[name] = "visiting"
+        for dependency in by_name[name].after:
+            visit(dependency, path + [name])
+        state[name] = "done"
+
+    for name in by_name:
+        visit(name, [])
+
+
+# Function to load a manifest file and expand it into jobs, with the budgets it sets
+def load_manifest(path, cores=None, memory_mb=None, runs_dir=runner.RUNS_DIR, python="python"):
+    manifest = command.read_config_file(path)
+    if not isinstance(manifest, (dict, list)):
+        raise ValueError(f"{path} should hold a manifest object or a list of tilesets")
+    settings = manifest if isinstance(manifest, dict) else {}
+    cores = cores or settings.get("cores") or os.cpu_count() or 1
+    if memory_mb is None:
+        memory_mb = settings["memory_gb"] * 1024 if "memory_gb" in settings else available_memory_mb()
+    jobs = expand_manifest(manifest, cores, runner.load_records(runs_dir), python)
+    return jobs, cores, memory_mb
+
+
+# Function to find the memory the batch may use: what's available now, or the machine's total
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            fields_kb = {line.split(":")[0]: int(line.split()[1]) for line in f}
+        return fields_kb.get("MemAvailable", fields_kb["MemTotal"]) / 1024
+    except (OSError, KeyError, ValueError, IndexError):
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1 << 20)
+
+
+# Function to pick which ready jobs start now, by priority then size, while they fit in what's free
+def pick_jobs(ready, free_cores, free_memory_mb, running):
+    started = []
+    for job in sorted(ready, key=lambda job: (-job.priority, -job.input_bytes)):
+        fits_memory = job.memory_mb <= free_memory_mb or (running == 0 and not started)
+        if job.threads <= free_cores and fits_memory:
+            started.append(job)
+            free_cores -= job.threads
+            free_memory_mb -= job.memory_mb
+    return started
+
+
+def _ready(jobs, finished, launched):
+    return [
+        job
+        for job in jobs
+        if job.name not in launched and all(finished.get(name) == "done" for name in job.after)
+    ]
+
+
+def _blocked(jobs, finished, launched):
+    return [
+        job
+        for job in jobs
+        if job.name not in launched and any(finished.get(name) in ("failed", "skipped") for name in job.after)
+    ]
+
+
+# Function to predict the schedule from estimated job times; returns (makespan, serial seconds, [(name, start)])
+def simulate(jobs, cores, memory_mb):
+    durations = {
+        job.name: job.estimated_seconds
+        if job.estimated_seconds is not None
+        else job.input_bytes / PLANNING_BYTES_PER_SECOND
+        for job in jobs
+    }
+    now, running, finished, launched, starts = 0.0, [], {}, set(), []
+    while len(finished) < len(jobs):
+        free_cores = cores - sum(job.threads for _, job in running)
+        free_memory = memory_mb - sum(job.memory_mb for _, job in running)
+        for job in pick_jobs(_ready(jobs, finished, launched), free_cores, free_memory, len(running)):
+            launched.add(job.name)
+            running.append((now + durations[job.name], job))
+            starts.append((job.name, round(now, 1)))
+        if not running:
+            break
+        running.sort(key=lambda item: item[0])
+        now, job = running.pop(0)
+        finished[job.name] = "done"
+    return now, sum(durations.values()), starts
+
+
+def _run_job(job, env, program, use_cache, runs_dir, cache_dir):
+    result = JobResult(name=job.name, status="done", threads=job.threads, memory_mb=job.memory_mb)
+    started = time.perf_counter()
+    for args in job.commands:
+        if args[0] == "tippecanoe":
+            args = list(program) + args[1:]
+        try:
+            if use_cache and args[: len(program)] == list(program):
+                record = build_cache.run(args, cache_dir=cache_dir, env=env)
+            else:
+                record = runner.run(args, env=env)
+        except OSError as e:
+            result.status, result.error = "failed", f"Couldn't start {args[0]}: {e}"
+            break
+        runner.save_record(record, runs_dir)
+        result.peak_rss_mb = max(result.peak_rss_mb, record.peak_rss_mb)
+        result.returncode = record.returncode
+        result.cached = result.cached or record.cached
+        if record.returncode != 0:
+            result.status, result.error = "failed", "\n".join(record.stderr_tail[-20:])
+            break
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+# Function to run the jobs within the budgets; serial runs them one at a time with every core each
+def run_batch(
+    jobs,
+    cores,
+    memory_mb,
+    serial=False,
+    program=("tippecanoe",),
+    use_cache=False,
+    runs_dir=runner.RUNS_DIR,
+    cache_dir=build_cache.CACHE_DIR,
+    on_event=None,
+):
+    batch_started = time.perf_counter()
+    results, finished, launched = {}, {}, set()
+    running = {}
+    lock = threading.Lock()
+
+    def event(message):
+        if on_event is not None:
+            with lock:
+                on_event(message)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as pool:
+        while len(finished) < len(jobs):
+            for job in _blocked(jobs, finished, launched):
+                launched.add(job.name)
+                finished[job.name] = "skipped"
+                results[job.name] = JobResult(
+                    name=job.name, status="skipped", threads=job.threads, memory_mb=job.memory_mb,
+                    error="an earlier tileset it runs after failed",
+                )
+                event(f"skipped {job.name}: a tileset it runs after failed")
+            ready = _ready(jobs, finished, launched)
+            if serial:
+                chosen = pick_jobs(ready, cores, math.inf, 0)[:1] if not running else []
+            else:
+                free_cores = cores - sum(job.threads for job in running.values())
+                free_memory = memory_mb - sum(job.memory_mb for job in running.values())
+                chosen = pick_jobs(ready, free_cores, free_memory, len(running))
+            for job in chosen:
+                threads = cores if serial else job.threads
+                env = dict(os.environ, TIPPECANOE_MAX_THREADS=str(power_of_two_threads(threads, cores)))
+                launched.add(job.name)
+                future = pool.submit(_run_job, job, env, program, use_cache, runs_dir, cache_dir)
+                running[future] = job
+                event(f"started {job.name} ({threads} threads, {job.memory_mb:,.0f} MB)")
+            if not running:
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                result = future.result()
+                result.started = round(time.perf_counter() - batch_started - result.seconds, 3)
+                if serial:
+                    result.threads = power_of_two_threads(cores, cores)
+                results[job.name] = result
+                finished[job.name] = result.status
+                event(f"{result.status} {job.name} in {result.seconds:.1f}s")
+
+    return BatchReport(
+        cores=cores,
+        memory_mb=memory_mb,
+        serial=serial,
+        makespan=time.perf_counter() - batch_started,
+        results=[results[job.name] for job in jobs if job.name in results],
+    )
+
+
+# Function to list the jobs as rows for display
+def job_rows(jobs):
+    return [
+        {
+            "tileset": job.name,
+            "output": job.output,
+            "priority": job.priority,
+            "after": ", ".join(job.after),
+            "threads": job.threads,
+            "memory MB": job.memory_mb,
+            "input MB": round(job.input_bytes / 1e6, 1),
+            "last build s": None if job.estimated_seconds is None else round(job.estimated_seconds, 1),
+        }
+        for job in jobs
+    ]
+
+
+# Function to list the results as rows for display
+def result_rows(report):
+    return [
+        {
+            "tileset": result.name,
+            "status": result.status,
+            "started s": round(result.started, 1),
+            "seconds": round(result.seconds, 1),
+            "threads": result.threads,
+            "memory MB": result.memory_mb,
+            "peak RSS MB": round(result.peak_rss_mb, 1),
+            "cached": result.cached,
+        }
+        for result in report.results
+    ]
+
+
+# Function to describe a batch in one line
+def describe_report(report):
+    statuses = [result.status for result in report.results]
+    counts = {status: statuses.count(status) for status in ("done", "failed", "skipped")}
+    mode = "serially" if report.serial else f"on {report.cores} cores"
+    return (
+        f"{counts['done']} built, {counts['failed']} failed, {counts['skipped']} skipped {mode} in "
+        f"{report.makespan:.1f}s; the jobs took {report.job_seconds:.1f}s back to back "
+        f"({report.speedup:.2f}x, {report.core_utilisation:.0%} of the core budget in use)"
+    )
+
+
+# Function to turn options into a manifest entry, keeping only what differs from the defaults
+def options_to_dict(options):
+    defaults = command.TippecanoeOptions()
+    values = {}
+    for f in fields(options):
+        value = getattr(options, f.name)
+        if value == getattr(defaults, f.name):
+            continue
+        if f.name == "inputs":
+            value = [{"path": item.path, "layer": item.layer} if item.layer else item.path for item in value]
+        elif isinstance(value, tuple):
+            value = list(value)
+        values[f.name] = value
+    return values
+
+
+# Function to add (or replace, by name) a tileset in a JSON manifest, creating the file if needed
+def add_to_manifest(path, name, options, priority=0, after=(), threads=None, memory_mb=None):
+    manifest = {"tilesets": []}
+    if os.path.exists(path):
+        manifest = command.read_config_file(path)
+        if isinstance(manifest, list):
+            manifest = {"tilesets": manifest}
+    entry = {"name": name, "priority": priority, "after": list(after), "options": options_to_dict(options)}
+    if threads:
+        entry["threads"] = threads
+    if memory_mb:
+        entry["memory_mb"] = memory_mb
+    tilesets = [item for item in manifest.get("tilesets", []) if item.get("name") != name]
+    manifest["tilesets"] = tilesets + [entry]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _print_rows(rows):
+    if not rows:
+        return
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in rows[0]}
+    print("  ".join(column.rjust(width) for column, width in widths.items()))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(width) for column, width in widths.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the tilesets in a manifest within a core and memory budget")
+    parser.add_argument("manifest", help="JSON or YAML manifest")
+    parser.add_argument("--cores", type=int, default=None, help="Core budget (default: the manifest's, or all)")
+    parser.add_argument("--memory-gb", type=float, default=None, help="Memory budget (default: the manifest's or free)")
+    parser.add_argument("--serial", action="store_true", help="Run one job at a time with every core, to compare")
+    parser.add_argument("--dry-run", action="store_true", help="Show the jobs and the predicted schedule only")
+    parser.add_argument("--cache", action="store_true", help="Reuse outputs from the build cache")
+    parser.add_argument("--runs-dir", default=runner.RUNS_DIR, help="Where run records are read and saved")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--fake", action="store_true", help="Use the scripted fake tippecanoe")
+    args = parser.parse_args()
+
+    try:
+        jobs, cores, memory_mb = load_manifest(
+            args.manifest,
+            args.cores,
+            None if args.memory_gb is None else args.memory_gb * 1024,
+            args.runs_dir,
+            sys.executable,
+        )
+    except (OSError, ValueError) as e:
+        sys.exit(f"Couldn't read {args.manifest}: {e}")
+
+    print(f"{len(jobs)} tilesets, {cores} cores, {memory_mb:,.0f} MB")
+    _print_rows(job_rows(jobs))
+    makespan, serial_seconds, _ = simulate(jobs, cores, memory_mb)
+    print(f"Predicted: {makespan:.1f}s scheduled against {serial_seconds:.1f}s back to back")
+    if args.dry_run:
+        return
+
+    program = ["tippecanoe"]
+    if args.fake:
+        from tiling_tools import fake_tippecanoe
+
+        program = fake_tippecanoe.TIPPECANOE
+    report = run_batch(
+        jobs,
+        cores,
+        memory_mb,
+        serial=args.serial,
+        program=program,
+        use_cache=args.cache,
+        runs_dir=args.runs_dir,
+        on_event=lambda message: print(message, file=sys.stderr, flush=True),
+    )
+    _print_rows(result_rows(report))
+    print(describe_report(report))
+    for result in report.results:
+        if result.status == "failed":
+            print(f"\n{result.name} failed:\n{result.error}", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({**asdict(report), "job_seconds": report.job_seconds, "speedup": report.speedup}, f, indent=2)
+    if any(result.status != "done" for result in report.results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Content-addressed cache of tippecanoe outputs, so unchanged builds aren't rerun.
+
+A build is keyed by a content hash of each input plus the command's arguments
+with the output, force and temp-directory options taken out. Inputs are hashed
+in chunks on a thread pool, and a file whose path, mtime and size match the last
+hash isn't read again. On a hit the cached MBTiles or PMTiles file is copied to
+the output path instead of running tippecanoe, with copy_file_range so that
+filesystems with reflinks (btrfs, XFS) share the blocks copy-on-write. The copy
+is the output's own, so editing it in place (tile-join, a metadata UPDATE) can't
+reach the cached build; an object whose size no longer matches the index is
+dropped rather than served. Least recently used entries
+are evicted to keep the cache under its quota, and hit/miss counts are kept with
+the index in the cache directory.
+
+    python -m tiling_tools.build_cache [--cache-dir tippecanoe_cache] [--quota-gb 20] -- tippecanoe -o out.mbtiles in.geojson
+    python -m tiling_tools.build_cache --stats
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tiling_tools import argv as argv_tools
+from tiling_tools import readers, runner
+
+CACHE_DIR = "tippecanoe_cache"
+QUOTA_BYTES = 20 * 1024**3
+
+# Inputs are hashed in chunks of this size, one chunk per task
+CHUNK_SIZE = 16 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+# Options that don't change the tiles tippecanoe writes
+OUTPUT_OPTIONS = ("-o", "--output", "-f", "--force", "-t", "--temporary-directory", "-q", "--quiet")
+DIRECTORY_OPTIONS = ("-e", "--output-to-directory")
+
+STATS = ("hits", "misses", "stores", "evictions", "seconds_saved", "bytes_restored")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key text PRIMARY KEY, filename text, bytes integer, build_seconds real,
+    created real, last_used real, hits integer DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS hashes (path text PRIMARY KEY, mtime_ns integer, size integer, digest text);
+CREATE TABLE IF NOT EXISTS stats (name text PRIMARY KEY, value real);
+"""
+
+
+def _connect(cache_dir):
+    os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+    connection = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), timeout=30)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _count(connection, name, amount=1):
+    connection.execute(
+        "INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        (name, amount),
+    )
+
+
+def _hash_chunk(path, start, length):
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(READ_SIZE, length))
+            if not block:
+                break
+            digest.update(block)
+            length -= len(block)
+    return digest.digest()
+
+
+# Function to hash a file's content as the hash of its chunk hashes, the chunks hashed in parallel
+def content_hash(path, pool=None, chunk_size=CHUNK_SIZE):
+    size = os.path.getsize(path)
+    starts = range(0, max(size, 1), chunk_size)
+    if pool is None or len(starts) == 1:
+        digests = [_hash_chunk(path, start, chunk_size) for start in starts]
+    else:
+        digests = list(pool.map(lambda start: _hash_chunk(path, start, chunk_size), starts))
+    return hashlib.blake2b(size.to_bytes(8, "little") + b"".join(digests), digest_size=32).hexdigest()
+
+
+# Function to hash input files, skipping those whose path, mtime and size match the last hash
+def input_hashes(paths, cache_dir=CACHE_DIR, workers=None):
+    connection = _connect(cache_dir)
+    try:
+        hashes = []
+        with ThreadPoolExecutor(workers or min(8, os.cpu_count() or 1)) as pool:
+            for path in paths:
+                path, mtime_ns, size = readers.file_key(path)
+                row = connection.execute(
+                    "SELECT digest FROM hashes WHERE path = ? AND mtime_ns = ? AND size = ?", (path, mtime_ns, size)
+                ).fetchone()
+                if row is None:
+                    row = (content_hash(path, pool),)
+                    connection.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", (path, mtime_ns, size, row[0]))
+                hashes.append(row[0])
+        connection.commit()
+    finally:
+        connection.close()
+    return hashes
+
+
+def _program_length(args):
+    # Programs run through the interpreter, such as the fake tippecanoe, take two tokens
+    return 2 if os.path.basename(args[0]).startswith("python") else 1
+
+
+# Function to key a tippecanoe command by its input contents and normalized arguments; None if it can't be cached
+def build_key(args, cache_dir=CACHE_DIR):
+    program_length = _program_length(args)
+    options, inputs = argv_tools.split_args(args[program_length:])
+    output = argv_tools.option_value(options, "-o", "--output")
+    if not output or argv_tools.option_value(options, *DIRECTORY_OPTIONS) or not inputs:
+        return None
+    hashes = input_hashes([path for _, path in inputs], cache_dir)
+    payload = {
+        "program": [os.path.basename(token) for token in args[:program_length]],
+        "options": argv_tools.join_options(argv_tools.without_options(options, *OUTPUT_OPTIONS)),
+        "inputs": [[argv_tools.layer_name(layer, path), digest] for (layer, path), digest in zip(inputs, hashes)],
+        "format": os.path.splitext(output)[1].lower(),
+    }
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+# Function to copy a file, letting the filesystem clone it where it can
+def copy_file(source, target):
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(src.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+                return
+            except OSError:
+                # Not supported between these filesystems; start again with a plain copy
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst, READ_SIZE)
+
+
+# Function to place a copy of a cached output at a path; returns (bytes, build seconds) or None
+def restore(key, output_path, cache_dir=CACHE_DIR):
+    connection = _connect(cache_dir)
+    try:
+        row = connection.execute("SELECT filename, bytes, build_seconds FROM entries WHERE key = ?", (key,)).fetchone()
+        cached_path = row and os.path.join(cache_dir, "objects", row[0])
+        if row is not None and os.path.exists(cached_path) and os.path.getsize(cached_path) != row[1]:
+            # Changed since it was stored, so it can't be trusted
+            os.remove(cached_path)
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if row is None or not os.path.exists(cached_path):
+            _count(connection, "misses")
+            connection.commit()
+            return None
+        partial = output_path + ".partial"
+        copy_file(cached_path, partial)
+        os.replace(partial, output_path)
+        connection.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        _count(connection, "hits")
+        _count(connection, "seconds_saved", row[2])
+        _count(connection, "bytes_restored", row[1])
+        connection.commit()
+    finally:
+        connection.close()
+    return row[1], row[2]
+
+
+# Function to copy a finished output into the cache, then evict down to the quota
+def store(key, output_path, build_seconds, cache_dir=CACHE_DIR, quota_bytes=QUOTA_BYTES):
+    size = os.path.getsize(output_path)
+    if size > quota_bytes:
+        return False
+    filename = key + os.path.splitext(output_path)[1].lower()
+    cached_path = os.path.join(cache_dir, "objects", filename)
+    connection = _connect(cache_dir)
+    try:
+        # Copy rather than link, so the cached file doesn't change if the output is later edited
+        copy_file(output_path, cached_path + ".tmp")
+        os.chmod(cached_path + ".tmp", stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(cached_path + ".tmp", cached_path)
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (key, filename, size, build_seconds, now, now),
+        )
+        _count(connection, "stores")
+        connection.commit()
+        _evict(connection, cache_dir, quota_bytes)
+    finally:
+        connection.close()
+    return True
+
+
+def _evict(connection, cache_dir, quota_bytes):
+    total = connection.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+    for key, filename, size in connection.execute(
+        "SELECT key, filename, bytes FROM entries ORDER BY last_used"
+    ).fetchall():
+        if total <= quota_bytes:
+            break
+        path = os.path.join(cache_dir, "objects", filename)
+        if os.path.exists(path):
+            os.remove(path)
+        connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        _count(connection, "evictions")
+        total -= size
+    connection.commit()
+
+
+# Function to evict least recently used entries until the cache fits the quota
+def evict(cache_dir=CACHE_DIR, quota_bytes=QUOTA_BYTES):
+    connection = _connect(cache_dir)
+    try:
+        _evict(connection, cache_dir, quota_bytes)
+    finally:
+        connection.close()
+
+
+# Function to report the cache's size and hit/miss counts
+def cache_stats(cache_dir=CACHE_DIR):
+    connection = _connect(cache_dir)
+    try:
+        counts = dict(connection.execute("SELECT name, value FROM stats").fetchall())
+        entries, total = connection.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+    finally:
+        connection.close()
+    stats = {name: counts.get(name, 0) for name in STATS}
+    lookups = stats["hits"] + stats["misses"]
+    stats.update(entries=entries, bytes=total, hit_rate=stats["hits"] / lookups if lookups else 0.0)
+    return stats
+
+
+# Function to delete every cached output and reset the counts
+def clear(cache_dir=CACHE_DIR):
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+# Function to run a tippecanoe command through the cache, returning a run record
+def run(args, on_progress=None, cache_dir=CACHE_DIR, quota_bytes=QUOTA_BYTES, **run_options):
+    started = time.perf_counter()
+    key = build_key(args, cache_dir)
+    if key is None:
+        return runner.run(args, on_progress, **run_options)
+    options, _ = argv_tools.split_args(args[_program_length(args):])
+    output_path = argv_tools.option_value(options, "-o", "--output")
+    # Without -f tippecanoe refuses to overwrite, so let it report that itself
+    if not os.path.exists(output_path) or argv_tools.has_flag(options, "-f", "--force"):
+        restored = restore(key, output_path, cache_dir)
+        if restored is not None:
+            return runner.RunRecord(
+                argv=list(args),
+                started_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                seconds=time.perf_counter() - started,
+                returncode=0,
+                output_path=output_path,
+                output_bytes=restored[0],
+                cached=True,
+            )
+    record = runner.run(args, on_progress, **run_options)
+    if record.returncode == 0 and os.path.isfile(output_path):
+        store(key, output_path, record.seconds, cache_dir, quota_bytes)
+    return record
+
+
+# Function to summarise the cache statistics in one line
+def describe_stats(stats):
+    return (
+        f"{stats['entries']} builds cached ({stats['bytes'] / 1e6:,.1f} MB), {stats['hits']:.0f} hits and "
+        f"{stats['misses']:.0f} misses ({stats['hit_rate']:.0%}), {stats['seconds_saved']:,.0f}s of builds saved, "
+        f"{stats['evictions']:.0f} evicted"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a tippecanoe command, reusing the output of an identical earlier build",
+        usage="%(prog)s [options] -- tippecanoe <tippecanoe arguments>",
+    )
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--quota-gb", type=float, default=QUOTA_BYTES / 1024**3, help="Disk quota for cached outputs")
+    parser.add_argument("--runs-dir", default=runner.RUNS_DIR, help="Directory for the JSON run records")
+    parser.add_argument("--fake", action="store_true", help="Use the fake tippecanoe stand-in")
+    parser.add_argument("--stats", action="store_true", help="Print the cache statistics and exit")
+    parser.add_argument("--clear", action="store_true", help="Empty the cache and exit")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.clear:
+        clear(args.cache_dir)
+        return
+    if args.stats:
+        print(describe_stats(cache_stats(args.cache_dir)))
+        return
+    command = [arg for arg in args.command if arg != "--"]
+    if not command:
+        parser.error("no command given")
+    if args.fake and os.path.basename(command[0]) == "tippecanoe":
+        from tiling_tools import fake_tippecanoe
+
+        command = fake_tippecanoe.TIPPECANOE + command[1:]
+
+    quota_bytes = int(args.quota_gb * 1024**3)
+    record = run(command, cache_dir=args.cache_dir, quota_bytes=quota_bytes)
+    source = "restored from the cache" if record.cached else runner.describe_record(record)
+    print(f"{source}; saved {runner.save_record(record, args.runs_dir)}")
+    print(describe_stats(cache_stats(args.cache_dir)))
+    sys.exit(record.returncode)
+
+
+if __name__ == "__main__":
+    main()
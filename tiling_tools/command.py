@@ -0,0 +1,416 @@
+"""Typed tippecanoe options model and command builder.
+
+The generator page is a view over this module; it can also be used headless:
+
+    python -m tiling_tools.command config.json [more.yaml ...] [--format shell|json]
+
+A config file holds one options object or a list of them, using the field names
+of TippecanoeOptions. Input files are given as "inputs": [{"path": ..., "layer": ...}]
+or plain path strings.
+"""
+
+import argparse
+import functools
+import json
+import shlex
+import sys
+from dataclasses import dataclass, fields, replace
+
+OUTPUT_FORMATS = ("MBTiles", "PMTiles", "MBTiles + PMTiles", "Directory")
+ZOOM_MODES = ("Specify", "Auto-detect")
+CLUSTER_METHODS = ("None", "Fixed Distance", "Cluster Densest As Needed")
+ATTRIBUTE_MODES = ("Keep All", "Include Only", "Exclude Some", "Exclude All")
+PROJECTIONS = ("EPSG:4326 (WGS84)", "EPSG:3857 (Web Mercator)")
+TILE_RECOMPRESSIONS = ("None", "gzip", "brotli", "zstd")
+
+DROP_FLAGS = {
+    "Drop Densest As Needed": "-as",
+    "Drop Fraction As Needed": "-ad",
+    "Drop Smallest As Needed": "-an",
+    "Coalesce Densest As Needed": "-aD",
+    "Coalesce Smallest As Needed": "-aN",
+    "Coalesce Fraction As Needed": "-aS",
+    "No Line Simplification": "-ps",
+    "No Tiny Polygon Reduction": "-pt",
+    "No Feature Limit": "-pf",
+    "No Tile Size Limit": "-pk",
+}
+DROP_OPTIONS = tuple(DROP_FLAGS)
+
+OUTPUT_EXTENSIONS = {"MBTiles": ".mbtiles", "PMTiles": ".pmtiles", "MBTiles + PMTiles": ".mbtiles"}
+
+
+@dataclass(frozen=True)
+class InputFile:
+    path: str
+    layer: str = ""
+
+
+@dataclass(frozen=True)
+class TippecanoeOptions:
+    # Basic options
+    output_file: str = "output.mbtiles"
+    output_format: str = "MBTiles"
+    output_dir: str = "output_tiles"
+    force_overwrite: bool = True
+    read_parallel: bool = False
+    name: str = ""
+    description: str = ""
+    attribution: str = ""
+    inputs: tuple = ()
+
+    # Zoom & detail
+    zoom_mode: str = "Specify"
+    max_zoom: int = 14
+    min_zoom: int = 0
+    extend_zooms: bool = False
+    auto_detail: bool = True
+    full_detail: int = 12
+    low_detail: int = 12
+    min_detail: int = 7
+
+    # Feature handling
+    drop_options: tuple = ()
+    drop_rate: float = 2.5
+    cluster_options: str = "None"
+    cluster_distance: int = 10
+    cluster_maxzoom: int = 14
+    accumulate_attributes: str = ""
+    calculate_feature_density: bool = False
+    detect_shared_borders: bool = False
+    grid_low_zooms: bool = False
+
+    # Attributes
+    attribute_mode: str = "Keep All"
+    include_attributes: str = ""
+    exclude_attributes: str = ""
+    generate_ids: bool = False
+    attribute_for_id: str = ""
+    attribute_types: str = ""
+    set_attributes: str = ""
+
+    # Advanced options
+    buffer_size: int = 5
+    simplification: float = 1.0
+    projection: str = "EPSG:4326 (WGS84)"
+    no_clipping: bool = False
+    no_duplication: bool = False
+    feature_filter: str = ""
+    max_tile_bytes: int = 500000
+    max_tile_features: int = 200000
+    preserve_input_order: bool = False
+    no_tile_compression: bool = False
+    tile_recompression: str = "None"
+    recompression_level: int = 0
+
+    def __post_init__(self):
+        for name, allowed in (
+            ("output_format", OUTPUT_FORMATS),
+            ("zoom_mode", ZOOM_MODES),
+            ("cluster_options", CLUSTER_METHODS),
+            ("attribute_mode", ATTRIBUTE_MODES),
+            ("projection", PROJECTIONS),
+            ("tile_recompression", TILE_RECOMPRESSIONS),
+        ):
+            if getattr(self, name) not in allowed:
+                raise ValueError(f"{name} must be one of {allowed}, not {getattr(self, name)!r}")
+        unknown = [option for option in self.drop_options if option not in DROP_FLAGS]
+        if unknown:
+            raise ValueError(f"Unknown drop options: {unknown}")
+
+
+FIELD_NAMES = {f.name for f in fields(TippecanoeOptions)}
+
+
+# Function to build options from a plain dict, e.g. a parsed JSON/YAML config
+def options_from_dict(config):
+    unknown = set(config) - FIELD_NAMES
+    if unknown:
+        raise ValueError(f"Unknown options: {sorted(unknown)}")
+    values = dict(config)
+    inputs = []
+    for item in values.get("inputs", ()):
+        if isinstance(item, InputFile):
+            inputs.append(item)
+        elif isinstance(item, str):
+            inputs.append(InputFile(path=item))
+        else:
+            inputs.append(InputFile(path=item.get("path", ""), layer=item.get("layer", "") or ""))
+    values["inputs"] = tuple(inputs)
+    values["drop_options"] = tuple(values.get("drop_options", ()))
+    return TippecanoeOptions(**values)
+
+
+# Function to give the output file the extension of the chosen format
+def output_filename(name, output_format):
+    if name.endswith(".mbtiles") or name.endswith(".pmtiles"):
+        name = name.rsplit(".", 1)[0]  # Remove existing extension
+    return name + OUTPUT_EXTENSIONS.get(output_format, "")
+
+
+def _lines(text):
+    return [line.strip() for line in text.strip().split("\n") if line.strip()]
+
+
+# Function to turn options into a tippecanoe argument list
+def build_argv(options, program="tippecanoe"):
+    cmd = [program]
+
+    # Output settings
+    if options.output_format == "Directory":
+        cmd += ["-e", options.output_dir]
+    else:
+        cmd += ["-o", output_filename(options.output_file, options.output_format)]
+
+    if options.force_overwrite:
+        cmd.append("-f")
+
+    if options.read_parallel:
+        cmd.append("-P")
+
+    if options.name:
+        cmd += ["-n", options.name]
+
+    if options.description:
+        cmd += ["-N", options.description]
+
+    if options.attribution:
+        cmd += ["-A", options.attribution]
+
+    # Zoom levels
+    if options.zoom_mode == "Auto-detect":
+        cmd.append("-zg")
+    else:
+        cmd.append(f"-z{options.max_zoom}")
+
+    if options.min_zoom > 0:
+        cmd.append(f"-Z{options.min_zoom}")
+
+    if options.extend_zooms:
+        cmd.append("-ae")
+
+    # Tile detail
+    if not options.auto_detail:
+        if options.full_detail != 12:
+            cmd.append(f"-d{options.full_detail}")
+
+        if options.low_detail != 12:
+            cmd.append(f"-D{options.low_detail}")
+
+        if options.min_detail != 7:
+            cmd.append(f"-m{options.min_detail}")
+
+    # Feature handling, in the order the options are listed
+    for option in DROP_OPTIONS:
+        if option in options.drop_options:
+            cmd.append(DROP_FLAGS[option])
+
+    if options.drop_rate != 2.5:
+        cmd.append(f"-r{options.drop_rate}")
+
+    # Clustering
+    if options.cluster_options == "Fixed Distance":
+        cmd.append(f"-K{options.cluster_distance}")
+        cmd.append(f"-k{options.cluster_maxzoom}")
+    elif options.cluster_options == "Cluster Densest As Needed":
+        cmd.append("-aC")
+
+    if options.cluster_options != "None":
+        for attr in options.accumulate_attributes.split(","):
+            attr = attr.strip()
+            if attr:
+                cmd.append(f"-E{attr}")
+
+    if options.calculate_feature_density:
+        cmd.append("-ag")
+
+    if options.detect_shared_borders:
+        cmd.append("-ab")
+
+    if options.grid_low_zooms:
+        cmd.append("-aL")
+
+    # Attributes
+    if options.attribute_mode == "Exclude All":
+        cmd.append("-X")
+    elif options.attribute_mode == "Include Only":
+        for attr in _lines(options.include_attributes):
+            cmd += ["-y", attr]
+    elif options.attribute_mode == "Exclude Some":
+        for attr in _lines(options.exclude_attributes):
+            cmd += ["-x", attr]
+
+    if options.generate_ids:
+        cmd.append("-ai")
+
+    if options.attribute_for_id:
+        cmd += ["--use-attribute-for-id", options.attribute_for_id]
+
+    for line in _lines(options.attribute_types):
+        cmd += ["-T", line]
+
+    for line in _lines(options.set_attributes):
+        cmd += ["--set-attribute", line]
+
+    # Advanced options
+    if options.buffer_size != 5:
+        cmd += ["-b", str(options.buffer_size)]
+
+    if options.simplification != 1.0:
+        cmd += ["-S", str(options.simplification)]
+
+    if options.projection == "EPSG:3857 (Web Mercator)":
+        cmd += ["-s", "EPSG:3857"]
+
+    if options.no_clipping:
+        cmd.append("-pc")
+
+    if options.no_duplication:
+        cmd.append("-pD")
+
+    if options.feature_filter:
+        cmd += ["-j", options.feature_filter]
+
+    if options.max_tile_bytes != 500000:
+        cmd += ["-M", str(options.max_tile_bytes)]
+
+    if options.max_tile_features != 200000:
+        cmd += ["-O", str(options.max_tile_features)]
+
+    if options.preserve_input_order:
+        cmd.append("-pi")
+
+    if options.no_tile_compression:
+        cmd.append("-pC")
+
+    # Input files
+    for file_input in options.inputs:
+        path = file_input.path.strip()
+        layer = file_input.layer.strip()
+        if path:
+            if layer:
+                cmd += ["-L", f"{layer}:{path}"]
+            else:
+                cmd.append(path)
+
+    return cmd
+
+
+# Function to list the commands that run after tippecanoe: recompressing the MBTiles output's tiles,
+# then deriving PMTiles from it
+def derived_commands(options, python="python"):
+    if options.output_format not in ("MBTiles", "MBTiles + PMTiles"):
+        return []
+    commands = []
+    mbtiles_path = output_filename(options.output_file, "MBTiles")
+    if options.tile_recompression != "None":
+        recompress = [python, "-m", "tiling_tools.recompress", mbtiles_path, "--method", options.tile_recompression]
+        if options.recompression_level:
+            recompress += ["--level", str(options.recompression_level)]
+        commands.append(recompress)
+    if options.output_format == "MBTiles + PMTiles":
+        pmtiles_path = output_filename(options.output_file, "PMTiles")
+        commands.append([python, "-m", "tiling_tools.to_pmtiles", mbtiles_path, pmtiles_path])
+    return commands
+
+
+# Function to build tippecanoe's argv followed by any derived commands
+def build_commands(options, program="tippecanoe"):
+    return [build_argv(options, program)] + derived_commands(options)
+
+
+# Function to reset options that can't affect the command, so equivalent options compare equal
+def normalize_options(options):
+    defaults = TippecanoeOptions()
+    changes = {}
+    if options.output_format == "Directory":
+        changes["output_file"] = defaults.output_file
+    else:
+        changes["output_dir"] = defaults.output_dir
+        changes["output_file"] = output_filename(options.output_file, options.output_format)
+    if options.zoom_mode == "Auto-detect":
+        changes["max_zoom"] = defaults.max_zoom
+    if options.auto_detail:
+        changes.update(full_detail=12, low_detail=12, min_detail=7)
+    if options.cluster_options == "None":
+        changes.update(accumulate_attributes="", cluster_distance=10, cluster_maxzoom=14)
+    elif options.cluster_options != "Fixed Distance":
+        changes.update(cluster_distance=10, cluster_maxzoom=14)
+    if options.tile_recompression == "None" or options.output_format not in ("MBTiles", "MBTiles + PMTiles"):
+        changes.update(tile_recompression="None", recompression_level=0)
+    if options.attribute_mode != "Include Only":
+        changes["include_attributes"] = ""
+    if options.attribute_mode != "Exclude Some":
+        changes["exclude_attributes"] = ""
+    changes["drop_options"] = tuple(option for option in DROP_OPTIONS if option in options.drop_options)
+    changes["inputs"] = tuple(
+        InputFile(path=item.path.strip(), layer=item.layer.strip()) for item in options.inputs if item.path.strip()
+    )
+    return replace(options, **changes)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_argv(options, program):
+    return tuple(build_argv(options, program))
+
+
+# Function to build the argv through a cache keyed on the normalized options
+def cached_argv(options, program="tippecanoe"):
+    return list(_cached_argv(normalize_options(options), program))
+
+
+# Function to report hit/miss counts of the argv cache
+def argv_cache_info():
+    return _cached_argv.cache_info()
+
+
+# Function to render an argument list as a copy-pasteable shell command
+def to_shell(argv):
+    return shlex.join(argv)
+
+
+# Function to chain several argument lists into one shell command line
+def commands_to_shell(commands):
+    return " && ".join(to_shell(argv) for argv in commands)
+
+
+# Function to read a JSON or YAML file as plain data
+def read_config_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("Reading YAML configs needs PyYAML (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+# Function to read a config file holding one options object or a list of them
+def load_configs(path):
+    data = read_config_file(path)
+    return data if isinstance(data, list) else [data]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate tippecanoe commands from JSON/YAML configs")
+    parser.add_argument("configs", nargs="+", help="JSON or YAML files with tippecanoe options")
+    parser.add_argument(
+        "--format",
+        choices=["shell", "json"],
+        default="shell",
+        help="Print shell commands (one per line, chained with &&) or JSON argv lists (one per line)",
+    )
+    args = parser.parse_args()
+    out = sys.stdout
+    for path in args.configs:
+        for config in load_configs(path):
+            commands = build_commands(options_from_dict(config))
+            if args.format == "shell":
+                out.write(commands_to_shell(commands) + "\n")
+            else:
+                out.writelines(json.dumps(argv) + "\n" for argv in commands)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""Streaming gzip and zstd compressed inputs into tippecanoe through named pipes.
+
+tippecanoe only reads plain files, so a compressed input would otherwise have
+to be decompressed to disk first, which doubles the I/O and needs scratch
+space as big as the data. Instead each compressed input gets a named pipe
+(FIFO) with the decompressed file's name, the `-L layer:path` argument is
+rewritten to read the pipe (with the layer name the original file would have
+had), and a writer thread decompresses into the pipe while tippecanoe reads it.
+
+Files made of independent blocks are decompressed by a pool of threads, since
+zlib and zstd release the GIL. Block gzip (BGZF, as written by bgzip) records
+each block's size in its header, and a zstd file written with several frames
+(zstd -T, pzstd) can be split by walking the frame and block headers, so the
+blocks are found without decompressing anything; blocks are read in order and
+decompressed a few at a time ahead of the pipe. Other gzip files go through
+pigz when it's installed, which reads, inflates and writes on separate
+threads, or zlib in the writer thread. zstd needs the zstandard package or the
+zstd command.
+
+A pipe can only be read once and from the start, so FlatGeobuf, which
+tippecanoe memory-maps, has to be decompressed first.
+
+Usage: python -m tiling_tools.compressed [--workers 8] -- tippecanoe -o out.mbtiles -L roads:roads.geojson.gz
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from tiling_tools import argv as argv_tools
+
+EXTENSIONS = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+WORKERS = min(8, os.cpu_count() or 1)
+
+# Blocks are grouped into tasks of about this many compressed bytes, and each worker keeps two tasks in flight
+TASK_BYTES = 1 << 20
+TASKS_PER_WORKER = 2
+READ_SIZE = 1 << 20
+
+GZIP_MAGIC = b"\x1f\x8b\x08"
+BGZF_BLOCK_BYTES = 65280  # Input per block, as bgzip uses, so a block always fits its 16-bit size
+ZSTD_MAGIC = 0xFD2FB528
+ZSTD_SKIPPABLE = 0x184D2A50  # Low four bits are free
+
+
+@dataclass
+class PipeStats:
+    path: str
+    pipe: str
+    method: str = ""
+    bytes_in: int = 0
+    bytes_out: int = 0
+    seconds: float = 0.0
+    error: str = None
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_out / self.seconds if self.seconds else 0.0
+
+
+# Function to find the compression an input's extension names, or None
+def compression(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+# Function to check if an input is gzip or zstd compressed
+def is_compressed(path):
+    return compression(path) is not None
+
+
+# Function to give the name of the decompressed file, e.g. roads.geojson.gz -> roads.geojson
+def inner_path(path):
+    return os.path.splitext(path)[0] if is_compressed(path) else path
+
+
+def _bgzf_blocks(f):
+    # Each BGZF member carries a BC extra subfield holding its total size minus one
+    offset = 0
+    while True:
+        f.seek(offset)
+        header = f.read(18)
+        if not header:
+            return
+        if len(header) < 18 or header[:3] != GZIP_MAGIC or not header[3] & 4 or header[12:14] != b"BC":
+            raise ValueError("not block gzip")
+        size = struct.unpack_from("<H", header, 16)[0] + 1
+        yield offset, size
+        offset += size
+
+
+def _zstd_frames(f):
+    offset = 0
+    while True:
+        f.seek(offset)
+        head = f.read(4)
+        if not head:
+            return
+        if len(head) < 4:
+            raise ValueError("truncated zstd frame")
+        magic = struct.unpack("<I", head)[0]
+        if magic & 0xFFFFFFF0 == ZSTD_SKIPPABLE:
+            offset += 8 + struct.unpack("<I", f.read(4))[0]
+            continue
+        if magic != ZSTD_MAGIC:
+            raise ValueError("not a zstd frame")
+        descriptor = f.read(1)[0]
+        single_segment = descriptor & 0x20
+        size_flag = descriptor >> 6
+        header = 1 + (0 if single_segment else 1) + (0, 1, 2, 4)[descriptor & 3]
+        header += (1 if single_segment else 0, 2, 4, 8)[size_flag]
+        position = offset + 4 + header
+        while True:
+            f.seek(position)
+            block = int.from_bytes(f.read(3), "little")
+            # An RLE block stores one byte however many it expands to
+            position += 3 + (1 if (block >> 1) & 3 == 1 else block >> 3)
+            if block & 1:
+                break
+        position += 4 if descriptor & 4 else 0
+        yield offset, position - offset
+        offset = position
+
+
+# Function to split a compressed file into independently decompressible blocks; None if it's one stream
+def block_spans(path):
+    with open(path, "rb") as f:
+        try:
+            spans = list(_bgzf_blocks(f) if compression(path) == "gzip" else _zstd_frames(f))
+        except (ValueError, IndexError, struct.error):
+            return None
+    return spans if len(spans) > 1 else None
+
+
+# Function to gzip a file as independent blocks (BGZF, readable by any gzip tool) so it can be decompressed in parallel
+def write_block_gzip(path, output_path=None, level=6):
+    output_path = output_path or path + ".gz"
+    with open(path, "rb") as f, open(output_path + ".partial", "wb") as out:
+        while True:
+            data = f.read(BGZF_BLOCK_BYTES)
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            body = compressor.compress(data) + compressor.flush()
+            header = GZIP_MAGIC + b"\x04" + bytes(5) + b"\xff" + struct.pack("<H2sHH", 6, b"BC", 2, len(body) + 25)
+            out.write(header + body + struct.pack("<II", zlib.crc32(data), len(data)))
+            # BGZF ends with an empty block
+            if not data:
+                break
+    os.replace(output_path + ".partial", output_path)
+    return output_path
+
+
+def _inflate_blocks(data, offsets):
+    # A BGZF block is an 18 byte header, raw deflate data, then the CRC-32 and length of what it inflates to
+    chunks = []
+    for start, end in offsets:
+        chunk = zlib.decompress(data[start + 18 : end - 8], -15)
+        if struct.unpack_from("<I", data, end - 8)[0] != zlib.crc32(chunk):
+            raise ValueError("block gzip CRC mismatch")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _zstd_module():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _unzstd(data, offsets):
+    decompressor = _zstd_module().ZstdDecompressor()
+    return b"".join(decompressor.decompressobj().decompress(data[start:end]) for start, end in offsets)
+
+
+def _tasks(spans):
+    task = []
+    for start, length in spans:
+        task.append((start, length))
+        if task[-1][0] + task[-1][1] - task[0][0] >= TASK_BYTES:
+            yield task
+            task = []
+    if task:
+        yield task
+
+
+def _parallel_chunks(path, spans, workers):
+    gzipped = compression(path) == "gzip"
+    pending = deque()
+    with open(path, "rb") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        for task in _tasks(spans):
+            start = task[0][0]
+            f.seek(start)
+            data = f.read(task[-1][0] + task[-1][1] - start)
+            offsets = [(s - start, s - start + length) for s, length in task]
+            pending.append(pool.submit(_inflate_blocks if gzipped else _unzstd, data, offsets))
+            if len(pending) >= workers * TASKS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _command_chunks(argv):
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finished = False
+    try:
+        while True:
+            chunk = process.stdout.read(READ_SIZE)
+            if not chunk:
+                finished = True
+                break
+            yield chunk
+    finally:
+        # Kill a reader stopped early before closing the pipe, or the command may die of SIGPIPE first
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        error = process.stderr.read().decode("utf-8", "replace").strip()
+        process.stderr.close()
+        returncode = process.wait()
+        if returncode != 0 and (finished or returncode not in (-signal.SIGKILL, -signal.SIGPIPE)):
+            raise ValueError(f"{argv[0]} failed: {error}")
+
+
+def _stream_chunks(path):
+    with open(path, "rb") as f:
+        if compression(path) == "gzip":
+            inflater = zlib.decompressobj(31)
+            member = False
+            while True:
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                while data:
+                    member = True
+                    yield inflater.decompress(data)
+                    if not inflater.eof:
+                        break
+                    # Concatenated members: start again on whatever follows the end of one
+                    data = inflater.unused_data
+                    inflater = zlib.decompressobj(31)
+                    member = False
+            if member:
+                raise ValueError(f"{path} is truncated")
+        else:
+            reader = _zstd_module().ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            while True:
+                chunk = reader.read(READ_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+
+# Function to choose how an input will be decompressed: "parallel", "pigz", "zstd command" or "stream"
+def decompression_method(path):
+    if block_spans(path) is not None and (compression(path) == "gzip" or _zstd_module() is not None):
+        return "parallel"
+    if compression(path) == "gzip":
+        return "pigz" if shutil.which("pigz") else "stream"
+    if _zstd_module() is not None:
+        return "stream"
+    if shutil.which("zstd"):
+        return "zstd command"
+    raise ImportError(f"Reading {path} needs the zstandard package (pip install zstandard) or the zstd command")
+
+
+# Function to stream an input's decompressed bytes in order
+def iter_chunks(path, workers=WORKERS, how=None):
+    how = how or decompression_method(path)
+    if how == "parallel":
+        return _parallel_chunks(path, block_spans(path), workers)
+    if how == "pigz":
+        return _command_chunks(["pigz", "-dc", path])
+    if how == "zstd command":
+        return _command_chunks(["zstd", "-dcq", path])
+    return _stream_chunks(path)
+
+
+class _ChunkStream(io.RawIOBase):
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            self._buffer = next(self._chunks, b"")
+            if not self._buffer:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+        super().close()
+
+
+# Function to open an input for reading as text, decompressing it on the fly if it's compressed
+def open_text(path, newline=None):
+    if not is_compressed(path):
+        return open(path, "r", encoding="utf-8", newline=newline)
+    stream = io.BufferedReader(_ChunkStream(iter_chunks(path)), READ_SIZE)
+    return io.TextIOWrapper(stream, encoding="utf-8", newline=newline)
+
+
+def _pipe_name(path):
+    name = os.path.basename(inner_path(path))
+    if not name.lower().endswith((".geojson", ".json")):
+        return name
+    # tippecanoe reads either way, but a pipe can't be sniffed twice, so one Feature per line gets its own extension
+    with open_text(path) as f:
+        first = f.readline(READ_SIZE).strip().lstrip("\x1e")
+    try:
+        line_delimited = json.loads(first).get("type") == "Feature"
+    except (ValueError, AttributeError):
+        line_delimited = False
+    return os.path.splitext(name)[0] + ".geojsonl" if line_delimited else name
+
+
+def _write_pipe(stats, workers):
+    started = time.perf_counter()
+    try:
+        # Opening blocks until tippecanoe opens the other end
+        with open(stats.pipe, "wb") as out:
+            for chunk in iter_chunks(stats.path, workers, stats.method):
+                out.write(chunk)
+                stats.bytes_out += len(chunk)
+    except BrokenPipeError:
+        stats.error = "tippecanoe stopped reading"
+    except (OSError, ValueError, ImportError, zlib.error) as e:
+        stats.error = str(e)
+    stats.seconds = time.perf_counter() - started
+
+
+def _program_length(args):
+    # The fake tippecanoe runs as a script; other Python commands (python -m ...) aren't tippecanoe
+    if os.path.basename(args[0]).startswith("python"):
+        return 2 if len(args) > 1 and args[1].endswith(".py") else None
+    return 1
+
+
+class Pipes:
+    """Named pipes standing in for the compressed inputs of a tippecanoe argv, for use as a context manager."""
+
+    def __init__(self, args, workers=WORKERS, workdir=None):
+        self.original = list(args)
+        self.args = list(args)
+        self.workers = workers
+        self.workdir = workdir
+        self.stats = []
+        self._directory = None
+        self._threads = []
+
+    def __enter__(self):
+        program_length = _program_length(self.original)
+        if program_length is None:
+            return self
+        options, inputs = argv_tools.split_args(self.original[program_length:])
+        rewritten = []
+        for layer, path in inputs:
+            if not is_compressed(path):
+                rewritten.append((layer, path))
+                continue
+            if inner_path(path).lower().endswith(".fgb"):
+                raise ValueError(f"FlatGeobuf can't be read through a pipe; decompress {path} first")
+            if not os.path.isfile(path):
+                raise ValueError(f"No such input: {path}")
+            how = decompression_method(path)
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix="tippecanoe-pipes-", dir=self.workdir)
+            # tippecanoe picks the reader from the extension, so the pipe has the decompressed file's name
+            pipe = os.path.join(self._directory, str(len(self.stats)), _pipe_name(path))
+            os.makedirs(os.path.dirname(pipe))
+            os.mkfifo(pipe)
+            self.stats.append(PipeStats(path=path, pipe=pipe, method=how, bytes_in=os.path.getsize(path)))
+            rewritten.append((argv_tools.layer_name(layer, path), pipe))
+        if self.stats:
+            program = self.original[:program_length]
+            self.args = [*program, *argv_tools.join_options(options), *argv_tools.input_args(rewritten)]
+        for stats in self.stats:
+            thread = threading.Thread(target=_write_pipe, args=(stats, self.workers), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc_info):
+        for stats, thread in zip(self.stats, self._threads):
+            if thread.is_alive():
+                # Open the reading end ourselves so a writer still waiting for a reader gets one and stops
+                try:
+                    reader = os.open(stats.pipe, os.O_RDONLY | os.O_NONBLOCK)
+                    os.close(reader)
+                except OSError:
+                    pass
+            thread.join()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        return False
+
+
+# Function to check if a tippecanoe argv has any compressed inputs
+def has_compressed_inputs(args):
+    program_length = _program_length(args)
+    if program_length is None:
+        return False
+    return any(is_compressed(path) for _, path in argv_tools.split_args(list(args)[program_length:])[1])
+
+
+# Function to describe one pipe's decompression in one line
+def describe_stats(stats):
+    line = (
+        f"{stats.path}: {stats.bytes_in / 1e6:,.1f} MB -> {stats.bytes_out / 1e6:,.1f} MB "
+        f"in {stats.seconds:.2f}s ({stats.bytes_per_second / 1e6:,.1f} MB/s, {stats.method})"
+    )
+    return line + (f"; {stats.error}" if stats.error else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run tippecanoe with compressed inputs streamed through pipes")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Decompression threads per input")
+    parser.add_argument("--workdir", default=None, help="Directory for the pipes")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="tippecanoe command, after --")
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("no command given")
+
+    try:
+        with Pipes(command, args.workers, args.workdir) as pipes:
+            returncode = subprocess.run(pipes.args).returncode
+    except (OSError, ValueError, ImportError) as e:
+        sys.exit(f"Couldn't stream the compressed inputs: {e}")
+    for stats in pipes.stats:
+        print(describe_stats(stats), file=sys.stderr)
+    sys.exit(returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Stand-in for the tippecanoe and tile-join binaries, for exercising pipelines offline.
+
+Run as ``python tiling_tools/fake_tippecanoe.py [tile-join] <args>``. It accepts the
+same arguments as the real tools, reads the inputs with our own readers and writes
+an MBTiles file (or a tile directory with -e) whose tiles are gzipped JSON listing
+the features whose buffered bounding box touches each tile. It prints progress to
+stderr in tippecanoe's format. Like tippecanoe, points below the max zoom are
+thinned by the -r drop rate below the -B base zoom, and a tile over the -M or -O limit fails the build
+unless a drop or coalesce strategy (-as, -ad, -an, -aD, -aN, -aS) is given, in
+which case features are dropped until it fits. Set FAKE_TIPPECANOE_DELAY to a number of seconds
+to sleep per tile when timing-sensitive code needs a slower build.
+"""
+
+import gzip
+import json
+import os
+import sys
+import time
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling_tools import argv, mbtiles, pmtiles, readers  # noqa: E402
+from tiling_tools.tiles import flip_y, geometry_world_bbox, tile_range, world_to_lonlat  # noqa: E402
+
+# Invocations for pipelines that take the program as an argv prefix
+TIPPECANOE = [sys.executable, os.path.abspath(__file__)]
+TILE_JOIN = [sys.executable, os.path.abspath(__file__), "tile-join"]
+
+# Flags that let tippecanoe drop features from tiles over the limits instead of failing
+DROP_AS_NEEDED = ("-as", "-ad", "-an", "-aD", "-aN", "-aS")
+
+
+def _encode(layers, compress):
+    data = json.dumps(layers, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return gzip.compress(data, mtime=0) if compress else data
+
+
+def _decode(data, compression=None):
+    if compression is not None:
+        data = pmtiles.decompress(data, compression)
+    elif data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+# Function to read back the tiles the fake wrote to an MBTiles file, as {(z, x, y): {layer: [properties]}}
+def read_tiles(path):
+    connection = mbtiles.connect(path)
+    try:
+        # Recompressed copies record their codec in the metadata
+        compression = mbtiles.tile_compression(mbtiles.read_metadata(connection))
+        rows = connection.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles").fetchall()
+    finally:
+        connection.close()
+    return {(z, x, flip_y(z, row)): _decode(data, compression) for z, x, row, data in rows}
+
+
+def _filter_properties(properties, options):
+    # --use-attribute-for-id moves the attribute into the feature id, which the fake doesn't write
+    id_attribute = argv.option_value(options, "--use-attribute-for-id")
+    if id_attribute is not None:
+        properties = {k: v for k, v in properties.items() if k != id_attribute}
+    if argv.has_flag(options, "-X", "--exclude-all"):
+        return {}
+    include = [argv.option_name_value(g)[1] for g in options if argv.option_name_value(g)[0] == "-y"]
+    exclude = [argv.option_name_value(g)[1] for g in options if argv.option_name_value(g)[0] == "-x"]
+    if include:
+        properties = {k: v for k, v in properties.items() if k in include}
+    return {k: v for k, v in properties.items() if k not in exclude}
+
+
+# Function to encode a tile, dropping features as tippecanoe would to keep it under -M and -O
+def _fit_tile(key, layers, options, compress):
+    max_bytes = int(argv.option_value(options, "-M", "--maximum-tile-bytes", default="500000"))
+    max_features = int(argv.option_value(options, "-O", "--maximum-tile-features", default="200000"))
+    if argv.has_flag(options, "-pk", "--no-tile-size-limit"):
+        max_bytes = None
+    if argv.has_flag(options, "-pf", "--no-feature-limit"):
+        max_features = None
+    can_drop = argv.has_flag(options, *DROP_AS_NEEDED)
+    while True:
+        data = _encode(layers, compress)
+        count = sum(len(features) for features in layers.values())
+        if max_features is not None and count > max_features:
+            problem = f"has {count} features, >{max_features}"
+        elif max_bytes is not None and len(data) > max_bytes:
+            problem = f"size is {len(data)} with detail 12, >{max_bytes}"
+        else:
+            return data
+        if not can_drop or count <= 1:
+            sys.stderr.write(f"\ntile {key[0]}/{key[1]}/{key[2]} {problem}\n")
+            sys.exit(f"could not make tile {key[0]}/{key[1]}/{key[2]} small enough")
+        layers = {name: features[::2] for name, features in layers.items()}
+
+
+def _progress(done, total, tile):
+    percent = 100.0 * done / total if total else 100.0
+    sys.stderr.write(f"  {percent:5.1f}%  {tile[0]}/{tile[1]}/{tile[2]}  \r")
+
+
+def _write_tiles(options, tiles, metadata):
+    output = argv.option_value(options, "-o", "--output")
+    directory = argv.option_value(options, "-e", "--output-to-directory")
+    force = argv.has_flag(options, "-f", "--force")
+    compress = not argv.has_flag(options, "-pC", "--no-tile-compression")
+    delay = float(os.environ.get("FAKE_TIPPECANOE_DELAY", "0"))
+
+    if output:
+        if not output.endswith(".mbtiles"):
+            sys.exit(f"fake tippecanoe only writes .mbtiles, not {output}")
+        if os.path.exists(output):
+            if not force:
+                sys.exit(f"{output}: file exists")
+            os.remove(output)
+        connection = mbtiles.create(output)
+    elif directory:
+        connection = None
+    else:
+        sys.exit("fake tippecanoe: must specify -o out.mbtiles or -e directory")
+
+    total = len(tiles)
+    for done, (key, layers) in enumerate(sorted(tiles.items()), start=1):
+        z, x, y = key
+        data = _fit_tile(key, layers, options, compress)
+        if connection is not None:
+            connection.execute(
+                "INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, flip_y(z, y), data)
+            )
+        else:
+            os.makedirs(os.path.join(directory, str(z), str(x)), exist_ok=True)
+            with open(os.path.join(directory, str(z), str(x), f"{y}.pbf"), "wb") as f:
+                f.write(data)
+        if delay:
+            time.sleep(delay)
+        _progress(done, total, key)
+    sys.stderr.write("\n")
+
+    if connection is not None:
+        connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", metadata.items())
+        connection.commit()
+        connection.close()
+
+
+def tippecanoe(args):
+    options, inputs = argv.split_args(args)
+    max_zoom = argv.option_value(options, "-z", "--maximum-zoom", default="14")
+    max_zoom = 14 if max_zoom == "g" else int(max_zoom)
+    min_zoom = int(argv.option_value(options, "-Z", "--minimum-zoom", default="0"))
+    buffer = float(argv.option_value(options, "-b", "--buffer", default="5"))
+    drop_rate = float(argv.option_value(options, "-r", "--drop-rate", default="2.5"))
+    base_zoom = int(argv.option_value(options, "-B", "--base-zoom", default=str(max_zoom)))
+    # Every n-th point is kept at each zoom below the base zoom, n growing by the drop rate per zoom
+    keep_every = {z: max(1, round(drop_rate ** max(0, base_zoom - z))) for z in range(min_zoom, max_zoom + 1)}
+
+    tiles = {}
+    layer_counts = {}
+    bounds = [1.0, 1.0, 0.0, 0.0]
+    for index, (layer, path) in enumerate(inputs):
+        name = argv.layer_name(layer, path)
+        sys.stderr.write(f'For layer {index}, using name "{name}"\n')
+        count = 0
+        for feature in readers.iter_features(path):
+            parts = readers.geometry_parts(feature.get("geometry"))
+            if not parts:
+                continue
+            count += 1
+            min_x, min_y, max_x, max_y = geometry_world_bbox(parts)
+            bounds = [min(bounds[0], min_x), min(bounds[1], min_y), max(bounds[2], max_x), max(bounds[3], max_y)]
+            properties = _filter_properties(feature.get("properties") or {}, options)
+            is_point = feature["geometry"].get("type") in ("Point", "MultiPoint")
+            for z in range(min_zoom, max_zoom + 1):
+                if is_point and count % keep_every[z]:
+                    continue
+                margin = buffer / 256.0 / (1 << z)
+                x0, y0, x1, y1 = tile_range(z, min_x - margin, min_y - margin, max_x + margin, max_y + margin)
+                for x in range(x0, x1 + 1):
+                    for y in range(y0, y1 + 1):
+                        tiles.setdefault((z, x, y), {}).setdefault(name, []).append(properties)
+        layer_counts[name] = layer_counts.get(name, 0) + count
+        sys.stderr.write(f"Read {count} features from {path}\n")
+
+    west, north = world_to_lonlat(bounds[0], bounds[1])
+    east, south = world_to_lonlat(bounds[2], bounds[3])
+    metadata = {
+        "name": argv.option_value(options, "-n", "--name", default="fake"),
+        "format": "pbf",
+        "bounds": f"{west:.6f},{south:.6f},{east:.6f},{north:.6f}",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "json": json.dumps(
+            {"vector_layers": [{"id": name, "minzoom": min_zoom, "maxzoom": max_zoom} for name in layer_counts]}
+        ),
+    }
+    _write_tiles(options, tiles, metadata)
+
+
+def tile_join(args):
+    options, inputs = argv.split_args(args)
+    tiles = {}
+    layers = {}
+    zooms = []
+    for _, path in inputs:
+        connection = mbtiles.connect(path)
+        metadata = mbtiles.read_metadata(connection)
+        for layer in metadata.get("json", {}).get("vector_layers", []):
+            layers[layer["id"]] = layer
+        zooms.extend(int(metadata[key]) for key in ("minzoom", "maxzoom") if key in metadata)
+        for z, x, row, data in connection.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles"):
+            merged = tiles.setdefault((z, x, flip_y(z, row)), {})
+            for name, features in _decode(data).items():
+                merged.setdefault(name, []).extend(features)
+        connection.close()
+
+    metadata = {
+        "name": argv.option_value(options, "-n", "--name", default="fake"),
+        "format": "pbf",
+        "minzoom": str(min(zooms, default=0)),
+        "maxzoom": str(max(zooms, default=0)),
+        "json": json.dumps({"vector_layers": list(layers.values())}),
+    }
+    _write_tiles(options, tiles, metadata)
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == "tile-join":
+        tile_join(args[1:])
+    else:
+        tippecanoe(args)
+
+
+if __name__ == "__main__":
+    main()
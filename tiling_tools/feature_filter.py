@@ -0,0 +1,575 @@
+"""Checking, previewing and applying tippecanoe -j feature filters in Python.
+
+-j takes a JSON object mapping layer names (or "*" for layers without their
+own entry) to a Mapbox GL Style filter. Filters are compiled once into
+predicates over a batch of features: each attribute a filter mentions becomes
+a column, and comparisons run over whole columns with NumPy. Types are strict
+as in the style spec, so ["==", "lanes", 2] doesn't match the string "2".
+Legacy filters (["==", "key", value], "in", "has", "all", ...) and the
+expression forms ["get", "key"], ["geometry-type"], ["id"] and ["!", ...] are
+understood, as are tippecanoe's "$type", "$id" and "$zoom" keys. Filters that
+depend on the zoom can be checked but not previewed or applied ahead of time.
+Other style-spec expressions ("match", "case", arithmetic, ...) are left to
+tippecanoe: a filter using them is accepted but not previewed or pre-filtered,
+and only filters that aren't valid style-spec expressions at all are errors.
+
+The preview evaluates each layer's filter on a sample of its input: random
+lines of line-delimited GeoJSON and CSV, every k-th feature of FlatGeobuf, and
+the first features of a FeatureCollection. Pre-filtering streams an input once
+and writes only the matching features as line-delimited GeoJSON, so tippecanoe
+never parses the rest.
+
+    python -m tiling_tools.feature_filter '{"roads": ["==", "class", "primary"]}' roads.geojsonl [--prefilter]
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+
+from tiling_tools import argv, compressed, flatgeobuf, readers
+
+SAMPLE_SIZE = 20000
+BATCH_SIZE = 65536
+FILTERED_SUFFIX = ".filtered-"
+FILTERED_EXTENSION = ".geojsonl"
+
+COMPARISONS = ("==", "!=", "<", "<=", ">", ">=")
+MEMBERSHIP = ("in", "!in")
+EXISTENCE = ("has", "!has")
+COMBINING = ("all", "any", "none")
+
+# Legacy filters see multi-geometries as their single type
+TYPE_NAMES = {
+    "Point": "Point",
+    "MultiPoint": "Point",
+    "LineString": "LineString",
+    "MultiLineString": "LineString",
+    "Polygon": "Polygon",
+    "MultiPolygon": "Polygon",
+}
+
+# Expression forms that stand for a key
+EXPRESSION_KEYS = {"geometry-type": "$type", "id": "$id", "zoom": "$zoom"}
+
+# Mapbox GL Style expression operators, for telling expressions compile_filter doesn't handle from mistakes
+STYLE_OPERATORS = frozenset(
+    """
+    ! != % * + - / < <= == > >= ^ abs accumulated acos all any array asin at atan boolean case ceil coalesce
+    collator concat cos distance downcase e feature-state floor format geometry-type get has heatmap-density id
+    image in index-of interpolate interpolate-hcl interpolate-lab is-supported-script length let line-progress
+    literal ln ln2 log10 log2 match max min number number-format object pi properties resolved-locale rgb rgba
+    round sin slice sqrt step string tan to-boolean to-color to-number to-rgba to-string typeof upcase var
+    within zoom
+    """.split()
+)
+
+
+class FilterError(ValueError):
+    pass
+
+
+class UnsupportedFilter(FilterError):
+    # A valid style-spec expression that tippecanoe evaluates but compile_filter doesn't
+    pass
+
+
+def _is_expression(value):
+    return isinstance(value, list) and bool(value) and value[0] in STYLE_OPERATORS
+
+
+@dataclass
+class FilterStats:
+    input_path: str
+    output_path: str
+    layer: str
+    read: int
+    kept: int
+    seconds: float
+
+    @property
+    def selectivity(self):
+        return self.kept / self.read if self.read else 0.0
+
+
+class _Column:
+    # One attribute across a batch, with the typed views comparisons need computed on first use
+
+    def __init__(self, values):
+        self.values = np.fromiter(values, dtype=object, count=len(values))
+
+    @cached_property
+    def present(self):
+        return np.fromiter((value is not None for value in self.values), dtype=bool, count=len(self.values))
+
+    @cached_property
+    def is_bool(self):
+        return np.fromiter((type(value) is bool for value in self.values), dtype=bool, count=len(self.values))
+
+    @cached_property
+    def is_string(self):
+        return np.fromiter((type(value) is str for value in self.values), dtype=bool, count=len(self.values))
+
+    @cached_property
+    def numbers(self):
+        # NaN wherever the value isn't a number (booleans aren't numbers here)
+        return np.fromiter(
+            (value if type(value) in (int, float) else np.nan for value in self.values),
+            dtype=np.float64,
+            count=len(self.values),
+        )
+
+    @cached_property
+    def is_number(self):
+        return ~np.isnan(self.numbers)
+
+
+class FeatureBatch:
+    # A batch of features whose attribute columns are built as filters ask for them
+
+    def __init__(self, features, zoom=None):
+        self.features = features
+        self.zoom = zoom
+        self._properties = [feature.get("properties") or {} for feature in features]
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.features)
+
+    def column(self, key):
+        if key not in self._columns:
+            if key == "$type":
+                values = [TYPE_NAMES.get((feature.get("geometry") or {}).get("type")) for feature in self.features]
+            elif key == "$id":
+                values = [feature.get("id") for feature in self.features]
+            elif key == "$zoom":
+                if self.zoom is None:
+                    raise FilterError("the filter depends on $zoom, so it can only be evaluated by tippecanoe")
+                values = [self.zoom] * len(self.features)
+            else:
+                values = [properties.get(key) for properties in self._properties]
+            self._columns[key] = _Column(values)
+        return self._columns[key]
+
+
+def _key(operand, path):
+    if isinstance(operand, str):
+        return operand
+    if isinstance(operand, list) and operand:
+        if operand[0] == "get" and len(operand) == 2 and isinstance(operand[1], str):
+            return operand[1]
+        if len(operand) == 1 and operand[0] in EXPRESSION_KEYS:
+            return EXPRESSION_KEYS[operand[0]]
+    if _is_expression(operand):
+        raise UnsupportedFilter(f"{path}: {json.dumps(operand)} can only be evaluated by tippecanoe")
+    raise FilterError(f"{path}: expected an attribute name or [\"get\", name], not {json.dumps(operand)}")
+
+
+def _literal(value, path):
+    if isinstance(value, list) and len(value) == 2 and value[0] == "literal":
+        if not isinstance(value[1], (list, dict)):
+            return value[1]
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    # A literal array or object, or an expression such as ["get", "other"], is compared by tippecanoe alone
+    if _is_expression(value):
+        raise UnsupportedFilter(f"{path}: comparing with {json.dumps(value)} can only be evaluated by tippecanoe")
+    raise FilterError(f"{path}: can't compare with {json.dumps(value)}")
+
+
+def _equals(column, value):
+    if value is None:
+        return ~column.present
+    if isinstance(value, bool):
+        return column.is_bool & (column.values == value)
+    if isinstance(value, (int, float)):
+        return column.is_number & (column.numbers == value)
+    return column.is_string & (column.values == value)
+
+
+def _orders(column, operator, value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        numbers = column.numbers
+        with np.errstate(invalid="ignore"):
+            result = {"<": numbers < value, "<=": numbers <= value, ">": numbers > value, ">=": numbers >= value}
+        return column.is_number & result[operator]
+    if isinstance(value, str):
+        compare = {
+            "<": lambda item: item < value,
+            "<=": lambda item: item <= value,
+            ">": lambda item: item > value,
+            ">=": lambda item: item >= value,
+        }[operator]
+        return np.fromiter(
+            (type(item) is str and compare(item) for item in column.values), dtype=bool, count=len(column.values)
+        )
+    return np.zeros(len(column.values), dtype=bool)
+
+
+def _member(column, values):
+    result = np.zeros(len(column.values), dtype=bool)
+    numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+    strings = {value for value in values if isinstance(value, str)}
+    bools = {value for value in values if isinstance(value, bool)}
+    if numbers:
+        result |= column.is_number & np.isin(column.numbers, numbers)
+    if strings:
+        result |= np.fromiter(
+            (type(item) is str and item in strings for item in column.values), dtype=bool, count=len(column.values)
+        )
+    if bools:
+        result |= np.fromiter(
+            (type(item) is bool and item in bools for item in column.values), dtype=bool, count=len(column.values)
+        )
+    if any(value is None for value in values):
+        result |= ~column.present
+    return result
+
+
+# Function to compile a filter into a function from a FeatureBatch to a boolean mask
+def compile_filter(expression, path="filter"):
+    if expression is True or expression == []:
+        return lambda batch: np.ones(len(batch), dtype=bool)
+    if expression is False:
+        return lambda batch: np.zeros(len(batch), dtype=bool)
+    if not isinstance(expression, list) or not expression or not isinstance(expression[0], str):
+        raise FilterError(f"{path}: expected a filter like [\"==\", \"key\", value], not {json.dumps(expression)}")
+    operator, arguments = expression[0], expression[1:]
+
+    if operator in COMBINING:
+        parts = []
+        unsupported = None
+        # Every part is still checked, so a mistake after an unsupported part is reported
+        for i, argument in enumerate(arguments):
+            try:
+                parts.append(compile_filter(argument, f"{path}[{i + 1}]"))
+            except UnsupportedFilter as e:
+                unsupported = unsupported or e
+        if unsupported is not None:
+            raise unsupported
+
+        def combine(batch):
+            result = np.ones(len(batch), dtype=bool) if operator == "all" else np.zeros(len(batch), dtype=bool)
+            for part in parts:
+                result = result & part(batch) if operator == "all" else result | part(batch)
+            return ~result if operator == "none" else result
+
+        return combine
+    if operator == "!":
+        if len(arguments) != 1:
+            raise FilterError(f"{path}: \"!\" takes one filter")
+        inner = compile_filter(arguments[0], f"{path}[1]")
+        return lambda batch: ~inner(batch)
+    if operator in EXISTENCE:
+        if len(arguments) != 1:
+            raise FilterError(f"{path}: \"{operator}\" takes one attribute name")
+        key = _key(arguments[0], f"{path}[1]")
+        if operator == "has":
+            return lambda batch: batch.column(key).present
+        return lambda batch: ~batch.column(key).present
+    if operator in COMPARISONS:
+        if len(arguments) != 2:
+            raise FilterError(f"{path}: \"{operator}\" takes an attribute and a value")
+        key = _key(arguments[0], f"{path}[1]")
+        value = _literal(arguments[1], f"{path}[2]")
+        if operator == "==":
+            return lambda batch: _equals(batch.column(key), value)
+        if operator == "!=":
+            return lambda batch: ~_equals(batch.column(key), value)
+        if value is None:
+            raise FilterError(f"{path}: \"{operator}\" can't compare with null")
+        return lambda batch: _orders(batch.column(key), operator, value)
+    if operator in MEMBERSHIP:
+        if not arguments:
+            raise FilterError(f"{path}: \"{operator}\" takes an attribute and values")
+        key = _key(arguments[0], f"{path}[1]")
+        values = arguments[1:]
+        # Expression form: ["in", ["get", key], ["literal", [values]]]
+        if len(values) == 1 and isinstance(values[0], list) and len(values[0]) == 2 and values[0][0] == "literal":
+            values = values[0][1] if isinstance(values[0][1], list) else [values[0][1]]
+        values = [_literal(value, f"{path}[{i + 2}]") for i, value in enumerate(values)]
+        if operator == "in":
+            return lambda batch: _member(batch.column(key), values)
+        return lambda batch: ~_member(batch.column(key), values)
+    if operator in STYLE_OPERATORS:
+        raise UnsupportedFilter(f"{path}: {json.dumps(operator)} can only be evaluated by tippecanoe")
+    raise FilterError(f"{path}: unknown filter operator {json.dumps(operator)}")
+
+
+# Function to find the attributes and special keys a filter reads
+def filter_keys(expression):
+    keys = set()
+    if isinstance(expression, list) and expression and isinstance(expression[0], str):
+        operator = expression[0]
+        if operator in COMBINING or operator == "!":
+            for argument in expression[1:]:
+                keys |= filter_keys(argument)
+        elif len(expression) > 1:
+            try:
+                keys.add(_key(expression[1], "filter"))
+            except FilterError:
+                pass
+    return keys
+
+
+# Function to parse and check the text given to -j; returns {layer: filter}
+def parse_filters(text):
+    try:
+        filters = json.loads(text)
+    except ValueError as e:
+        raise FilterError(f"not valid JSON: {e}") from None
+    if not isinstance(filters, dict):
+        raise FilterError("-j takes a JSON object mapping layer names (or \"*\") to filters")
+    tippecanoe_only(filters)
+    return filters
+
+
+# Function to find the layers whose filter only tippecanoe can evaluate; returns {layer: reason}
+def tippecanoe_only(filters):
+    reasons = {}
+    for layer, expression in filters.items():
+        try:
+            compile_filter(expression, f"filter for layer {layer!r}")
+        except UnsupportedFilter as e:
+            reasons[layer] = str(e)
+    return reasons
+
+
+def _can_evaluate(expression):
+    try:
+        compile_filter(expression)
+    except UnsupportedFilter:
+        return False
+    return "$zoom" not in filter_keys(expression)
+
+
+# Function to pick the filter tippecanoe applies to a layer: its own, else "*", else None
+def filter_for_layer(filters, layer):
+    if layer in filters:
+        return filters[layer]
+    return filters.get("*")
+
+
+# Function to pick the filter a layer can be pre-filtered with; None if it has none, it depends on the zoom or
+# only tippecanoe can evaluate it
+def prefilter_expression(filters, layer):
+    expression = filter_for_layer(filters, layer)
+    if expression is None or not _can_evaluate(expression):
+        return None
+    return expression
+
+
+# Function to name the pre-filtered copy of an input; the name changes with the filter, and the full
+# input name is kept so a.csv and a.geojson don't collide
+def filtered_path(path, expression, output_dir=None):
+    digest = hashlib.blake2b(json.dumps(expression, sort_keys=True).encode("utf-8"), digest_size=4).hexdigest()
+    name = os.path.basename(path) + FILTERED_SUFFIX + digest + FILTERED_EXTENSION
+    return os.path.join(output_dir or os.path.dirname(path), name)
+
+
+# Function to check whether an up-to-date pre-filtered copy exists
+def is_filtered(path, expression, output_dir=None):
+    target = filtered_path(path, expression, output_dir)
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path)
+
+
+def _sample_lines(path, size, rng, skip_header):
+    total = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline() if skip_header else b""
+        start = len(header)
+        lines = {}
+        for offset in np.sort(rng.integers(start, max(start + 1, total), size)).tolist():
+            # The line after a random offset, so every line but the first is equally likely
+            f.seek(max(start, offset - 1))
+            if offset > start:
+                f.readline()
+            at = f.tell()
+            line = f.readline()
+            if line.strip():
+                lines[at] = line
+    lines = list(lines.values())
+    estimate = (total - start) / (sum(map(len, lines)) / len(lines)) if lines else 0
+    return header, lines, int(estimate)
+
+
+def _sample_flatgeobuf(path, size):
+    with open(path, "rb") as f:
+        header = flatgeobuf.read_header(f)
+        count = header["features_count"]
+        step = max(1, count // size)
+        f.seek(header["features_offset"])
+        features = []
+        for i in range(count):
+            size_bytes = f.read(4)
+            if len(size_bytes) < 4:
+                break
+            length = int.from_bytes(size_bytes, "little")
+            if i % step:
+                f.seek(length, os.SEEK_CUR)
+                continue
+            features.append(flatgeobuf.decode_feature(f.read(length), header))
+    return features, count
+
+
+# Function to sample an input's features; returns (features, estimated feature count or None)
+def sample_features(path, size=SAMPLE_SIZE, seed=0):
+    input_format = readers.detect_format(path)
+    rng = np.random.default_rng(seed)
+    # A compressed input can't be seeked into, so it's sampled from the start
+    seekable = not compressed.is_compressed(path)
+    if seekable and input_format == "flatgeobuf":
+        return _sample_flatgeobuf(path, size)
+    if seekable and input_format == "geojsonseq":
+        _, lines, estimate = _sample_lines(path, size, rng, skip_header=False)
+        features = [readers._as_feature(json.loads(line.decode("utf-8").strip().lstrip("\x1e"))) for line in lines]
+        return [feature for feature in features if feature is not None], estimate
+    if seekable and input_format == "csv":
+        header, lines, estimate = _sample_lines(path, size, rng, skip_header=True)
+        columns = next(csv.reader([header.decode("utf-8")]))
+        lat_index, lon_index = readers.csv_coordinate_columns(columns, path)
+        rows = csv.reader(line.decode("utf-8") for line in lines)
+        features = [readers.csv_feature(row, columns, lat_index, lon_index) for row in rows]
+        return [feature for feature in features if feature is not None], estimate
+    features = []
+    for feature in readers.iter_features(path, input_format):
+        features.append(feature)
+        if len(features) > size:
+            return features[:size], None
+    return features, len(features)
+
+
+# Function to preview how many features each input's filter keeps; inputs are (path, layer) pairs
+def preview_selectivity(filters, inputs, sample_size=SAMPLE_SIZE):
+    rows = []
+    for path, layer in inputs:
+        name = argv.layer_name(layer, path)
+        expression = filter_for_layer(filters, name)
+        row = {"layer": name, "input": path, "sampled": None, "matched": None, "selectivity": None}
+        row.update({"estimated features": None, "estimated kept": None, "note": ""})
+        if expression is None:
+            row["note"] = "no filter: every feature is kept"
+            rows.append(row)
+            continue
+        if "$zoom" in filter_keys(expression):
+            row["note"] = "depends on $zoom: only tippecanoe can evaluate it"
+            rows.append(row)
+            continue
+        if not _can_evaluate(expression):
+            row["note"] = "uses expressions only tippecanoe can evaluate"
+            rows.append(row)
+            continue
+        features, estimate = sample_features(path, sample_size)
+        mask = compile_filter(expression)(FeatureBatch(features)) if features else np.zeros(0, dtype=bool)
+        matched = int(mask.sum())
+        fraction = matched / len(features) if features else 0.0
+        row.update(
+            {
+                "sampled": len(features),
+                "matched": matched,
+                "selectivity": round(fraction, 4),
+                "estimated features": estimate,
+                "estimated kept": None if estimate is None else int(round(estimate * fraction)),
+            }
+        )
+        rows.append(row)
+    return rows
+
+
+# Function to stream an input and write only the features a filter keeps as line-delimited GeoJSON
+def prefilter(path, expression, output_path=None, layer=""):
+    started = time.perf_counter()
+    output_path = output_path or filtered_path(path, expression)
+    predicate = compile_filter(expression)
+    read = kept = 0
+    partial = output_path + ".partial"
+    try:
+        with open(partial, "w", encoding="utf-8") as out:
+            batch = []
+            for feature in readers.iter_features(path):
+                batch.append(feature)
+                if len(batch) >= BATCH_SIZE:
+                    kept += _write_matching(out, batch, predicate)
+                    read += len(batch)
+                    batch = []
+            if batch:
+                kept += _write_matching(out, batch, predicate)
+                read += len(batch)
+        os.replace(partial, output_path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return FilterStats(
+        input_path=path,
+        output_path=output_path,
+        layer=argv.layer_name(layer, path),
+        read=read,
+        kept=kept,
+        seconds=time.perf_counter() - started,
+    )
+
+
+def _write_matching(out, batch, predicate):
+    mask = predicate(FeatureBatch(batch))
+    matching = [json.dumps(feature, separators=(",", ":")) for feature, keep in zip(batch, mask.tolist()) if keep]
+    if matching:
+        out.write("\n".join(matching) + "\n")
+    return len(matching)
+
+
+# Function to describe a pre-filtering pass in one line
+def describe_stats(stats):
+    return (
+        f"{stats.output_path}: kept {stats.kept} of {stats.read} features ({stats.selectivity:.1%}) "
+        f"in {stats.seconds:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check, preview and apply a tippecanoe -j feature filter")
+    parser.add_argument("filter", help="The -j JSON, or @file to read it from a file")
+    parser.add_argument("inputs", nargs="*", help="Input files, or layer:path like tippecanoe's -L")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE, help="Features sampled per input for the preview")
+    parser.add_argument("--prefilter", action="store_true", help="Write the matching features of each input")
+    args = parser.parse_args()
+
+    text = args.filter
+    if text.startswith("@"):
+        with open(text[1:], "r", encoding="utf-8") as f:
+            text = f.read()
+    try:
+        filters = parse_filters(text)
+    except FilterError as e:
+        sys.exit(f"Invalid filter: {e}")
+    print(f"Valid filter for {', '.join(repr(layer) for layer in filters) or 'no layers'}")
+    for reason in tippecanoe_only(filters).values():
+        print(f"Not previewed or pre-filtered: {reason}")
+
+    inputs = []
+    for item in args.inputs:
+        layer, _, path = item.rpartition(":") if not os.path.exists(item) else ("", "", item)
+        inputs.append((path, layer))
+    if not inputs:
+        return
+    rows = preview_selectivity(filters, inputs, args.sample)
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in rows[0]}
+    print("  ".join(column.rjust(width) for column, width in widths.items()))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(width) for column, width in widths.items()))
+    if args.prefilter:
+        for path, layer in inputs:
+            expression = prefilter_expression(filters, argv.layer_name(layer, path))
+            if expression is None:
+                continue
+            print(describe_stats(prefilter(path, expression, layer=layer)))
+
+
+if __name__ == "__main__":
+    main()
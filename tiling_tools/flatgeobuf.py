@@ -0,0 +1,506 @@
+"""Minimal FlatGeobuf reader and writer (header, features, properties and packed R-tree)."""
+
+import json
+import math
+import struct
+
+import numpy as np
+
+MAGIC = b"fgb\x03fgb\x00"
+NODE_ITEM_SIZE = 40
+
+GEOMETRY_TYPES = {
+    0: "Unknown",
+    1: "Point",
+    2: "LineString",
+    3: "Polygon",
+    4: "MultiPoint",
+    5: "MultiLineString",
+    6: "MultiPolygon",
+    7: "GeometryCollection",
+}
+
+# Column type -> (struct format, byte size); variable-length types use None
+COLUMN_TYPES = {
+    0: ("<b", 1),  # Byte
+    1: ("<B", 1),  # UByte
+    2: ("<?", 1),  # Bool
+    3: ("<h", 2),  # Short
+    4: ("<H", 2),  # UShort
+    5: ("<i", 4),  # Int
+    6: ("<I", 4),  # UInt
+    7: ("<q", 8),  # Long
+    8: ("<Q", 8),  # ULong
+    9: ("<f", 4),  # Float
+    10: ("<d", 8),  # Double
+    11: (None, None),  # String
+    12: (None, None),  # Json
+    13: (None, None),  # DateTime
+    14: (None, None),  # Binary
+}
+
+
+# Flatbuffer table accessor; only the few primitives FlatGeobuf needs
+class _Table:
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        vtable = pos - struct.unpack_from("<i", buf, pos)[0]
+        self.vtable = vtable
+        self.vtable_size = struct.unpack_from("<H", buf, vtable)[0]
+
+    def _field(self, slot):
+        voffset = 4 + 2 * slot
+        if voffset >= self.vtable_size:
+            return 0
+        return struct.unpack_from("<H", self.buf, self.vtable + voffset)[0]
+
+    def scalar(self, slot, fmt, default=0):
+        offset = self._field(slot)
+        if not offset:
+            return default
+        return struct.unpack_from(fmt, self.buf, self.pos + offset)[0]
+
+    def _indirect(self, slot):
+        offset = self._field(slot)
+        if not offset:
+            return None
+        at = self.pos + offset
+        return at + struct.unpack_from("<I", self.buf, at)[0]
+
+    def string(self, slot):
+        at = self._indirect(slot)
+        if at is None:
+            return None
+        length = struct.unpack_from("<I", self.buf, at)[0]
+        return bytes(self.buf[at + 4 : at + 4 + length]).decode("utf-8")
+
+    def vector(self, slot):
+        # Returns (start of elements, element count)
+        at = self._indirect(slot)
+        if at is None:
+            return None, 0
+        return at + 4, struct.unpack_from("<I", self.buf, at)[0]
+
+    def table(self, slot):
+        at = self._indirect(slot)
+        return None if at is None else _Table(self.buf, at)
+
+    def tables(self, slot):
+        start, count = self.vector(slot)
+        result = []
+        for i in range(count):
+            at = start + 4 * i
+            result.append(_Table(self.buf, at + struct.unpack_from("<I", self.buf, at)[0]))
+        return result
+
+
+def _double_vector(table, slot):
+    start, count = table.vector(slot)
+    if not count:
+        return ()
+    return struct.unpack_from(f"<{count}d", table.buf, start)
+
+
+def _uint_vector(table, slot):
+    start, count = table.vector(slot)
+    if not count:
+        return ()
+    return struct.unpack_from(f"<{count}I", table.buf, start)
+
+
+# Function to compute the byte size of a packed Hilbert R-tree index
+def packed_rtree_size(num_items, node_size):
+    if node_size == 0 or num_items == 0:
+        return 0
+    return sum(count for _, count in level_bounds(num_items, node_size)) * NODE_ITEM_SIZE
+
+
+# Function to find where each level of a packed R-tree sits in its node array, leaves first
+def level_bounds(num_items, node_size):
+    node_size = min(max(node_size, 2), 65535)
+    counts = [num_items]
+    n = num_items
+    # Like the reference implementation, a single item still gets a root node above it
+    while True:
+        n = (n + node_size - 1) // node_size
+        counts.append(n)
+        if n == 1:
+            break
+    # The root comes first in the file and the leaves last
+    starts = []
+    end = sum(counts)
+    for count in counts:
+        end -= count
+        starts.append(end)
+    return list(zip(starts, counts))
+
+
+def _parse_columns(tables):
+    return [
+        {
+            "name": column.string(0),
+            "type": column.scalar(1, "<B"),
+        }
+        for column in tables
+    ]
+
+
+# Function to read the header of a FlatGeobuf file
+def read_header(f):
+    magic = f.read(8)
+    if magic[:3] != MAGIC[:3] or magic[4:7] != MAGIC[4:7]:
+        raise ValueError("Not a FlatGeobuf file")
+    header_size = struct.unpack("<I", f.read(4))[0]
+    buf = f.read(header_size)
+    root = _Table(buf, struct.unpack_from("<I", buf, 0)[0])
+    header = {
+        "name": root.string(0),
+        "envelope": list(_double_vector(root, 1)),
+        "geometry_type": root.scalar(2, "<B"),
+        "has_z": bool(root.scalar(3, "<B")),
+        "has_m": bool(root.scalar(4, "<B")),
+        "columns": _parse_columns(root.tables(7)),
+        "features_count": root.scalar(8, "<Q"),
+        "index_node_size": root.scalar(9, "<H", 16),
+    }
+    crs = root.table(10)
+    header["crs"] = None if crs is None else {"org": crs.string(0), "code": crs.scalar(1, "<i")}
+    header["index_size"] = packed_rtree_size(header["features_count"], header["index_node_size"])
+    header["features_offset"] = 12 + header_size + header["index_size"]
+    return header
+
+
+def _decode_properties(buf, columns):
+    properties = {}
+    pos = 0
+    while pos < len(buf):
+        index = struct.unpack_from("<H", buf, pos)[0]
+        pos += 2
+        column = columns[index]
+        fmt, size = COLUMN_TYPES[column["type"]]
+        if fmt is not None:
+            value = struct.unpack_from(fmt, buf, pos)[0]
+            pos += size
+        else:
+            length = struct.unpack_from("<I", buf, pos)[0]
+            raw = bytes(buf[pos + 4 : pos + 4 + length])
+            pos += 4 + length
+            if column["type"] == 12:
+                value = json.loads(raw)
+            elif column["type"] == 14:
+                value = raw.hex()
+            else:
+                value = raw.decode("utf-8")
+        properties[column["name"]] = value
+    return properties
+
+
+def _pairs(xy):
+    return [[xy[i], xy[i + 1]] for i in range(0, len(xy), 2)]
+
+
+def _split(xy, ends):
+    if not ends:
+        return [_pairs(xy)]
+    parts = []
+    start = 0
+    for end in ends:
+        parts.append(_pairs(xy[start * 2 : end * 2]))
+        start = end
+    return parts
+
+
+def _decode_geometry(geometry, geometry_type):
+    if geometry is None:
+        return None
+    geometry_type = geometry.scalar(6, "<B") or geometry_type
+    name = GEOMETRY_TYPES.get(geometry_type, "Unknown")
+    if name == "MultiPolygon":
+        polygons = [_decode_geometry(part, 3) for part in geometry.tables(7)]
+        return {"type": name, "coordinates": [polygon["coordinates"] for polygon in polygons]}
+    if name == "GeometryCollection":
+        return {
+            "type": name,
+            "geometries": [_decode_geometry(part, 0) for part in geometry.tables(7)],
+        }
+    xy = _double_vector(geometry, 1)
+    ends = _uint_vector(geometry, 0)
+    if name == "Point":
+        coordinates = list(xy[:2])
+    elif name in ("LineString", "MultiPoint"):
+        coordinates = _pairs(xy)
+    elif name in ("Polygon", "MultiLineString"):
+        coordinates = _split(xy, ends)
+    else:
+        return None
+    return {"type": name, "coordinates": coordinates}
+
+
+# Function to decode one size-prefixed feature buffer into a GeoJSON feature
+def decode_feature(buf, header):
+    root = _Table(buf, struct.unpack_from("<I", buf, 0)[0])
+    columns = header["columns"]
+    start, count = root.vector(1)
+    properties = _decode_properties(buf[start : start + count], columns) if count else {}
+    return {
+        "type": "Feature",
+        "geometry": _decode_geometry(root.table(0), header["geometry_type"]),
+        "properties": properties,
+    }
+
+
+# Function to stream the features of a FlatGeobuf file one at a time
+def iter_features(path):
+    with open(path, "rb") as f:
+        header = read_header(f)
+        f.seek(header["features_offset"])
+        while True:
+            size_bytes = f.read(4)
+            if len(size_bytes) < 4:
+                break
+            size = struct.unpack("<I", size_bytes)[0]
+            buf = f.read(size)
+            if len(buf) < size:
+                break
+            yield decode_feature(buf, header)
+
+
+GEOMETRY_TYPE_CODES = {name: code for code, name in GEOMETRY_TYPES.items()}
+
+# Column types used when writing, picked from the Python type of the values
+BOOL, LONG, DOUBLE, STRING, JSON = 2, 7, 10, 11, 12
+
+_SCALARS = {"u8": ("<B", 1), "u16": ("<H", 2), "i32": ("<i", 4), "u64": ("<Q", 8)}
+
+
+# Flatbuffer writer laid out front to back: each table's vtable, then the table, then what it points at
+class _Builder:
+    def __init__(self):
+        self.buf = bytearray(4)  # Root offset, patched in finish()
+
+    def _pad(self, alignment, extra=0):
+        # The size prefix counts towards alignment, hence the 4
+        self.buf += bytes(-(4 + len(self.buf) + extra) % alignment)
+
+    def _write(self, kind, value):
+        if kind == "string":
+            self._pad(4)
+            at = len(self.buf)
+            data = value.encode("utf-8")
+            self.buf += struct.pack("<I", len(data)) + data + b"\x00"
+            return at
+        if kind == "doubles":
+            self._pad(8, 4)
+            at = len(self.buf)
+            self.buf += struct.pack(f"<I{len(value)}d", len(value), *value)
+            return at
+        if kind in ("uints", "bytes"):
+            self._pad(4)
+            at = len(self.buf)
+            data = struct.pack(f"<{len(value)}I", *value) if kind == "uints" else bytes(value)
+            self.buf += struct.pack("<I", len(value)) + data
+            return at
+        if kind == "table":
+            return self.table(value)
+        # Vector of tables: the offsets first, then the tables themselves
+        self._pad(4)
+        at = len(self.buf)
+        self.buf += struct.pack("<I", len(value)) + bytes(4 * len(value))
+        for i, fields in enumerate(value):
+            slot = at + 4 + 4 * i
+            struct.pack_into("<I", self.buf, slot, self.table(fields) - slot)
+        return at
+
+    # Function to write a table given {slot: (kind, value)}; returns its position
+    def table(self, fields):
+        inline = sorted(
+            ((slot, kind, value) for slot, (kind, value) in fields.items() if value is not None),
+            key=lambda field: -(_SCALARS[field[1]][1] if field[1] in _SCALARS else 4),
+        )
+        offsets = {}
+        size = 4  # soffset to the vtable
+        for slot, kind, _ in inline:
+            width = _SCALARS[kind][1] if kind in _SCALARS else 4
+            size += -(size + 4) % width if width == 8 else 0
+            offsets[slot] = size
+            size += width
+        slots = max(fields) + 1 if fields else 0
+
+        self._pad(2)
+        vtable = len(self.buf)
+        self.buf += struct.pack(f"<HH{slots}H", 4 + 2 * slots, size, *(offsets.get(i, 0) for i in range(slots)))
+        self._pad(8, 4)
+        at = len(self.buf)
+        self.buf += struct.pack("<i", at - vtable) + bytes(size - 4)
+        references = []
+        for slot, kind, value in inline:
+            if kind in _SCALARS:
+                struct.pack_into(_SCALARS[kind][0], self.buf, at + offsets[slot], value)
+            else:
+                references.append((at + offsets[slot], kind, value))
+        for position, kind, value in references:
+            struct.pack_into("<I", self.buf, position, self._write(kind, value) - position)
+        return at
+
+    # Function to finish the buffer with the given root table, size-prefixed
+    def finish(self, root):
+        struct.pack_into("<I", self.buf, 0, root)
+        return struct.pack("<I", len(self.buf)) + bytes(self.buf)
+
+
+# Function to pick a FlatGeobuf column type for a Python value
+def column_type(value):
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return LONG
+    if isinstance(value, float):
+        return DOUBLE
+    if isinstance(value, (dict, list)):
+        return JSON
+    return STRING
+
+
+# Function to encode a header; columns are (name, type) pairs
+def encode_header(columns, features_count, geometry_type=0, envelope=None, name="", index_node_size=0):
+    builder = _Builder()
+    root = builder.table(
+        {
+            0: ("string", name),
+            1: ("doubles", envelope),
+            2: ("u8", geometry_type),
+            7: ("tables", [{0: ("string", column), 1: ("u8", kind)} for column, kind in columns]),
+            8: ("u64", features_count),
+            9: ("u16", index_node_size),
+            10: ("table", {0: ("string", "EPSG"), 1: ("i32", 4326)}),
+        }
+    )
+    return MAGIC + builder.finish(root)
+
+
+def _encode_properties(properties, column_index):
+    out = bytearray()
+    for key, value in properties.items():
+        if value is None or key not in column_index:
+            continue
+        index, kind = column_index[key]
+        if kind == BOOL:
+            out += struct.pack("<H?", index, bool(value))
+        elif kind == LONG and isinstance(value, int):
+            out += struct.pack("<Hq", index, value)
+        elif kind == DOUBLE and isinstance(value, (int, float)):
+            out += struct.pack("<Hd", index, value)
+        else:
+            text = value if isinstance(value, str) and kind == STRING else json.dumps(value)
+            data = text.encode("utf-8")
+            out += struct.pack("<HI", index, len(data)) + data
+    return bytes(out)
+
+
+def _geometry_fields(geometry, with_type):
+    kind = geometry["type"]
+    coordinates = geometry["coordinates"]
+    fields = {6: ("u8", GEOMETRY_TYPE_CODES[kind])} if with_type else {}
+    if kind == "MultiPolygon":
+        fields[7] = ("tables", [_geometry_fields({"type": "Polygon", "coordinates": part}, True) for part in coordinates])
+        return fields
+    if kind == "Point":
+        parts = [[coordinates]]
+    elif kind in ("LineString", "MultiPoint"):
+        parts = [coordinates]
+    elif kind in ("Polygon", "MultiLineString"):
+        parts = coordinates
+    else:
+        raise ValueError(f"Can't write {kind} geometries")
+    xy = [value for part in parts for point in part for value in point[:2]]
+    fields[1] = ("doubles", xy)
+    if len(parts) > 1:
+        ends = []
+        for part in parts:
+            ends.append((ends[-1] if ends else 0) + len(part))
+        fields[0] = ("uints", ends)
+    return fields
+
+
+# Function to encode one feature as a size-prefixed buffer; column_index maps names to (index, type)
+def encode_feature(feature, column_index, geometry_type=0):
+    builder = _Builder()
+    geometry = feature.get("geometry")
+    properties = _encode_properties(feature.get("properties") or {}, column_index)
+    root = builder.table(
+        {
+            0: ("table", _geometry_fields(geometry, geometry_type == 0) if geometry else None),
+            1: ("bytes", properties if properties else None),
+        }
+    )
+    return builder.finish(root)
+
+
+# Function to grow an envelope [min x, min y, max x, max y] to cover a geometry
+def extend_envelope(envelope, geometry):
+    from tiling_tools.readers import geometry_parts
+
+    for part in geometry_parts(geometry):
+        for point in part:
+            envelope[0] = min(envelope[0], point[0])
+            envelope[1] = min(envelope[1], point[1])
+            envelope[2] = max(envelope[2], point[0])
+            envelope[3] = max(envelope[3], point[1])
+    return envelope
+
+
+# Function to write GeoJSON-like features to an unindexed FlatGeobuf file
+def write_features(path, features, columns=None, geometry_type=None, name=""):
+    features = list(features)
+    if columns is None:
+        seen = {}
+        for feature in features:
+            for key, value in (feature.get("properties") or {}).items():
+                if value is not None and key not in seen:
+                    seen[key] = column_type(value)
+        columns = list(seen.items())
+    if geometry_type is None:
+        kinds = {feature["geometry"]["type"] for feature in features if feature.get("geometry")}
+        geometry_type = GEOMETRY_TYPE_CODES[kinds.pop()] if len(kinds) == 1 else 0
+    column_index = {column: (index, kind) for index, (column, kind) in enumerate(columns)}
+    envelope = [math.inf, math.inf, -math.inf, -math.inf]
+    for feature in features:
+        if feature.get("geometry"):
+            extend_envelope(envelope, feature["geometry"])
+    with open(path, "wb") as f:
+        f.write(
+            encode_header(
+                columns, len(features), geometry_type, envelope if features else None, name=name
+            )
+        )
+        for feature in features:
+            f.write(encode_feature(feature, column_index, geometry_type))
+
+
+# Node items of a packed R-tree: a box and, for leaves, the feature's byte offset or else the first child's index
+NODE_DTYPE = np.dtype(
+    [("min_x", "<f8"), ("min_y", "<f8"), ("max_x", "<f8"), ("max_y", "<f8"), ("offset", "<u8")]
+)
+NODE_CHUNK = 1 << 20
+
+
+# Function to fill in the upper levels of a packed R-tree whose leaves (in Hilbert order) are already set
+def build_packed_rtree(nodes, num_items, node_size):
+    levels = level_bounds(num_items, node_size)
+    for (start, count), (parent_start, parent_count) in zip(levels, levels[1:]):
+        # Chunks are whole parents wide, so the nodes can live in a memory-mapped file
+        step = (NODE_CHUNK // node_size) * node_size
+        for chunk in range(0, count, step):
+            children = np.asarray(nodes[start + chunk : start + min(count, chunk + step)])
+            first = np.arange(0, len(children), node_size)
+            parents = np.empty(len(first), dtype=NODE_DTYPE)
+            parents["min_x"] = np.minimum.reduceat(children["min_x"], first)
+            parents["min_y"] = np.minimum.reduceat(children["min_y"], first)
+            parents["max_x"] = np.maximum.reduceat(children["max_x"], first)
+            parents["max_y"] = np.maximum.reduceat(children["max_y"], first)
+            parents["offset"] = start + chunk + first
+            at = parent_start + chunk // node_size
+            nodes[at : at + len(parents)] = parents
+    return nodes
+
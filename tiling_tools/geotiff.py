@@ -0,0 +1,431 @@
+"""Header-only GeoTIFF reading and batch zoom recommendations for raster tiling.
+
+Only the TIFF header and the first IFD are read (plus the values its tags point
+at), never pixel data, so hundreds of rasters or COGs can be profiled quickly.
+The zoom maths runs on NumPy arrays over all files at once.
+
+    python -m tiling_tools.geotiff rasters/ [more.tif ...]
+"""
+
+import argparse
+import glob
+import math
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from tiling_tools import readers
+
+# Bytes read up front; COG headers sit at the start of the file and almost always fit
+HEADER_READ_SIZE = 65536
+
+# TIFF tags
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+SAMPLES_PER_PIXEL = 277
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+SAMPLE_FORMAT = 339
+MODEL_PIXEL_SCALE = 33550
+MODEL_TIEPOINT = 33922
+MODEL_TRANSFORMATION = 34264
+GEO_KEY_DIRECTORY = 34735
+GEO_DOUBLE_PARAMS = 34736
+GEO_ASCII_PARAMS = 34737
+GDAL_NODATA = 42113
+
+# GeoKeys
+GT_MODEL_TYPE = 1024
+GT_RASTER_TYPE = 1025
+GEOGRAPHIC_TYPE = 2048
+GEOG_ANGULAR_UNITS = 2054
+PROJECTED_CS_TYPE = 3072
+PROJ_LINEAR_UNITS = 3076
+
+MODEL_PROJECTED = 1
+MODEL_GEOGRAPHIC = 2
+RASTER_PIXEL_IS_POINT = 2
+
+# Linear unit codes -> metres
+LINEAR_UNITS = {9001: 1.0, 9002: 0.3048, 9003: 1200.0 / 3937.0}
+
+# TIFF field type -> (struct code, size)
+FIELD_TYPES = {
+    1: ("B", 1),  # BYTE
+    2: ("s", 1),  # ASCII
+    3: ("H", 2),  # SHORT
+    4: ("I", 4),  # LONG
+    5: ("II", 8),  # RATIONAL
+    6: ("b", 1),  # SBYTE
+    7: ("B", 1),  # UNDEFINED
+    8: ("h", 2),  # SSHORT
+    9: ("i", 4),  # SLONG
+    10: ("ii", 8),  # SRATIONAL
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE
+    16: ("Q", 8),  # LONG8
+    17: ("q", 8),  # SLONG8
+    18: ("Q", 8),  # IFD8
+}
+
+EARTH_RADIUS = 6378137.0
+EARTH_CIRCUMFERENCE = 2 * math.pi * EARTH_RADIUS
+METRES_PER_DEGREE = EARTH_CIRCUMFERENCE / 360.0
+TILE_SIZE = 256
+MAX_ZOOM = 30
+
+# Web Mercator CRS codes, whose metres shrink by cos(latitude) on the ground
+WEB_MERCATOR_CODES = {3857, 3785, 900913, 102100, 102113}
+
+
+@dataclass
+class RasterHeader:
+    path: str
+    width: int = 0
+    height: int = 0
+    bands: int = 1
+    bits_per_sample: int = 8
+    compression: int = 1
+    tiled: bool = False
+    overviews: int = 0
+    geotransform: tuple = None  # GDAL order: origin x, pixel width, row rotation, origin y, column rotation, pixel height
+    model_type: int = 0
+    epsg: int = None
+    linear_unit: float = 1.0
+    nodata: str = None
+    error: str = None
+
+    @property
+    def georeferenced(self):
+        return self.geotransform is not None
+
+    @property
+    def crs(self):
+        return f"EPSG:{self.epsg}" if self.epsg else ("geographic" if self.model_type == MODEL_GEOGRAPHIC else None)
+
+
+class _TiffFile:
+    def __init__(self, f):
+        self.f = f
+        self.head = f.read(HEADER_READ_SIZE)
+        order = self.head[:2]
+        if order == b"II":
+            self.endian = "<"
+        elif order == b"MM":
+            self.endian = ">"
+        else:
+            raise ValueError("Not a TIFF file")
+        version = struct.unpack_from(self.endian + "H", self.head, 2)[0]
+        if version == 42:
+            self.big = False
+            self.first_ifd = struct.unpack_from(self.endian + "I", self.head, 4)[0]
+        elif version == 43:
+            self.big = True
+            self.first_ifd = struct.unpack_from(self.endian + "Q", self.head, 8)[0]
+        else:
+            raise ValueError(f"Unsupported TIFF version {version}")
+
+    def read(self, offset, size):
+        if offset + size <= len(self.head):
+            return self.head[offset : offset + size]
+        self.f.seek(offset)
+        data = self.f.read(size)
+        if len(data) < size:
+            raise ValueError("TIFF file is truncated")
+        return data
+
+    def ifd(self, offset):
+        count_format, entry_size, pointer_format = ("Q", 20, "Q") if self.big else ("H", 12, "I")
+        count_size = struct.calcsize(count_format)
+        count = struct.unpack(self.endian + count_format, self.read(offset, count_size))[0]
+        block = self.read(offset + count_size, count * entry_size + struct.calcsize(pointer_format))
+        tags = {}
+        for i in range(count):
+            entry = block[i * entry_size : (i + 1) * entry_size]
+            tag, field_type = struct.unpack_from(self.endian + "HH", entry, 0)
+            if self.big:
+                n = struct.unpack_from(self.endian + "Q", entry, 4)[0]
+                inline, value_offset = entry[12:20], 12
+            else:
+                n = struct.unpack_from(self.endian + "I", entry, 4)[0]
+                inline, value_offset = entry[8:12], 8
+            tags[tag] = (field_type, n, inline, value_offset)
+        next_ifd = struct.unpack_from(self.endian + pointer_format, block, count * entry_size)[0]
+        return tags, next_ifd
+
+    def value(self, entry):
+        field_type, n, inline, _ = entry
+        if field_type not in FIELD_TYPES:
+            return None
+        code, size = FIELD_TYPES[field_type]
+        total = size * n
+        if total <= len(inline):
+            data = inline[:total]
+        else:
+            offset = struct.unpack(self.endian + ("Q" if self.big else "I"), inline)[0]
+            data = self.read(offset, total)
+        if field_type == 2:
+            return data.rstrip(b"\x00").decode("latin-1")
+        values = struct.unpack(self.endian + code * n, data)
+        if field_type in (5, 10):
+            values = tuple(values[i] / values[i + 1] if values[i + 1] else 0.0 for i in range(0, len(values), 2))
+        return values
+
+
+def _geo_keys(tiff, tags):
+    if GEO_KEY_DIRECTORY not in tags:
+        return {}
+    directory = tiff.value(tags[GEO_KEY_DIRECTORY])
+    doubles = tiff.value(tags[GEO_DOUBLE_PARAMS]) if GEO_DOUBLE_PARAMS in tags else ()
+    ascii_params = tiff.value(tags[GEO_ASCII_PARAMS]) if GEO_ASCII_PARAMS in tags else ""
+    keys = {}
+    for i in range(4, 4 + 4 * directory[3], 4):
+        key, location, count, value = directory[i : i + 4]
+        if location == 0:
+            keys[key] = value
+        elif location == GEO_DOUBLE_PARAMS:
+            keys[key] = doubles[value] if count == 1 else doubles[value : value + count]
+        elif location == GEO_ASCII_PARAMS:
+            keys[key] = ascii_params[value : value + count].rstrip("|")
+    return keys
+
+
+# Function to read a GeoTIFF's dimensions, georeferencing and CRS from its header only
+def read_header(path):
+    header = RasterHeader(path=path)
+    with open(path, "rb") as f:
+        tiff = _TiffFile(f)
+        tags, next_ifd = tiff.ifd(tiff.first_ifd)
+
+        def first(tag, default=None):
+            return tiff.value(tags[tag])[0] if tag in tags else default
+
+        header.width = first(IMAGE_WIDTH, 0)
+        header.height = first(IMAGE_LENGTH, 0)
+        header.bands = first(SAMPLES_PER_PIXEL, 1)
+        header.bits_per_sample = first(BITS_PER_SAMPLE, 1)
+        header.compression = first(COMPRESSION, 1)
+        header.tiled = TILE_WIDTH in tags and TILE_LENGTH in tags
+        if GDAL_NODATA in tags:
+            header.nodata = tiff.value(tags[GDAL_NODATA]).strip() or None
+
+        # Count the reduced-resolution IFDs (overviews) by following the chain without reading their tags
+        seen = {tiff.first_ifd}
+        while next_ifd and next_ifd not in seen and header.overviews < 64:
+            seen.add(next_ifd)
+            header.overviews += 1
+            next_ifd = tiff.ifd(next_ifd)[1]
+
+        if MODEL_TRANSFORMATION in tags:
+            m = tiff.value(tags[MODEL_TRANSFORMATION])
+            header.geotransform = (m[3], m[0], m[1], m[7], m[4], m[5])
+        elif MODEL_PIXEL_SCALE in tags and MODEL_TIEPOINT in tags:
+            scale = tiff.value(tags[MODEL_PIXEL_SCALE])
+            tie = tiff.value(tags[MODEL_TIEPOINT])
+            i, j, x, y = tie[0], tie[1], tie[3], tie[4]
+            header.geotransform = (x - i * scale[0], scale[0], 0.0, y + j * scale[1], 0.0, -scale[1])
+
+        keys = _geo_keys(tiff, tags)
+        header.model_type = keys.get(GT_MODEL_TYPE, 0)
+        if keys.get(GT_RASTER_TYPE) == RASTER_PIXEL_IS_POINT and header.geotransform:
+            # Tie points refer to pixel centres; shift to the corner like GDAL does
+            gt = header.geotransform
+            header.geotransform = (gt[0] - gt[1] / 2, gt[1], gt[2], gt[3] - gt[5] / 2, gt[4], gt[5])
+        epsg = keys.get(PROJECTED_CS_TYPE) or keys.get(GEOGRAPHIC_TYPE)
+        header.epsg = epsg if isinstance(epsg, int) and 0 < epsg < 32767 else None
+        if header.model_type == 0 and header.epsg:
+            header.model_type = MODEL_PROJECTED if PROJECTED_CS_TYPE in keys else MODEL_GEOGRAPHIC
+        header.linear_unit = LINEAR_UNITS.get(keys.get(PROJ_LINEAR_UNITS), 1.0)
+    return header
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Function to read a header, reusing the result while the file's path, mtime and size are unchanged
+def cached_header(path):
+    key = readers.file_key(path)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    try:
+        header = read_header(path)
+    except (OSError, ValueError, struct.error, IndexError) as e:
+        header = RasterHeader(path=path, error=str(e))
+    with _cache_lock:
+        _cache[key] = header
+    return header
+
+
+# Function to read many headers concurrently (the work is almost all file I/O)
+def read_headers(paths, workers=16):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(cached_header, paths))
+
+
+# Function to expand directories and glob patterns into a sorted list of GeoTIFF paths
+def find_rasters(patterns):
+    paths = set()
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern.strip())
+        if not pattern:
+            continue
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                paths.update(
+                    os.path.join(root, name) for name in names if name.lower().endswith((".tif", ".tiff"))
+                )
+        else:
+            paths.update(glob.glob(pattern, recursive=True))
+    return sorted(paths)
+
+
+def _utm_latitude(epsg, northing):
+    # Rough inverse of UTM northing; only used for cos(latitude) in the zoom maths
+    south = 32701 <= epsg <= 32760
+    return ((northing - 10000000.0) if south else northing) / 110574.0
+
+
+@lru_cache(maxsize=64)
+def _to_wgs84(epsg):
+    try:
+        from pyproj import Transformer
+    except ImportError:
+        return None
+    try:
+        return Transformer.from_crs(epsg, 4326, always_xy=True)
+    except Exception:
+        return None
+
+
+def _projected_latitude(epsg, x, y):
+    # Other projected CRSs need pyproj; without it they're treated as equatorial
+    transformer = _to_wgs84(epsg) if epsg else None
+    return transformer.transform(x, y)[1] if transformer is not None else None
+
+
+# Function to compute ground resolution and zoom recommendations for many rasters at once
+def recommend_zooms(headers, tile_size=TILE_SIZE):
+    usable = [h for h in headers if h.error is None and h.georeferenced and h.width and h.height]
+    if not usable:
+        return []
+    gt = np.array([h.geotransform for h in usable], dtype=np.float64)
+    width = np.array([h.width for h in usable], dtype=np.float64)
+    height = np.array([h.height for h in usable], dtype=np.float64)
+    geographic = np.array([h.model_type == MODEL_GEOGRAPHIC for h in usable])
+    mercator = np.array([h.epsg in WEB_MERCATOR_CODES for h in usable])
+    utm = np.array([h.epsg is not None and (32601 <= h.epsg <= 32660 or 32701 <= h.epsg <= 32760) for h in usable])
+    unit = np.array([h.linear_unit for h in usable], dtype=np.float64)
+
+    pixel_x = np.hypot(gt[:, 1], gt[:, 4])
+    pixel_y = np.hypot(gt[:, 2], gt[:, 5])
+    centre_x = gt[:, 0] + gt[:, 1] * width / 2 + gt[:, 2] * height / 2
+    centre_y = gt[:, 3] + gt[:, 4] * width / 2 + gt[:, 5] * height / 2
+
+    # Latitude of each raster's centre, where the CRS lets us work it out without a projection library
+    latitude = np.zeros(len(usable))
+    latitude[geographic] = centre_y[geographic]
+    latitude[mercator] = np.degrees(np.arctan(np.sinh(centre_y[mercator] / EARTH_RADIUS)))
+    for i in np.flatnonzero(utm):
+        latitude[i] = _utm_latitude(usable[i].epsg, centre_y[i])
+    latitude_known = geographic | mercator | utm
+    for i in np.flatnonzero(~latitude_known):
+        projected = _projected_latitude(usable[i].epsg, centre_x[i], centre_y[i])
+        if projected is not None:
+            latitude[i] = projected
+            latitude_known[i] = True
+    latitude = np.clip(latitude, -85.0511, 85.0511)
+    cos_lat = np.cos(np.radians(latitude))
+
+    # Ground metres per pixel: degrees scale with cos(lat) east-west, Mercator metres shrink with cos(lat)
+    ground_x = np.where(geographic, pixel_x * METRES_PER_DEGREE * cos_lat, pixel_x * unit)
+    ground_y = np.where(geographic, pixel_y * METRES_PER_DEGREE, pixel_y * unit)
+    ground_x = np.where(mercator, ground_x * cos_lat, ground_x)
+    ground_y = np.where(mercator, ground_y * cos_lat, ground_y)
+    resolution = np.minimum(ground_x, ground_y)
+
+    # A zoom z tile pixel covers C * cos(lat) / (tile_size * 2^z) metres of ground
+    exact = np.log2(EARTH_CIRCUMFERENCE * cos_lat / (tile_size * resolution))
+    max_zoom = np.clip(np.ceil(exact - 1e-9), 0, MAX_ZOOM).astype(int)
+    native_zoom = np.clip(np.floor(exact + 1e-9), 0, MAX_ZOOM).astype(int)
+    extent = np.maximum(ground_x * width, ground_y * height) / cos_lat  # In Mercator metres
+    min_zoom = np.clip(np.floor(np.log2(EARTH_CIRCUMFERENCE / extent)), 0, max_zoom).astype(int)
+
+    rows = []
+    for i, h in enumerate(usable):
+        rows.append(
+            {
+                "path": h.path,
+                "width": h.width,
+                "height": h.height,
+                "bands": h.bands,
+                "crs": h.crs,
+                "centre latitude": round(float(latitude[i]), 4),
+                "resolution (m)": round(float(resolution[i]), 4),
+                "exact zoom": round(float(exact[i]), 2),
+                "min zoom": int(min_zoom[i]),
+                "max zoom": int(max_zoom[i]),
+                "gdal2tiles max zoom": int(native_zoom[i]),
+                "cog": h.tiled and h.overviews > 0,
+                "latitude known": bool(latitude_known[i]),
+            }
+        )
+    return rows
+
+
+# Function to combine per-file recommendations into one zoom range for a mosaic of the rasters
+def combined_zooms(rows):
+    if not rows:
+        return None
+    return min(row["min zoom"] for row in rows), max(row["max zoom"] for row in rows)
+
+
+# Function to build the gdal2tiles command (plus gdalbuildvrt for several rasters) for a zoom range
+def gdal2tiles_commands(paths, min_zoom, max_zoom, output_dir="tiles", processes=None, resampling="average", xyz=True):
+    commands = []
+    if len(paths) == 1:
+        source = paths[0]
+    else:
+        source = "mosaic.vrt"
+        commands.append(["gdalbuildvrt", source, *paths])
+    argv = ["gdal2tiles.py", f"--zoom={min_zoom}-{max_zoom}", f"--resampling={resampling}"]
+    if xyz:
+        argv.append("--xyz")
+    if processes:
+        argv.append(f"--processes={processes}")
+    argv += [source, output_dir]
+    commands.append(argv)
+    return commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend web map zoom levels for GeoTIFFs from their headers")
+    parser.add_argument("paths", nargs="+", help="GeoTIFF files, directories or glob patterns")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    args = parser.parse_args()
+
+    headers = read_headers(find_rasters(args.paths))
+    for header in headers:
+        if header.error or not header.georeferenced:
+            print(f"{header.path}: skipped ({header.error or 'no georeferencing'})")
+    rows = recommend_zooms(headers, args.tile_size)
+    for row in rows:
+        print(
+            f"{row['path']}: {row['width']}x{row['height']} {row['crs'] or 'unknown CRS'}, "
+            f"{row['resolution (m)']} m/px -> zoom {row['min zoom']}-{row['max zoom']} (exact {row['exact zoom']})"
+        )
+    zooms = combined_zooms(rows)
+    if zooms:
+        print(f"all {len(rows)} rasters: zoom {zooms[0]}-{zooms[1]}")
+
+
+if __name__ == "__main__":
+    main()
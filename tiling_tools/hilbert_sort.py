@@ -0,0 +1,280 @@
+"""Out-of-core Hilbert sort of input features, so tippecanoe reads them in spatial order.
+
+tippecanoe sorts features by tile as it reads them. When the input is
+spatially random, every temp-file chunk touches the whole extent and the
+sort has more to do. Sorting the input along a Hilbert curve first makes
+neighbouring features neighbours in the file.
+
+Line-delimited GeoJSON and CSV are split into byte ranges at line boundaries,
+and each range is read by its own worker process. A worker keys every line by
+the Hilbert position of its bounding box centre and writes sorted runs of at
+most memory / workers bytes. The runs are then merged into the output, with
+the original lines copied unchanged. A GeoJSON FeatureCollection is converted
+to line-delimited GeoJSON first (tiling_tools.ndjson). FlatGeobuf is rewritten
+by tiling_tools.to_flatgeobuf, which sorts the same way and adds an index.
+Features without a geometry go at the end, in input order. CSV rows are
+split at newlines, so quoted values can't contain line breaks.
+
+    python -m tiling_tools.hilbert_sort input.geojsonl [output.geojsonl] [--memory 256] [--workers 4]
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from tiling_tools import compressed, ndjson, readers, to_flatgeobuf
+from tiling_tools.tiles import hilbert_keys, lonlat_to_world
+
+SORTED_SUFFIX = ".hilbert"
+SORTABLE_FORMATS = ("geojson", "geojsonseq", "csv", "flatgeobuf")
+
+MEMORY_BYTES = 256 << 20
+BATCH_SIZE = 65536
+MIN_RANGE = 1 << 22
+
+# Key for features without a geometry: after every Hilbert position
+NO_GEOMETRY_KEY = np.iinfo(np.int64).max
+
+# Run record: Hilbert key, byte offset in the input (keeps ties in input order) and line length
+RECORD = struct.Struct("<qqI")
+# Bytes per buffered line on top of the line itself, for the Python objects holding it
+LINE_OVERHEAD = 120
+
+
+@dataclass
+class SortStats:
+    input_path: str
+    output_path: str
+    features: int
+    runs: int
+    workers: int
+    bytes_in: int
+    bytes_out: int
+    peak_temp_bytes: int
+    seconds: float
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_in / self.seconds if self.seconds else 0.0
+
+
+# Function to name the sorted copy of an input; FeatureCollections come out line-delimited
+def sorted_path(path, output_dir=None):
+    stem, extension = os.path.splitext(os.path.basename(path))
+    input_format = readers.detect_format(path) if os.path.isfile(path) else None
+    if input_format in ("geojson", "geojsonseq"):
+        extension = ndjson.CONVERTED_EXTENSION
+    return os.path.join(output_dir or os.path.dirname(path), stem + SORTED_SUFFIX + extension)
+
+
+# Function to check whether a sorted copy exists and is newer than its source
+def is_sorted(path, output_dir=None):
+    target = sorted_path(path, output_dir)
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path)
+
+
+# Function to check if an input is in a format that can be sorted
+def is_sortable(path):
+    # Sorting splits the input into byte ranges, which a compressed file doesn't have
+    if compressed.is_compressed(path):
+        return False
+    return os.path.isfile(path) and readers.detect_format(path) in SORTABLE_FORMATS
+
+
+def _geojson_keys(lines):
+    geometries = []
+    for line in lines:
+        try:
+            feature = json.loads(line.lstrip(b"\x1e"))
+            geometries.append(feature.get("geometry") if isinstance(feature, dict) else None)
+        except ValueError:
+            geometries.append(None)
+    keys = np.full(len(lines), NO_GEOMETRY_KEY, dtype=np.int64)
+    located = [i for i, geometry in enumerate(geometries) if readers.geometry_parts(geometry)]
+    if located:
+        min_x, min_y, max_x, max_y = readers.geometry_bboxes([geometries[i] for i in located])
+        keys[located] = hilbert_keys(*lonlat_to_world((min_x + max_x) / 2.0, (min_y + max_y) / 2.0))
+    return keys
+
+
+def _csv_keys(lines, lon_index, lat_index):
+    lon = np.full(len(lines), np.nan)
+    lat = np.full(len(lines), np.nan)
+    for i, row in enumerate(csv.reader(line.decode("utf-8") for line in lines)):
+        try:
+            lon[i] = float(row[lon_index])
+            lat[i] = float(row[lat_index])
+        except (ValueError, IndexError):
+            pass
+    keys = np.full(len(lines), NO_GEOMETRY_KEY, dtype=np.int64)
+    located = ~np.isnan(lon) & ~np.isnan(lat)
+    if located.any():
+        keys[located] = hilbert_keys(*lonlat_to_world(lon[located], lat[located]))
+    return keys
+
+
+def _write_run(path, records):
+    with open(path, "wb") as f:
+        for key, offset, line in sorted(records, key=lambda record: (record[0], record[1])):
+            f.write(RECORD.pack(key, offset, len(line)) + line)
+
+
+def _key_lines(pending, csv_columns):
+    texts = [line for _, line in pending]
+    keys = _csv_keys(texts, *csv_columns) if csv_columns else _geojson_keys(texts)
+    return list(zip(keys.tolist(), (offset for offset, _ in pending), texts))
+
+
+# Function run in each worker: sorts the lines starting inside [start, end) into runs; returns (run paths, lines)
+def sort_range(path, start, end, run_prefix, memory_bytes, csv_columns=None):
+    runs = []
+    records, pending, size, lines = [], [], 0, 0
+    with open(path, "rb") as f:
+        # A line belongs to the range its first byte is in
+        if start:
+            f.seek(start - 1)
+            f.readline()
+        offset = f.tell()
+        while offset < end:
+            line = f.readline()
+            if not line:
+                break
+            stripped = line.rstrip(b"\r\n")
+            if stripped.strip():
+                pending.append((offset, stripped + b"\n"))
+                size += len(stripped) + LINE_OVERHEAD
+                lines += 1
+            offset += len(line)
+            if len(pending) >= BATCH_SIZE or size >= memory_bytes:
+                records += _key_lines(pending, csv_columns)
+                pending = []
+            if size >= memory_bytes:
+                runs.append(f"{run_prefix}.{len(runs)}")
+                _write_run(runs[-1], records)
+                records, size = [], 0
+    records += _key_lines(pending, csv_columns)
+    if records:
+        runs.append(f"{run_prefix}.{len(runs)}")
+        _write_run(runs[-1], records)
+    return runs, lines
+
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            key, offset, size = RECORD.unpack(head)
+            yield key, offset, f.read(size)
+
+
+def _csv_header(path):
+    with open(path, "rb") as f:
+        header = f.readline()
+    lat_index, lon_index = readers.csv_coordinate_columns(next(csv.reader([header.decode("utf-8")])), path)
+    return header, (lon_index, lat_index)
+
+
+def _line_sort(path, output_path, memory_bytes, workers, workdir, input_format):
+    header, csv_columns = b"", None
+    if input_format == "csv":
+        header, csv_columns = _csv_header(path)
+    first = len(header)
+    size = os.path.getsize(path)
+    ranges = max(1, min(workers, (size - first) // MIN_RANGE))
+    step = -(-(size - first) // ranges)
+    bounds = [(first + i * step, min(size, first + (i + 1) * step)) for i in range(ranges)]
+    prefix = os.path.join(workdir, "run")
+
+    with ProcessPoolExecutor(max_workers=ranges) as pool:
+        futures = [
+            pool.submit(sort_range, path, start, end, f"{prefix}{i}", memory_bytes // ranges, csv_columns)
+            for i, (start, end) in enumerate(bounds)
+        ]
+        results = [future.result() for future in futures]
+    runs = [run for run_paths, _ in results for run in run_paths]
+    temp_bytes = sum(os.path.getsize(run) for run in runs)
+
+    partial = output_path + ".partial"
+    with open(partial, "wb") as out:
+        out.write(header.rstrip(b"\r\n") + b"\n" if header else b"")
+        for _, _, line in heapq.merge(*(_read_run(run) for run in runs)):
+            out.write(line)
+    os.replace(partial, output_path)
+    return sum(lines for _, lines in results), len(runs), ranges, temp_bytes
+
+
+# Function to Hilbert-sort the features of any supported input into a new file
+def sort_input(path, output_path=None, memory_bytes=MEMORY_BYTES, workers=None, workdir=None):
+    started = time.perf_counter()
+    output_path = output_path or sorted_path(path)
+    workers = workers or os.cpu_count() or 1
+    input_format = readers.detect_format(path)
+    if input_format not in SORTABLE_FORMATS:
+        raise ValueError(f"Can't sort {input_format} input {path}")
+
+    with tempfile.TemporaryDirectory(dir=workdir or os.path.dirname(os.path.abspath(output_path))) as tmp:
+        if input_format == "flatgeobuf":
+            stats = to_flatgeobuf.convert(path, output_path, memory_bytes, workdir=tmp)
+            features, runs, used_workers = stats.features, stats.runs, 1
+            temp_bytes = stats.bytes_out
+        else:
+            source, temp_bytes = path, 0
+            if input_format == "geojson":
+                source = os.path.join(tmp, "features" + ndjson.CONVERTED_EXTENSION)
+                temp_bytes = ndjson.convert(path, source, workers=workers).bytes_out
+            features, runs, used_workers, run_bytes = _line_sort(
+                source, output_path, memory_bytes, workers, tmp, "csv" if input_format == "csv" else "geojsonseq"
+            )
+            temp_bytes += run_bytes
+
+    return SortStats(
+        input_path=path,
+        output_path=output_path,
+        features=features,
+        runs=runs,
+        workers=used_workers,
+        bytes_in=os.path.getsize(path),
+        bytes_out=os.path.getsize(output_path),
+        peak_temp_bytes=temp_bytes,
+        seconds=time.perf_counter() - started,
+    )
+
+
+# Function to describe a sort in one line
+def describe_stats(stats):
+    return (
+        f"{stats.output_path}: {stats.features} features in {stats.seconds:.1f}s "
+        f"({stats.bytes_per_second / 1e6:.1f} MB/s sorted, {stats.runs} runs from {stats.workers} "
+        f"worker{'s' if stats.workers != 1 else ''}, {stats.peak_temp_bytes / 1e6:.0f} MB temp)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hilbert-sort input features so tippecanoe reads them in spatial order")
+    parser.add_argument("input")
+    parser.add_argument("output", nargs="?")
+    parser.add_argument("--memory", type=int, default=MEMORY_BYTES >> 20, help="MB of lines held in memory across workers")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--workdir", default=None, help="Directory for the sorted runs (default: next to the output)")
+    args = parser.parse_args()
+    try:
+        stats = sort_input(args.input, args.output, args.memory << 20, args.workers, args.workdir)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Couldn't sort {args.input}: {e}")
+    print(describe_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
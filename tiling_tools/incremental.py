@@ -0,0 +1,546 @@
+"""Incremental tippecanoe rebuilds: regenerate only the tiles touched by changed features.
+
+Next to the MBTiles output, a snapshot keeps every input feature's key (its id,
+an id property, or failing those its content hash), a content hash and its
+bounding box. An update snapshots the new inputs, diffs the two in SQLite and
+works out the tiles the added, removed and changed features touch at each zoom,
+widened by the -b buffer as tippecanoe clips them.
+
+Those tiles are rebuilt in two tippecanoe runs: zooms from a split zoom up come
+from an extract of just the features touching the affected tiles at the split
+zoom (which covers every higher zoom too), and the zooms below it, whose tiles
+cover large areas, from the full input but only up to the split. The split is
+chosen to minimise features read plus features tiled per zoom across both runs,
+and when even the best split wouldn't save a fifth of a full rebuild, the whole
+tileset is rebuilt instead. -B is pinned to the original max zoom so point
+dropping follows the same rate per zoom, and the rebuilt tiles replace the
+affected ones in the existing MBTiles in one transaction.
+
+Below the base zoom, tippecanoe thins points (-r) by their place in the whole
+input, so one added point can change which are kept in tiles far from it. When
+the inputs hold points and the drop rate is above 1, the split is kept at or
+above the base zoom and every tile of the zooms below it is replaced from the
+full input's run.
+
+Tiles match a full rebuild wherever each tile depends only on the features that
+touch it. Options that look at the whole input (-zg, -as/-ad guessing rates)
+can make the extract's tiles differ slightly; --verify builds the full tileset
+as well and compares every tile.
+
+    python -m tiling_tools.incremental [--id-property id] [--verify] -- tippecanoe -z14 -o out.mbtiles in.geojson
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from tiling_tools import argv, mbtiles, readers, runner
+from tiling_tools.sharding import MANAGED_OPTIONS
+from tiling_tools.tiles import flip_y, geometry_world_bbox, world_to_lonlat
+
+SNAPSHOT_SUFFIX = ".features.sqlite"
+BATCH_SIZE = 50000
+
+# An update is only worth it if its estimated cost is at most this fraction of a full rebuild's
+MAX_COST_FRACTION = 0.8
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE features (
+    layer integer, key text, hash blob, min_x real, min_y real, max_x real, max_y real, point integer
+);
+"""
+
+
+@dataclass
+class UpdateResult:
+    mode: str = "incremental"  # "full", "unchanged" or "incremental"
+    features: int = 0
+    added: int = 0
+    removed: int = 0
+    changed: int = 0
+    split_zoom: int = None
+    extract_features: int = 0
+    affected_tiles: dict = field(default_factory=dict)  # Zoom -> number of tiles rebuilt
+    tiles_written: int = 0
+    tiles_emptied: int = 0  # Affected tiles left with no features
+    build_seconds: float = 0.0
+    seconds: float = 0.0
+
+
+# Function to hash a feature's geometry, properties and id
+def feature_hash(feature):
+    content = {key: feature.get(key) for key in ("id", "geometry", "properties")}
+    data = json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+# Function to key a feature for diffing: its id, then the id property, then its content hash
+def feature_key(feature, id_property=None, digest=None):
+    if feature.get("id") is not None:
+        return str(feature["id"])
+    properties = feature.get("properties") or {}
+    if id_property and properties.get(id_property) is not None:
+        return str(properties[id_property])
+    return (digest or feature_hash(feature)).hex()
+
+
+def _iter_boxes(path):
+    # Features without a geometry are skipped, as tippecanoe skips them
+    for feature in readers.iter_features(path):
+        parts = readers.geometry_parts(feature.get("geometry"))
+        if parts:
+            yield feature, geometry_world_bbox(parts)
+
+
+def _is_point(feature):
+    return feature["geometry"].get("type") in ("Point", "MultiPoint")
+
+
+# Function to write the key, hash and bounding box of every input feature to a snapshot file
+def write_snapshot(inputs, path, id_property=None):
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(SNAPSHOT_SCHEMA)
+        count = 0
+        for index, (_, input_path) in enumerate(inputs):
+            rows = []
+            for feature, bbox in _iter_boxes(input_path):
+                digest = feature_hash(feature)
+                rows.append((index, feature_key(feature, id_property, digest), digest, *bbox, _is_point(feature)))
+                if len(rows) >= BATCH_SIZE:
+                    connection.executemany("INSERT INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    count += len(rows)
+                    rows = []
+            connection.executemany("INSERT INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            count += len(rows)
+        connection.execute("CREATE INDEX features_key ON features (layer, key, hash)")
+        connection.commit()
+    finally:
+        connection.close()
+    return count
+
+
+_CHANGED = """
+SELECT a.layer, a.key, a.min_x, a.min_y, a.max_x, a.max_y FROM {a}.features a
+WHERE NOT EXISTS (SELECT 1 FROM {b}.features b WHERE b.layer = a.layer AND b.key = a.key AND b.hash = a.hash)
+"""
+
+
+# Function to diff two snapshots; returns (bounding boxes of every changed feature, added, removed, changed)
+def diff_snapshots(old_path, new_path):
+    connection = sqlite3.connect(new_path)
+    try:
+        connection.execute("ATTACH DATABASE ? AS old", (old_path,))
+        old_rows = connection.execute(_CHANGED.format(a="old", b="main")).fetchall()
+        new_rows = connection.execute(_CHANGED.format(a="main", b="old")).fetchall()
+    finally:
+        connection.close()
+    old_keys = {row[:2] for row in old_rows}
+    new_keys = {row[:2] for row in new_rows}
+    # A changed feature's old and new boxes both count: it leaves some tiles and enters others
+    boxes = np.array([row[2:] for row in old_rows + new_rows], dtype=np.float64).reshape(-1, 4)
+    return boxes, len(new_keys - old_keys), len(old_keys - new_keys), len(old_keys & new_keys)
+
+
+def _ranges(boxes, z, buffer_size):
+    n = 1 << z
+    margin = buffer_size / 256.0 / n
+    lo = np.clip(np.floor((boxes[:, :2] - margin) * n), 0, n - 1).astype(np.int64)
+    hi = np.clip(np.floor((boxes[:, 2:] + margin) * n), 0, n - 1).astype(np.int64)
+    return lo[:, 0], lo[:, 1], hi[:, 0], hi[:, 1]
+
+
+# Function to find the tiles at each zoom that changed boxes touch, buffer included
+def affected_tiles(boxes, min_zoom, max_zoom, buffer_size=5):
+    affected = {}
+    for z in range(min_zoom, max_zoom + 1):
+        tiles = set()
+        for x0, y0, x1, y1 in zip(*(values.tolist() for values in _ranges(boxes, z, buffer_size))):
+            tiles.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+        affected[z] = tiles
+    return affected
+
+
+# Function to flag the features whose buffered boxes touch any of the given tiles at a zoom
+def features_touching(boxes, tiles, z, buffer_size=5):
+    x0, y0, x1, y1 = _ranges(boxes, z, buffer_size)
+    n = 1 << z
+    mask = np.zeros(len(boxes), dtype=bool)
+    if not tiles:
+        return mask
+    single = (x0 == x1) & (y0 == y1)
+    codes = np.array([x * n + y for x, y in tiles], dtype=np.int64)
+    mask[single] = np.isin(x0[single] * n + y0[single], codes)
+    # Features over several tiles: walk whichever is shorter, their tiles or the affected ones
+    for i in np.flatnonzero(~single).tolist():
+        if (x1[i] - x0[i] + 1) * (y1[i] - y0[i] + 1) <= len(tiles):
+            mask[i] = any((x, y) in tiles for x in range(x0[i], x1[i] + 1) for y in range(y0[i], y1[i] + 1))
+        else:
+            mask[i] = any(x0[i] <= x <= x1[i] and y0[i] <= y <= y1[i] for x, y in tiles)
+    return mask
+
+
+# Function to load the layer index and bounding box of every feature in a snapshot, in input order
+def snapshot_boxes(path):
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute("SELECT layer, min_x, min_y, max_x, max_y FROM features ORDER BY rowid").fetchall()
+    finally:
+        connection.close()
+    table = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    return table[:, 0].astype(np.int64), table[:, 1:]
+
+
+# Function to check whether a snapshot holds any points
+def has_points(path):
+    connection = sqlite3.connect(path)
+    try:
+        return bool(connection.execute("SELECT EXISTS (SELECT 1 FROM features WHERE point)").fetchone()[0])
+    finally:
+        connection.close()
+
+
+# Function to find the zoom below which tippecanoe thins points across the whole input; None if it can't be known
+def thinning_zoom(options, max_zoom):
+    drop_rate = argv.option_value(options, "-r", "--drop-rate", default="2.5")
+    if drop_rate != "g" and float(drop_rate) <= 1:
+        return 0
+    base_zoom = argv.option_value(options, "-B", "--base-zoom", default=str(max_zoom))
+    # A guessed base zoom depends on the whole input, and an extract would guess another
+    return int(base_zoom) if base_zoom.isdigit() else None
+
+
+# Function to estimate a run's cost: tippecanoe reads its features once and tiles them once per zoom
+def run_cost(features, zooms):
+    return features * (1 + zooms) if features and zooms else 0
+
+
+# Function to pick the split zoom, at lowest_split or above, with the lowest estimated cost;
+# returns (cost, zoom, extract mask), or None if no zoom is allowed
+def choose_split_zoom(boxes, affected, min_zoom, max_zoom, buffer_size=5, lowest_split=None):
+    best = None
+    for z in range(max(min_zoom, lowest_split or 0), max_zoom + 1):
+        mask = features_touching(boxes, affected[z], z, buffer_size)
+        cost = run_cost(len(boxes), z - min_zoom) + run_cost(int(mask.sum()), max_zoom - z + 1)
+        if best is None or cost < best[0]:
+            best = (cost, z, mask)
+    return best
+
+
+# Function to write the flagged features of each input to GeoJSONSeq files; returns (layer, path) inputs
+def write_extracts(inputs, layers, mask, workdir):
+    extracts = []
+    for index, (layer, path) in enumerate(inputs):
+        keep = mask[layers == index]
+        if not keep.any():
+            continue
+        output = os.path.join(workdir, f"extract_{index}.geojsonl")
+        with open(output, "w", encoding="utf-8") as f:
+            for i, (feature, _) in enumerate(_iter_boxes(path)):
+                if keep[i]:
+                    f.write(json.dumps(feature, separators=(",", ":")) + "\n")
+        extracts.append((argv.layer_name(layer, path), output))
+    return extracts
+
+
+def _partial_args(options, inputs, output, min_zoom, max_zoom, base_zoom):
+    base = argv.join_options(argv.without_options(options, *MANAGED_OPTIONS))
+    if argv.option_value(options, "-B", "--base-zoom") is None:
+        base.append(f"-B{base_zoom}")
+    return [*base, "-f", "-o", output, f"-Z{min_zoom}", f"-z{max_zoom}", *argv.input_args(inputs)]
+
+
+def _full_args(options, inputs):
+    return [*argv.join_options(argv.without_options(options, "-f", "--force")), "-f", *argv.input_args(inputs)]
+
+
+def _build(tippecanoe, args):
+    record = runner.run([*tippecanoe, *args])
+    if record.returncode != 0:
+        raise RuntimeError("tippecanoe failed:\n" + "\n".join(record.stderr_tail[-20:]))
+    return record.seconds
+
+
+# Function to list the tiles an MBTiles file holds at a zoom, as (x, y) pairs
+def zoom_tiles(path, z):
+    connection = mbtiles.connect(path)
+    try:
+        rows = connection.execute("SELECT tile_column, tile_row FROM tiles WHERE zoom_level = ?", (z,)).fetchall()
+    finally:
+        connection.close()
+    return {(x, flip_y(z, row)) for x, row in rows}
+
+
+# Function to replace the affected tiles of an MBTiles file with those of partial builds, in one transaction
+def splice(output, parts, affected):
+    connection = mbtiles.connect(output, readonly=False)
+    connection.isolation_level = None
+    where = "zoom_level = ? AND tile_column = ? AND tile_row = ?"
+    written = emptied = 0
+    try:
+        deduplicated = mbtiles.tiles_is_view(connection)
+        table, column = ("map", "tile_id") if deduplicated else ("tiles", "1")
+        for index, (path, _) in enumerate(parts):
+            if path is not None:
+                connection.execute(f"ATTACH DATABASE ? AS part{index}", (path,))
+        connection.execute("BEGIN")
+        for index, (path, zooms) in enumerate(parts):
+            for z in zooms:
+                keys = [(z, x, flip_y(z, y)) for x, y in sorted(affected[z])]
+                existing = {}
+                for key in keys:
+                    row = connection.execute(f"SELECT {column} FROM {table} WHERE {where}", key).fetchone()
+                    if row is not None:
+                        existing[key] = row[0]
+                connection.executemany(f"DELETE FROM {table} WHERE {where}", list(existing))
+                rows = []
+                if path is not None:
+                    query = f"SELECT zoom_level, tile_column, tile_row, tile_data FROM part{index}.tiles WHERE {where}"
+                    rows = [row for key in keys for row in connection.execute(query, key)]
+                if deduplicated:
+                    tile_ids = [hashlib.md5(row[3]).hexdigest() for row in rows]
+                    connection.executemany(
+                        "INSERT INTO images (tile_data, tile_id) SELECT ?, ? "
+                        "WHERE NOT EXISTS (SELECT 1 FROM images WHERE tile_id = ?)",
+                        [(row[3], tile_id, tile_id) for row, tile_id in zip(rows, tile_ids)],
+                    )
+                    connection.executemany(
+                        "INSERT INTO map VALUES (?, ?, ?, ?)", [(*row[:3], tile_id) for row, tile_id in zip(rows, tile_ids)]
+                    )
+                    # Images only the replaced tiles used are no longer needed
+                    connection.executemany(
+                        "DELETE FROM images WHERE tile_id = ? AND NOT EXISTS (SELECT 1 FROM map WHERE tile_id = ?)",
+                        [(tile_id, tile_id) for tile_id in set(existing.values())],
+                    )
+                else:
+                    connection.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", rows)
+                written += len(rows)
+                emptied += len(set(existing) - {tuple(row[:3]) for row in rows})
+        connection.execute("COMMIT")
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+    return written, emptied
+
+
+def _update_bounds(output, snapshot):
+    connection = sqlite3.connect(snapshot)
+    try:
+        bounds = connection.execute("SELECT MIN(min_x), MIN(min_y), MAX(max_x), MAX(max_y) FROM features").fetchone()
+    finally:
+        connection.close()
+    if bounds[0] is None:
+        return
+    west, north = world_to_lonlat(bounds[0], bounds[1])
+    east, south = world_to_lonlat(bounds[2], bounds[3])
+    connection = mbtiles.connect(output, readonly=False)
+    try:
+        connection.execute(
+            "UPDATE metadata SET value = ? WHERE name = 'bounds'", (f"{west:.6f},{south:.6f},{east:.6f},{north:.6f}",)
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+# Function to bring an MBTiles output up to date with its inputs, rebuilding only the changed tiles
+def update(
+    args,
+    id_property=None,
+    workdir=None,
+    tippecanoe=("tippecanoe",),
+    full=False,
+):
+    started = time.perf_counter()
+    options, inputs = argv.split_args(args)
+    output = argv.option_value(options, "-o", "--output")
+    if not output or not output.endswith(".mbtiles"):
+        raise ValueError("Incremental builds need an MBTiles output (-o out.mbtiles)")
+    max_zoom = argv.option_value(options, "-z", "--maximum-zoom")
+    if max_zoom is None or not max_zoom.isdigit():
+        raise ValueError("Incremental builds need an explicit maximum zoom (-z), not -zg")
+    max_zoom = int(max_zoom)
+    min_zoom = int(argv.option_value(options, "-Z", "--minimum-zoom", default="0"))
+    buffer_size = float(argv.option_value(options, "-b", "--buffer", default="5"))
+
+    result = UpdateResult()
+    snapshot = output + SNAPSHOT_SUFFIX
+    new_snapshot = snapshot + ".new"
+    try:
+        result.features = write_snapshot(inputs, new_snapshot, id_property)
+        if full or not os.path.exists(output) or not os.path.exists(snapshot):
+            result.mode = "full"
+            result.build_seconds = _build(tippecanoe, _full_args(options, inputs))
+            os.replace(new_snapshot, snapshot)
+            result.seconds = time.perf_counter() - started
+            return result
+
+        boxes, result.added, result.removed, result.changed = diff_snapshots(snapshot, new_snapshot)
+        if not len(boxes):
+            result.mode = "unchanged"
+            os.replace(new_snapshot, snapshot)
+            result.seconds = time.perf_counter() - started
+            return result
+
+        affected = affected_tiles(boxes, min_zoom, max_zoom, buffer_size)
+        result.affected_tiles = {z: len(tiles) for z, tiles in affected.items()}
+        layers, feature_boxes = snapshot_boxes(new_snapshot)
+        thinned_below = min_zoom
+        if has_points(new_snapshot):
+            thinned_below = thinning_zoom(options, max_zoom)
+            # With a guessed base zoom any zoom may be thinned differently, so only a full rebuild matches one
+            if thinned_below is None:
+                thinned_below = max_zoom + 1
+        best = choose_split_zoom(feature_boxes, affected, min_zoom, max_zoom, buffer_size, thinned_below)
+        if best is not None:
+            cost, result.split_zoom, mask = best
+            result.extract_features = int(mask.sum())
+        if best is None or cost > MAX_COST_FRACTION * run_cost(len(feature_boxes), max_zoom - min_zoom + 1):
+            result.mode = "full"
+            result.build_seconds = _build(tippecanoe, _full_args(options, inputs))
+            os.replace(new_snapshot, snapshot)
+            result.seconds = time.perf_counter() - started
+            return result
+
+        own_workdir = workdir is None
+        workdir = workdir or tempfile.mkdtemp(prefix="tippecanoe_incremental_")
+        os.makedirs(workdir, exist_ok=True)
+        try:
+            split = result.split_zoom
+            parts = []
+            extracts = write_extracts(inputs, layers, mask, workdir)
+            high = os.path.join(workdir, "high.mbtiles")
+            if extracts:
+                result.build_seconds += _build(
+                    tippecanoe, _partial_args(options, extracts, high, split, max_zoom, max_zoom)
+                )
+            # With nothing left to extract, the affected tiles are simply deleted
+            parts.append((high if extracts else None, range(split, max_zoom + 1)))
+            if split > min_zoom:
+                low = os.path.join(workdir, "low.mbtiles")
+                result.build_seconds += _build(
+                    tippecanoe, _partial_args(options, inputs, low, min_zoom, split - 1, max_zoom)
+                )
+                parts.append((low, range(min_zoom, split)))
+                # Points thinned across the whole input may have changed anywhere at these zooms
+                for z in range(min_zoom, min(split, thinned_below)):
+                    affected[z] = zoom_tiles(output, z) | zoom_tiles(low, z)
+                    result.affected_tiles[z] = len(affected[z])
+            result.tiles_written, result.tiles_emptied = splice(output, parts, affected)
+            _update_bounds(output, new_snapshot)
+            os.replace(new_snapshot, snapshot)
+        finally:
+            if own_workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+        result.seconds = time.perf_counter() - started
+        return result
+    finally:
+        # A failed update keeps the old snapshot and doesn't leave the new one behind
+        if os.path.exists(new_snapshot):
+            os.remove(new_snapshot)
+
+
+# Function to compare two MBTiles files tile by tile; returns rows of same/different/missing counts per zoom
+def compare_tilesets(path_a, path_b):
+    connection = mbtiles.connect(path_a)
+    try:
+        connection.execute("ATTACH DATABASE ? AS b", (mbtiles.readonly_uri(path_b),))
+        counts = {}
+        for z, same, different in connection.execute(
+            "SELECT a.zoom_level, SUM(a.tile_data = b.tile_data), SUM(a.tile_data != b.tile_data) "
+            "FROM main.tiles a JOIN b.tiles b USING (zoom_level, tile_column, tile_row) GROUP BY a.zoom_level"
+        ):
+            counts.setdefault(z, {}).update(same=same, different=different)
+        for name, first, second in (("only in first", "main", "b"), ("only in second", "b", "main")):
+            for z, missing in connection.execute(
+                f"SELECT x.zoom_level, COUNT(*) FROM {first}.tiles x LEFT JOIN {second}.tiles y "
+                "USING (zoom_level, tile_column, tile_row) WHERE y.tile_data IS NULL GROUP BY x.zoom_level"
+            ):
+                counts.setdefault(z, {})[name] = missing
+    finally:
+        connection.close()
+    columns = ("same", "different", "only in first", "only in second")
+    return [{"zoom": z, **{column: counts[z].get(column, 0) for column in columns}} for z in sorted(counts)]
+
+
+# Function to build the full tileset next to an incremental output and compare every tile
+def verify(args, tippecanoe=("tippecanoe",)):
+    options, inputs = argv.split_args(args)
+    output = argv.option_value(options, "-o", "--output")
+    with tempfile.TemporaryDirectory(prefix="tippecanoe_verify_") as workdir:
+        full_output = os.path.join(workdir, "full.mbtiles")
+        options = argv.without_options(options, "-o", "--output") + [["-o", full_output]]
+        _build(tippecanoe, _full_args(options, inputs))
+        return compare_tilesets(output, full_output)
+
+
+# Function to summarise an update in one line
+def describe_result(result):
+    if result.mode == "full":
+        reason = ""
+        if result.split_zoom is not None:
+            reason = f" (cheaper than updating {sum(result.affected_tiles.values()):,} affected tiles)"
+        return f"full build of {result.features:,} features{reason} in {result.seconds:.1f}s; snapshot saved"
+    if result.mode == "unchanged":
+        return f"no feature changes among {result.features:,} features ({result.seconds:.1f}s)"
+    return (
+        f"{result.added:,} added, {result.removed:,} removed, {result.changed:,} changed; "
+        f"{sum(result.affected_tiles.values()):,} tiles affected, zooms {result.split_zoom}+ rebuilt from "
+        f"{result.extract_features:,} of {result.features:,} features; {result.tiles_written:,} tiles written, "
+        f"{result.tiles_emptied:,} emptied, in {result.seconds:.1f}s ({result.build_seconds:.1f}s in tippecanoe)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Update a tippecanoe MBTiles output, rebuilding only the tiles touched by changed features",
+        usage="%(prog)s [options] -- tippecanoe <tippecanoe arguments>",
+    )
+    parser.add_argument("--id-property", help="Property that identifies features without a GeoJSON id")
+    parser.add_argument("--full", action="store_true", help="Rebuild everything and save a fresh snapshot")
+    parser.add_argument("--verify", action="store_true", help="Also build the full tileset and compare every tile")
+    parser.add_argument("--workdir", default=None, help="Keep the extracts and partial builds here")
+    parser.add_argument("--fake", action="store_true", help="Use the fake tippecanoe stand-in")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    command = [arg for arg in args.command if arg != "--"]
+    if command and os.path.basename(command[0]) == "tippecanoe":
+        command = command[1:]
+    if not command:
+        parser.error("no command given")
+    tippecanoe = ("tippecanoe",)
+    if args.fake:
+        from tiling_tools import fake_tippecanoe
+
+        tippecanoe = tuple(fake_tippecanoe.TIPPECANOE)
+
+    try:
+        result = update(command, args.id_property, args.workdir, tippecanoe, args.full)
+    except (ValueError, RuntimeError) as e:
+        sys.exit(str(e))
+    print(describe_result(result))
+    if args.verify:
+        rows = verify(command, tippecanoe)
+        for row in rows:
+            print(" ".join(f"{name} {value}" for name, value in row.items()))
+        if any(row["different"] or row["only in first"] or row["only in second"] for row in rows):
+            sys.exit("the incremental output differs from a full rebuild")
+        print("identical to a full rebuild")
+
+
+if __name__ == "__main__":
+    main()
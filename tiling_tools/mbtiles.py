@@ -0,0 +1,79 @@
+"""Small helpers for reading and writing MBTiles (SQLite) tilesets."""
+
+import json
+import pathlib
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name text, value text);
+CREATE UNIQUE INDEX IF NOT EXISTS name ON metadata (name);
+CREATE TABLE IF NOT EXISTS tiles (zoom_level integer, tile_column integer, tile_row integer, tile_data blob);
+CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row);
+"""
+
+# Tiles stored once per distinct image, with a "tiles" view over the zoom/column/row map
+DEDUPLICATED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name text, value text);
+CREATE UNIQUE INDEX IF NOT EXISTS name ON metadata (name);
+CREATE TABLE IF NOT EXISTS map (zoom_level integer, tile_column integer, tile_row integer, tile_id text);
+CREATE UNIQUE INDEX IF NOT EXISTS map_index ON map (zoom_level, tile_column, tile_row);
+CREATE TABLE IF NOT EXISTS images (tile_data blob, tile_id text);
+CREATE UNIQUE INDEX IF NOT EXISTS images_id ON images (tile_id);
+CREATE VIEW IF NOT EXISTS tiles AS
+    SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column, map.tile_row AS tile_row,
+           images.tile_data AS tile_data
+    FROM map JOIN images ON images.tile_id = map.tile_id;
+"""
+
+# PMTiles tile compression codes for the codecs a "compression" metadata entry can name; MBTiles readers
+# otherwise assume gzip
+COMPRESSION_CODES = {"none": 1, "gzip": 2, "brotli": 3, "zstd": 4}
+
+
+# Function to make a read-only SQLite URI for a path, quoting characters such as "#", "?" and "%"
+def readonly_uri(path):
+    return pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+
+
+# Function to open an MBTiles file, read-only unless asked otherwise
+def connect(path, readonly=True):
+    if readonly:
+        return sqlite3.connect(readonly_uri(path), uri=True, check_same_thread=False)
+    return sqlite3.connect(path)
+
+
+# Function to create an empty MBTiles file with the plain tiles table, or the map/images pair
+def create(path, deduplicated=False):
+    connection = sqlite3.connect(path)
+    connection.executescript(DEDUPLICATED_SCHEMA if deduplicated else SCHEMA)
+    return connection
+
+
+# Function to write metadata entries, storing dicts and lists as JSON
+def write_metadata(connection, metadata):
+    connection.executemany(
+        "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+        [(name, json.dumps(value) if isinstance(value, (dict, list)) else str(value)) for name, value in metadata.items()],
+    )
+
+
+# Function to read the metadata table into a dict, expanding the "json" entry
+def read_metadata(connection):
+    metadata = dict(connection.execute("SELECT name, value FROM metadata").fetchall())
+    if "json" in metadata:
+        try:
+            metadata["json"] = json.loads(metadata["json"])
+        except ValueError:
+            pass
+    return metadata
+
+
+# Function to check whether "tiles" is the deduplicated map/images view rather than a table
+def tiles_is_view(connection):
+    row = connection.execute("SELECT type FROM sqlite_master WHERE name = 'tiles'").fetchone()
+    return row is not None and row[0] == "view"
+
+
+# Function to read the tile compression the metadata declares, as a PMTiles code, or None when it doesn't say
+def tile_compression(metadata):
+    return COMPRESSION_CODES.get(str(metadata.get("compression", "")).lower())
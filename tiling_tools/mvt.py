@@ -0,0 +1,89 @@
+"""Minimal Mapbox Vector Tile (protobuf) reading: enough to count layers and features."""
+
+import gzip
+import zlib
+
+# Protobuf wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+# Field numbers from the vector tile spec
+TILE_LAYERS = 3
+LAYER_NAME = 1
+LAYER_FEATURES = 2
+
+
+# Function to read a protobuf varint, returning (value, next position)
+def read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+# Function to iterate over (field number, wire type, value) in a protobuf message
+# Length-delimited values are returned as memoryview slices, without copying
+def iter_fields(buf):
+    view = memoryview(buf)
+    pos = 0
+    end = len(view)
+    while pos < end:
+        key, pos = read_varint(view, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == VARINT:
+            value, pos = read_varint(view, pos)
+        elif wire_type == LENGTH_DELIMITED:
+            length, pos = read_varint(view, pos)
+            value = view[pos : pos + length]
+            pos += length
+        elif wire_type == FIXED64:
+            value = view[pos : pos + 8]
+            pos += 8
+        elif wire_type == FIXED32:
+            value = view[pos : pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield number, wire_type, value
+
+
+# Function to undo the gzip or zlib compression tippecanoe applies to tiles
+def decompress(data):
+    data = bytes(data)
+    if data[:2] == b"\x1f\x8b":
+        return gzip.decompress(data)
+    if data[:1] == b"\x78":
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            pass
+    return data
+
+
+# Function to count the features in each layer of a vector tile
+def layer_feature_counts(data):
+    counts = {}
+    for number, wire_type, layer in iter_fields(decompress(data)):
+        if number != TILE_LAYERS or wire_type != LENGTH_DELIMITED:
+            continue
+        name = ""
+        features = 0
+        for field_number, _, value in iter_fields(layer):
+            if field_number == LAYER_NAME:
+                name = bytes(value).decode("utf-8")
+            elif field_number == LAYER_FEATURES:
+                features += 1
+        counts[name] = counts.get(name, 0) + features
+    return counts
+
+
+# Function to count all features in a vector tile
+def count_features(data):
+    return sum(layer_feature_counts(data).values())
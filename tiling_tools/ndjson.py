@@ -0,0 +1,254 @@
+"""Parallel GeoJSON FeatureCollection to line-delimited GeoJSON conversion."""
+
+import argparse
+import codecs
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+BLOCK_SIZE = 1 << 22
+WHITESPACE = b" \t\r\n"
+CONVERTED_EXTENSION = ".geojsonl"
+
+_FEATURES_KEY = re.compile(rb'"features"\s*:\s*\[')
+
+
+@dataclass
+class ConversionStats:
+    input_path: str
+    output_path: str
+    features: int
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+    workers: int
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_in / self.seconds if self.seconds else 0.0
+
+
+# Function to name the line-delimited copy of a GeoJSON file
+def converted_path(path, output_dir=None):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir or os.path.dirname(path), stem + CONVERTED_EXTENSION)
+
+
+# Function to check whether a converted copy exists and is newer than its source
+def is_converted(path, output_dir=None):
+    target = converted_path(path, output_dir)
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path)
+
+
+# Function to find the byte offset just inside the "features" array
+def find_features_start(path):
+    with open(path, "rb") as f:
+        buf = b""
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                return None
+            buf += block
+            match = _FEATURES_KEY.search(buf)
+            if match:
+                return match.end()
+            # Keep a tail in case the key straddles two blocks
+            buf = buf[-64:]
+
+
+class _Reader:
+    # Incrementally decodes a byte range of the file, keeping byte offsets in step
+
+    def __init__(self, f, start):
+        f.seek(start)
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0  # Position in self.text
+        self.offset = start  # File byte offset of self.text[self.pos]
+        self.eof = False
+
+    def fill(self):
+        block = self.f.read(BLOCK_SIZE)
+        self.eof = not block
+        self.text = self.text[self.pos :] + self.decoder.decode(block, final=self.eof)
+        self.pos = 0
+
+    def skip_separators(self):
+        # Skips whitespace and commas; all ASCII so chars and bytes advance together
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in " \t\r\n,":
+                self.pos += 1
+                self.offset += 1
+            if self.pos < len(self.text) or self.eof:
+                return
+            self.fill()
+
+    def peek(self):
+        self.skip_separators()
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def decode_feature(self, decoder):
+        # Returns (obj, raw utf-8 bytes) for the JSON value at the current position
+        while True:
+            try:
+                obj, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            raw = self.text[self.pos : end].encode("utf-8")
+            self.pos = end
+            self.offset += len(raw)
+            return obj, raw
+
+
+def _is_feature_start(f, candidate, decoder):
+    # A feature starts at a "{" preceded by "[" or "," that decodes to a Feature followed by "," or "]"
+    f.seek(max(0, candidate - 256))
+    before = f.read(candidate - max(0, candidate - 256)).rstrip(WHITESPACE)
+    if not before or before[-1:] not in (b",", b"["):
+        return False
+    reader = _Reader(f, candidate)
+    reader.fill()
+    try:
+        obj, _ = reader.decode_feature(decoder)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return False
+    if not isinstance(obj, dict) or obj.get("type") != "Feature":
+        return False
+    while reader.pos < len(reader.text) and reader.text[reader.pos] in " \t\r\n":
+        reader.pos += 1
+        if reader.pos >= len(reader.text) and not reader.eof:
+            reader.fill()
+    return reader.pos < len(reader.text) and reader.text[reader.pos] in ",]"
+
+
+def _find_feature_start(f, start, end, decoder):
+    f.seek(start)
+    position = start
+    while position < end:
+        block = f.read(min(BLOCK_SIZE, end - position))
+        if not block:
+            return None
+        index = block.find(b"{")
+        while index != -1:
+            candidate = position + index
+            if _is_feature_start(f, candidate, decoder):
+                return candidate
+            index = block.find(b"{", index + 1)
+        position += len(block)
+        f.seek(position)
+    return None
+
+
+# Function run in each worker: converts the features that start inside [start, end)
+def convert_range(path, start, end, part_path, known_boundary=False):
+    decoder = json.JSONDecoder()
+    features = 0
+    with open(path, "rb") as f, open(part_path, "wb") as out:
+        first = start if known_boundary else _find_feature_start(f, start, end, decoder)
+        if first is None:
+            return {"first": None, "next": None, "features": 0, "bytes_out": 0}
+        reader = _Reader(f, first)
+        reader.fill()
+        while True:
+            char = reader.peek()
+            if char != "{" or reader.offset >= end:
+                break
+            _, raw = reader.decode_feature(decoder)
+            # Raw newlines can only be whitespace in JSON, so they are safe to flatten
+            out.write(raw.replace(b"\n", b" ").replace(b"\r", b" "))
+            out.write(b"\n")
+            features += 1
+        next_start = reader.offset if char == "{" else None
+        return {"first": first, "next": next_start, "features": features, "bytes_out": out.tell()}
+
+
+# Function to convert a FeatureCollection into line-delimited GeoJSON using several processes
+def convert(path, output_path=None, workers=None, min_chunk=BLOCK_SIZE):
+    started = time.perf_counter()
+    output_path = output_path or converted_path(path)
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    features_start = find_features_start(path)
+    if features_start is None:
+        raise ValueError(f"{path} is not a GeoJSON FeatureCollection")
+
+    chunks = max(1, min(workers, (size - features_start) // min_chunk))
+    step = (size - features_start + chunks - 1) // chunks
+    bounds = [
+        (features_start + i * step, min(size, features_start + (i + 1) * step)) for i in range(chunks)
+    ]
+    part_paths = [f"{output_path}.part{i}" for i in range(chunks)]
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, chunks)) as pool:
+            futures = [
+                pool.submit(convert_range, path, start, end, part, i == 0)
+                for i, ((start, end), part) in enumerate(zip(bounds, part_paths))
+            ]
+            results = [future.result() for future in futures]
+
+        # Each range's guessed first feature must be where the previous range stopped;
+        # if the boundary guess was wrong, redo that range from the true boundary
+        expected = features_start
+        for i, (start, end) in enumerate(bounds):
+            if expected is None:
+                results[i] = {"first": None, "next": None, "features": 0, "bytes_out": 0}
+                open(part_paths[i], "wb").close()
+                continue
+            if results[i]["first"] != expected and expected < end:
+                results[i] = convert_range(path, expected, end, part_paths[i], known_boundary=True)
+            elif expected >= end:
+                # The previous range already covered this one
+                results[i] = {"first": None, "next": expected, "features": 0, "bytes_out": 0}
+                open(part_paths[i], "wb").close()
+            expected = results[i]["next"]
+
+        partial = output_path + ".partial"
+        with open(partial, "wb") as out:
+            for part in part_paths:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out, BLOCK_SIZE)
+                os.remove(part)
+        os.replace(partial, output_path)
+    finally:
+        # A failed conversion doesn't leave its parts behind
+        for part in part_paths:
+            if os.path.exists(part):
+                os.remove(part)
+
+    return ConversionStats(
+        input_path=path,
+        output_path=output_path,
+        features=sum(result["features"] for result in results),
+        bytes_in=size,
+        bytes_out=sum(result["bytes_out"] for result in results),
+        seconds=time.perf_counter() - started,
+        workers=min(workers, chunks),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a GeoJSON FeatureCollection to line-delimited GeoJSON for tippecanoe -P"
+    )
+    parser.add_argument("input")
+    parser.add_argument("output", nargs="?")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    stats = convert(args.input, args.output, workers=args.workers)
+    print(
+        f"Wrote {stats.features} features to {stats.output_path} "
+        f"in {stats.seconds:.2f}s ({stats.bytes_per_second / 1e6:.1f} MB/s, {stats.workers} workers)"
+    )
+
+
+if __name__ == "__main__":
+    main()
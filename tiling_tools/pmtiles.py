@@ -0,0 +1,408 @@
+"""Memory-mapped PMTiles v3 reader.
+
+The archive is mapped rather than read, and tiles come back as memoryview
+slices of the map. Only the root directory is decoded on open; leaf directories
+are decoded on first use and kept in a small cache, so a lookup touches a few
+kilobytes even in multi-GB archives. Directories are decoded into NumPy arrays
+with a vectorized varint decoder.
+
+    python -m tiling_tools.pmtiles archive.pmtiles [z/x/y ...]
+"""
+
+import argparse
+import gzip
+import json
+import mmap
+import struct
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from tiling_tools.tiles import hilbert_index
+
+MAGIC = b"PMTiles"
+VERSION = 3
+HEADER_SIZE = 127
+
+COMPRESSIONS = {0: "unknown", 1: "none", 2: "gzip", 3: "brotli", 4: "zstd"}
+TILE_TYPES = {0: "unknown", 1: "mvt", 2: "png", 3: "jpeg", 4: "webp", 5: "avif"}
+
+# Decoded leaf directories kept per reader
+LEAF_CACHE_SIZE = 64
+
+MAX_ZOOM = 31
+
+# First tile id of each zoom: zoom z starts after the 4^0 + ... + 4^(z-1) tiles above it
+ZOOM_STARTS = np.array([((1 << (2 * z)) - 1) // 3 for z in range(MAX_ZOOM + 2)], dtype=np.uint64)
+
+_HEADER = struct.Struct("<7sBQQQQQQQQQQQBBBBBBiiiiBii")
+
+
+@dataclass
+class Header:
+    version: int
+    root_offset: int
+    root_length: int
+    metadata_offset: int
+    metadata_length: int
+    leaf_directory_offset: int
+    leaf_directory_length: int
+    tile_data_offset: int
+    tile_data_length: int
+    addressed_tiles_count: int
+    tile_entries_count: int
+    tile_contents_count: int
+    clustered: bool
+    internal_compression: int
+    tile_compression: int
+    tile_type: int
+    min_zoom: int
+    max_zoom: int
+    min_lon_e7: int
+    min_lat_e7: int
+    max_lon_e7: int
+    max_lat_e7: int
+    center_zoom: int
+    center_lon_e7: int
+    center_lat_e7: int
+
+    @property
+    def bounds(self):
+        return (self.min_lon_e7 / 1e7, self.min_lat_e7 / 1e7, self.max_lon_e7 / 1e7, self.max_lat_e7 / 1e7)
+
+    @property
+    def center(self):
+        return (self.center_lon_e7 / 1e7, self.center_lat_e7 / 1e7, self.center_zoom)
+
+
+@dataclass
+class Directory:
+    tile_ids: np.ndarray
+    run_lengths: np.ndarray  # 0 marks a pointer to a leaf directory
+    offsets: np.ndarray
+    lengths: np.ndarray
+
+    def __len__(self):
+        return len(self.tile_ids)
+
+
+# Function to parse the fixed 127-byte header
+def parse_header(buf):
+    if len(buf) < HEADER_SIZE:
+        raise ValueError("File is too short to be a PMTiles archive")
+    values = _HEADER.unpack_from(buf, 0)
+    if values[0] != MAGIC:
+        raise ValueError("Not a PMTiles archive (bad magic)")
+    if values[1] != VERSION:
+        raise ValueError(f"Only PMTiles version {VERSION} is supported, not {values[1]}")
+    header = Header(*values[1:])
+    header.clustered = bool(header.clustered)
+    return header
+
+
+# Function to compute the PMTiles tile id of z/x/y (position along the Hilbert curve, zooms in order)
+def tile_id(z, x, y):
+    if z > MAX_ZOOM:
+        raise ValueError(f"Zoom {z} is beyond the PMTiles limit of {MAX_ZOOM}")
+    if not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        raise ValueError(f"Tile {z}/{x}/{y} is outside the zoom {z} grid")
+    return int(ZOOM_STARTS[z]) + hilbert_index(z, x, y)
+
+
+# Function to find the zoom of each tile id
+def tile_id_zooms(tile_ids):
+    return np.searchsorted(ZOOM_STARTS, np.asarray(tile_ids, dtype=np.uint64), side="right") - 1
+
+
+# Function to undo the internal or tile compression named in the header
+def decompress(data, compression):
+    if compression in (0, 1):
+        return data
+    if compression == 2:
+        return gzip.decompress(data)
+    if compression == 3:
+        try:
+            import brotli
+        except ImportError:
+            raise ImportError("This archive uses brotli compression; pip install brotli to read it")
+        return brotli.decompress(bytes(data))
+    if compression == 4:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("This archive uses zstd compression; pip install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(bytes(data))
+    raise ValueError(f"Unknown compression {compression}")
+
+
+# Function to decode a run of protobuf-style varints in one vectorized pass
+def decode_varints(buf, count=None):
+    data = np.frombuffer(buf, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    if count is not None:
+        if len(ends) < count:
+            raise ValueError("Truncated varint data")
+        ends = ends[:count]
+    if not len(ends):
+        return np.empty(0, dtype=np.uint64)
+    data = data[: ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Byte k of a varint holds bits 7k..7k+6
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    if position.max(initial=0) > 9:
+        raise ValueError("Varint is longer than 64 bits")
+    parts = (data & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+# Function to encode unsigned integers as protobuf-style varints in one vectorized pass
+def encode_varints(values):
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * k))
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for k in range(int(sizes.max(initial=0))):
+        has_byte = sizes > k
+        byte = (values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = sizes[has_byte] > k + 1
+        out[starts[has_byte] + k] = (byte | (more.astype(np.uint64) << np.uint64(7))).astype(np.uint8)
+    return out.tobytes()
+
+
+# Function to decode a (decompressed) directory into arrays
+def decode_directory(buf):
+    data = memoryview(buf)
+    count = int(decode_varints(data[:10], 1)[0])
+    values = decode_varints(data[len(encode_varints([count])) :], 4 * count)
+    tile_ids = np.cumsum(values[:count], dtype=np.uint64)
+    run_lengths = values[count : 2 * count]
+    lengths = values[2 * count : 3 * count]
+    raw_offsets = values[3 * count :].astype(np.int64)
+
+    # An offset of 0 means "right after the previous entry"; anything else is offset + 1
+    lengths_signed = lengths.astype(np.int64)
+    explicit = raw_offsets != 0
+    if count:
+        explicit[0] = True
+    segment = np.cumsum(explicit) - 1
+    segment_starts = np.flatnonzero(explicit)
+    preceding = np.concatenate(([0], np.cumsum(lengths_signed)[:-1]))
+    offsets = (raw_offsets[segment_starts] - 1)[segment] + preceding - preceding[segment_starts][segment]
+    return Directory(tile_ids, run_lengths, offsets.astype(np.uint64), lengths)
+
+
+# Function to encode directory entries (uncompressed), the inverse of decode_directory
+def encode_directory(tile_ids, run_lengths, lengths, offsets):
+    tile_ids = np.asarray(tile_ids, dtype=np.uint64)
+    lengths = np.asarray(lengths, dtype=np.uint64)
+    offsets = np.asarray(offsets, dtype=np.uint64)
+    deltas = np.diff(tile_ids, prepend=np.uint64(0))
+    raw_offsets = offsets + np.uint64(1)
+    if len(offsets) > 1:
+        follows = offsets[1:] == offsets[:-1] + lengths[:-1]
+        raw_offsets[1:][follows] = 0
+    return encode_varints([len(tile_ids)]) + encode_varints(
+        np.concatenate([deltas, np.asarray(run_lengths, dtype=np.uint64), lengths, raw_offsets])
+    )
+
+
+# Function to pack a Header back into its 127 bytes
+def pack_header(header):
+    return _HEADER.pack(MAGIC, *(int(getattr(header, f.name)) for f in fields(Header)))
+
+
+# Function to find the entry covering a tile id: (index, is_leaf) or None
+def find_entry(directory, tile):
+    index = int(directory.tile_ids.searchsorted(np.uint64(tile), "right")) - 1
+    if index < 0:
+        return None
+    run_length = directory.run_lengths.item(index)
+    if run_length == 0:
+        return index, True
+    if tile - directory.tile_ids.item(index) < run_length:
+        return index, False
+    return None
+
+
+class PMTilesReader:
+    def __init__(self, path, leaf_cache_size=LEAF_CACHE_SIZE):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty")
+        self.buf = memoryview(self._map)
+        self.header = parse_header(self.buf)
+        self.root = self._read_directory(self.header.root_offset, self.header.root_length)
+        self._leaves = OrderedDict()
+        self.leaf_cache_size = leaf_cache_size
+        self.leaves_decoded = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.root = None
+        self._leaves.clear()
+        self.buf.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # Tiles handed out as memoryviews still hold the map; it closes when they go
+        self._file.close()
+
+    def _read_directory(self, offset, length):
+        data = decompress(self.buf[offset : offset + length], self.header.internal_compression)
+        return decode_directory(data)
+
+    # Function to fetch a leaf directory, decoding it on first use
+    def leaf(self, offset, length):
+        key = (offset, length)
+        directory = self._leaves.get(key)
+        if directory is not None:
+            self._leaves.move_to_end(key)
+            return directory
+        directory = self._read_directory(self.header.leaf_directory_offset + offset, length)
+        self.leaves_decoded += 1
+        self._leaves[key] = directory
+        if len(self._leaves) > self.leaf_cache_size:
+            self._leaves.popitem(last=False)
+        return directory
+
+    @property
+    def metadata(self):
+        start = self.header.metadata_offset
+        data = decompress(self.buf[start : start + self.header.metadata_length], self.header.internal_compression)
+        return json.loads(bytes(data) or b"{}")
+
+    # Function to locate a tile's bytes as (offset, length) relative to the tile data section
+    def locate(self, z, x, y):
+        tile = tile_id(z, x, y)
+        directory = self.root
+        for _ in range(4):  # The spec allows at most three levels of leaves
+            found = find_entry(directory, tile)
+            if found is None:
+                return None
+            index, is_leaf = found
+            offset, length = directory.offsets.item(index), directory.lengths.item(index)
+            if not is_leaf:
+                return offset, length
+            directory = self.leaf(offset, length)
+        raise ValueError("Directory nesting is deeper than the spec allows")
+
+    # Function to return a tile as a memoryview of the mapped file (still compressed), or None
+    def get_tile(self, z, x, y):
+        location = self.locate(z, x, y)
+        if location is None:
+            return None
+        start = self.header.tile_data_offset + location[0]
+        return self.buf[start : start + location[1]]
+
+    # Function to return a tile with its tile compression undone
+    def get_tile_data(self, z, x, y):
+        data = self.get_tile(z, x, y)
+        return None if data is None else decompress(data, self.header.tile_compression)
+
+    # Function to walk every directory, root first, then each leaf
+    def iter_directories(self):
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            leaf = directory.run_lengths == 0
+            for offset, length in zip(directory.offsets[leaf].tolist(), directory.lengths[leaf].tolist()):
+                # Walked leaves bypass the cache so a full scan doesn't evict the hot ones
+                pending.append(self._read_directory(self.header.leaf_directory_offset + offset, length))
+            yield directory
+
+
+# Function to summarise run-lengths, deduplication and bytes per zoom across all directories
+def archive_stats(reader):
+    entries = 0
+    addressed = 0
+    runs = 0
+    leaves = 0
+    offsets = []
+    zoom_tiles = np.zeros(MAX_ZOOM + 1, dtype=np.int64)
+    zoom_bytes = np.zeros(MAX_ZOOM + 1, dtype=np.int64)
+    for directory in reader.iter_directories():
+        tiles = directory.run_lengths > 0
+        leaves += int((~tiles).sum())
+        run_lengths = directory.run_lengths[tiles].astype(np.int64)
+        lengths = directory.lengths[tiles].astype(np.int64)
+        entries += len(run_lengths)
+        addressed += int(run_lengths.sum())
+        runs += int((run_lengths > 1).sum())
+        offsets.append(directory.offsets[tiles])
+        # A run can cross into the next zoom; it is counted at the zoom where it starts
+        zooms = tile_id_zooms(directory.tile_ids[tiles])
+        zoom_tiles += np.bincount(zooms, weights=run_lengths, minlength=MAX_ZOOM + 1).astype(np.int64)
+        zoom_bytes += np.bincount(zooms, weights=run_lengths * lengths, minlength=MAX_ZOOM + 1).astype(np.int64)
+    unique = len(np.unique(np.concatenate(offsets))) if offsets else 0
+    header = reader.header
+    return {
+        "addressed_tiles": addressed,
+        "tile_entries": entries,
+        "tile_contents": unique,
+        "run_length_entries": runs,
+        "leaf_directories": leaves,
+        "dedup_ratio": round(addressed / unique, 3) if unique else None,
+        "tile_data_bytes": header.tile_data_length,
+        "directory_bytes": header.root_length + header.leaf_directory_length,
+        "zooms": {
+            z: {"tiles": int(zoom_tiles[z]), "bytes": int(zoom_bytes[z])}
+            for z in np.flatnonzero(zoom_tiles).tolist()
+        },
+    }
+
+
+# Function to describe the header as plain values for display
+def describe_header(header):
+    return {
+        "version": header.version,
+        "tile_type": TILE_TYPES.get(header.tile_type, header.tile_type),
+        "tile_compression": COMPRESSIONS.get(header.tile_compression, header.tile_compression),
+        "internal_compression": COMPRESSIONS.get(header.internal_compression, header.internal_compression),
+        "clustered": header.clustered,
+        "min_zoom": header.min_zoom,
+        "max_zoom": header.max_zoom,
+        "bounds": header.bounds,
+        "center": header.center,
+        "addressed_tiles_count": header.addressed_tiles_count,
+        "tile_entries_count": header.tile_entries_count,
+        "tile_contents_count": header.tile_contents_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a PMTiles v3 archive")
+    parser.add_argument("path", help="PMTiles file")
+    parser.add_argument("tiles", nargs="*", help="z/x/y tiles to look up")
+    parser.add_argument("--stats", action="store_true", help="Walk every directory for dedup and per-zoom totals")
+    args = parser.parse_args()
+
+    with PMTilesReader(args.path) as reader:
+        json.dump(describe_header(reader.header), sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        for tile in args.tiles:
+            z, x, y = (int(part) for part in tile.split("/"))
+            location = reader.locate(z, x, y)
+            if location is None:
+                print(f"{tile}: missing")
+            else:
+                print(f"{tile}: {location[1]} bytes at tile data offset {location[0]}")
+        if args.stats:
+            json.dump(archive_stats(reader), sys.stdout, indent=2)
+            sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Bounded-memory input profiler used to suggest zoom, detail and drop rate."""
+
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from tiling_tools import readers
+from tiling_tools.tiles import lonlat_to_world
+
+BATCH_SIZE = 65536
+SAMPLE_SIZE = 100000
+EARTH_CIRCUMFERENCE = 40075016.686
+
+# Spacing histogram in log2 of normalized Web Mercator units (1.0 == the whole world)
+LOG_BINS = np.arange(-48.0, 0.25, 0.25)
+
+# Features per tile that tippecanoe handles comfortably when guessing a drop rate
+TARGET_TILE_FEATURES = 50000
+
+# tippecanoe's -zg goes a factor of 8 (three zooms) beyond just distinguishing features
+DISTINGUISH_ZOOMS = 3
+
+MAX_ZOOM_LIMIT = 22
+DEFAULT_DETAIL = 12
+MAX_DETAIL = 30
+DEFAULT_DROP_RATE = 2.5
+
+
+@dataclass
+class InputProfile:
+    paths: list = field(default_factory=list)
+    feature_count: int = 0
+    geometry_types: Counter = field(default_factory=Counter)
+    vertex_count: int = 0
+    max_feature_vertices: int = 0
+    bbox: list = None
+    spacing_count: int = 0
+    spacing_log_sum: float = 0.0
+    spacing_min: float = float("inf")
+    spacing_hist: np.ndarray = field(default_factory=lambda: np.zeros(len(LOG_BINS) - 1, dtype=np.int64))
+    sample_keys: np.ndarray = field(default_factory=lambda: np.empty(0))
+    sample_x: np.ndarray = field(default_factory=lambda: np.empty(0))
+    sample_y: np.ndarray = field(default_factory=lambda: np.empty(0))
+
+
+class _Batch:
+    def __init__(self):
+        self.lon = []
+        self.lat = []
+        self.part = []  # Part id per vertex; spacing is only measured inside a part
+        self.rep_lon = []  # One representative point per feature
+        self.rep_lat = []
+        self.next_part = 0
+
+    def __len__(self):
+        return len(self.lon)
+
+
+def _update_bbox(profile, lon, lat):
+    bbox = [float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())]
+    if profile.bbox is None:
+        profile.bbox = bbox
+    else:
+        profile.bbox = [
+            min(profile.bbox[0], bbox[0]),
+            min(profile.bbox[1], bbox[1]),
+            max(profile.bbox[2], bbox[2]),
+            max(profile.bbox[3], bbox[3]),
+        ]
+
+
+def _add_spacing(profile, distances):
+    distances = distances[distances > 0]
+    if not len(distances):
+        return
+    logs = np.log2(distances)
+    profile.spacing_count += len(distances)
+    profile.spacing_log_sum += float(logs.sum())
+    profile.spacing_min = min(profile.spacing_min, float(distances.min()))
+    profile.spacing_hist += np.histogram(np.clip(logs, LOG_BINS[0], LOG_BINS[-1] - 1e-9), LOG_BINS)[0]
+
+
+def _merge_sample(profile, keys, x, y):
+    # Bottom-k sampling: keep the points with the smallest random keys
+    keys = np.concatenate([profile.sample_keys, keys])
+    x = np.concatenate([profile.sample_x, x])
+    y = np.concatenate([profile.sample_y, y])
+    if len(keys) > SAMPLE_SIZE:
+        keep = np.argpartition(keys, SAMPLE_SIZE)[:SAMPLE_SIZE]
+        keys, x, y = keys[keep], x[keep], y[keep]
+    profile.sample_keys, profile.sample_x, profile.sample_y = keys, x, y
+
+
+def _flush(profile, batch, rng):
+    if not len(batch) and not batch.rep_lon:
+        return
+    if len(batch):
+        lon = np.asarray(batch.lon, dtype=np.float64)
+        lat = np.asarray(batch.lat, dtype=np.float64)
+        part = np.asarray(batch.part, dtype=np.int64)
+        _update_bbox(profile, lon, lat)
+        x, y = lonlat_to_world(lon, lat)
+        same_part = part[1:] == part[:-1]
+        _add_spacing(profile, np.hypot(np.diff(x), np.diff(y))[same_part])
+    if batch.rep_lon:
+        rx, ry = lonlat_to_world(
+            np.asarray(batch.rep_lon, dtype=np.float64), np.asarray(batch.rep_lat, dtype=np.float64)
+        )
+        _merge_sample(profile, rng.random(len(rx)), rx, ry)
+
+
+# Function to scan one input file in fixed-size batches and build its profile
+def scan_input(path, batch_size=BATCH_SIZE, seed=0):
+    profile = InputProfile(paths=[path])
+    rng = np.random.default_rng(seed)
+    batch = _Batch()
+    for feature in readers.iter_features(path):
+        geometry = feature.get("geometry")
+        if not geometry:
+            continue
+        profile.feature_count += 1
+        profile.geometry_types[geometry.get("type", "Unknown")] += 1
+        parts = readers.geometry_parts(geometry)
+        if not parts:
+            continue
+        batch.rep_lon.append(parts[0][0][0])
+        batch.rep_lat.append(parts[0][0][1])
+        vertices = 0
+        for part in parts:
+            batch.lon.extend(coordinate[0] for coordinate in part)
+            batch.lat.extend(coordinate[1] for coordinate in part)
+            batch.part.extend([batch.next_part] * len(part))
+            batch.next_part += 1
+            vertices += len(part)
+        profile.vertex_count += vertices
+        profile.max_feature_vertices = max(profile.max_feature_vertices, vertices)
+        if len(batch) >= batch_size:
+            _flush(profile, batch, rng)
+            batch = _Batch()
+    _flush(profile, batch, rng)
+    return profile
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Function to profile an input, reusing the result while its path, mtime and size are unchanged
+def profile_input(path):
+    key = readers.file_key(path)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    profile = scan_input(path)
+    with _cache_lock:
+        for stale in [k for k in _cache if k[0] == key[0]]:
+            del _cache[stale]
+        _cache[key] = profile
+    return profile
+
+
+# Function to combine per-file profiles into one
+def merge_profiles(profiles):
+    merged = InputProfile()
+    for profile in profiles:
+        merged.paths.extend(profile.paths)
+        merged.feature_count += profile.feature_count
+        merged.geometry_types.update(profile.geometry_types)
+        merged.vertex_count += profile.vertex_count
+        merged.max_feature_vertices = max(merged.max_feature_vertices, profile.max_feature_vertices)
+        if profile.bbox is not None:
+            _update_bbox(merged, np.array(profile.bbox[0::2]), np.array(profile.bbox[1::2]))
+        merged.spacing_count += profile.spacing_count
+        merged.spacing_log_sum += profile.spacing_log_sum
+        merged.spacing_min = min(merged.spacing_min, profile.spacing_min)
+        merged.spacing_hist += profile.spacing_hist
+        _merge_sample(merged, profile.sample_keys, profile.sample_x, profile.sample_y)
+    return merged
+
+
+def _spacing_percentile(profile, q):
+    if not profile.spacing_count:
+        return None
+    cumulative = np.cumsum(profile.spacing_hist)
+    index = int(np.searchsorted(cumulative, q / 100.0 * cumulative[-1]))
+    return float(2.0 ** LOG_BINS[min(index + 1, len(LOG_BINS) - 1)])
+
+
+def _morton(x, y, bits=16):
+    scale = float(1 << bits)
+    ix = (x * scale).astype(np.uint64)
+    iy = (y * scale).astype(np.uint64)
+    code = np.zeros(len(x), dtype=np.uint64)
+    for bit in range(bits):
+        code |= ((ix >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+        code |= ((iy >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+    return code
+
+
+# Function to estimate the typical distance between neighbouring features
+def feature_spacing(profile):
+    n = len(profile.sample_x)
+    if n < 2 or profile.feature_count < 2:
+        return None
+    # Like tippecanoe, measure the gaps between features in spatial index order
+    order = np.argsort(_morton(profile.sample_x, profile.sample_y))
+    gaps = np.hypot(np.diff(profile.sample_x[order]), np.diff(profile.sample_y[order]))
+    gaps = gaps[gaps > 0]
+    if not len(gaps):
+        return None
+    # A sample of n features is sqrt(N / n) times sparser than the full data
+    return float(np.exp(np.log(gaps).mean()) * np.sqrt(n / profile.feature_count))
+
+
+def _zoom_for_spacing(spacing, detail):
+    # One tile pixel at zoom z and detail d is 2^-(z + d) of the world
+    return int(np.ceil(-np.log2(spacing) - detail))
+
+
+def _densest_tile(profile, zoom):
+    n = len(profile.sample_x)
+    tiles = (1 << zoom)
+    x = (profile.sample_x * tiles).astype(np.int64)
+    y = (profile.sample_y * tiles).astype(np.int64)
+    counts = np.unique(x * tiles + y, return_counts=True)[1]
+    return float(counts.max()) * profile.feature_count / n
+
+
+# Function to turn a profile into suggested -z, -d and -r values
+def suggest_options(profile, target_features=TARGET_TILE_FEATURES):
+    if not profile.feature_count:
+        return {}
+    zooms = []
+    feature_gap = feature_spacing(profile)
+    if feature_gap:
+        zooms.append(_zoom_for_spacing(feature_gap, DEFAULT_DETAIL) + DISTINGUISH_ZOOMS)
+    if profile.spacing_count:
+        vertex_gap = float(2.0 ** (profile.spacing_log_sum / profile.spacing_count))
+        zooms.append(_zoom_for_spacing(vertex_gap, DEFAULT_DETAIL))
+    if not zooms:
+        return {"max_zoom": 0, "full_detail": DEFAULT_DETAIL, "drop_rate": DEFAULT_DROP_RATE}
+
+    needed = max(zooms)
+    max_zoom = int(np.clip(needed, 0, MAX_ZOOM_LIMIT))
+    # Past the zoom limit, extra precision has to come from a finer tile grid
+    full_detail = int(min(MAX_DETAIL, DEFAULT_DETAIL + max(0, needed - MAX_ZOOM_LIMIT)))
+
+    drop_rate = 1.0
+    for zoom in range(max_zoom):
+        densest = _densest_tile(profile, zoom)
+        if densest > target_features:
+            drop_rate = max(drop_rate, (densest / target_features) ** (1.0 / (max_zoom - zoom)))
+    return {
+        "max_zoom": max_zoom,
+        "full_detail": full_detail,
+        "drop_rate": round(drop_rate, 2),
+    }
+
+
+# Function to summarise a profile as plain values for display
+def describe_profile(profile):
+    spacing = feature_spacing(profile)
+    median = _spacing_percentile(profile, 50)
+    return {
+        "Features": profile.feature_count,
+        "Geometry types": dict(profile.geometry_types),
+        "Vertices": profile.vertex_count,
+        "Max vertices per feature": profile.max_feature_vertices,
+        "Bounding box": profile.bbox,
+        "Feature spacing (m)": None if spacing is None else round(spacing * EARTH_CIRCUMFERENCE, 3),
+        "Median vertex spacing (m)": None if median is None else round(median * EARTH_CIRCUMFERENCE, 3),
+        "Min vertex spacing (m)": None
+        if not profile.spacing_count
+        else round(profile.spacing_min * EARTH_CIRCUMFERENCE, 3),
+    }
@@ -0,0 +1,561 @@
+"""Parallel raster pyramid builder: an in-process alternative to gdal2tiles.
+
+Only the max zoom is cut from the source rasters, in blocks of neighbouring tiles
+spread across a process pool. Every lower zoom is made by 2x2 downsampling the
+tiles below it with NumPy, so the sources are read once. Empty (all nodata)
+tiles are skipped and identical tiles are stored once.
+
+Pixels are read with rasterio (windowed reads) when it is installed. Otherwise
+each raster is decoded once with Pillow into a memory-mapped scratch file that
+the workers read windows from, so the pool shares one copy through the page
+cache instead of decoding a raster per worker. Sources should be 8-bit; other
+data types are clipped to 0-255, like gdal2tiles. Sources in geographic or Web
+Mercator coordinates work as they are; other projections need pyproj.
+
+    python -m tiling_tools.raster_tiles input.tif [more.tif ...] -o tiles.mbtiles
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+
+from tiling_tools import geotiff, mbtiles, to_pmtiles
+from tiling_tools.tiles import flip_y, lonlat_to_world, quadkey_index, tile_range, world_to_lonlat
+
+TILE_SIZE = 256
+
+# Zoom levels each worker task renders below its block tile (4^3 = 64 max-zoom tiles per task)
+BLOCK_LEVELS = 3
+
+TILE_FORMATS = {"png": "PNG", "webp": "WEBP", "jpg": "JPEG"}
+RESAMPLING = ("average", "near")
+
+
+@dataclass
+class PyramidStats:
+    output_path: str
+    tiles: int = 0
+    unique_tiles: int = 0
+    empty_tiles: int = 0
+    tiles_by_zoom: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def tiles_per_second(self):
+        return self.tiles / self.seconds if self.seconds else 0.0
+
+
+@lru_cache(maxsize=16)
+def _transformer(source_epsg, target_epsg):
+    try:
+        from pyproj import Transformer
+    except ImportError:
+        raise ValueError(f"Rasters in EPSG:{source_epsg} need pyproj (pip install pyproj)") from None
+    return Transformer.from_crs(source_epsg, target_epsg, always_xy=True)
+
+
+# Function to convert normalized Web Mercator coordinates to a raster's CRS
+def world_to_crs(epsg, wx, wy):
+    if epsg == 4326:
+        return world_to_lonlat(wx, wy)
+    x = (np.asarray(wx, dtype=np.float64) - 0.5) * geotiff.EARTH_CIRCUMFERENCE
+    y = (0.5 - np.asarray(wy, dtype=np.float64)) * geotiff.EARTH_CIRCUMFERENCE
+    if epsg in geotiff.WEB_MERCATOR_CODES:
+        return x, y
+    return _transformer(3857, epsg).transform(x, y)
+
+
+# Function to convert coordinates in a raster's CRS to normalized Web Mercator
+def crs_to_world(epsg, x, y):
+    if epsg == 4326:
+        return lonlat_to_world(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    if epsg not in geotiff.WEB_MERCATOR_CODES:
+        x, y = _transformer(epsg, 3857).transform(x, y)
+    wx = np.asarray(x, dtype=np.float64) / geotiff.EARTH_CIRCUMFERENCE + 0.5
+    wy = 0.5 - np.asarray(y, dtype=np.float64) / geotiff.EARTH_CIRCUMFERENCE
+    return np.clip(wx, 0.0, 1.0 - 1e-12), np.clip(wy, 0.0, 1.0 - 1e-12)
+
+
+def _has_rasterio():
+    return importlib.util.find_spec("rasterio") is not None
+
+
+# Function to decode a raster with Pillow into a (bands, rows, columns) memory-mapped file; returns
+# (path, dtype, shape) for RasterSource
+def decode_to_file(path, directory):
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = None  # Big rasters are expected here
+    with Image.open(path) as image:
+        pixels = np.asarray(image)
+    pixels = pixels[np.newaxis] if pixels.ndim == 2 else pixels.transpose(2, 0, 1)
+    fd, pixel_path = tempfile.mkstemp(suffix=".pixels", dir=directory)
+    os.close(fd)
+    mapped = np.memmap(pixel_path, dtype=pixels.dtype, mode="w+", shape=pixels.shape)
+    mapped[:] = pixels
+    mapped.flush()
+    del mapped
+    return pixel_path, pixels.dtype.str, pixels.shape
+
+
+class RasterSource:
+    def __init__(self, path, pixel_file=None):
+        self.path = path
+        self.pixel_file = pixel_file
+        self.header = geotiff.read_header(path)
+        if not self.header.georeferenced:
+            raise ValueError(f"{path} has no georeferencing tags")
+        self.epsg = self.header.epsg
+        if self.epsg is None and self.header.model_type == geotiff.MODEL_GEOGRAPHIC:
+            self.epsg = 4326
+        if self.epsg is None:
+            raise ValueError(f"{path} has no EPSG code")
+        gt = self.header.geotransform
+        self.origin = np.array([gt[0], gt[3]])
+        self.inverse = np.linalg.inv(np.array([[gt[1], gt[2]], [gt[4], gt[5]]]))
+        try:
+            self.nodata = float(self.header.nodata) if self.header.nodata is not None else None
+        except ValueError:
+            self.nodata = None
+        # North-up rasters in lon/lat or Web Mercator map tile columns to pixel columns and rows to rows
+        self.separable = gt[2] == 0 and gt[4] == 0 and self.epsg in (4326, *geotiff.WEB_MERCATOR_CODES)
+        self._dataset = None
+        self._pixels = None
+
+    # Function to find the raster's footprint in normalized Web Mercator
+    def world_bbox(self):
+        w, h = self.header.width, self.header.height
+        gt = self.header.geotransform
+        cols = np.array([0, w, 0, w, w / 2, 0, w / 2, w], dtype=np.float64)
+        rows = np.array([0, 0, h, h, 0, h / 2, h, h / 2], dtype=np.float64)
+        x = gt[0] + cols * gt[1] + rows * gt[2]
+        y = gt[3] + cols * gt[4] + rows * gt[5]
+        wx, wy = crs_to_world(self.epsg, x, y)
+        return float(np.min(wx)), float(np.min(wy)), float(np.max(wx)), float(np.max(wy))
+
+    # Function to map normalized Web Mercator points to (column, row) pixel positions
+    def pixel_positions(self, wx, wy):
+        x, y = world_to_crs(self.epsg, wx, wy)
+        dx = np.asarray(x) - self.origin[0]
+        dy = np.asarray(y) - self.origin[1]
+        col = self.inverse[0, 0] * dx + self.inverse[0, 1] * dy
+        row = self.inverse[1, 0] * dx + self.inverse[1, 1] * dy
+        return np.floor(col).astype(np.int64), np.floor(row).astype(np.int64)
+
+    # Function to read a (bands, rows, columns) window of pixels
+    def read(self, col0, row0, col1, row1):
+        if self._dataset is None and self._pixels is None:
+            self._open()
+        if self._dataset is not None:
+            from rasterio.windows import Window
+
+            return self._dataset.read(window=Window(col0, row0, col1 - col0, row1 - row0))
+        return self._pixels[:, row0:row1, col0:col1]
+
+    def _open(self):
+        if _has_rasterio():
+            import rasterio
+
+            self._dataset = rasterio.open(self.path)
+            return
+        if self.pixel_file is not None:
+            pixel_path, dtype, shape = self.pixel_file
+            self._pixels = np.memmap(pixel_path, dtype=dtype, mode="r", shape=shape)
+            return
+        from PIL import Image
+
+        Image.MAX_IMAGE_PIXELS = None  # Big rasters are expected here
+        with Image.open(self.path) as image:
+            pixels = np.asarray(image)
+        self._pixels = pixels[np.newaxis] if pixels.ndim == 2 else pixels.transpose(2, 0, 1)
+
+    def close(self):
+        if self._dataset is not None:
+            self._dataset.close()
+        self._dataset = self._pixels = None
+
+
+# Function to turn sampled (bands, n) values into RGBA pixels, making nodata transparent
+def to_rgba(values, nodata=None):
+    bands = values.shape[0]
+    rgba = np.empty((values.shape[1], 4), dtype=np.uint8)
+    scaled = values if values.dtype == np.uint8 else np.clip(values, 0, 255).astype(np.uint8)
+    if bands < 3:
+        rgba[:, :3] = scaled[0][:, np.newaxis]
+    else:
+        rgba[:, :3] = scaled[:3].T
+    rgba[:, 3] = scaled[1] if bands == 2 else scaled[3] if bands >= 4 else 255
+    if nodata is not None:
+        empty = values[0] == nodata
+        for band in values[1 : min(bands, 3)]:
+            empty &= band == nodata
+        rgba[empty, 3] = 0
+    return rgba
+
+
+def _span(valid):
+    indices = np.flatnonzero(valid)
+    return (int(indices[0]), int(indices[-1]) + 1) if len(indices) else None
+
+
+# Function to render one tile from the sources, nearest neighbour at pixel centres
+def render_tile(sources, z, x, y, tile_size=TILE_SIZE):
+    n = 1 << z
+    centres = (np.arange(tile_size) + 0.5) / tile_size
+    xs, ys = (x + centres) / n, (y + centres) / n
+    tile = np.zeros((tile_size, tile_size, 4), dtype=np.uint8)
+    for source, bbox in sources:
+        if xs[-1] < bbox[0] or xs[0] > bbox[2] or ys[-1] < bbox[1] or ys[0] > bbox[3]:
+            continue
+        width, height = source.header.width, source.header.height
+        if source.separable:
+            col, row = source.pixel_positions(xs, ys)
+            columns = _span((col >= 0) & (col < width))
+            rows = _span((row >= 0) & (row < height))
+            if columns is None or rows is None:
+                continue
+            col, row = col[columns[0] : columns[1]], row[rows[0] : rows[1]]
+            col0, row0 = int(col.min()), int(row.min())
+            window = source.read(col0, row0, int(col.max()) + 1, int(row.max()) + 1)
+            values = window.take(row - row0, axis=1).take(col - col0, axis=2)
+            pixels = to_rgba(values.reshape(len(window), -1), source.nodata).reshape(len(row), len(col), 4)
+            region = tile[rows[0] : rows[1], columns[0] : columns[1]]
+            if region[..., 3].any():
+                fill = region[..., 3] == 0  # Earlier sources win where rasters overlap
+                region[fill] = pixels[fill]
+            else:
+                region[...] = pixels
+            continue
+        wx, wy = np.meshgrid(xs, ys)
+        col, row = source.pixel_positions(wx, wy)
+        inside = (col >= 0) & (col < width) & (row >= 0) & (row < height) & (tile[..., 3] == 0)
+        if not inside.any():
+            continue
+        col, row = col[inside], row[inside]
+        col0, row0 = int(col.min()), int(row.min())
+        window = source.read(col0, row0, int(col.max()) + 1, int(row.max()) + 1)
+        tile[inside] = to_rgba(window[:, row - row0, col - col0], source.nodata)
+    return tile
+
+
+# Function to make a parent tile from up to four children, keyed by (dx, dy)
+def downsample(children, resampling="average", tile_size=TILE_SIZE):
+    canvas = np.zeros((2 * tile_size, 2 * tile_size, 4), dtype=np.uint8)
+    for (dx, dy), child in children.items():
+        if child is not None:
+            canvas[dy * tile_size : (dy + 1) * tile_size, dx * tile_size : (dx + 1) * tile_size] = child
+    if resampling == "near":
+        return np.ascontiguousarray(canvas[::2, ::2])
+    if len(children) == 4 and canvas[..., 3].min() == 255:
+        total = sum(canvas[dy::2, dx::2].astype(np.uint16) for dy in (0, 1) for dx in (0, 1))
+        return ((total + 2) // 4).astype(np.uint8)
+    # Alpha-weighted mean of each 2x2 block, so transparent pixels don't darken the edges
+    quarters = [canvas[dy::2, dx::2].astype(np.uint32) for dy in (0, 1) for dx in (0, 1)]
+    weight = sum(quarter[..., 3] for quarter in quarters)
+    colour = sum(quarter[..., :3] * quarter[..., 3:] for quarter in quarters)
+    tile = np.empty((tile_size, tile_size, 4), dtype=np.uint8)
+    tile[..., :3] = (colour + weight[..., np.newaxis] // 2) // np.maximum(weight, 1)[..., np.newaxis]
+    tile[..., 3] = (weight + 2) // 4
+    return tile
+
+
+# Function to encode a tile, or return None when it is fully transparent
+def encode(tile, tile_format="png", quality=85):
+    from PIL import Image
+
+    alpha = tile[..., 3]
+    if not alpha.any():
+        return None
+    if tile_format == "jpg" or alpha.min() == 255:
+        image = Image.fromarray(np.ascontiguousarray(tile[..., :3]), "RGB")
+    else:
+        image = Image.fromarray(tile, "RGBA")
+    buffer = io.BytesIO()
+    image.save(buffer, TILE_FORMATS[tile_format], quality=quality)
+    return buffer.getvalue()
+
+
+_worker = {}
+
+
+def _init_worker(paths, pixel_files, ranges, max_zoom, tile_format, resampling, tile_size):
+    sources = [RasterSource(path, pixel_file) for path, pixel_file in zip(paths, pixel_files)]
+    _worker.update(
+        sources=[(source, source.world_bbox()) for source in sources],
+        ranges=ranges,
+        max_zoom=max_zoom,
+        tile_format=tile_format,
+        resampling=resampling,
+        tile_size=tile_size,
+    )
+
+
+def _in_range(ranges, z, x, y):
+    x0, y0, x1, y1 = ranges[z]
+    return x0 <= x <= x1 and y0 <= y <= y1
+
+
+# Function run in the workers: render one block's max-zoom tiles and downsample them up to the block tile
+def _render_block(block):
+    w = _worker
+    tiles = []
+    empty = 0
+
+    def build(z, x, y):
+        nonlocal empty
+        if z == w["max_zoom"]:
+            tile = render_tile(w["sources"], z, x, y, w["tile_size"])
+        else:
+            children = {
+                (dx, dy): build(z + 1, 2 * x + dx, 2 * y + dy)
+                for dy in (0, 1)
+                for dx in (0, 1)
+                if _in_range(w["ranges"], z + 1, 2 * x + dx, 2 * y + dy)
+            }
+            if not any(child is not None for child in children.values()):
+                empty += 1
+                return None
+            tile = downsample(children, w["resampling"], w["tile_size"])
+        data = encode(tile, w["tile_format"])
+        if data is None:
+            empty += 1
+            return None
+        tiles.append((z, x, y, data))
+        return tile
+
+    top = build(*block)
+    return block, tiles, top, empty
+
+
+class _MBTilesWriter:
+    def __init__(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self.connection = mbtiles.create(path, deduplicated=True)
+
+    def add(self, z, x, y, data, digest, new):
+        if new:
+            self.connection.execute("INSERT INTO images (tile_data, tile_id) VALUES (?, ?)", (data, digest))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)",
+            (z, x, flip_y(z, y), digest),
+        )
+
+    def finish(self, metadata):
+        mbtiles.write_metadata(self.connection, metadata)
+        self.connection.commit()
+        self.connection.close()
+
+
+class _DirectoryWriter:
+    def __init__(self, path, extension):
+        self.path = path
+        self.extension = extension
+        self.first_copy = {}
+
+    def add(self, z, x, y, data, digest, new):
+        directory = os.path.join(self.path, str(z), str(x))
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, f"{y}.{self.extension}")
+        if os.path.exists(target):
+            os.remove(target)
+        if new:
+            with open(target, "wb") as f:
+                f.write(data)
+            self.first_copy[digest] = target
+            return
+        # Repeated tiles are hard links to the first copy where the filesystem allows it
+        try:
+            os.link(self.first_copy[digest], target)
+        except OSError:
+            shutil.copyfile(self.first_copy[digest], target)
+
+    def finish(self, metadata):
+        with open(os.path.join(self.path, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+
+# Function to work out the default zoom range from the rasters' headers
+def default_zooms(paths):
+    zooms = geotiff.combined_zooms(geotiff.recommend_zooms([geotiff.read_header(path) for path in paths]))
+    if zooms is None:
+        raise ValueError("None of the rasters are georeferenced")
+    return zooms
+
+
+# Function to build a tile pyramid from one or more rasters into .mbtiles, .pmtiles or a directory
+def build(
+    paths,
+    output_path,
+    min_zoom=None,
+    max_zoom=None,
+    tile_format="png",
+    resampling="average",
+    processes=None,
+    tile_size=TILE_SIZE,
+    progress=None,
+):
+    if tile_format not in TILE_FORMATS:
+        raise ValueError(f"Tile format must be one of {', '.join(TILE_FORMATS)}")
+    if resampling not in RESAMPLING:
+        raise ValueError(f"Resampling must be one of {', '.join(RESAMPLING)}")
+    started = time.perf_counter()
+    if min_zoom is None or max_zoom is None:
+        default_min, default_max = default_zooms(paths)
+        min_zoom = default_min if min_zoom is None else min_zoom
+        max_zoom = max(default_max if max_zoom is None else max_zoom, min_zoom)
+
+    boxes = [RasterSource(path).world_bbox() for path in paths]
+    bbox = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+    ranges = {z: tile_range(z, *bbox) for z in range(min_zoom, max_zoom + 1)}
+    block_zoom = max(min_zoom, max_zoom - BLOCK_LEVELS)
+    x0, y0, x1, y1 = ranges[block_zoom]
+    blocks = sorted(
+        ((block_zoom, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)),
+        key=lambda block: quadkey_index(*block),
+    )
+
+    stats = PyramidStats(output_path=output_path)
+    lower = output_path.lower()
+    pmtiles_output = lower.endswith(".pmtiles")
+    if lower.endswith(".mbtiles") or pmtiles_output:
+        target = output_path + ".building.mbtiles" if pmtiles_output else output_path
+        writer = _MBTilesWriter(target)
+    else:
+        writer = _DirectoryWriter(output_path, tile_format)
+    seen = set()
+
+    def write(z, x, y, data):
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        new = digest not in seen
+        seen.add(digest)
+        writer.add(z, x, y, data, digest, new)
+        stats.tiles += 1
+        stats.unique_tiles += new
+        stats.tiles_by_zoom[z] = stats.tiles_by_zoom.get(z, 0) + 1
+
+    # Parents below the block zoom are finished as soon as all their children have arrived;
+    # blocks come back in quadkey order, so only a few tiles per zoom wait here at a time
+    pending = {}
+
+    def finish(z, x, y, tile):
+        if z == min_zoom:
+            return
+        parent = (z - 1, x >> 1, y >> 1)
+        children = pending.setdefault(parent, {})
+        children[(x & 1, y & 1)] = tile
+        expected = sum(
+            _in_range(ranges, z, 2 * parent[1] + dx, 2 * parent[2] + dy) for dy in (0, 1) for dx in (0, 1)
+        )
+        if len(children) < expected:
+            return
+        del pending[parent]
+        merged = None
+        if any(child is not None for child in children.values()):
+            merged = downsample(children, resampling, tile_size)
+            data = encode(merged, tile_format)
+            if data is None:
+                merged = None
+            else:
+                write(*parent, data)
+        if merged is None:
+            stats.empty_tiles += 1
+        finish(*parent, merged)
+
+    processes = processes or os.cpu_count() or 1
+    pixel_files = [None] * len(paths)
+    scratch = None
+    pool = None
+    try:
+        if processes > 1 and not _has_rasterio():
+            # Decoded once here and mapped by every worker, rather than decoded whole in each of them
+            scratch = tempfile.mkdtemp(prefix="raster_tiles_")
+            pixel_files = [decode_to_file(path, scratch) for path in paths]
+        initargs = (list(paths), pixel_files, ranges, max_zoom, tile_format, resampling, tile_size)
+        if processes == 1:
+            _init_worker(*initargs)
+            results = map(_render_block, blocks)
+        else:
+            pool = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=initargs)
+            results = pool.map(_render_block, blocks, chunksize=max(1, min(16, len(blocks) // (4 * processes))))
+        for done, (block, tiles, top, empty) in enumerate(results, 1):
+            for tile in tiles:
+                write(*tile)
+            stats.empty_tiles += empty
+            finish(*block, top)
+            if progress is not None:
+                progress(done, len(blocks))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        else:
+            for source, _ in _worker.get("sources", []):
+                source.close()
+            _worker.clear()
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    west, north = world_to_lonlat(bbox[0], bbox[1])
+    east, south = world_to_lonlat(bbox[2], bbox[3])
+    bounds = [round(float(v), 7) for v in (west, south, east, north)]
+    writer.finish(
+        {
+            "name": os.path.splitext(os.path.basename(paths[0]))[0],
+            "format": tile_format,
+            "type": "overlay",
+            "minzoom": min_zoom,
+            "maxzoom": max_zoom,
+            "bounds": ",".join(str(v) for v in bounds),
+            "center": f"{(bounds[0] + bounds[2]) / 2},{(bounds[1] + bounds[3]) / 2},{min_zoom}",
+        }
+    )
+    if pmtiles_output:
+        to_pmtiles.convert(target, output_path)
+        os.remove(target)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+# Function to summarise a build in one line
+def describe_stats(stats):
+    zooms = ", ".join(f"z{z}: {count:,}" for z, count in sorted(stats.tiles_by_zoom.items()))
+    return (
+        f"{stats.output_path}: {stats.tiles:,} tiles ({stats.unique_tiles:,} unique, {stats.empty_tiles:,} empty "
+        f"skipped) in {stats.seconds:.1f}s, {stats.tiles_per_second:,.0f} tiles/s [{zooms}]"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a raster tile pyramid from GeoTIFFs")
+    parser.add_argument("paths", nargs="+", help="GeoTIFF files, directories or glob patterns")
+    parser.add_argument("-o", "--output", required=True, help="Output .mbtiles, .pmtiles or directory")
+    # -Z and -z as in tippecanoe
+    parser.add_argument("-Z", "--min-zoom", type=int, help="Lowest zoom (default: from the rasters' extent)")
+    parser.add_argument("-z", "--max-zoom", type=int, help="Highest zoom (default: from the rasters' resolution)")
+    parser.add_argument("--format", choices=list(TILE_FORMATS), default="png")
+    parser.add_argument("--resampling", choices=RESAMPLING, default="average")
+    parser.add_argument("--processes", type=int, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    paths = geotiff.find_rasters(args.paths)
+    if not paths:
+        raise SystemExit("No rasters found")
+    stats = build(
+        paths, args.output, args.min_zoom, args.max_zoom, args.format, args.resampling, args.processes
+    )
+    print(describe_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
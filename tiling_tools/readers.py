@@ -0,0 +1,228 @@
+"""Streaming readers for the input formats tippecanoe accepts."""
+
+import csv
+import json
+import os
+import re
+import stat
+
+import numpy as np
+
+from tiling_tools import compressed, flatgeobuf
+
+CHUNK_SIZE = 1 << 22
+
+# Column names tippecanoe recognises as point coordinates in CSV input
+CSV_LAT_COLUMNS = ("latitude", "lat", "y")
+CSV_LON_COLUMNS = ("longitude", "lon", "long", "lng", "x")
+
+GEOJSONSEQ_EXTENSIONS = (".geojsonl", ".geojsons", ".geojsonseq", ".ndjson", ".jsonl")
+
+_FEATURES_KEY = re.compile(r'"features"\s*:\s*\[')
+
+
+# Function to work out which reader to use for an input path; compressed inputs are judged by what's inside
+def detect_format(path):
+    lower = compressed.inner_path(path).lower()
+    if lower.endswith(".fgb"):
+        return "flatgeobuf"
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith(GEOJSONSEQ_EXTENSIONS):
+        return "geojsonseq"
+    # A pipe can only be read once, so it's taken at its name
+    if stat.S_ISFIFO(os.stat(path).st_mode):
+        return "geojson"
+    # A .geojson/.json file may still hold one Feature per line
+    with compressed.open_text(path) as f:
+        first_line = f.readline(CHUNK_SIZE).strip().lstrip("\x1e")
+    try:
+        first = json.loads(first_line)
+    except ValueError:
+        return "geojson"
+    if isinstance(first, dict) and first.get("type") == "Feature":
+        return "geojsonseq"
+    return "geojson"
+
+
+def _as_feature(obj):
+    if not isinstance(obj, dict):
+        return None
+    if obj.get("type") == "Feature":
+        return obj
+    if obj.get("type") in (None, "FeatureCollection"):
+        return None
+    return {"type": "Feature", "geometry": obj, "properties": {}}
+
+
+# Function to stream the features of a GeoJSON FeatureCollection without loading it all
+def iter_geojson_features(path, chunk_size=CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    with compressed.open_text(path) as f:
+        buf = ""
+        eof = False
+        match = None
+        while match is None and not eof:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf += chunk
+            match = _FEATURES_KEY.search(buf)
+
+        if match is None:
+            # Single Feature or bare geometry
+            feature = _as_feature(json.loads(buf)) if buf.strip() else None
+            if feature is not None:
+                yield feature
+            return
+
+        pos = match.end()
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    return
+                buf = buf[pos:] + f.read(chunk_size)
+                eof = len(buf) == 0
+                pos = 0
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            feature = _as_feature(obj)
+            if feature is not None:
+                yield feature
+
+
+# Function to stream line-delimited GeoJSON (one Feature per line, RS prefixes allowed)
+def iter_geojsonseq_features(path):
+    with compressed.open_text(path) as f:
+        for line in f:
+            line = line.strip().lstrip("\x1e")
+            if not line:
+                continue
+            feature = _as_feature(json.loads(line))
+            if feature is not None:
+                yield feature
+
+
+def _csv_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+# Function to find the latitude and longitude columns of a CSV header; returns (lat index, lon index)
+def csv_coordinate_columns(header, path=""):
+    lower = [column.strip().lower() for column in header]
+    lat_index = next((lower.index(name) for name in CSV_LAT_COLUMNS if name in lower), None)
+    lon_index = next((lower.index(name) for name in CSV_LON_COLUMNS if name in lower), None)
+    if lat_index is None or lon_index is None:
+        raise ValueError(f"{path}: no latitude/longitude columns found")
+    return lat_index, lon_index
+
+
+# Function to turn one CSV row into a Point feature, or None if it has no usable coordinates
+def csv_feature(row, header, lat_index, lon_index):
+    try:
+        lon = float(row[lon_index])
+        lat = float(row[lat_index])
+    except (ValueError, IndexError):
+        return None
+    properties = {}
+    for i, value in enumerate(row):
+        if i in (lat_index, lon_index) or value == "" or i >= len(header):
+            continue
+        properties[header[i]] = _csv_value(value)
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": properties,
+    }
+
+
+# Function to stream CSV rows as Point features, like tippecanoe's CSV reader
+def iter_csv_features(path):
+    with compressed.open_text(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        lat_index, lon_index = csv_coordinate_columns(header, path)
+        for row in reader:
+            feature = csv_feature(row, header, lat_index, lon_index)
+            if feature is not None:
+                yield feature
+
+
+# Function to stream features from any supported input file
+def iter_features(path, input_format=None):
+    input_format = input_format or detect_format(path)
+    if input_format == "flatgeobuf":
+        if compressed.is_compressed(path):
+            raise ValueError(f"FlatGeobuf has to be decompressed before it can be read: {path}")
+        return flatgeobuf.iter_features(path)
+    if input_format == "csv":
+        return iter_csv_features(path)
+    if input_format == "geojsonseq":
+        return iter_geojsonseq_features(path)
+    return iter_geojson_features(path)
+
+
+# Function to split a geometry into its coordinate sequences (points, lines and rings)
+def geometry_parts(geometry):
+    if not geometry:
+        return []
+    kind = geometry.get("type")
+    coordinates = geometry.get("coordinates")
+    if kind == "Point":
+        return [[coordinates]] if coordinates else []
+    if kind in ("MultiPoint", "LineString"):
+        return [coordinates] if coordinates else []
+    if kind in ("MultiLineString", "Polygon"):
+        return [part for part in coordinates if part]
+    if kind == "MultiPolygon":
+        return [ring for polygon in coordinates for ring in polygon if ring]
+    if kind == "GeometryCollection":
+        return [part for child in geometry.get("geometries", []) for part in geometry_parts(child)]
+    return []
+
+
+# Function to find the lon/lat bounding boxes of non-empty geometries in one pass; returns min x, min y, max x, max y arrays
+def geometry_bboxes(geometries):
+    lon, lat, starts = [], [], []
+    for geometry in geometries:
+        starts.append(len(lon))
+        for part in geometry_parts(geometry):
+            lon.extend(coordinate[0] for coordinate in part)
+            lat.extend(coordinate[1] for coordinate in part)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.intp)
+    return (
+        np.minimum.reduceat(lon, starts),
+        np.minimum.reduceat(lat, starts),
+        np.maximum.reduceat(lon, starts),
+        np.maximum.reduceat(lat, starts),
+    )
+
+
+# Function to return a path's cache key (path, mtime and size)
+def file_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,312 @@
+"""Parallel post-build recompression and compaction of MBTiles tilesets.
+
+tippecanoe gzips every tile at zlib's default level, or leaves them all
+uncompressed with -pC. This rewrites a finished MBTiles with the tiles
+recompressed as gzip at a chosen level, brotli or zstd, in worker processes,
+so the CDN can serve them as stored. The output uses the deduplicated
+map/images schema: identical tiles (oceans, empty land) are stored once, and
+the file is VACUUMed at the end.
+
+Tiles are streamed from the input in batches and only a bounded number of
+batches are in flight, so memory doesn't grow with the archive. Repeats are
+spotted by a digest of the stored bytes, from a bounded cache of recent digests
+and then by the images table's unique index. The codec is recorded in the
+"compression" metadata entry, which the tile server and the PMTiles converter
+read, since MBTiles readers otherwise assume gzip.
+
+    python -m tiling_tools.recompress input.mbtiles [output.mbtiles] --method brotli [--level 11] [--workers 8]
+"""
+
+import argparse
+import gzip
+import hashlib
+import importlib.util
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from tiling_tools import mbtiles, mvt, pmtiles, to_pmtiles
+
+METHODS = ("gzip", "brotli", "zstd", "none")
+DEFAULT_LEVELS = {"gzip": 9, "brotli": 11, "zstd": 19, "none": 0}
+LEVEL_RANGES = {"gzip": (1, 9), "brotli": (0, 11), "zstd": (1, 22), "none": (0, 0)}
+
+# Tiles read from the input per batch handed to a worker
+BATCH_TILES = 2048
+# Batches queued per worker, enough to keep them busy while the writer catches up
+BATCHES_PER_WORKER = 2
+DEDUP_CACHE_SIZE = 1000000
+
+
+@dataclass
+class ZoomBytes:
+    zoom: int
+    tiles: int = 0
+    stored: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+
+    @property
+    def saved_bytes(self):
+        return self.input_bytes - self.output_bytes
+
+
+@dataclass
+class RecompressStats:
+    input_path: str
+    output_path: str
+    method: str
+    level: int
+    workers: int = 1
+    tiles: int = 0
+    unique_tiles: int = 0
+    tile_bytes: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    seconds: float = 0.0
+    vacuum_seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+    zooms: dict = field(default_factory=dict)
+
+    @property
+    def tiles_per_second(self):
+        return self.tiles / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.tile_bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+
+# Function to check a method and level, filling in the method's default level
+def resolve_level(method, level=None):
+    if method not in METHODS:
+        raise ValueError(f"Compression method must be one of {METHODS}, not {method!r}")
+    if not level:
+        return DEFAULT_LEVELS[method]
+    low, high = LEVEL_RANGES[method]
+    if not low <= level <= high:
+        raise ValueError(f"{method} levels run from {low} to {high}, not {level}")
+    return level
+
+
+# Function to check the codec a method needs is installed, failing before any work starts
+def check_codec(method):
+    package = {"brotli": "brotli", "zstd": "zstandard"}.get(method)
+    if package and importlib.util.find_spec(package) is None:
+        raise ImportError(f"{method} recompression needs the {package} package; pip install {package}")
+
+
+_compressors = {}
+
+
+def _compress(data, method, level):
+    if method == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if method == "brotli":
+        import brotli
+
+        return brotli.compress(data, quality=level)
+    if method == "zstd":
+        compressor = _compressors.get(level)
+        if compressor is None:
+            import zstandard
+
+            compressor = _compressors[level] = zstandard.ZstdCompressor(level=level)
+        return compressor.compress(data)
+    return data
+
+
+# Function run in a worker: decompress each tile as stored, then compress it with the new method
+def _recompress_batch(jobs, method, level, source_compression):
+    results = []
+    for digest, zoom, data in jobs:
+        if source_compression is None:
+            raw = mvt.decompress(data)
+        else:
+            raw = pmtiles.decompress(data, source_compression)
+        results.append((digest, zoom, _compress(raw, method, level)))
+    return results
+
+
+def _batches(cursor, stats, digests, dedup_cache_size):
+    while True:
+        rows = cursor.fetchmany(BATCH_TILES)
+        if not rows:
+            return
+        mapped = []
+        jobs = []
+        for z, x, row, data in rows:
+            # A 16 byte blob id rather than hex text; map and its index repeat it for every tile
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            mapped.append((z, x, row, digest))
+            zoom = stats.zooms.get(z)
+            if zoom is None:
+                zoom = stats.zooms[z] = ZoomBytes(z)
+            zoom.tiles += 1
+            zoom.input_bytes += len(data)
+            stats.tiles += 1
+            if digest in digests:
+                digests.move_to_end(digest)
+                continue
+            digests[digest] = None
+            if len(digests) > dedup_cache_size:
+                digests.popitem(last=False)
+            jobs.append((digest, z, data))
+            stats.tile_bytes += len(data)
+        yield mapped, jobs
+
+
+def _ordered_results(pool, batches, method, level, source_compression, limit):
+    pending = deque()
+    for mapped, jobs in batches:
+        pending.append((mapped, pool.submit(_recompress_batch, jobs, method, level, source_compression)))
+        if len(pending) >= limit:
+            mapped, future = pending.popleft()
+            yield mapped, future.result()
+    while pending:
+        mapped, future = pending.popleft()
+        yield mapped, future.result()
+
+
+# Function to recompress every tile of an MBTiles file into a deduplicated, vacuumed copy;
+# the output defaults to replacing the input
+def recompress(
+    input_path,
+    output_path=None,
+    method="gzip",
+    level=None,
+    workers=None,
+    dedup_cache_size=DEDUP_CACHE_SIZE,
+    progress=None,
+):
+    level = resolve_level(method, level)
+    check_codec(method)
+    output_path = output_path or input_path
+    workers = max(1, workers or os.cpu_count() or 1)
+    stats = RecompressStats(input_path=input_path, output_path=output_path, method=method, level=level, workers=workers)
+    if not os.path.isfile(input_path):
+        raise ValueError(f"{input_path} doesn't exist")
+    started = time.perf_counter()
+    stats.input_bytes = os.path.getsize(input_path)
+
+    partial = output_path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    connection = mbtiles.connect(input_path)
+    out = mbtiles.create(partial, deduplicated=True)
+    # The partial file is thrown away on failure, so there is nothing for a journal to protect
+    out.execute("PRAGMA journal_mode = OFF")
+    out.execute("PRAGMA synchronous = OFF")
+    pool = None
+    try:
+        metadata = mbtiles.read_metadata(connection)
+        source_compression = mbtiles.tile_compression(metadata)
+        cursor = connection.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles")
+        batches = _batches(cursor, stats, OrderedDict(), dedup_cache_size)
+        if workers == 1:
+            results = (
+                (mapped, _recompress_batch(jobs, method, level, source_compression)) for mapped, jobs in batches
+            )
+        else:
+            pool = ProcessPoolExecutor(workers)
+            results = _ordered_results(pool, batches, method, level, source_compression, workers * BATCHES_PER_WORKER)
+        for mapped, recompressed in results:
+            for digest, z, data in recompressed:
+                # A repeat that fell out of the digest cache is caught by the unique index
+                inserted = out.execute(
+                    "INSERT OR IGNORE INTO images (tile_data, tile_id) VALUES (?, ?)", (data, digest)
+                ).rowcount
+                if inserted:
+                    stats.unique_tiles += 1
+                    stats.zooms[z].stored += 1
+                    stats.zooms[z].output_bytes += len(data)
+            out.executemany(
+                "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)", mapped
+            )
+            if progress is not None:
+                progress(stats.tiles)
+
+        metadata["compression"] = method
+        mbtiles.write_metadata(out, metadata)
+        out.commit()
+        vacuum_started = time.perf_counter()
+        out.execute("VACUUM")
+        stats.vacuum_seconds = time.perf_counter() - vacuum_started
+    except BaseException:
+        out.close()
+        os.remove(partial)
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        connection.close()
+    out.close()
+    os.replace(partial, output_path)
+
+    stats.zooms = dict(sorted(stats.zooms.items()))
+    stats.output_bytes = os.path.getsize(output_path)
+    stats.seconds = time.perf_counter() - started
+    stats.peak_rss_mb = to_pmtiles.peak_rss_mb()
+    return stats
+
+
+# Function to tabulate the tile bytes before and after at each zoom; repeats stored once count as saved
+def zoom_rows(stats):
+    return [
+        {
+            "zoom": zoom.zoom,
+            "tiles": zoom.tiles,
+            "stored": zoom.stored,
+            "input MB": round(zoom.input_bytes / 1e6, 2),
+            "output MB": round(zoom.output_bytes / 1e6, 2),
+            "saved MB": round(zoom.saved_bytes / 1e6, 2),
+            "saved %": round(100 * zoom.saved_bytes / zoom.input_bytes, 1) if zoom.input_bytes else 0.0,
+        }
+        for zoom in stats.zooms.values()
+    ]
+
+
+# Function to summarise a recompression in one line
+def describe_stats(stats):
+    level = f" level {stats.level}" if stats.method != "none" else ""
+    return (
+        f"{stats.output_path}: {stats.tiles:,} tiles ({stats.unique_tiles:,} unique) as {stats.method}{level} "
+        f"in {stats.seconds:.1f}s ({stats.vacuum_seconds:.1f}s VACUUM) on {stats.workers} workers, "
+        f"{stats.tiles_per_second:,.0f} tiles/s, {stats.mb_per_second:,.1f} MB/s, "
+        f"{stats.input_bytes / 1e6:,.1f} MB -> {stats.output_bytes / 1e6:,.1f} MB, peak RSS {stats.peak_rss_mb:.0f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompress and deduplicate the tiles of an MBTiles file")
+    parser.add_argument("input", help="MBTiles file")
+    parser.add_argument("output", nargs="?", help="MBTiles file to write (default: replace the input)")
+    parser.add_argument("--method", choices=METHODS, default="gzip")
+    parser.add_argument("--level", type=int, help="Compression level (default: gzip 9, brotli 11, zstd 19)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument(
+        "--dedup-cache", type=int, default=DEDUP_CACHE_SIZE, help="Number of tile digests kept for deduplication"
+    )
+    args = parser.parse_args()
+
+    try:
+        stats = recompress(args.input, args.output, args.method, args.level, args.workers, args.dedup_cache)
+    except (OSError, ValueError, ImportError, sqlite3.Error) as e:
+        sys.exit(f"Couldn't recompress {args.input}: {e}")
+
+    rows = zoom_rows(stats)
+    if rows:
+        columns = list(rows[0])
+        widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+        print("  ".join(column.rjust(widths[column]) for column in columns))
+        for row in rows:
+            print("  ".join(str(row[column]).rjust(widths[column]) for column in columns))
+    print(describe_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
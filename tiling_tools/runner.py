@@ -0,0 +1,414 @@
+"""Instrumented runner for tippecanoe commands.
+
+Runs a command as a subprocess and parses tippecanoe's progress output from
+stderr (reading, sorting and tiling phases, the zoom being tiled, size-limit
+warnings). While it runs, it samples the process tree's CPU time, resident
+memory and the temp directory's disk usage, then saves a JSON run record, so
+option sets can be compared on real numbers. tippecanoe unlinks its temp files
+as soon as it opens them, so temp use is the growth of the whole filesystem
+holding the temp directory: a file output written there is subtracted, but a
+directory output (-e) and anything else writing to that filesystem are counted. Sampling reads /proc where it
+exists; elsewhere only the totals from getrusage are recorded. Compressed
+inputs are streamed through named pipes (tiling_tools.compressed).
+
+    python -m tiling_tools.runner [--runs-dir runs] -- tippecanoe -o out.mbtiles in.geojson
+"""
+
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+from tiling_tools import argv as argv_tools
+from tiling_tools import compressed
+
+RUNS_DIR = "tippecanoe_runs"
+SAMPLE_INTERVAL = 0.25
+
+# Lines of stderr kept in the run record
+STDERR_LINES = 200
+
+_TILE_PROGRESS = re.compile(r"^\s*([\d.]+)%\s+(\d+)/(\d+)/(\d+)")
+_READ = re.compile(r"^Read ([\d.]+)( million)? features")
+_REORDER = re.compile(r"^Reordering geometry:\s*([\d.]+)%")
+_MAX_ZOOM = re.compile(r"^Choosing a maxzoom of -z(\d+)")
+_TOO_BIG = re.compile(r"^tile (\d+)/(\d+)/(\d+) (size is \d+|has \d+ features)")
+
+
+@dataclass
+class Progress:
+    phase: str = "starting"
+    percent: float = 0.0
+    zoom: int = None
+    tile: str = None
+    features_read: int = 0
+    chosen_max_zoom: int = None
+    zooms: list = field(default_factory=list)
+    phase_started: dict = field(default_factory=dict)  # Seconds since the start at which each phase began
+    size_warnings: list = field(default_factory=list)
+    lines: list = field(default_factory=list)
+
+
+@dataclass
+class RunRecord:
+    argv: list
+    started_at: str
+    seconds: float = 0.0
+    returncode: int = None
+    cpu_seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+    peak_temp_mb: float = 0.0
+    temp_dir: str = None
+    output_path: str = None
+    output_bytes: int = None
+    max_zoom_reached: int = None
+    features_read: int = 0
+    phase_seconds: dict = field(default_factory=dict)
+    size_warnings: list = field(default_factory=list)
+    samples: list = field(default_factory=list)  # [seconds, cpu seconds, rss MB, temp MB]
+    stderr_tail: list = field(default_factory=list)
+    cached: bool = False  # Output restored from the build cache rather than built
+    temp_includes_output: bool = False  # The temp figures are a filesystem delta that counts the output too
+
+    @property
+    def cpu_utilisation(self):
+        return self.cpu_seconds / self.seconds if self.seconds else 0.0
+
+
+# Function to update the progress from one line (or \r-terminated update) of tippecanoe's stderr
+def parse_line(progress, line, elapsed=0.0):
+    line = line.rstrip()
+    if not line.strip():
+        return
+
+    def enter(phase):
+        if progress.phase != phase:
+            progress.phase = phase
+            progress.percent = 0.0
+            progress.phase_started.setdefault(phase, round(elapsed, 3))
+
+    match = _TILE_PROGRESS.match(line)
+    if match:
+        enter("tiling")
+        progress.percent = float(match.group(1))
+        progress.zoom = int(match.group(2))
+        progress.tile = "/".join(match.group(i) for i in (2, 3, 4))
+        if progress.zoom not in progress.zooms:
+            progress.zooms.append(progress.zoom)
+        return
+    progress.lines.append(line)
+    del progress.lines[:-STDERR_LINES]
+    match = _READ.match(line)
+    if match:
+        enter("reading")
+        count = float(match.group(1)) * (1e6 if match.group(2) else 1)
+        progress.features_read = max(progress.features_read, int(count))
+        return
+    match = _REORDER.match(line)
+    if match or line.startswith(("Sorting", "Merging")):
+        enter("sorting")
+        if match:
+            progress.percent = float(match.group(1))
+        return
+    match = _MAX_ZOOM.match(line)
+    if match:
+        progress.chosen_max_zoom = int(match.group(1))
+        return
+    match = _TOO_BIG.match(line)
+    if match:
+        progress.size_warnings.append(line)
+        del progress.size_warnings[:-STDERR_LINES]
+        return
+    if line.startswith("For layer"):
+        enter("reading")
+
+
+def _read_stderr(stream, progress, lock, started):
+    buffer = ""
+    while True:
+        chunk = stream.read1(65536) if hasattr(stream, "read1") else stream.read(65536)
+        if not chunk:
+            break
+        buffer += chunk.decode("utf-8", "replace")
+        *complete, buffer = re.split(r"[\r\n]", buffer)
+        with lock:
+            for line in complete:
+                parse_line(progress, line, time.perf_counter() - started)
+    with lock:
+        parse_line(progress, buffer, time.perf_counter() - started)
+
+
+def _child_pids():
+    # Map each process to its children from /proc/<pid>/stat (field 4 is the parent)
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(name))
+    return children
+
+
+# Function to sum CPU seconds and resident memory over a process and its descendants, from /proc
+def sample_process_tree(pid):
+    if not os.path.isdir("/proc"):
+        return None
+    children = _child_pids()
+    pending = [pid]
+    cpu = rss = 0.0
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, ()))
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{current}/statm") as f:
+                resident = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime, stime
+        rss += resident * page_size / (1024 * 1024)
+    return cpu, rss
+
+
+# Function to measure the space used on the filesystem holding a directory, in MB
+def disk_used_mb(path):
+    stat = os.statvfs(path)
+    return (stat.f_blocks - stat.f_bfree) * stat.f_frsize / (1024 * 1024)
+
+
+# Function to find the temporary directory a tippecanoe argv will use
+def temp_dir_for(args):
+    options, _ = argv_tools.split_args(args[1:])
+    return argv_tools.option_value(options, "-t", "--temporary-directory") or tempfile.gettempdir()
+
+
+# Function to find a tippecanoe argv's output; returns (path, whether it is a tile directory)
+def _output(args):
+    options, _ = argv_tools.split_args(args[1:])
+    path = argv_tools.option_value(options, "-o", "--output")
+    if path:
+        return path, False
+    return argv_tools.option_value(options, "-e", "--output-to-directory"), True
+
+
+def _device(path):
+    # An output that doesn't exist yet will be on its parent directory's device
+    while path and not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(path or ".").st_dev
+
+
+def _allocated_mb(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return 0.0
+    # Blocks rather than the length, as statvfs counts them
+    return getattr(info, "st_blocks", info.st_size // 512) * 512 / (1024 * 1024)
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, names in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return total
+
+
+# Function to run a command, sampling it until it exits; on_progress(progress, sample) is called between samples
+def run(args, on_progress=None, sample_interval=SAMPLE_INTERVAL, env=None, temp_dir=None):
+    if compressed.has_compressed_inputs(args):
+        # Compressed inputs are decompressed into named pipes while tippecanoe reads them
+        with compressed.Pipes(args) as pipes:
+            record = run(pipes.args, on_progress, sample_interval, env, temp_dir)
+        record.argv = list(args)
+        return record
+    record = RunRecord(argv=list(args), started_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    record.temp_dir = temp_dir or temp_dir_for(args)
+    record.output_path, output_is_directory = _output(args)
+    progress = Progress()
+    lock = threading.Lock()
+
+    # Temp files are unlinked as soon as tippecanoe opens them, so watch the filesystem rather than the directory
+    temp_baseline = disk_used_mb(record.temp_dir) if os.path.isdir(record.temp_dir) else None
+    output_file = None
+    if temp_baseline is not None and record.output_path:
+        if _device(os.path.abspath(record.output_path)) == _device(record.temp_dir):
+            # Walking a tile directory on every sample would cost too much, so it stays in the figure
+            record.temp_includes_output = output_is_directory
+            if not output_is_directory:
+                output_file = record.output_path
+                output_baseline = _allocated_mb(output_file)
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+    reader = threading.Thread(target=_read_stderr, args=(process.stderr, progress, lock, started), daemon=True)
+    reader.start()
+
+    while True:
+        finished = process.poll() is not None
+        elapsed = time.perf_counter() - started
+        tree = None if finished else sample_process_tree(process.pid)
+        temp = 0.0
+        if temp_baseline is not None:
+            temp = disk_used_mb(record.temp_dir) - temp_baseline
+            if output_file is not None:
+                # tippecanoe -f removes an existing output first, which the baseline also accounts for
+                temp -= _allocated_mb(output_file) - output_baseline
+            temp = max(0.0, temp)
+        if tree is not None:
+            sample = [round(elapsed, 3), round(tree[0], 3), round(tree[1], 1), round(temp, 1)]
+            record.samples.append(sample)
+            record.peak_rss_mb = max(record.peak_rss_mb, tree[1])
+        else:
+            sample = [round(elapsed, 3), None, None, round(temp, 1)]
+        record.peak_temp_mb = max(record.peak_temp_mb, temp)
+        if on_progress is not None:
+            with lock:
+                on_progress(progress, sample)
+        if finished:
+            break
+        try:
+            process.wait(sample_interval)  # Returns as soon as the process exits, so timings aren't rounded up
+        except subprocess.TimeoutExpired:
+            pass
+
+    reader.join()
+    process.stderr.close()
+    record.seconds = time.perf_counter() - started
+    record.returncode = process.returncode
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    record.cpu_seconds = (usage.ru_utime - usage_before.ru_utime) + (usage.ru_stime - usage_before.ru_stime)
+    if not record.samples:
+        # Without /proc, fall back to the largest child this process has ever waited for
+        record.peak_rss_mb = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+
+    if process.returncode == 0:
+        progress.phase_started.setdefault("done", round(record.seconds, 3))
+    phases = sorted(progress.phase_started.items(), key=lambda item: item[1])
+    ends = [start for _, start in phases[1:]] + [record.seconds]
+    record.phase_seconds = {phase: round(end - start, 3) for (phase, start), end in zip(phases, ends) if phase != "done"}
+    record.max_zoom_reached = max(progress.zooms) if progress.zooms else None
+    record.features_read = progress.features_read
+    record.size_warnings = progress.size_warnings
+    record.stderr_tail = progress.lines
+    if record.output_path and os.path.exists(record.output_path):
+        record.output_bytes = _size(record.output_path)
+    return record
+
+
+# Function to save a run record as JSON in the runs directory, returning its path
+def save_record(record, runs_dir=RUNS_DIR):
+    os.makedirs(runs_dir, exist_ok=True)
+    name = f"{record.started_at.replace(':', '')}-{os.getpid()}-{int(time.time() * 1000) % 1000:03d}.json"
+    path = os.path.join(runs_dir, name)
+    with open(path, "w") as f:
+        json.dump({**asdict(record), "cpu_utilisation": record.cpu_utilisation}, f, indent=2)
+    return path
+
+
+# Function to load saved run records, newest first
+def load_records(runs_dir=RUNS_DIR):
+    if not os.path.isdir(runs_dir):
+        return []
+    records = []
+    for name in sorted(os.listdir(runs_dir), reverse=True):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(runs_dir, name)) as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return records
+
+
+# Function to turn run records into rows for comparing option sets
+def summary_rows(records):
+    return [
+        {
+            "started": record["started_at"],
+            "exit": record["returncode"],
+            "seconds": round(record["seconds"], 2),
+            "CPU seconds": round(record["cpu_seconds"], 2),
+            "cores used": round(record.get("cpu_utilisation", 0.0), 2),
+            "peak RSS (MB)": round(record["peak_rss_mb"], 1),
+            "peak temp (MB)": round(record["peak_temp_mb"], 1),
+            "temp includes output": record.get("temp_includes_output", False),
+            "output (MB)": round(record["output_bytes"] / 1e6, 2) if record.get("output_bytes") is not None else None,
+            "max zoom": record.get("max_zoom_reached"),
+            "cached": record.get("cached", False),
+            "command": " ".join(record["argv"][1:]),
+        }
+        for record in records
+    ]
+
+
+# Function to describe a progress update in one line
+def describe_progress(progress):
+    if progress.phase == "tiling":
+        return f"tiling {progress.percent:.1f}% (zoom {progress.zoom}, tile {progress.tile})"
+    if progress.phase == "reading":
+        return f"reading: {progress.features_read:,} features"
+    if progress.phase == "sorting":
+        return f"sorting {progress.percent:.1f}%"
+    return progress.phase
+
+
+# Function to summarise a run record in one line
+def describe_record(record):
+    output = f", output {record.output_bytes / 1e6:,.1f} MB" if record.output_bytes is not None else ""
+    temp = "filesystem growth (output included)" if record.temp_includes_output else "temp"
+    return (
+        f"exit {record.returncode} in {record.seconds:.1f}s, {record.cpu_seconds:.1f} CPU s "
+        f"({record.cpu_utilisation:.1f} cores), peak RSS {record.peak_rss_mb:.0f} MB, "
+        f"peak {temp} {record.peak_temp_mb:.0f} MB{output}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a tippecanoe command and record its performance",
+        usage="%(prog)s [options] -- tippecanoe <tippecanoe arguments>",
+    )
+    parser.add_argument("--runs-dir", default=RUNS_DIR, help="Directory for the JSON run records")
+    parser.add_argument("--fake", action="store_true", help="Use the fake tippecanoe stand-in")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    command = [arg for arg in args.command if arg != "--"]
+    if not command:
+        parser.error("no command given")
+    if args.fake and os.path.basename(command[0]) == "tippecanoe":
+        from tiling_tools import fake_tippecanoe
+
+        command = fake_tippecanoe.TIPPECANOE + command[1:]
+
+    last = [None]
+
+    def report(progress, sample):
+        line = describe_progress(progress)
+        if line != last[0]:
+            print(f"[{sample[0]:7.1f}s] {line}", file=sys.stderr)
+            last[0] = line
+
+    record = run(command, on_progress=report)
+    print(f"{describe_record(record)}; saved {save_record(record, args.runs_dir)}")
+    sys.exit(record.returncode)
+
+
+if __name__ == "__main__":
+    main()
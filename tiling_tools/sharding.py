@@ -0,0 +1,358 @@
+"""Spatially sharded tippecanoe builds merged back together with tile-join.
+
+Inputs are split into shards of tiles at a chosen shard zoom, ordered along a
+quadkey (Z-order) or Hilbert curve and cut into runs of similar feature counts.
+Each shard gets its own tippecanoe job for the zooms at or above the shard zoom,
+with features near its edges copied in so tile buffers stay complete; tiles that
+fall outside the shard are trimmed afterwards. One overview job builds the lower
+zooms from the full input, its base zoom (-B) pinned to the full build's so points
+are dropped at the same rate, and tile-join merges everything into the final output.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from tiling_tools import argv, compressed, mbtiles, readers
+from tiling_tools.tiles import geometry_world_bbox, hilbert_index, quadkey_index, tile_range
+
+METHODS = {"quadkey": quadkey_index, "hilbert": hilbert_index}
+
+# Options that the sharded pipeline sets itself for every job
+MANAGED_OPTIONS = (
+    "-o",
+    "--output",
+    "-e",
+    "--output-to-directory",
+    "-z",
+    "--maximum-zoom",
+    "-Z",
+    "--minimum-zoom",
+    "-f",
+    "--force",
+)
+
+
+@dataclass
+class Shard:
+    index: int
+    zoom: int
+    tiles: list
+    weight: int = 0
+    inputs: list = field(default_factory=list)
+
+
+@dataclass
+class Job:
+    name: str
+    argv: list
+    output: str
+    weight: int = 0
+    trim_zoom: int = None
+    trim_tiles: list = None
+
+
+def _iter_boxes(inputs):
+    for layer, path in inputs:
+        name = argv.layer_name(layer, path)
+        for feature in readers.iter_features(path):
+            parts = readers.geometry_parts(feature.get("geometry"))
+            if parts:
+                yield name, feature, geometry_world_bbox(parts)
+
+
+def _covered_tiles(zoom, bbox, margin):
+    x0, y0, x1, y1 = tile_range(zoom, bbox[0] - margin, bbox[1] - margin, bbox[2] + margin, bbox[3] + margin)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+# Function to count features per tile at the shard zoom
+def count_tiles(inputs, zoom):
+    counts = Counter()
+    for _, _, bbox in _iter_boxes(inputs):
+        counts.update(_covered_tiles(zoom, bbox, 0.0))
+    return counts
+
+
+# Function to cut the occupied tiles into shards of roughly equal feature counts
+def plan_shards(tile_counts, zoom, shards, method="hilbert"):
+    if method not in METHODS:
+        raise ValueError(f"Unknown shard method {method!r}, expected one of {sorted(METHODS)}")
+    curve = METHODS[method]
+    ordered = sorted(tile_counts, key=lambda tile: curve(zoom, tile[0], tile[1]))
+    total = sum(tile_counts.values())
+    target = total / max(1, shards)
+
+    plan = []
+    current = Shard(index=0, zoom=zoom, tiles=[])
+    for tile in ordered:
+        if current.tiles and current.weight + tile_counts[tile] / 2 > target and len(plan) < shards - 1:
+            plan.append(current)
+            current = Shard(index=len(plan), zoom=zoom, tiles=[])
+        current.tiles.append(tile)
+        current.weight += tile_counts[tile]
+    if current.tiles:
+        plan.append(current)
+    return plan
+
+
+# Function to write each shard's features, plus a buffer-wide margin around it, to line-delimited files
+def write_shard_inputs(inputs, plan, workdir, buffer_size=5):
+    if not plan:
+        return plan
+    zoom = plan[0].zoom
+    tile_to_shard = {tile: shard for shard in plan for tile in shard.tiles}
+    # Tile buffers are widest relative to the shard at its lowest zoom
+    margin = buffer_size / 256.0 / (1 << zoom)
+    handles = {}
+    try:
+        for name, feature, bbox in _iter_boxes(inputs):
+            targets = {
+                tile_to_shard[tile].index
+                for tile in _covered_tiles(zoom, bbox, margin)
+                if tile in tile_to_shard
+            }
+            if not targets:
+                continue
+            line = json.dumps(feature, separators=(",", ":")) + "\n"
+            for index in targets:
+                key = (index, name)
+                if key not in handles:
+                    path = os.path.join(workdir, f"shard_{index}_{name}.geojsonl")
+                    handles[key] = open(path, "w", encoding="utf-8")
+                    plan[index].inputs.append((name, path))
+                handles[key].write(line)
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return plan
+
+
+# Function to build the overview and per-shard tippecanoe jobs from a full tippecanoe argv
+def shard_jobs(args, plan, workdir, shard_zoom, tippecanoe=("tippecanoe",)):
+    options, inputs = argv.split_args(args)
+    max_zoom = argv.option_value(options, "-z", "--maximum-zoom")
+    if max_zoom is None or not max_zoom.isdigit():
+        raise ValueError("Sharded builds need an explicit maximum zoom (-z), not -zg")
+    max_zoom = int(max_zoom)
+    min_zoom = int(argv.option_value(options, "-Z", "--minimum-zoom", default="0"))
+    base = argv.join_options(argv.without_options(options, *MANAGED_OPTIONS))
+    # tippecanoe's base zoom defaults to the max zoom, which would be the overview's own top zoom,
+    # and points would then be dropped as if the tileset stopped there
+    overview_base = list(base)
+    if argv.option_value(options, "-B", "--base-zoom") is None:
+        overview_base.append(f"-B{max_zoom}")
+
+    jobs = []
+    if min_zoom < shard_zoom:
+        output = os.path.join(workdir, "overview.mbtiles")
+        top = min(max_zoom, shard_zoom - 1)
+        jobs.append(
+            Job(
+                name="overview",
+                argv=[
+                    *tippecanoe,
+                    *overview_base,
+                    "-f",
+                    "-o",
+                    output,
+                    f"-Z{min_zoom}",
+                    f"-z{top}",
+                    *argv.input_args(inputs),
+                ],
+                output=output,
+                weight=sum(shard.weight for shard in plan),
+            )
+        )
+    if max_zoom >= shard_zoom:
+        for shard in plan:
+            if not shard.inputs:
+                continue
+            output = os.path.join(workdir, f"shard_{shard.index}.mbtiles")
+            jobs.append(
+                Job(
+                    name=f"shard {shard.index}",
+                    argv=[
+                        *tippecanoe,
+                        *base,
+                        "-f",
+                        "-o",
+                        output,
+                        f"-Z{max(min_zoom, shard_zoom)}",
+                        f"-z{max_zoom}",
+                        *argv.input_args(shard.inputs),
+                    ],
+                    output=output,
+                    weight=shard.weight,
+                    trim_zoom=shard.zoom,
+                    trim_tiles=shard.tiles,
+                )
+            )
+    return jobs
+
+
+# Function to delete tiles that lie outside a shard's own tiles (they only hold overlap)
+def trim_shard(path, zoom, shard_tiles):
+    connection = mbtiles.connect(path, readonly=False)
+    try:
+        table = "map" if mbtiles.tiles_is_view(connection) else "tiles"
+        connection.execute("CREATE TEMP TABLE keep (x integer, y integer, PRIMARY KEY (x, y))")
+        connection.executemany("INSERT INTO keep VALUES (?, ?)", shard_tiles)
+        levels = [row[0] for row in connection.execute(f"SELECT DISTINCT zoom_level FROM {table}")]
+        for z in levels:
+            if z < zoom:
+                continue
+            shift = z - zoom
+            connection.execute(
+                f"""
+                DELETE FROM {table}
+                WHERE zoom_level = ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM keep
+                    WHERE keep.x = ({table}.tile_column >> ?)
+                    AND keep.y = (((1 << ?) - 1 - {table}.tile_row) >> ?)
+                )
+                """,
+                (z, shift, z, shift),
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+# Function run in a pool worker: runs one tippecanoe job and trims its output
+def run_job(job, threads=None):
+    env = dict(os.environ)
+    if threads:
+        env["TIPPECANOE_MAX_THREADS"] = str(threads)
+    started = time.perf_counter()
+    # The overview job reads the original inputs, which may be compressed
+    with compressed.Pipes(job.argv) as pipes:
+        completed = subprocess.run(pipes.args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if completed.returncode == 0 and job.trim_tiles is not None and os.path.exists(job.output):
+        trim_shard(job.output, job.trim_zoom, job.trim_tiles)
+    return {
+        "name": job.name,
+        "returncode": completed.returncode,
+        "seconds": time.perf_counter() - started,
+        "stderr": completed.stderr[-2000:],
+    }
+
+
+# Function to run jobs on a process pool, biggest first
+def run_jobs(jobs, workers=None):
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job, threads) for job in sorted(jobs, key=lambda job: -job.weight)]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results
+
+
+# Function to build the tile-join argv that merges the job outputs into the requested output
+def tile_join_args(args, outputs, tile_join=("tile-join",)):
+    options, _ = argv.split_args(args)
+    merged = [*tile_join, "-f", "-pk"]
+    for flags in (("-o", "--output"), ("-e", "--output-to-directory")):
+        value = argv.option_value(options, *flags)
+        if value:
+            merged.extend([flags[0], value])
+    for flags in (("-n", "--name"), ("-N", "--description"), ("-A", "--attribution")):
+        value = argv.option_value(options, *flags)
+        if value:
+            merged.extend([flags[0], value])
+    return merged + list(outputs)
+
+
+# Function to run a complete sharded build for a tippecanoe argv
+def run_sharded(
+    args,
+    shard_zoom=6,
+    shards=8,
+    method="hilbert",
+    workers=None,
+    workdir=None,
+    tippecanoe=("tippecanoe",),
+    tile_join=("tile-join",),
+    keep_workdir=False,
+):
+    timings = {}
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="tippecanoe_shards_")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        options, inputs = argv.split_args(args)
+        buffer_size = float(argv.option_value(options, "-b", "--buffer", default="5"))
+
+        started = time.perf_counter()
+        plan = plan_shards(count_tiles(inputs, shard_zoom), shard_zoom, shards, method)
+        write_shard_inputs(inputs, plan, workdir, buffer_size)
+        timings["split"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        jobs = shard_jobs(args, plan, workdir, shard_zoom, tippecanoe)
+        results = run_jobs(jobs, workers)
+        timings["tiles"] = time.perf_counter() - started
+        failed = [result for result in results if result["returncode"] != 0]
+        if failed:
+            raise RuntimeError(f"{failed[0]['name']} failed:\n{failed[0]['stderr']}")
+
+        started = time.perf_counter()
+        merge = tile_join_args(args, [job.output for job in jobs], tile_join)
+        completed = subprocess.run(merge, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"tile-join failed:\n{completed.stderr[-2000:]}")
+        timings["merge"] = time.perf_counter() - started
+        return {"shards": plan, "jobs": results, "merge": merge, "timings": timings}
+    finally:
+        if own_workdir and not keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a tippecanoe command as spatial shards merged with tile-join",
+        usage="%(prog)s [options] -- tippecanoe <tippecanoe arguments>",
+    )
+    parser.add_argument("--shard-zoom", type=int, default=6)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--method", choices=sorted(METHODS), default="hilbert")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--fake", action="store_true", help="Use the fake tippecanoe/tile-join stand-ins")
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    command = [arg for arg in args.command if arg != "--"]
+    programs = {}
+    if args.fake:
+        from tiling_tools import fake_tippecanoe
+
+        programs = {"tippecanoe": fake_tippecanoe.TIPPECANOE, "tile_join": fake_tippecanoe.TILE_JOIN}
+    if command and os.path.basename(command[0]) == "tippecanoe":
+        command = command[1:]
+    result = run_sharded(
+        command,
+        shard_zoom=args.shard_zoom,
+        shards=args.shards,
+        method=args.method,
+        workers=args.workers,
+        workdir=args.workdir,
+        keep_workdir=args.workdir is not None,
+        **programs,
+    )
+    for job in sorted(result["jobs"], key=lambda job: job["name"]):
+        print(f"{job['name']}: {job['seconds']:.1f}s")
+    print(" ".join(f"{phase} {seconds:.1f}s" for phase, seconds in result["timings"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,554 @@
+"""Preview of polygon simplification with and without shared-border detection.
+
+tippecanoe simplifies each polygon ring on its own, with a tolerance of -S
+tile units at the zoom's detail, so two polygons that share a border can
+simplify it differently and leave slivers between them. -ab ("Detect Shared
+Borders") finds the edges polygons have in common and simplifies each shared
+stretch once, at the cost of indexing every edge of every tile. This runs both
+on a sample of the input polygons, those around the tile at the preview zoom
+holding the most polygon vertices, so the effect and the cost show before a
+build.
+
+Coordinates are snapped to the tile grid at the zoom and detail. Every vertex
+gets a 64-bit hash of its layer and grid position, and every edge a hash of
+its two vertices in either order; sorting the edge hashes finds the shared
+edges, and the vertices where sharing starts, stops or changes neighbour
+become fixed nodes. Douglas-Peucker runs on all rings at once: each round
+finds the farthest vertex of every open interval with NumPy reductions and
+splits the intervals it is out of tolerance for. Visvalingam-Whyatt removes,
+each round, every vertex whose triangle is under the area tolerance and
+smaller than its neighbours'. Ties go by vertex hash, so a shared stretch
+simplifies the same way from both sides.
+
+Gaps are measured along the shared edges: each vertex's offset from the
+simplified boundary is taken from both sides, and where the two disagree the
+polygons have pulled apart or overlap. The time -ab adds is extrapolated from
+the edge index time per vertex over every polygon vertex at every zoom, and
+its memory from an assumed edge record size over the densest tile's edges on
+every thread.
+
+Usage: python -m tiling_tools.simplification options.json [--zoom 12] [--tile 12/654/1583] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from tiling_tools import command, readers
+from tiling_tools.tiles import lonlat_to_world, tile_bounds
+
+BATCH_SIZE = 65536
+SAMPLE_VERTICES = 500000
+POLYGON_TYPES = ("Polygon", "MultiPolygon")
+METHODS = ("Douglas-Peucker", "Visvalingam")
+# Bytes assumed per edge record while tippecanoe looks for shared borders in a tile
+EDGE_BYTES = 24
+# Disagreement between the two sides of a shared edge, in tile units, counted as a gap
+GAP_UNITS = 0.5
+# Below this share of edges in common, -ab has little to work with
+SHARED_FRACTION = 0.05
+# Largest coordinate span for exact integer cross products
+EXACT_SPAN = 1 << 30
+
+
+@dataclass
+class PolygonScan:
+    zoom: int
+    features: int = 0
+    vertices: int = 0
+    tiles: dict = field(default_factory=dict)  # (x, y) -> vertices of the polygons centred in the tile
+
+
+@dataclass
+class ModeResult:
+    method: str
+    shared_borders: bool
+    vertices: int = 0
+    collapsed_rings: int = 0
+    mismatched_edges: int = 0
+    gap_area: float = 0.0
+    max_gap: float = 0.0
+    seconds: float = 0.0
+
+
+@dataclass
+class SimplificationPreview:
+    zoom: int
+    detail: int
+    tolerance: float
+    tile: tuple
+    features: int = 0
+    rings: int = 0
+    input_vertices: int = 0
+    vertices: int = 0
+    dropped_rings: int = 0
+    edges: int = 0
+    shared_edges: int = 0
+    nodes: int = 0
+    index_seconds: float = 0.0
+    truncated: bool = False
+    total_features: int = 0
+    total_vertices: int = 0
+    tile_vertices: int = 0
+    zooms: int = 1
+    threads: int = 1
+    modes: list = field(default_factory=list)
+
+    @property
+    def shared_fraction(self):
+        return self.shared_edges / self.edges if self.edges else 0.0
+
+    # Seconds -ab adds over the build, at the edge index's rate per vertex on this machine
+    @property
+    def shared_border_seconds(self):
+        return self.index_seconds / self.vertices * self.total_vertices * self.zooms if self.vertices else 0.0
+
+    @property
+    def shared_border_mb(self):
+        return self.tile_vertices * EDGE_BYTES * self.threads / 1e6
+
+
+@dataclass
+class _Rings:
+    x: np.ndarray
+    y: np.ndarray
+    keys: np.ndarray
+    starts: np.ndarray  # ring offsets into the points, with the end as the last entry
+    ring: np.ndarray  # ring of each point
+
+
+def _mix(values):
+    # splitmix64's finaliser; uint64 arithmetic wraps
+    z = values.astype(np.uint64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _polygon_batches(path, batch_size=BATCH_SIZE):
+    geometries = []
+    for feature in readers.iter_features(path):
+        geometry = feature.get("geometry")
+        if geometry and geometry.get("type") in POLYGON_TYPES and readers.geometry_parts(geometry):
+            geometries.append(geometry)
+            if len(geometries) >= batch_size:
+                yield geometries
+                geometries = []
+    if geometries:
+        yield geometries
+
+
+# Function to count an input's polygons and their vertices, binned by bounding box centre into tiles at a zoom
+def scan_polygons(path, zoom):
+    scan = PolygonScan(zoom=zoom)
+    n = 1 << zoom
+    for geometries in _polygon_batches(path):
+        counts = np.array([sum(len(part) for part in readers.geometry_parts(g)) for g in geometries])
+        min_lon, min_lat, max_lon, max_lat = readers.geometry_bboxes(geometries)
+        x, y = lonlat_to_world((min_lon + max_lon) / 2, (min_lat + max_lat) / 2)
+        keys = (x * n).astype(np.int64) * n + (y * n).astype(np.int64)
+        tiles, inverse = np.unique(keys, return_inverse=True)
+        for key, total in zip(tiles.tolist(), np.bincount(inverse, weights=counts).tolist()):
+            tile = divmod(key, n)
+            scan.tiles[tile] = scan.tiles.get(tile, 0) + int(total)
+        scan.features += len(geometries)
+        scan.vertices += int(counts.sum())
+    return scan
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Function to scan an input's polygons, reusing the result while its path, mtime, size and the zoom are unchanged
+def load_scan(path, zoom):
+    key = (*readers.file_key(path), zoom)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    scan = scan_polygons(path, zoom)
+    with _cache_lock:
+        for stale in [k for k in _cache if k[0] == key[0]]:
+            del _cache[stale]
+        _cache[key] = scan
+    return scan
+
+
+def _sample_rings(paths, zoom, tile, max_vertices):
+    west, south, east, north = tile_bounds(zoom, *tile)
+    rings, layers = [], []
+    features = vertices = 0
+    for layer, path in enumerate(paths):
+        for geometries in _polygon_batches(path):
+            min_lon, min_lat, max_lon, max_lat = readers.geometry_bboxes(geometries)
+            hits = (min_lon <= east) & (max_lon >= west) & (min_lat <= north) & (max_lat >= south)
+            for i in np.flatnonzero(hits):
+                parts = [np.asarray(part, dtype=np.float64)[:, :2] for part in readers.geometry_parts(geometries[i])]
+                count = sum(len(part) for part in parts)
+                if features and vertices + count > max_vertices:
+                    return rings, layers, features, vertices, True
+                for part in parts:
+                    if (part[0] != part[-1]).any():
+                        part = np.vstack([part, part[:1]])
+                    rings.append(part)
+                    layers.append(layer)
+                features += 1
+                vertices += count
+    return rings, layers, features, vertices, False
+
+
+# Function to snap rings to the grid of a zoom and detail, dropping repeated points and rings that collapse
+def _snap(rings, layers, zoom, detail):
+    lengths = np.array([len(ring) for ring in rings])
+    coordinates = np.concatenate(rings)
+    x, y = lonlat_to_world(coordinates[:, 0], coordinates[:, 1])
+    scale = float(1 << (zoom + detail))
+    x = np.rint(x * scale).astype(np.int64)
+    y = np.rint(y * scale).astype(np.int64)
+    ring = np.repeat(np.arange(len(rings)), lengths)
+    while True:
+        keep = np.ones(len(x), dtype=bool)
+        keep[1:] = (x[1:] != x[:-1]) | (y[1:] != y[:-1]) | (ring[1:] != ring[:-1])
+        # Snapping also leaves spikes out to a point and straight back, which have no area and no clear side
+        spike = (x[:-2] == x[2:]) & (y[:-2] == y[2:]) & (ring[:-2] == ring[2:]) & keep[1:-1]
+        keep[1:-1] &= ~spike
+        if keep.all():
+            break
+        x, y, ring = x[keep], y[keep], ring[keep]
+    # A ring needs three distinct corners and its closing point
+    valid = np.bincount(ring, minlength=len(rings)) >= 4
+    keep = valid[ring]
+    x, y, ring = x[keep], y[keep], ring[keep]
+    layer = np.asarray(layers, dtype=np.uint64)[ring]
+    ring = np.cumsum(valid)[ring] - 1
+    x -= x.min(initial=0)
+    y -= y.min(initial=0)
+    keys = _mix(x.astype(np.uint64) ^ _mix(y.astype(np.uint64) ^ _mix(layer)))
+    if max(x.max(initial=0), y.max(initial=0)) >= EXACT_SPAN:
+        x, y = x.astype(np.float64), y.astype(np.float64)
+    starts = np.searchsorted(ring, np.arange(int(valid.sum()) + 1))
+    return _Rings(x, y, keys, starts, ring), int((~valid).sum())
+
+
+# Function to hash every edge and find the shared ones; returns the shared flag per edge, the vertex pairs of
+# edges shared by exactly two rings, and the fixed nodes
+def _edge_index(rings):
+    n = len(rings.x)
+    last = np.zeros(n, dtype=bool)
+    last[rings.starts[1:] - 1] = True
+    edge_start = np.flatnonzero(~last)
+    a, b = rings.keys[edge_start], rings.keys[edge_start + 1]
+    edge_keys = _mix(np.minimum(a, b) ^ _mix(np.maximum(a, b)))
+    order = np.argsort(edge_keys, kind="stable")
+    ordered = edge_keys[order]
+    boundaries = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1], True])
+    run_lengths = np.diff(boundaries)
+    shared = np.empty(len(edge_keys), dtype=bool)
+    shared[order] = np.repeat(run_lengths >= 2, run_lengths)
+    pairs = boundaries[:-1][run_lengths == 2]
+    first, second = edge_start[order[pairs]], edge_start[order[pairs + 1]]
+    different = rings.ring[first] != rings.ring[second]
+    pairs = (first[different], second[different])
+
+    # Nodes: where a ring's edges go from shared to not (or back), and where three or more rings meet
+    open_points = edge_start
+    edge_of = open_points - rings.ring[open_points]
+    previous = edge_of - 1
+    ring_first = rings.starts[:-1]
+    previous[np.searchsorted(open_points, ring_first)] = rings.starts[1:] - 2 - np.arange(len(ring_first))
+    node = shared[edge_of] != shared[previous]
+    point_keys, point_rings = rings.keys[open_points], rings.ring[open_points]
+    by_key = np.lexsort((point_rings, point_keys))
+    sorted_keys, sorted_rings = point_keys[by_key], point_rings[by_key]
+    distinct = np.r_[True, (sorted_keys[1:] != sorted_keys[:-1]) | (sorted_rings[1:] != sorted_rings[:-1])]
+    member_keys = sorted_keys[distinct]
+    member_starts = np.flatnonzero(np.r_[True, member_keys[1:] != member_keys[:-1], True])
+    junctions = member_keys[member_starts[:-1]][np.diff(member_starts) >= 3]
+    # A node for one ring is a node for all of them, or a spike left by snapping could hide it on one side
+    node = np.isin(point_keys, np.concatenate([junctions, point_keys[node]]))
+
+    # A ring with no node starts at its smallest hash, which its neighbour on the other side agrees on
+    point_ring_starts = ring_first - np.arange(len(ring_first))
+    has_node = np.logical_or.reduceat(node, point_ring_starts)
+    smallest = np.minimum.reduceat(point_keys, point_ring_starts)
+    node |= ~has_node[point_rings] & (point_keys == smallest[point_rings])
+    nodes = np.zeros(n, dtype=bool)
+    nodes[open_points] = node
+    return shared, pairs, nodes
+
+
+# Function to rotate every ring to start at its first node; returns the source index of each rotated point
+def _rotation(rings, nodes):
+    lengths = np.diff(rings.starts)
+    positions = np.flatnonzero(nodes)
+    firsts = positions[np.unique(rings.ring[positions], return_index=True)[1]] - rings.starts[:-1]
+    starts = np.repeat(rings.starts[:-1], lengths)
+    local = np.arange(len(rings.x)) - starts
+    return starts + (local + np.repeat(firsts, lengths)) % np.repeat(lengths - 1, lengths)
+
+
+# Function to simplify all rings at once with Douglas-Peucker, never removing fixed points; returns the kept mask
+def douglas_peucker(x, y, keys, fixed, tolerance):
+    kept = fixed.copy()
+    points = np.flatnonzero(fixed)
+    start, end = points[:-1], points[1:]
+    while True:
+        wide = end - start > 1
+        start, end = start[wide], end[wide]
+        if not len(start):
+            return kept
+        lengths = end - start - 1
+        offsets = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        interval = np.repeat(np.arange(len(start)), lengths)
+        index = np.arange(int(lengths.sum())) - offsets[interval] + start[interval] + 1
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[index] - x[start][interval], y[index] - y[start][interval]
+        # Within an interval the chord length is a constant, so the cross product ranks distances exactly
+        degenerate = (dx == 0) & (dy == 0)
+        distance = np.where(degenerate[interval], px * px + py * py, np.abs(dx[interval] * py - dy[interval] * px))
+        limit = np.where(degenerate, tolerance * tolerance, tolerance * np.hypot(dx, dy))
+        farthest = np.maximum.reduceat(distance, offsets)
+        candidates = distance == farthest[interval]
+        best = np.maximum.reduceat(np.where(candidates, keys[index], np.uint64(0)), offsets)
+        chosen = np.flatnonzero(candidates & (keys[index] == best[interval]))
+        chosen = index[chosen[np.unique(interval[chosen], return_index=True)[1]]]
+        split = farthest > limit
+        kept[chosen[split]] = True
+        start, end = np.concatenate([start[split], chosen[split]]), np.concatenate([chosen[split], end[split]])
+
+
+# Function to simplify all rings at once with Visvalingam-Whyatt, never removing fixed points; returns the kept mask
+def visvalingam(x, y, keys, fixed, tolerance):
+    kept = np.ones(len(x), dtype=bool)
+    threshold = 2 * tolerance * tolerance  # twice the triangle area
+    while True:
+        index = np.flatnonzero(kept)
+        # Ring ends are fixed, so every movable point's kept neighbours are in its own ring
+        previous, following = np.roll(index, 1), np.roll(index, -1)
+        dx, dy = x[following] - x[previous], y[following] - y[previous]
+        area = np.abs(dx * (y[index] - y[previous]) - dy * (x[index] - x[previous])).astype(np.float64)
+        area[fixed[index]] = np.inf
+        point_keys = keys[index]
+        area_before, keys_before = np.roll(area, 1), np.roll(point_keys, 1)
+        area_after, keys_after = np.roll(area, -1), np.roll(point_keys, -1)
+        remove = (
+            (area < threshold)
+            & ((area < area_before) | ((area == area_before) & (point_keys < keys_before)))
+            & ((area < area_after) | ((area == area_after) & (point_keys < keys_after)))
+        )
+        if not remove.any():
+            return kept
+        kept[index[remove]] = False
+
+
+# Function to find every point's signed offset from the simplified boundary through it (zero where kept)
+def _offsets(x, y, kept):
+    kept_index = np.flatnonzero(kept)
+    index = np.arange(len(x))
+    previous = kept_index[np.searchsorted(kept_index, index, side="right") - 1]
+    following = kept_index[np.minimum(np.searchsorted(kept_index, index), len(kept_index) - 1)]
+    dx = (x[following] - x[previous]).astype(np.float64)
+    dy = (y[following] - y[previous]).astype(np.float64)
+    length = np.hypot(dx, dy)
+    cross = dx * (y - y[previous]) - dy * (x - x[previous])
+    offsets = np.divide(cross, length, out=np.zeros(len(x)), where=length > 0)
+    offsets[kept] = 0.0
+    return offsets
+
+
+def _measure(result, rings, kept, offsets, pairs):
+    kept_per_ring = np.add.reduceat(kept, rings.starts[:-1])
+    collapsed = kept_per_ring < 4
+    result.vertices = int(kept_per_ring[~collapsed].sum())
+    result.collapsed_rings = int(collapsed.sum())
+    first, second = pairs
+    whole = ~collapsed[rings.ring[first]] & ~collapsed[rings.ring[second]]
+    first, second = first[whole], second[whole]
+    # The second ring crosses the edge one way or the other; running the other way flips its offsets' sign
+    same = rings.keys[first] == rings.keys[second]
+    start_gap = offsets[first] - np.where(same, offsets[second], -offsets[second + 1])
+    end_gap = offsets[first + 1] - np.where(same, offsets[second + 1], -offsets[second])
+    start_gap, end_gap = np.abs(start_gap), np.abs(end_gap)
+    length = np.hypot((rings.x[first + 1] - rings.x[first]) * 1.0, (rings.y[first + 1] - rings.y[first]) * 1.0)
+    widest = np.maximum(start_gap, end_gap)
+    result.mismatched_edges = int((widest > GAP_UNITS).sum())
+    result.gap_area = float(((start_gap + end_gap) / 2 * length).sum())
+    result.max_gap = float(widest.max(initial=0.0))
+
+
+# Function to simplify a sample of the inputs' polygons every way and measure the vertices kept and gaps left
+def preview(paths, zoom, detail=12, tolerance=1.0, tile=None, max_vertices=SAMPLE_VERTICES, min_zoom=0, threads=None):
+    scans = [load_scan(path, zoom) for path in paths]
+    tiles = {}
+    for scan in scans:
+        for key, count in scan.tiles.items():
+            tiles[key] = tiles.get(key, 0) + count
+    if not tiles:
+        raise ValueError("No polygons in the inputs")
+    tile = tuple(tile) if tile is not None else max(tiles, key=tiles.get)
+    result = SimplificationPreview(
+        zoom=zoom,
+        detail=detail,
+        tolerance=tolerance,
+        tile=(zoom, *tile),
+        total_features=sum(scan.features for scan in scans),
+        total_vertices=sum(scan.vertices for scan in scans),
+        tile_vertices=tiles.get(tile, 0),
+        zooms=max(1, zoom - min_zoom + 1),
+        threads=threads or os.cpu_count() or 1,
+    )
+    sampled, layers, result.features, result.input_vertices, result.truncated = _sample_rings(
+        paths, zoom, tile, max_vertices
+    )
+    if not sampled:
+        raise ValueError(f"No polygons near tile {zoom}/{tile[0]}/{tile[1]}")
+    rings, result.dropped_rings = _snap(sampled, layers, zoom, detail)
+    result.rings = len(rings.starts) - 1
+    result.vertices = len(rings.x)
+    if not result.rings:
+        return result
+
+    started = time.perf_counter()
+    shared, pairs, nodes = _edge_index(rings)
+    result.index_seconds = time.perf_counter() - started
+    result.edges = len(shared)
+    result.shared_edges = int(shared.sum())
+    result.nodes = int(nodes.sum())
+
+    ends = np.zeros(len(rings.x), dtype=bool)
+    ends[rings.starts[:-1]] = True
+    ends[rings.starts[1:] - 1] = True
+    for method, simplify in zip(METHODS, (douglas_peucker, visvalingam)):
+        for shared_borders in (False, True):
+            mode = ModeResult(method=method, shared_borders=shared_borders)
+            started = time.perf_counter()
+            if shared_borders:
+                source = _rotation(rings, nodes)
+                fixed = nodes[source] | ends
+                x, y = rings.x[source], rings.y[source]
+                rotated_kept = simplify(x, y, rings.keys[source], fixed, tolerance)
+                mode.seconds = time.perf_counter() - started
+                kept = np.zeros(len(rings.x), dtype=bool)
+                kept[source] = rotated_kept
+                offsets = np.zeros(len(rings.x))
+                offsets[source] = _offsets(x, y, rotated_kept)
+                # Rotation leaves out each ring's closing point, which is its first point again
+                kept[rings.starts[1:] - 1] = kept[rings.starts[:-1]]
+                offsets[rings.starts[1:] - 1] = offsets[rings.starts[:-1]]
+            else:
+                kept = simplify(rings.x, rings.y, rings.keys, ends, tolerance)
+                mode.seconds = time.perf_counter() - started
+                offsets = _offsets(rings.x, rings.y, kept)
+            _measure(mode, rings, kept, offsets, pairs)
+            result.modes.append(mode)
+    return result
+
+
+# Function to pick the detail tippecanoe uses at a zoom
+def detail_at(options, zoom):
+    if options.auto_detail:
+        return 12
+    return options.full_detail if zoom >= options.max_zoom else options.low_detail
+
+
+# Function to preview an options object's simplification at a zoom (default its max zoom)
+def preview_inputs(options, zoom=None, tile=None, max_vertices=SAMPLE_VERTICES):
+    paths = [input_file.path for input_file in options.inputs if input_file.path]
+    if not paths:
+        raise ValueError("No input files to preview")
+    zoom = options.max_zoom if zoom is None else zoom
+    return preview(
+        paths, zoom, detail_at(options, zoom), options.simplification, tile, max_vertices, options.min_zoom
+    )
+
+
+# Function to tabulate a preview, one row per simplification method, with and without -ab
+def mode_rows(result):
+    pixels = 256 / (1 << result.detail)
+    return [
+        {
+            "method": mode.method,
+            "-ab": "yes" if mode.shared_borders else "no",
+            "vertices": mode.vertices,
+            "reduction %": round(100 * (1 - mode.vertices / result.vertices), 1) if result.vertices else 0.0,
+            "collapsed rings": mode.collapsed_rings,
+            "gapped edges": mode.mismatched_edges,
+            "gap area px²": round(mode.gap_area * pixels * pixels, 2),
+            "max gap px": round(mode.max_gap * pixels, 3),
+            "ms": round(mode.seconds * 1000, 1),
+        }
+        for mode in result.modes
+    ]
+
+
+# Function to say whether -ab is worth its cost for these polygons
+def recommendation(result):
+    independent = next((mode for mode in result.modes if not mode.shared_borders), None)
+    if result.shared_fraction < SHARED_FRACTION:
+        return f"Only {result.shared_fraction:.0%} of polygon edges are shared here, so -ab has little to fix"
+    if independent is None or not independent.mismatched_edges:
+        return "Shared borders simplify the same way without -ab here, so it would cost time for nothing"
+    return (
+        f"Without -ab, {independent.mismatched_edges:,} shared edges pull apart (up to "
+        f"{independent.max_gap * 256 / (1 << result.detail):.2f} px); -ab closes them"
+    )
+
+
+# Function to summarise a preview in one line
+def describe_preview(result):
+    z, x, y = result.tile
+    truncated = ", truncated" if result.truncated else ""
+    return (
+        f"{result.features:,} polygons ({result.vertices:,} vertices{truncated}) around tile {z}/{x}/{y} at detail "
+        f"{result.detail}, -S {result.tolerance:g}: {result.shared_fraction:.0%} of edges shared, {result.nodes:,} "
+        f"nodes. Over {result.total_vertices:,} polygon vertices, -ab adds about "
+        f"{result.shared_border_seconds:.1f}s and {result.shared_border_mb:.0f} MB"
+    )
+
+
+def _tile(text):
+    z, x, y = (int(part) for part in text.split("/"))
+    return z, x, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preview polygon simplification with and without -ab")
+    parser.add_argument("config", help="JSON or YAML options file; the first options object is previewed")
+    parser.add_argument("--zoom", type=int, help="Zoom to preview (default: the max zoom)")
+    parser.add_argument("--tile", type=_tile, help="Tile to sample around, as z/x/y (default: the densest)")
+    parser.add_argument("--max-vertices", type=int, default=SAMPLE_VERTICES, help="Vertices to sample")
+    parser.add_argument("--json", action="store_true", help="Print the preview as JSON")
+    args = parser.parse_args()
+
+    zoom, tile = args.zoom, None
+    if args.tile is not None:
+        zoom, tile = args.tile[0], args.tile[1:]
+    try:
+        options = command.options_from_dict(command.load_configs(args.config)[0])
+        result = preview_inputs(options, zoom, tile, args.max_vertices)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Couldn't preview the simplification: {e}")
+
+    if args.json:
+        print(json.dumps({"modes": mode_rows(result), "summary": describe_preview(result)}, indent=2))
+        return
+    rows = mode_rows(result)
+    if rows:
+        columns = list(rows[0])
+        widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+        print("  ".join(column.rjust(widths[column]) for column in columns))
+        for row in rows:
+            print("  ".join(str(row[column]).rjust(widths[column]) for column in columns))
+    print(describe_preview(result))
+    print(recommendation(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Reproducible synthetic point, line and polygon datasets for benchmarking tippecanoe options.
+
+Features are generated with NumPy from a seed: a mix of Gaussian clusters (the
+dense areas that trigger dropping and coalescing) and a uniform background.
+Datasets are written as GeoJSONSeq, CSV (points only) or FlatGeobuf, picked by
+the output extension.
+
+    python -m tiling_tools.synthetic points 1000000 -o points.fgb --clusters 50 --spread 0.02
+"""
+
+import argparse
+import csv
+import json
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from tiling_tools import flatgeobuf
+from tiling_tools.readers import GEOJSONSEQ_EXTENSIONS
+
+KINDS = ("points", "lines", "polygons")
+GEOMETRY_TYPES = {"points": "Point", "lines": "LineString", "polygons": "Polygon"}
+
+# East Africa, roughly where our bridge sites are
+DEFAULT_BBOX = (28.0, -12.0, 42.0, 5.0)
+
+CATEGORIES = np.array(["road", "footpath", "river", "school", "clinic", "market", "church", "bridge"])
+
+# Features formatted per batch when writing text formats
+WRITE_BATCH = 100000
+
+# Grid cell in degrees over which the densest spot is measured
+DENSITY_CELL = 0.1
+KM_PER_DEGREE = 111.32
+
+
+@dataclass
+class SyntheticDataset:
+    kind: str
+    lon: np.ndarray  # Vertices of all features, concatenated
+    lat: np.ndarray
+    offsets: np.ndarray  # Feature i has vertices offsets[i]:offsets[i + 1]
+    properties: dict  # Column name -> one value per feature
+
+    @property
+    def count(self):
+        return len(self.offsets) - 1
+
+    @property
+    def vertex_count(self):
+        return len(self.lon)
+
+
+# Function to place feature centres: clustered_fraction of them in Gaussian clusters, the rest uniform
+def _centres(rng, count, bbox, clusters, clustered_fraction, spread):
+    west, south, east, north = bbox
+    lon = rng.uniform(west, east, count)
+    lat = rng.uniform(south, north, count)
+    clustered = rng.random(count) < clustered_fraction
+    if clusters > 0 and clustered.any():
+        cluster_lon = rng.uniform(west, east, clusters)
+        cluster_lat = rng.uniform(south, north, clusters)
+        # Zipf-like cluster sizes, so a few clusters are far denser than the rest
+        weights = 1.0 / np.arange(1, clusters + 1)
+        members = rng.choice(clusters, clustered.sum(), p=weights / weights.sum())
+        lon[clustered] = cluster_lon[members] + rng.normal(0.0, spread, len(members))
+        lat[clustered] = cluster_lat[members] + rng.normal(0.0, spread, len(members))
+    return np.clip(lon, west, east), np.clip(lat, south, north)
+
+
+def _properties(rng, count):
+    return {
+        "id": np.arange(count, dtype=np.int64),
+        "category": CATEGORIES[rng.integers(0, len(CATEGORIES), count)],
+        "value": np.round(rng.lognormal(0.0, 1.0, count), 3),
+        "population": rng.poisson(500, count).astype(np.int64),
+    }
+
+
+# Function to generate a dataset; size is the typical feature extent in degrees, vertices per line/polygon
+def generate(
+    kind,
+    count,
+    seed=0,
+    bbox=DEFAULT_BBOX,
+    clusters=20,
+    clustered_fraction=0.8,
+    spread=0.05,
+    vertices=16,
+    size=0.01,
+):
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    rng = np.random.default_rng(seed)
+    lon, lat = _centres(rng, count, bbox, clusters, clustered_fraction, spread)
+    scale = size * rng.lognormal(0.0, 0.5, count)[:, np.newaxis]
+    cos_lat = np.cos(np.radians(lat))[:, np.newaxis]
+
+    if kind == "points":
+        offsets = np.arange(count + 1, dtype=np.int64)
+    elif kind == "lines":
+        # Random walks that mostly keep their heading
+        heading = rng.uniform(0, 2 * np.pi, (count, 1)) + np.cumsum(rng.normal(0, 0.3, (count, vertices)), axis=1)
+        step = scale / vertices
+        dx = np.cumsum(np.cos(heading) * step, axis=1) / cos_lat
+        dy = np.cumsum(np.sin(heading) * step, axis=1)
+        lon = (lon[:, np.newaxis] + dx - dx[:, :1]).ravel()
+        lat = (lat[:, np.newaxis] + dy - dy[:, :1]).ravel()
+        offsets = np.arange(count + 1, dtype=np.int64) * vertices
+    else:
+        # Star-shaped rings with jittered radii, closed by repeating the first vertex
+        angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False) + rng.uniform(0, 0.5, (count, vertices))
+        radius = scale / 2 * rng.uniform(0.6, 1.0, (count, vertices))
+        ring_lon = lon[:, np.newaxis] + np.cos(angles) * radius / cos_lat
+        ring_lat = lat[:, np.newaxis] + np.sin(angles) * radius
+        lon = np.concatenate([ring_lon, ring_lon[:, :1]], axis=1).ravel()
+        lat = np.concatenate([ring_lat, ring_lat[:, :1]], axis=1).ravel()
+        offsets = np.arange(count + 1, dtype=np.int64) * (vertices + 1)
+
+    return SyntheticDataset(kind, np.round(lon, 7), np.round(lat, 7), offsets, _properties(rng, count))
+
+
+# Function to stream the dataset as GeoJSON-like features
+def iter_features(dataset):
+    columns = {name: values.tolist() for name, values in dataset.properties.items()}
+    lon, lat, offsets = dataset.lon.tolist(), dataset.lat.tolist(), dataset.offsets.tolist()
+    for i in range(dataset.count):
+        start, end = offsets[i], offsets[i + 1]
+        coordinates = [[x, y] for x, y in zip(lon[start:end], lat[start:end])]
+        if dataset.kind == "points":
+            coordinates = coordinates[0]
+        elif dataset.kind == "polygons":
+            coordinates = [coordinates]
+        yield {
+            "type": "Feature",
+            "properties": {name: values[i] for name, values in columns.items()},
+            "geometry": {"type": GEOMETRY_TYPES[dataset.kind], "coordinates": coordinates},
+        }
+
+
+# Function to write the dataset as GeoJSONSeq, one feature per line
+def write_geojsonseq(dataset, path):
+    with open(path, "w", encoding="utf-8") as f:
+        batch = []
+        for feature in iter_features(dataset):
+            batch.append(json.dumps(feature, separators=(",", ":")))
+            if len(batch) >= WRITE_BATCH:
+                f.write("\n".join(batch) + "\n")
+                batch = []
+        if batch:
+            f.write("\n".join(batch) + "\n")
+
+
+# Function to write a point dataset as CSV with lon/lat columns
+def write_csv(dataset, path):
+    if dataset.kind != "points":
+        raise ValueError("CSV inputs can only hold points")
+    names = list(dataset.properties)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([*names, "lon", "lat"])
+        for start in range(0, dataset.count, WRITE_BATCH):
+            end = min(start + WRITE_BATCH, dataset.count)
+            columns = [dataset.properties[name][start:end].tolist() for name in names]
+            writer.writerows(zip(*columns, dataset.lon[start:end].tolist(), dataset.lat[start:end].tolist()))
+
+
+# Function to write the dataset as an unindexed FlatGeobuf file, streaming the features
+def write_flatgeobuf(dataset, path):
+    columns = [
+        (name, flatgeobuf.column_type(values[0].item() if len(values) else ""))
+        for name, values in dataset.properties.items()
+    ]
+    column_index = {name: (index, kind) for index, (name, kind) in enumerate(columns)}
+    geometry_type = flatgeobuf.GEOMETRY_TYPE_CODES[GEOMETRY_TYPES[dataset.kind]]
+    envelope = None
+    if dataset.count:
+        envelope = [dataset.lon.min(), dataset.lat.min(), dataset.lon.max(), dataset.lat.max()]
+    with open(path, "wb") as f:
+        f.write(flatgeobuf.encode_header(columns, dataset.count, geometry_type, envelope, name=dataset.kind))
+        for feature in iter_features(dataset):
+            f.write(flatgeobuf.encode_feature(feature, column_index, geometry_type))
+
+
+# Function to write the dataset in the format given by the path's extension
+def write(dataset, path):
+    lower = path.lower()
+    if lower.endswith(".fgb"):
+        write_flatgeobuf(dataset, path)
+    elif lower.endswith(".csv"):
+        write_csv(dataset, path)
+    elif lower.endswith(GEOJSONSEQ_EXTENSIONS):
+        write_geojsonseq(dataset, path)
+    else:
+        raise ValueError(f"Write .fgb, .csv or one of {', '.join(GEOJSONSEQ_EXTENSIONS)}, not {path}")
+    return path
+
+
+# Function to measure a dataset's density in features/km²; returns (mean over its bbox, densest grid cell)
+def densities(dataset, cell=DENSITY_CELL):
+    if not dataset.count:
+        return 0.0, 0.0
+    # Features are placed by their first vertex
+    lon, lat = dataset.lon[dataset.offsets[:-1]], dataset.lat[dataset.offsets[:-1]]
+    west, east, south, north = float(lon.min()), float(lon.max()), float(lat.min()), float(lat.max())
+    area_km2 = (east - west) * (north - south) * KM_PER_DEGREE**2 * math.cos(math.radians((north + south) / 2))
+    columns = np.floor((lon - west) / cell).astype(np.int64)
+    rows = np.floor((lat - south) / cell).astype(np.int64)
+    cells, counts = np.unique(rows * (columns.max() + 1) + columns, return_counts=True)
+    densest = cells[np.argmax(counts)] // (columns.max() + 1)
+    cell_km2 = (cell * KM_PER_DEGREE) ** 2 * math.cos(math.radians(south + (densest + 0.5) * cell))
+    return dataset.count / max(area_km2, cell_km2), counts.max() / cell_km2
+
+
+# Function to summarise a dataset's size and density in one line
+def describe_dataset(dataset):
+    west, east = float(dataset.lon.min()), float(dataset.lon.max())
+    south, north = float(dataset.lat.min()), float(dataset.lat.max())
+    mean, peak = densities(dataset)
+    return (
+        f"{dataset.count:,} {dataset.kind} ({dataset.vertex_count:,} vertices) over "
+        f"{west:.2f},{south:.2f},{east:.2f},{north:.2f}, {mean:,.3g} features/km² on average and "
+        f"{peak:,.3g} in the densest {DENSITY_CELL}° cell"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a reproducible synthetic dataset")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("count", type=int)
+    parser.add_argument("-o", "--output", required=True, help="Output .fgb, .csv or .geojsonl file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bbox", default=",".join(str(v) for v in DEFAULT_BBOX), help="west,south,east,north")
+    parser.add_argument("--clusters", type=int, default=20)
+    parser.add_argument("--clustered-fraction", type=float, default=0.8)
+    parser.add_argument("--spread", type=float, default=0.05, help="Cluster standard deviation in degrees")
+    parser.add_argument("--vertices", type=int, default=16, help="Vertices per line or polygon")
+    parser.add_argument("--size", type=float, default=0.01, help="Typical line/polygon extent in degrees")
+    args = parser.parse_args()
+
+    dataset = generate(
+        args.kind,
+        args.count,
+        seed=args.seed,
+        bbox=tuple(float(v) for v in args.bbox.split(",")),
+        clusters=args.clusters,
+        clustered_fraction=args.clustered_fraction,
+        spread=args.spread,
+        vertices=args.vertices,
+        size=args.size,
+    )
+    write(dataset, args.output)
+    print(f"{args.output}: {describe_dataset(dataset)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+"""Dry-run tile load estimator: features per tile at every zoom before anything is built.
+
+Every feature is reduced to one point (a point feature's own position, the
+centre of any other feature's bounding box) and binned into the tile grid of
+a single key zoom with integer math: the point's tile x and y are interleaved
+into a Morton code, so the tile that contains it at any lower zoom is the code
+shifted right by two bits per zoom. Batches of codes are sorted and run-length
+counted, and each zoom from the key zoom down to min_zoom is one more shift
+and merge of the runs above it, so the cost is one sort of the input and then
+work proportional to the occupied tiles.
+
+The estimate for a tile applies the drop rate to its points below the base
+zoom (the max zoom) and, with fixed-distance clustering, caps its points at
+the number of occupied cluster cells, cells of about the cluster distance in
+a 256-pixel tile. Features that span several tiles are only counted in the one
+holding their centre, so line and polygon counts are a lower bound. Zooms
+whose hottest tile is over -O or, at an assumed compression ratio, -M are
+flagged, along with what tippecanoe will do about it with the drop options
+given.
+
+The estimate can use the input profiler's sample of representative points,
+scaled up to the full feature count (quick, but the hottest tiles at high
+zooms are noisy), or a full scan of the inputs.
+
+Usage: python -m tiling_tools.tile_load options.json [--sample] [--top 10] [--json]
+"""
+
+import argparse
+import json
+import sys
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from tiling_tools import command, profiler, readers
+from tiling_tools.attributes import FEATURE_BYTES, VERTEX_BYTES
+from tiling_tools.tiles import lonlat_to_world
+
+BATCH_SIZE = 65536
+
+# Sorted runs are merged once this many are waiting, which bounds memory to the occupied tiles
+COMPACT_KEYS = 1 << 22
+
+# tippecanoe's cluster distance is in pixels of a nominal 256-pixel tile
+TILE_PIXELS = 256
+
+# -M limits the compressed tile; vector tiles typically gzip to about half their size
+COMPRESSION_RATIO = 0.5
+
+# Morton codes are 64 bits, two per zoom
+MAX_KEY_ZOOM = 31
+
+# Points, then everything else: drop rate and clustering only apply to points
+POINTS, OTHER = 0, 1
+POINT_TYPES = ("Point", "MultiPoint")
+
+
+@dataclass
+class TileLoad:
+    level: int
+    paths: list = field(default_factory=list)
+    keys: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+    counts: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    pending: list = field(default_factory=list)
+    pending_keys: int = 0
+    feature_count: int = 0
+    vertex_count: int = 0
+    scale: float = 1.0  # Features each binned point stands for; above 1 for a sample
+
+
+@dataclass
+class ZoomLoad:
+    zoom: int
+    tiles: int
+    occupancy: float
+    mean_features: float
+    p99_features: float
+    max_features: float
+    unclustered_max: float
+    max_kb: float
+    hottest: list
+    status: str
+
+
+@dataclass
+class LoadEstimate:
+    zooms: list
+    warnings: list
+    feature_count: int
+    feature_bytes: float
+    sampled: bool
+
+
+def _spread(values):
+    values = values & np.uint64(0xFFFFFFFF)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def _squeeze(values):
+    values = values & np.uint64(0x5555555555555555)
+    for shift, mask in (
+        (1, 0x3333333333333333),
+        (2, 0x0F0F0F0F0F0F0F0F),
+        (4, 0x00FF00FF00FF00FF),
+        (8, 0x0000FFFF0000FFFF),
+        (16, 0x00000000FFFFFFFF),
+    ):
+        values = (values | (values >> np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+# Function to find the Morton code of the tile at a zoom holding each normalized Web Mercator point
+def world_keys(x, y, level):
+    scale = float(1 << level)
+    return (_spread((x * scale).astype(np.uint64)) << np.uint64(1)) | _spread((y * scale).astype(np.uint64))
+
+
+# Function to find the Morton code of each lon/lat point's tile at a zoom
+def point_keys(lon, lat, level):
+    return world_keys(*lonlat_to_world(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)), level)
+
+
+# Function to turn Morton codes at a zoom back into tile x and y
+def key_tiles(keys):
+    return _squeeze(keys >> np.uint64(1)).astype(np.int64), _squeeze(keys).astype(np.int64)
+
+
+def _runs(keys, counts=None):
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    if counts is None:
+        return keys[starts], np.diff(np.append(starts, len(keys)))
+    return keys[starts], np.add.reduceat(counts, starts, axis=0)
+
+
+def _compact(load):
+    if not load.pending:
+        return
+    keys = np.concatenate([load.keys, *(keys for keys, _ in load.pending)])
+    counts = np.concatenate([load.counts, *(counts for _, counts in load.pending)])
+    order = np.argsort(keys)
+    load.keys, load.counts = _runs(keys[order], counts[order])
+    load.pending, load.pending_keys = [], 0
+
+
+# Function to add a batch of feature positions; kinds are POINTS or OTHER per feature
+def add_points(load, lon, lat, kinds):
+    if not len(lon):
+        return
+    # The kind rides in the low bit, so a plain sort groups each tile's points and other features
+    keys = (point_keys(lon, lat, load.level) << np.uint64(1)) | np.asarray(kinds, dtype=np.uint64)
+    keys, counts = _runs(np.sort(keys))
+    load.pending.append((keys, counts))
+    load.pending_keys += len(keys)
+    load.feature_count += len(lon)
+    if load.pending_keys >= max(COMPACT_KEYS, len(load.keys)):
+        _compact(load)
+
+
+# Function to scan one input file and bin every feature at the key zoom
+def scan_input(path, level, batch_size=BATCH_SIZE):
+    load = TileLoad(level=level, paths=[path])
+    geometries, kinds = [], []
+    for feature in readers.iter_features(path):
+        geometry = feature.get("geometry")
+        parts = readers.geometry_parts(geometry)
+        if not parts:
+            continue
+        load.vertex_count += sum(len(part) for part in parts)
+        geometries.append(geometry)
+        kinds.append(POINTS if geometry.get("type") in POINT_TYPES else OTHER)
+        if len(geometries) >= batch_size:
+            min_x, min_y, max_x, max_y = readers.geometry_bboxes(geometries)
+            add_points(load, (min_x + max_x) / 2, (min_y + max_y) / 2, kinds)
+            geometries, kinds = [], []
+    if geometries:
+        min_x, min_y, max_x, max_y = readers.geometry_bboxes(geometries)
+        add_points(load, (min_x + max_x) / 2, (min_y + max_y) / 2, kinds)
+    _compact(load)
+    return load
+
+
+# Function to bin an input profile's point sample, scaled up to the profile's feature count
+def load_from_profile(profile, level, seed=0):
+    load = TileLoad(level=level, paths=list(profile.paths), vertex_count=profile.vertex_count)
+    n = len(profile.sample_x)
+    if not n:
+        return load
+    # The sample doesn't say which points are point features, so they're assigned in proportion
+    points = sum(count for kind, count in profile.geometry_types.items() if kind in POINT_TYPES)
+    share = points / max(1, sum(profile.geometry_types.values()))
+    kinds = (np.random.default_rng(seed).random(n) >= share).astype(np.uint64)
+    keys = (world_keys(profile.sample_x, profile.sample_y, level) << np.uint64(1)) | kinds
+    load.keys, load.counts = _runs(np.sort(keys))
+    load.feature_count = profile.feature_count
+    load.scale = profile.feature_count / n
+    return load
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Function to scan an input, reusing the result while its path, mtime, size and key zoom are unchanged
+def load_input(path, level):
+    key = (*readers.file_key(path), level)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    load = scan_input(path, level)
+    with _cache_lock:
+        for stale in [k for k in _cache if k[0] == key[0]]:
+            del _cache[stale]
+        _cache[key] = load
+    return load
+
+
+# Function to combine per-file loads binned at the same key zoom
+def merge_loads(loads, level):
+    merged = TileLoad(level=level)
+    for load in loads:
+        if load.level != level:
+            raise ValueError(f"Can't merge tile loads binned at zoom {load.level} and {level}")
+        merged.paths.extend(load.paths)
+        merged.feature_count += load.feature_count
+        merged.vertex_count += load.vertex_count
+        if load.scale != merged.scale:
+            raise ValueError("Can't merge a sampled tile load with a scanned one")
+        merged.pending.append((load.keys, load.counts))
+    _compact(merged)
+    return merged
+
+
+def _cluster_zooms(options):
+    if options.cluster_options != "Fixed Distance":
+        return None
+    return max(0, int(round(np.log2(TILE_PIXELS / max(1, options.cluster_distance)))))
+
+
+# Function to pick the zoom to bin features at: the max zoom, plus cluster cells below the cluster max zoom
+def key_level(options):
+    level = options.max_zoom
+    cluster_zooms = _cluster_zooms(options)
+    if cluster_zooms is not None:
+        level = max(level, min(options.cluster_maxzoom, options.max_zoom) + cluster_zooms)
+    return min(level, MAX_KEY_ZOOM)
+
+
+def _retained(options, zoom):
+    # tippecanoe keeps 1 / rate^(basezoom - z) of the points below the base zoom
+    if options.drop_rate <= 1 or zoom >= options.max_zoom:
+        return 1.0
+    return float(options.drop_rate) ** -(options.max_zoom - zoom)
+
+
+def _status(options, features, tile_bytes):
+    over = []
+    if features > options.max_tile_features and "No Feature Limit" not in options.drop_options:
+        over.append("-O")
+    if tile_bytes * COMPRESSION_RATIO > options.max_tile_bytes and "No Tile Size Limit" not in options.drop_options:
+        over.append("-M")
+    if not over:
+        return "ok"
+    limits = " and ".join(over)
+    if options.cluster_options == "Cluster Densest As Needed":
+        return f"over {limits}: points clustered as needed"
+    dropping = [option for option in options.drop_options if option.endswith("As Needed")]
+    if dropping:
+        return f"over {limits}: {dropping[0].lower()}"
+    return f"over {limits}: tippecanoe will fail"
+
+
+# Function to estimate the features in every occupied tile from min zoom to max zoom
+def estimate(load, options, top=5, attribute_bytes=0):
+    _compact(load)
+    level = load.level
+    if level < options.max_zoom:
+        raise ValueError(f"The load was binned at zoom {level}, below the max zoom {options.max_zoom}")
+    min_zoom = min(options.min_zoom, options.max_zoom)
+    vertices = load.vertex_count / load.feature_count if load.feature_count else 1.0
+    feature_bytes = FEATURE_BYTES + VERTEX_BYTES * vertices + attribute_bytes
+    cluster_zooms = _cluster_zooms(options)
+
+    # Split the kind bit out into a points column and an other features column
+    keys, first = _runs(load.keys >> np.uint64(1))
+    counts = np.zeros((len(keys), 2))
+    counts[np.repeat(np.arange(len(keys)), first), (load.keys & np.uint64(1)).astype(np.intp)] = load.counts
+    counts *= load.scale
+
+    # One shift per zoom: runs at each zoom are the merged runs of the zoom above
+    occupied = {}
+    for zoom in range(level, min_zoom - 1, -1):
+        if zoom < level:
+            keys, counts = _runs(keys >> np.uint64(2), counts)
+        occupied[zoom] = (keys, counts)
+
+    zooms, warnings = [], []
+    for zoom in range(min_zoom, options.max_zoom + 1):
+        keys, counts = occupied[zoom]
+        points = counts[:, POINTS] * _retained(options, zoom)
+        unclustered = points + counts[:, OTHER]
+        if cluster_zooms is not None and zoom <= options.cluster_maxzoom:
+            cell_level = min(level, zoom + cluster_zooms)
+            cell_keys, cell_counts = occupied[cell_level]
+            cell_keys = cell_keys[cell_counts[:, POINTS] > 0] >> np.uint64(2 * (cell_level - zoom))
+            # Shifting keeps the cells sorted, so they run-length count into their tiles
+            tiles, cells = _runs(cell_keys)
+            capped = np.zeros(len(keys))
+            capped[np.searchsorted(keys, tiles)] = cells
+            points = np.minimum(points, capped)
+        features = points + counts[:, OTHER]
+        if not len(features):
+            continue
+        hottest = np.argsort(features)[::-1][:top]
+        tile_x, tile_y = key_tiles(keys[hottest])
+        max_bytes = float(features[hottest[0]]) * feature_bytes
+        status = _status(options, float(features[hottest[0]]), max_bytes)
+        zooms.append(
+            ZoomLoad(
+                zoom=zoom,
+                tiles=len(keys),
+                occupancy=len(keys) / float(1 << (2 * zoom)),
+                mean_features=float(features.mean()),
+                p99_features=float(np.percentile(features, 99)),
+                max_features=float(features[hottest[0]]),
+                unclustered_max=float(unclustered.max()),
+                max_kb=max_bytes / 1000,
+                hottest=[
+                    (zoom, int(x), int(y), float(features[i]))
+                    for x, y, i in zip(tile_x.tolist(), tile_y.tolist(), hottest.tolist())
+                ],
+                status=status,
+            )
+        )
+        if status != "ok":
+            warnings.append(
+                f"z{zoom}: hottest tile about {features[hottest[0]]:,.0f} features, "
+                f"{max_bytes / 1000:,.0f} KB before compression; {status}"
+            )
+    return LoadEstimate(
+        zooms=zooms,
+        warnings=warnings,
+        feature_count=load.feature_count,
+        feature_bytes=feature_bytes,
+        sampled=load.scale != 1.0,
+    )
+
+
+# Function to estimate the tile load of an options object's inputs, scanning them or using their profiles
+def estimate_inputs(options, sample=False, top=5, attribute_bytes=0):
+    paths = [input_file.path for input_file in options.inputs if input_file.path]
+    if not paths:
+        raise ValueError("No input files to estimate")
+    level = key_level(options)
+    if sample:
+        load = load_from_profile(profiler.merge_profiles([profiler.profile_input(path) for path in paths]), level)
+    else:
+        load = merge_loads([load_input(path, level) for path in paths], level)
+    return estimate(load, options, top, attribute_bytes)
+
+
+# Function to tabulate an estimate, one row per zoom
+def zoom_rows(result):
+    return [
+        {
+            "zoom": zoom.zoom,
+            "tiles": zoom.tiles,
+            "occupancy": round(zoom.occupancy, 6),
+            "mean features": round(zoom.mean_features, 1),
+            "p99 features": round(zoom.p99_features),
+            "max features": round(zoom.max_features),
+            "unclustered max": round(zoom.unclustered_max),
+            "max KB": round(zoom.max_kb, 1),
+            "status": zoom.status,
+        }
+        for zoom in result.zooms
+    ]
+
+
+# Function to list the hottest tiles across all zooms, most features first
+def hottest_rows(result, count=10):
+    tiles = sorted((tile for zoom in result.zooms for tile in zoom.hottest), key=lambda tile: -tile[3])
+    return [{"z": z, "x": x, "y": y, "features": round(features)} for z, x, y, features in tiles[:count]]
+
+
+# Function to summarise an estimate in one line
+def describe_estimate(result):
+    source = " (from a sample)" if result.sampled else ""
+    over = [zoom.zoom for zoom in result.zooms if zoom.status != "ok"]
+    limits = "no zoom over the -O/-M limits" if not over else "over the limits at z" + ", z".join(map(str, over))
+    return (
+        f"{result.feature_count:,} features{source}, about {result.feature_bytes:.0f} bytes each; "
+        f"{limits}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate features per tile at every zoom before building")
+    parser.add_argument("config", help="JSON or YAML options file; the first options object is estimated")
+    parser.add_argument("--sample", action="store_true", help="Use the input profiler's sample instead of a full scan")
+    parser.add_argument("--top", type=int, default=10, help="Hottest tiles to list")
+    parser.add_argument("--attribute-bytes", type=float, default=0, help="Encoded attribute bytes per feature")
+    parser.add_argument("--json", action="store_true", help="Print the estimate as JSON")
+    args = parser.parse_args()
+
+    try:
+        options = command.options_from_dict(command.load_configs(args.config)[0])
+        result = estimate_inputs(options, args.sample, args.top, args.attribute_bytes)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Couldn't estimate the tile load: {e}")
+
+    if args.json:
+        print(json.dumps({"zooms": zoom_rows(result), "hottest": hottest_rows(result, args.top)}, indent=2))
+        return
+    rows = zoom_rows(result)
+    if rows:
+        columns = list(rows[0])
+        widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+        print("  ".join(column.rjust(widths[column]) for column in columns))
+        for row in rows:
+            print("  ".join(str(row[column]).rjust(widths[column]) for column in columns))
+    hottest = hottest_rows(result, args.top)
+    print("Hottest tiles: " + ", ".join(f"{t['z']}/{t['x']}/{t['y']} ({t['features']:,})" for t in hottest))
+    for warning in result.warnings:
+        print(warning)
+    print(describe_estimate(result))
+
+
+if __name__ == "__main__":
+    main()
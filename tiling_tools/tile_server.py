@@ -0,0 +1,568 @@
+"""Local asyncio tile server for previewing MBTiles and PMTiles output.
+
+Serves /{z}/{x}/{y}.{ext} from one tileset, a TileJSON at /tiles.json and a
+MapLibre preview map at /. MBTiles lookups run on a small thread pool, each
+thread borrowing one of a pool of read-only SQLite connections. PMTiles
+lookups go through tiling_tools.pmtiles, which maps the archive and caches its
+leaf directories, and run on the event loop. Hot tiles (and misses) are kept
+in an LRU cache bounded in bytes, and concurrent requests for a tile that
+isn't cached share one lookup. Tiles carry an ETag with Cache-Control:
+no-cache, so browsers revalidate and get 304s. Tiles and the raw archive at
+/archive.pmtiles (for PMTiles clients) answer single-range requests.
+
+The tileset is reopened and the cache dropped when the file changes, so a
+rebuild shows up on the next request.
+
+    python -m tiling_tools.tile_server output.mbtiles [--port 8765] [--cache-mb 64]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from tiling_tools import mbtiles, pmtiles
+
+HOST = "127.0.0.1"
+PORT = 8765
+POOL_SIZE = 4
+CACHE_BYTES = 64 << 20
+# Bytes charged per cached entry on top of the tile, for the key and the entry itself
+ENTRY_OVERHEAD = 200
+# Seconds between checks of whether the tileset file changed
+RELOAD_INTERVAL = 1.0
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Content-Encoding for each PMTiles tile compression code
+ENCODINGS = {2: "gzip", 3: "br", 4: "zstd"}
+CONTENT_TYPES = {
+    "pbf": "application/x-protobuf",
+    "mvt": "application/x-protobuf",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+REASONS = {
+    200: "OK",
+    204: "No Content",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    500: "Internal Server Error",
+}
+
+
+@dataclass
+class Tile:
+    data: bytes
+    etag: str
+    encoding: str = None
+
+
+# Cached in place of tiles that aren't in the tileset, so empty areas cost one lookup
+MISSING = Tile(b"", "")
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict
+    body: bytes = b""
+
+
+class TileCache:
+    # LRU of tiles bounded by their total size in bytes
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        tile = self.entries.get(key)
+        if tile is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        if key in self.entries:
+            return
+        cost = len(tile.data) + ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        self.entries[key] = tile
+        self.size += cost
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.data) + ENTRY_OVERHEAD
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+class MBTilesSource:
+    threaded = True
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        if not os.path.isfile(path):
+            raise ValueError(f"{path} doesn't exist")
+        self.connections = queue.Queue()
+        try:
+            for _ in range(pool_size):
+                self.connections.put(mbtiles.connect(path))
+            connection = self.connections.get()
+            try:
+                self.metadata = mbtiles.read_metadata(connection)
+            finally:
+                self.connections.put(connection)
+        except sqlite3.Error as e:
+            self.close()
+            raise ValueError(f"{path} isn't a readable MBTiles file: {e}") from None
+        self.format = self.metadata.get("format", "pbf")
+        self.tile_compression = mbtiles.tile_compression(self.metadata)
+
+    # Function run on a pool thread: one tile's bytes, or None
+    def get_tile(self, z, x, y):
+        connection = self.connections.get()
+        try:
+            row = connection.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, (1 << z) - 1 - y),
+            ).fetchone()
+        finally:
+            self.connections.put(connection)
+        return None if row is None else bytes(row[0])
+
+    def tilejson(self):
+        metadata = self.metadata
+        tilejson = {"name": metadata.get("name", os.path.basename(self.path))}
+        for key in ("minzoom", "maxzoom"):
+            if key in metadata:
+                tilejson[key] = int(metadata[key])
+        for key in ("bounds", "center"):
+            if key in metadata:
+                tilejson[key] = [float(value) for value in str(metadata[key]).split(",")]
+        if isinstance(metadata.get("json"), dict):
+            tilejson["vector_layers"] = metadata["json"].get("vector_layers", [])
+        return tilejson
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+
+class PMTilesSource:
+    threaded = False
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        self.reader = pmtiles.PMTilesReader(path)
+        self.format = {1: "pbf", 2: "png", 3: "jpg", 4: "webp", 5: "avif"}.get(self.reader.header.tile_type, "pbf")
+        self.tile_compression = self.reader.header.tile_compression
+
+    # Function to copy one tile out of the map, or None; fast enough for the event loop
+    def get_tile(self, z, x, y):
+        data = self.reader.get_tile(z, x, y)
+        return None if data is None else bytes(data)
+
+    def tilejson(self):
+        header = self.reader.header
+        metadata = self.reader.metadata
+        tilejson = {
+            "name": metadata.get("name", os.path.basename(self.path)),
+            "minzoom": header.min_zoom,
+            "maxzoom": header.max_zoom,
+            "bounds": list(header.bounds),
+            "center": list(header.center),
+        }
+        if "vector_layers" in metadata:
+            tilejson["vector_layers"] = metadata["vector_layers"]
+        return tilejson
+
+    @property
+    def archive(self):
+        return self.reader.buf
+
+    def close(self):
+        self.reader.close()
+
+
+# Function to open a tileset by its extension
+def open_source(path, pool_size=POOL_SIZE):
+    if path.endswith(".pmtiles"):
+        return PMTilesSource(path, pool_size)
+    if path.endswith(".mbtiles"):
+        return MBTilesSource(path, pool_size)
+    raise ValueError(f"Can only serve .mbtiles or .pmtiles, not {path}")
+
+
+# Function to wrap a tile's bytes with its ETag and the encoding browsers need to be told about
+def make_tile(data, tile_compression=None):
+    if data is None:
+        return MISSING
+    etag = '"' + hashlib.blake2b(data, digest_size=8).hexdigest() + '"'
+    encoding = ENCODINGS.get(tile_compression) or ("gzip" if data[:2] == GZIP_MAGIC else None)
+    return Tile(data, etag, encoding)
+
+
+# Function to parse a single-range Range header against a body size; returns (start, end) inclusive,
+# None to send the whole body, or "unsatisfiable"
+def parse_range(value, size):
+    unit, _, ranges = (value or "").partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None  # Multiple ranges aren't supported; the whole body is a valid answer
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+# Function to answer with a body, honouring If-None-Match and Range
+def body_response(body, request_headers, content_type, etag=None, encoding=None):
+    headers = {"Content-Type": content_type, "Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+    if etag:
+        headers["ETag"] = etag
+        if etag in request_headers.get("if-none-match", ""):
+            return Response(304, headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    size = len(body)
+    if "range" in request_headers and (not etag or request_headers.get("if-range", etag) == etag):
+        byte_range = parse_range(request_headers["range"], size)
+        if byte_range == "unsatisfiable":
+            return Response(416, {"Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(206, headers, bytes(body[start : end + 1]))
+    return Response(200, headers, bytes(body))
+
+
+def _json_response(value):
+    return Response(200, {"Content-Type": "application/json", "Cache-Control": "no-cache"}, json.dumps(value).encode())
+
+
+class TileServer:
+    def __init__(self, path, cache_bytes=CACHE_BYTES, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self.cache = TileCache(cache_bytes)
+        self.source = open_source(path, pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+        self._mtime = os.path.getmtime(path)
+        self._checked = time.monotonic()
+        self._pending = {}
+        self.requests = 0
+        self.not_modified = 0
+        self.reloads = 0
+        self.url = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._connections = {}
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked < RELOAD_INTERVAL:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return  # Mid-rebuild; keep serving what's open
+        if mtime != self._mtime:
+            # The old source is dropped rather than closed, since pool threads may still be reading from it
+            self.source = open_source(self.path, self.pool_size)
+            self._mtime = mtime
+            self.cache.clear()
+            self.reloads += 1
+
+    # Function to fetch a tile through the cache, sharing one lookup between concurrent requests for it
+    async def tile(self, z, x, y):
+        self._reload_if_changed()
+        key = (z, x, y)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await pending
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            source = self.source
+            if source.threaded:
+                data = await asyncio.get_running_loop().run_in_executor(self.executor, source.get_tile, z, x, y)
+            else:
+                data = source.get_tile(z, x, y)
+            tile = make_tile(data, source.tile_compression)
+            self.cache.put(key, tile)
+            future.set_result(tile)
+            return tile
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Marks it retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._pending[key]
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "cached_tiles": len(self.cache.entries),
+            "cached_mb": round(self.cache.size / 1e6, 2),
+            "reloads": self.reloads,
+        }
+
+    async def respond(self, method, target, headers):
+        if method not in ("GET", "HEAD"):
+            return Response(405, {"Allow": "GET, HEAD"})
+        path = urlsplit(target).path
+        if path in ("/", "/index.html"):
+            return Response(200, {"Content-Type": "text/html; charset=utf-8"}, PREVIEW_HTML.encode("utf-8"))
+        if path == "/tiles.json":
+            tilejson = self.source.tilejson()
+            host = headers.get("host", f"{HOST}:{PORT}")
+            tilejson.update(tilejson="3.0.0", tiles=[f"http://{host}/{{z}}/{{x}}/{{y}}.{self.source.format}"])
+            return _json_response(tilejson)
+        if path == "/stats":
+            return _json_response(self.stats())
+        if path == "/archive.pmtiles" and isinstance(self.source, PMTilesSource):
+            self._reload_if_changed()
+            etag = f'"{int(self._mtime * 1e6):x}"'
+            return body_response(self.source.archive, headers, "application/octet-stream", etag)
+        parts = path.strip("/").split("/")
+        if len(parts) == 3:
+            try:
+                z, x = int(parts[0]), int(parts[1])
+                y = int(parts[2].split(".")[0])
+            except ValueError:
+                return Response(400, {})
+            if not (0 <= z <= pmtiles.MAX_ZOOM and 0 <= x < 1 << z and 0 <= y < 1 << z):
+                return Response(404, {})
+            try:
+                tile = await self.tile(z, x, y)
+            except (sqlite3.Error, ValueError) as e:
+                # Usually a tileset caught mid-rebuild; the next request after it's written reloads it
+                return Response(500, {"Content-Type": "text/plain"}, str(e).encode("utf-8"))
+            if tile is MISSING:
+                return Response(204 if self.source.format == "pbf" else 404, {"Cache-Control": "no-cache"})
+            response = body_response(
+                tile.data, headers, CONTENT_TYPES.get(self.source.format, "application/octet-stream"), tile.etag,
+                tile.encoding,
+            )
+            if response.status == 304:
+                self.not_modified += 1
+            return response
+        return Response(404, {})
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+                self.requests += 1
+                response = await self.respond(method, target, headers)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = [f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}"]
+                response.headers.setdefault("Access-Control-Allow-Origin", "*")
+                response.headers["Content-Length"] = str(len(response.body))
+                response.headers["Connection"] = "keep-alive" if keep_alive else "close"
+                head += [f"{name}: {value}" for name, value in response.headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD" and response.body:
+                    writer.write(response.body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    # Function to start listening on the running loop; port 0 picks a free port
+    async def listen(self, host=HOST, port=PORT):
+        self._server = await asyncio.start_server(self.handle, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self._server
+
+    # Function to serve from a daemon thread with its own event loop, for the Streamlit page
+    def start(self, host=HOST, port=PORT):
+        started = threading.Event()
+        failure = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.listen(host, port))
+            except OSError as e:
+                failure.append(e)
+                started.set()
+                return
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+        return self.url
+
+    # Function to stop accepting and drop open keep-alive connections
+    async def shutdown(self):
+        self._server.close()
+        # Closing the transports ends each handler's wait for its next request
+        tasks = list(self._connections)
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
+        self.executor.shutdown(wait=False)
+        self.source.close()
+
+
+PREVIEW_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Tile Preview</title>
+<link rel="stylesheet" href="https://unpkg.com/maplibre-gl@4/dist/maplibre-gl.css">
+<script src="https://unpkg.com/maplibre-gl@4/dist/maplibre-gl.js"></script>
+<style>html, body, #map { margin: 0; height: 100%; } #info { position: absolute; top: 8px; left: 8px;
+background: rgba(255,255,255,0.85); padding: 4px 8px; font: 12px sans-serif; }</style>
+</head>
+<body>
+<div id="map"></div><div id="info"></div>
+<script>
+const colors = ["#e6194b", "#3cb44b", "#4363d8", "#f58231", "#911eb4", "#42d4f4", "#f032e6", "#9a6324"];
+fetch("tiles.json").then((response) => response.json()).then((tilejson) => {
+  const layers = [{id: "background", type: "background", paint: {"background-color": "#f4f4f2"}}];
+  if (tilejson.vector_layers) {
+    tilejson.vector_layers.forEach((layer, i) => {
+      const color = colors[i % colors.length];
+      const common = {source: "preview", "source-layer": layer.id};
+      layers.push({...common, id: layer.id + "-fill", type: "fill", filter: ["==", "$type", "Polygon"],
+                   paint: {"fill-color": color, "fill-opacity": 0.3, "fill-outline-color": color}});
+      layers.push({...common, id: layer.id + "-line", type: "line", filter: ["==", "$type", "LineString"],
+                   paint: {"line-color": color, "line-width": 1.5}});
+      layers.push({...common, id: layer.id + "-point", type: "circle", filter: ["==", "$type", "Point"],
+                   paint: {"circle-color": color, "circle-radius": 3}});
+    });
+  } else {
+    layers.push({id: "raster", type: "raster", source: "preview"});
+  }
+  const center = tilejson.center || [0, 0, 1];
+  const map = new maplibregl.Map({
+    container: "map",
+    center: [center[0], center[1]],
+    zoom: center[2] || 1,
+    style: {version: 8, sources: {preview: {type: tilejson.vector_layers ? "vector" : "raster",
+            url: location.origin + "/tiles.json"}}, layers: layers},
+  });
+  map.addControl(new maplibregl.NavigationControl());
+  const info = document.getElementById("info");
+  const show = () => { info.textContent = tilejson.name + "  z" + map.getZoom().toFixed(1); };
+  map.on("move", show);
+  show();
+  if (tilejson.bounds) { map.fitBounds([[tilejson.bounds[0], tilejson.bounds[1]], [tilejson.bounds[2], tilejson.bounds[3]]], {animate: false}); }
+  map.on("click", (event) => {
+    const features = map.queryRenderedFeatures(event.point);
+    if (features.length) {
+      new maplibregl.Popup().setLngLat(event.lngLat)
+        .setHTML("<pre>" + JSON.stringify(features[0].properties, null, 1) + "</pre>").addTo(map);
+    }
+  });
+});
+</script>
+</body>
+</html>
+"""
+
+
+async def _serve(server, host, port):
+    await server.listen(host, port)
+    print(f"Serving {server.path} at {server.url}", flush=True)
+    async with server._server:
+        await server._server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve an MBTiles or PMTiles tileset with a preview map")
+    parser.add_argument("path")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on, or 0 for any free port")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_BYTES >> 20, help="MB of tiles kept in memory")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="SQLite connections for MBTiles")
+    args = parser.parse_args()
+    try:
+        server = TileServer(args.path, args.cache_mb << 20, args.pool_size)
+        asyncio.run(_serve(server, args.host, args.port))
+    except (OSError, ValueError) as e:
+        sys.exit(f"Couldn't serve {args.path}: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Web Mercator tile math shared by the tiling tools."""
+
+import math
+
+import numpy as np
+
+MAX_LATITUDE = 85.0511287798
+
+
+# Function to project lon/lat into normalized Web Mercator (0..1, y down)
+def lonlat_to_world(lon, lat):
+    lat = np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = 0.5 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / (2 * np.pi)
+    return np.clip(x, 0.0, 1.0 - 1e-12), np.clip(y, 0.0, 1.0 - 1e-12)
+
+
+# Function to convert normalized Web Mercator back to lon/lat
+def world_to_lonlat(x, y):
+    lon = np.asarray(x, dtype=np.float64) * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y, dtype=np.float64)))))
+    return lon, lat
+
+
+# Function to return the lon/lat bounds (west, south, east, north) of an XYZ tile
+def tile_bounds(z, x, y):
+    n = float(1 << z)
+    west, north = world_to_lonlat(x / n, y / n)
+    east, south = world_to_lonlat((x + 1) / n, (y + 1) / n)
+    return float(west), float(south), float(east), float(north)
+
+
+# Function to find the range of tiles at a zoom covered by a world-coordinate box
+def tile_range(z, min_x, min_y, max_x, max_y):
+    n = 1 << z
+    x0 = min(n - 1, max(0, int(math.floor(min_x * n))))
+    y0 = min(n - 1, max(0, int(math.floor(min_y * n))))
+    x1 = min(n - 1, max(0, int(math.floor(max_x * n))))
+    y1 = min(n - 1, max(0, int(math.floor(max_y * n))))
+    return x0, y0, x1, y1
+
+
+# Function to compute a feature's bounding box in world coordinates
+def geometry_world_bbox(parts):
+    lon = [coordinate[0] for part in parts for coordinate in part]
+    lat = [coordinate[1] for part in parts for coordinate in part]
+    x, y = lonlat_to_world(np.array(lon), np.array(lat))
+    return float(x.min()), float(y.min()), float(x.max()), float(y.max())
+
+
+# Function to flip between XYZ and TMS (MBTiles) row numbering
+def flip_y(z, y):
+    return (1 << z) - 1 - y
+
+
+# Function to order tiles along a Z-order (quadkey) curve
+def quadkey_index(z, x, y):
+    index = 0
+    for bit in range(z):
+        index |= ((x >> bit) & 1) << (2 * bit)
+        index |= ((y >> bit) & 1) << (2 * bit + 1)
+    return index
+
+
+# Function to position a tile along the Hilbert curve at its zoom
+def hilbert_index(z, x, y):
+    index = 0
+    s = 1 << (z - 1) if z > 0 else 0
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        index += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        s >>= 1
+    return index
+
+
+# Function to position arrays of normalized Web Mercator points along a Hilbert curve of 2^bits cells a side
+def hilbert_keys(x, y, bits=24):
+    side = 1 << bits
+    x = np.clip((np.asarray(x, dtype=np.float64) * side).astype(np.int64), 0, side - 1)
+    y = np.clip((np.asarray(y, dtype=np.float64) * side).astype(np.int64), 0, side - 1)
+    keys = np.zeros(len(x), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve inside it is the same as the one at the next level
+        x &= s - 1
+        y &= s - 1
+        flip = rx & ~ry
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return keys
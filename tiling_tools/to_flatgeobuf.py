@@ -0,0 +1,318 @@
+"""Streaming CSV/GeoJSON -> FlatGeobuf converter with a packed Hilbert R-tree.
+
+tippecanoe reads FlatGeobuf without parsing any text, so converting CSV and
+GeoJSON inputs once makes every later build ingest faster. Features are read
+in batches, keyed by the Hilbert position of their bounding box centre and
+spooled as sorted runs of at most --memory bytes (counting the batch being
+read), so inputs bigger than RAM are sorted on disk. The runs are then merged in Hilbert order into the feature
+section, while the R-tree's leaves are written to a memory-mapped file and the
+levels above them built in chunks. The column types are only fixed after the
+whole input has been seen: a column holding both ints and floats is written as
+doubles, and any other mix as strings.
+
+FlatGeobuf features have no id, so GeoJSON ids are written to a tippecanoe_id
+column for tippecanoe's --use-attribute-for-id, which takes the column back out
+of the attributes. Only ids tippecanoe keeps (whole numbers of zero or more)
+are carried, up to 2**63. Per-feature "tippecanoe" members (layer, minzoom, maxzoom) have
+nowhere to go, so inputs that use them are refused rather than converted.
+
+    python -m tiling_tools.to_flatgeobuf input.geojson [output.fgb] [--memory 256]
+"""
+
+import argparse
+import heapq
+import marshal
+import math
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from tiling_tools import argv, flatgeobuf, readers
+from tiling_tools.tiles import hilbert_keys, lonlat_to_world
+
+CONVERTED_EXTENSION = ".fgb"
+CONVERTIBLE_FORMATS = ("csv", "geojson", "geojsonseq")
+
+# Column holding GeoJSON feature ids, for tippecanoe --use-attribute-for-id
+ID_COLUMN = "tippecanoe_id"
+
+BATCH_SIZE = 65536
+MEMORY_BYTES = 256 << 20
+NODE_SIZE = 16
+COPY_SIZE = 1 << 22
+
+# Spooled record: Hilbert key, input order, bounding box and the length of the marshalled feature that follows
+RECORD = struct.Struct("<qq4dI")
+# Bytes per buffered feature on top of its marshalled data, for the Python objects holding it
+RECORD_OVERHEAD = 200
+
+WRITABLE_GEOMETRIES = ("Point", "LineString", "Polygon", "MultiPoint", "MultiLineString", "MultiPolygon")
+
+
+@dataclass
+class ConversionStats:
+    input_path: str
+    output_path: str
+    features: int
+    skipped: int
+    runs: int
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_in / self.seconds if self.seconds else 0.0
+
+
+# Function to name the FlatGeobuf copy of an input; the full name is kept so a.csv and a.geojson don't collide
+def converted_path(path, output_dir=None):
+    return os.path.join(output_dir or os.path.dirname(path), os.path.basename(path) + CONVERTED_EXTENSION)
+
+
+# Function to check whether a converted copy exists and is newer than its source
+def is_converted(path, output_dir=None):
+    target = converted_path(path, output_dir)
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path)
+
+
+# Function to check if an input is in a format worth converting
+def is_convertible(path):
+    return os.path.isfile(path) and readers.detect_format(path) in CONVERTIBLE_FORMATS
+
+
+# Function to check whether a converted file carries feature ids in ID_COLUMN
+def has_feature_ids(path):
+    with open(path, "rb") as f:
+        return any(column["name"] == ID_COLUMN for column in flatgeobuf.read_header(f)["columns"])
+
+
+# Function to pick the id tippecanoe would keep for a GeoJSON feature; None for ids it drops
+def feature_id(feature):
+    value = feature.get("id")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return None
+    # A long column is signed, so ids past 2**63 can't be written either
+    if not 0 <= value < 1 << 63 or value != int(value):
+        return None
+    return int(value)
+
+
+def _with_id(feature, number):
+    properties = feature.get("properties") or {}
+    if "tippecanoe" in feature:
+        raise ValueError(
+            f"feature {number} has a \"tippecanoe\" member (layer, minzoom or maxzoom), which FlatGeobuf can't "
+            "hold; give tippecanoe the GeoJSON itself"
+        )
+    value = feature_id(feature)
+    if value is None:
+        return feature
+    if ID_COLUMN in properties:
+        raise ValueError(f"feature {number} has both an id and a {ID_COLUMN!r} property, which would hold the id")
+    return {"geometry": feature["geometry"], "properties": {**properties, ID_COLUMN: value}}
+
+
+# Function to widen a column's type to hold another value's
+def merge_column_type(current, kind):
+    if current is None or current == kind:
+        return kind
+    if {current, kind} == {flatgeobuf.LONG, flatgeobuf.DOUBLE}:
+        return flatgeobuf.DOUBLE
+    if flatgeobuf.JSON in (current, kind):
+        return flatgeobuf.JSON
+    return flatgeobuf.STRING
+
+
+class _Spool:
+    def __init__(self, workdir, memory_bytes):
+        self.workdir = workdir
+        self.memory_bytes = memory_bytes
+        self.records = []
+        self.keys = []
+        self.size = 0
+        self.runs = []
+        self.envelope = [math.inf, math.inf, -math.inf, -math.inf]
+
+    # Function to add a batch of features, given as their geometries and spool records
+    def add(self, geometries, records, order):
+        min_x, min_y, max_x, max_y = readers.geometry_bboxes(geometries)
+        keys = hilbert_keys(*lonlat_to_world((min_x + max_x) / 2.0, (min_y + max_y) / 2.0))
+        self.envelope = [
+            min(self.envelope[0], float(min_x.min())),
+            min(self.envelope[1], float(min_y.min())),
+            max(self.envelope[2], float(max_x.max())),
+            max(self.envelope[3], float(max_y.max())),
+        ]
+        for i, data in enumerate(records):
+            self.records.append((order + i, float(min_x[i]), float(min_y[i]), float(max_x[i]), float(max_y[i]), data))
+            self.size += len(data) + RECORD_OVERHEAD
+        self.keys.extend(keys.tolist())
+        if self.size >= self.memory_bytes:
+            self.flush()
+
+    def _sorted(self):
+        order = np.argsort(np.asarray(self.keys, dtype=np.int64), kind="stable")
+        return [(self.keys[i], *self.records[i]) for i in order.tolist()]
+
+    # Function to write the buffered records to disk as one sorted run
+    def flush(self):
+        if not self.records:
+            return
+        path = os.path.join(self.workdir, f"run{len(self.runs)}")
+        with open(path, "wb") as f:
+            for key, order, min_x, min_y, max_x, max_y, data in self._sorted():
+                f.write(RECORD.pack(key, order, min_x, min_y, max_x, max_y, len(data)) + data)
+        self.runs.append(path)
+        self.records, self.keys, self.size = [], [], 0
+
+    # Function to yield every record in Hilbert order, merging the runs if any were spooled
+    def merged(self):
+        if not self.runs:
+            return iter(self._sorted())
+        self.flush()
+        return heapq.merge(*(_read_run(path) for path in self.runs))
+
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            *fields, size = RECORD.unpack(head)
+            yield (*fields, f.read(size))
+
+
+# Function to convert a CSV or GeoJSON input to a spatially indexed FlatGeobuf file
+def convert(path, output_path=None, memory_bytes=MEMORY_BYTES, node_size=NODE_SIZE, workdir=None):
+    started = time.perf_counter()
+    output_path = output_path or converted_path(path)
+    columns = {}
+    geometry_types = set()
+    features = skipped = 0
+
+    with tempfile.TemporaryDirectory(dir=workdir or os.path.dirname(os.path.abspath(output_path))) as tmp:
+        spool = _Spool(tmp, memory_bytes)
+        geometries, records, pending = [], [], 0
+        for feature in readers.iter_features(path):
+            geometry = feature.get("geometry")
+            if not geometry or geometry.get("type") not in WRITABLE_GEOMETRIES or not readers.geometry_parts(geometry):
+                skipped += 1
+                continue
+            geometry_types.add(geometry["type"])
+            feature = _with_id(feature, features + len(records) + skipped + 1)
+            properties = feature.get("properties") or {}
+            for key, value in properties.items():
+                if value is not None:
+                    columns[key] = merge_column_type(columns.get(key), flatgeobuf.column_type(value))
+            # marshal is several times faster than JSON and only ever reads back what it wrote here
+            data = marshal.dumps({"geometry": feature["geometry"], "properties": properties})
+            geometries.append(feature["geometry"])
+            records.append(data)
+            pending += len(data) + RECORD_OVERHEAD
+            # Batches end at the memory budget too, so a few large polygons can't overshoot it
+            if len(records) >= BATCH_SIZE or spool.size + pending >= memory_bytes:
+                spool.add(geometries, records, features)
+                features += len(records)
+                geometries, records, pending = [], [], 0
+        if records:
+            spool.add(geometries, records, features)
+            features += len(records)
+
+        column_index = {column: (index, kind) for index, (column, kind) in enumerate(columns.items())}
+        geometry_type = (
+            flatgeobuf.GEOMETRY_TYPE_CODES[next(iter(geometry_types))] if len(geometry_types) == 1 else 0
+        )
+        feature_path = os.path.join(tmp, "features")
+        node_size = node_size if features else 0
+        nodes = leaves = None
+        if node_size:
+            levels = flatgeobuf.level_bounds(features, node_size)
+            leaf_start = levels[0][0]
+            nodes = np.memmap(
+                os.path.join(tmp, "index"), dtype=flatgeobuf.NODE_DTYPE, mode="w+", shape=(sum(n for _, n in levels),)
+            )
+            leaves = np.empty(min(features, flatgeobuf.NODE_CHUNK), dtype=flatgeobuf.NODE_DTYPE)
+
+        with open(feature_path, "wb") as out:
+            written = filled = 0
+            for _, _, min_x, min_y, max_x, max_y, data in spool.merged():
+                if leaves is not None:
+                    leaves[filled] = (min_x, min_y, max_x, max_y, out.tell())
+                    filled += 1
+                    if filled == len(leaves):
+                        nodes[leaf_start + written : leaf_start + written + filled] = leaves
+                        written += filled
+                        filled = 0
+                out.write(flatgeobuf.encode_feature(marshal.loads(data), column_index, geometry_type))
+            if filled:
+                nodes[leaf_start + written : leaf_start + written + filled] = leaves[:filled]
+        runs = len(spool.runs)
+
+        partial = output_path + ".partial"
+        with open(partial, "wb") as f:
+            f.write(
+                flatgeobuf.encode_header(
+                    list(columns.items()),
+                    features,
+                    geometry_type,
+                    spool.envelope if features else None,
+                    name=argv.layer_name(None, path),
+                    index_node_size=node_size,
+                )
+            )
+            if nodes is not None:
+                flatgeobuf.build_packed_rtree(nodes, features, node_size)
+                nodes.flush()
+                with open(nodes.filename, "rb") as index:
+                    shutil.copyfileobj(index, f, COPY_SIZE)
+                del nodes
+            with open(feature_path, "rb") as feature_file:
+                shutil.copyfileobj(feature_file, f, COPY_SIZE)
+        os.replace(partial, output_path)
+
+    return ConversionStats(
+        input_path=path,
+        output_path=output_path,
+        features=features,
+        skipped=skipped,
+        runs=runs,
+        bytes_in=os.path.getsize(path),
+        bytes_out=os.path.getsize(output_path),
+        seconds=time.perf_counter() - started,
+    )
+
+
+# Function to describe a conversion in one line
+def describe_stats(stats):
+    skipped = f", {stats.skipped} without a writable geometry skipped" if stats.skipped else ""
+    return (
+        f"{stats.output_path}: {stats.features} features in {stats.seconds:.1f}s "
+        f"({stats.bytes_per_second / 1e6:.1f} MB/s, {stats.runs or 'no'} sorted runs spooled{skipped})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert CSV or GeoJSON to FlatGeobuf with a packed Hilbert R-tree")
+    parser.add_argument("input")
+    parser.add_argument("output", nargs="?")
+    parser.add_argument("--memory", type=int, default=MEMORY_BYTES >> 20, help="MB of features to sort in memory")
+    parser.add_argument("--node-size", type=int, default=NODE_SIZE, help="R-tree node size, or 0 for no index")
+    parser.add_argument("--workdir", default=None, help="Directory for the sorted runs (default: next to the output)")
+    args = parser.parse_args()
+    try:
+        stats = convert(args.input, args.output, args.memory << 20, args.node_size, args.workdir)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Couldn't convert {args.input}: {e}")
+    print(describe_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Streaming MBTiles -> PMTiles v3 converter with content-hash tile deduplication.
+
+Tiles are read in PMTiles tile id (Hilbert) order, letting SQLite's external
+sorter do the ordering, so the whole tile index never has to fit in memory.
+Identical tiles (oceans, empty land) are stored once: consecutive repeats become
+run-length entries, and repeats further apart point back at the first copy.
+Tile data and directory entries are spooled to temporary files next to the
+output and assembled at the end.
+
+    python -m tiling_tools.to_pmtiles input.mbtiles output.pmtiles
+"""
+
+import argparse
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from tiling_tools import mbtiles, pmtiles
+from tiling_tools.tiles import flip_y
+
+# Digests of recently written tiles kept for deduplication; repeated tiles stay in it
+DEDUP_CACHE_SIZE = 1000000
+
+# Directory entries buffered before spooling them to disk
+ENTRY_BATCH = 65536
+
+# The header and root directory must fit in the first 16 KiB fetched by clients
+ROOT_LIMIT = 16384 - pmtiles.HEADER_SIZE
+LEAF_SIZE = 4096
+
+TILE_TYPES = {"pbf": 1, "mvt": 1, "png": 2, "jpg": 3, "jpeg": 3, "webp": 4, "avif": 5}
+
+
+@dataclass
+class ConversionStats:
+    input_path: str
+    output_path: str
+    tiles: int = 0
+    unique_tiles: int = 0
+    entries: int = 0
+    leaf_directories: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+
+    @property
+    def tiles_per_second(self):
+        return self.tiles / self.seconds if self.seconds else 0.0
+
+
+# Function to read the peak resident memory of this process so far
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def _tms_tile_id(z, x, row):
+    return pmtiles.tile_id(z, x, flip_y(z, row))
+
+
+class _EntryWriter:
+    def __init__(self, f):
+        self.f = f
+        self.batch = []
+        self.count = 0
+        self.run_start = None  # [tile id, run length, offset, length] of the open entry
+
+    def add(self, tile, offset, length):
+        run = self.run_start
+        if run is not None and run[2] == offset and run[0] + run[1] == tile:
+            run[1] += 1
+            return
+        self._close_run()
+        self.run_start = [tile, 1, offset, length]
+
+    def _close_run(self):
+        if self.run_start is not None:
+            self.batch.append(self.run_start)
+            self.count += 1
+            self.run_start = None
+        if len(self.batch) >= ENTRY_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            np.asarray(self.batch, dtype=np.uint64).tofile(self.f)
+            self.batch = []
+
+    def finish(self):
+        self._close_run()
+        self.flush()
+        self.f.flush()
+
+
+def _compressed_directory(entries):
+    # Spooled columns are tile id, run length, offset, length
+    directory = pmtiles.encode_directory(entries[:, 0], entries[:, 1], entries[:, 3], entries[:, 2])
+    return gzip.compress(directory, mtime=0)
+
+
+# Function to split the spooled entries into leaf directories until the root fits
+def _write_directories(entries, leaves_file):
+    if not len(entries) or len(entries) <= LEAF_SIZE:
+        root = _compressed_directory(np.asarray(entries))
+        if len(root) <= ROOT_LIMIT:
+            return root, 0
+
+    leaf_size = LEAF_SIZE
+    while True:
+        leaves_file.seek(0)
+        leaves_file.truncate()
+        pointers = []
+        for start in range(0, len(entries), leaf_size):
+            chunk = np.asarray(entries[start : start + leaf_size])
+            leaf = _compressed_directory(chunk)
+            pointers.append((int(chunk[0, 0]), leaves_file.tell(), len(leaf)))
+            leaves_file.write(leaf)
+        pointer_ids, pointer_offsets, pointer_lengths = zip(*pointers)
+        root = gzip.compress(
+            pmtiles.encode_directory(pointer_ids, [0] * len(pointers), pointer_lengths, pointer_offsets), mtime=0
+        )
+        if len(root) <= ROOT_LIMIT:
+            leaves_file.flush()
+            return root, len(pointers)
+        leaf_size *= 2
+
+
+def _header_fields(metadata, first_tile):
+    bounds = [float(v) for v in str(metadata.get("bounds", "-180,-85.0511287798,180,85.0511287798")).split(",")]
+    min_zoom = int(metadata.get("minzoom", 0))
+    max_zoom = int(metadata.get("maxzoom", min_zoom))
+    if "center" in metadata:
+        center = [float(v) for v in str(metadata["center"]).split(",")]
+    else:
+        center = [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, min_zoom]
+    tile_format = str(metadata.get("format", "pbf")).lower()
+    compression = mbtiles.tile_compression(metadata)
+    if compression is None:
+        compression = 2 if first_tile is not None and bytes(first_tile[:2]) == b"\x1f\x8b" else 1
+    return {
+        "tile_type": TILE_TYPES.get(tile_format, 0),
+        "tile_compression": compression,
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "min_lon_e7": round(bounds[0] * 1e7),
+        "min_lat_e7": round(bounds[1] * 1e7),
+        "max_lon_e7": round(bounds[2] * 1e7),
+        "max_lat_e7": round(bounds[3] * 1e7),
+        "center_zoom": int(center[2]) if len(center) > 2 else min_zoom,
+        "center_lon_e7": round(center[0] * 1e7),
+        "center_lat_e7": round(center[1] * 1e7),
+    }
+
+
+# Function to convert an MBTiles file into a clustered, deduplicated PMTiles archive
+def convert(input_path, output_path, dedup_cache_size=DEDUP_CACHE_SIZE, progress=None):
+    stats = ConversionStats(input_path=input_path, output_path=output_path)
+    started = time.perf_counter()
+    stats.input_bytes = os.path.getsize(input_path)
+
+    connection = mbtiles.connect(input_path)
+    connection.create_function("pmtiles_tile_id", 3, _tms_tile_id, deterministic=True)
+    workdir = os.path.dirname(os.path.abspath(output_path))
+    with contextlib.ExitStack() as spool:
+        data_file, entries_file, leaves_file = (
+            spool.enter_context(tempfile.TemporaryFile(dir=workdir)) for _ in range(3)
+        )
+        try:
+            metadata = mbtiles.read_metadata(connection)
+            entries = _EntryWriter(entries_file)
+            digests = OrderedDict()
+            first_tile = None
+            cursor = connection.execute(
+                "SELECT pmtiles_tile_id(zoom_level, tile_column, tile_row) AS id, tile_data "
+                "FROM tiles ORDER BY id"
+            )
+            while True:
+                rows = cursor.fetchmany(1024)
+                if not rows:
+                    break
+                for tile, data in rows:
+                    if first_tile is None:
+                        first_tile = data
+                    digest = hashlib.blake2b(data, digest_size=16).digest()
+                    location = digests.get(digest)
+                    if location is None:
+                        location = (data_file.tell(), len(data))
+                        data_file.write(data)
+                        stats.unique_tiles += 1
+                        digests[digest] = location
+                        if len(digests) > dedup_cache_size:
+                            digests.popitem(last=False)
+                    else:
+                        digests.move_to_end(digest)
+                    entries.add(tile, *location)
+                    stats.tiles += 1
+                if progress is not None:
+                    progress(stats.tiles)
+            entries.finish()
+            digests.clear()
+        finally:
+            connection.close()
+
+        stats.entries = entries.count
+        if entries.count:
+            spooled = np.memmap(entries_file, dtype=np.uint64, mode="r", shape=(entries.count, 4))
+        else:
+            spooled = np.empty((0, 4), dtype=np.uint64)
+        root, stats.leaf_directories = _write_directories(spooled, leaves_file)
+        del spooled
+
+        # PMTiles keeps vector_layers and friends at the top level rather than in a "json" string
+        pm_metadata = dict(metadata)
+        if isinstance(pm_metadata.get("json"), dict):
+            pm_metadata.update(pm_metadata.pop("json"))
+        metadata_bytes = gzip.compress(json.dumps(pm_metadata).encode("utf-8"), mtime=0)
+
+        leaves_length = leaves_file.seek(0, os.SEEK_END)
+        data_length = data_file.seek(0, os.SEEK_END)
+        root_offset = pmtiles.HEADER_SIZE
+        header = pmtiles.Header(
+            version=pmtiles.VERSION,
+            root_offset=root_offset,
+            root_length=len(root),
+            metadata_offset=root_offset + len(root),
+            metadata_length=len(metadata_bytes),
+            leaf_directory_offset=root_offset + len(root) + len(metadata_bytes),
+            leaf_directory_length=leaves_length,
+            tile_data_offset=root_offset + len(root) + len(metadata_bytes) + leaves_length,
+            tile_data_length=data_length,
+            addressed_tiles_count=stats.tiles,
+            tile_entries_count=stats.entries,
+            tile_contents_count=stats.unique_tiles,
+            clustered=True,
+            internal_compression=2,
+            **_header_fields(metadata, first_tile),
+        )
+
+        partial = output_path + ".partial"
+        with open(partial, "wb") as out:
+            out.write(pmtiles.pack_header(header))
+            out.write(root)
+            out.write(metadata_bytes)
+            leaves_file.seek(0)
+            shutil.copyfileobj(leaves_file, out, 1 << 20)
+            data_file.seek(0)
+            shutil.copyfileobj(data_file, out, 1 << 20)
+        os.replace(partial, output_path)
+
+    stats.output_bytes = os.path.getsize(output_path)
+    stats.seconds = time.perf_counter() - started
+    stats.peak_rss_mb = peak_rss_mb()
+    return stats
+
+
+# Function to summarise a conversion in one line
+def describe_stats(stats):
+    return (
+        f"{stats.output_path}: {stats.tiles:,} tiles ({stats.unique_tiles:,} unique, {stats.entries:,} entries, "
+        f"{stats.leaf_directories} leaves) in {stats.seconds:.1f}s, {stats.tiles_per_second:,.0f} tiles/s, "
+        f"{stats.input_bytes / 1e6:,.1f} MB -> {stats.output_bytes / 1e6:,.1f} MB, peak RSS {stats.peak_rss_mb:.0f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an MBTiles file to PMTiles")
+    parser.add_argument("input", help="MBTiles file")
+    parser.add_argument("output", nargs="?", help="PMTiles file (default: the input with a .pmtiles extension)")
+    parser.add_argument(
+        "--dedup-cache", type=int, default=DEDUP_CACHE_SIZE, help="Number of tile digests kept for deduplication"
+    )
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.input)[0] + ".pmtiles"
+    stats = convert(args.input, output, args.dedup_cache)
+    print(describe_stats(stats))
+
+
+if __name__ == "__main__":
+    main()